@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -73,6 +74,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'configuracion.middleware.ConfigCacheMiddleware',  # Cachés de configuración al día entre workers
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -233,18 +235,52 @@ SESSION_COOKIE_AGE = 86400  # 24 horas
 SESSION_SAVE_EVERY_REQUEST = False
 
 # Cache configuration
-# Usando cache en memoria (locmem) - no requiere configuración adicional
-# Para producción con múltiples workers, considerar Redis o Memcached
-CACHES = {
-    'default': {
+# Caché compartida entre workers de gunicorn (dashboard e informes).
+# La invalidación es por versión de datos (ver core/cache_datos.py), no por TTL.
+# CACHE_BACKEND:
+#   - 'file'   (default): archivos en CACHE_LOCATION, sin servicios externos
+#   - 'db':     tabla en la base de datos (requiere: python manage.py createcachetable)
+#   - 'redis':  REDIS_URL (requiere el paquete redis)
+#   - 'locmem': memoria por proceso (solo desarrollo / un worker)
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'file')
+_CACHE_OPCIONES = {
+    'MAX_ENTRIES': 1000,
+}
+if CACHE_BACKEND == 'db':
+    _CACHE_DEFAULT = {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': os.getenv('CACHE_LOCATION', 'pesco_cache'),
+        'OPTIONS': _CACHE_OPCIONES,
+    }
+elif CACHE_BACKEND == 'redis':
+    _CACHE_DEFAULT = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/1'),
+    }
+elif CACHE_BACKEND == 'locmem':
+    _CACHE_DEFAULT = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'LOCATION': 'pesco-cache',
-        'TIMEOUT': 300,  # 5 minutos por defecto
-        'OPTIONS': {
-            'MAX_ENTRIES': 1000,
-        }
+        'OPTIONS': _CACHE_OPCIONES,
     }
-}
+else:
+    _CACHE_DEFAULT = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'pesco-cache')),
+        'OPTIONS': _CACHE_OPCIONES,
+    }
+_CACHE_DEFAULT['TIMEOUT'] = 300  # 5 minutos por defecto
+CACHES = {'default': _CACHE_DEFAULT}
+
+# Precalentamiento al cargar la aplicación WSGI (ver core/precarga.py):
+# cachés de configuración, calendario laboral y librerías pesadas. Con
+# gunicorn.conf.py (preload_app) se hace una vez en el maestro.
+PRECALENTAR_AL_INICIAR = os.getenv('PRECALENTAR_AL_INICIAR', str(not DEBUG)) == 'True'
+MODULOS_PRECARGA = [
+    m.strip() for m in os.getenv(
+        'MODULOS_PRECARGA', 'numpy,pandas,openpyxl,reportlab.pdfgen.canvas,supabase'
+    ).split(',') if m.strip()
+]
 
 # Token simple para API de IA (usado por servidor MCP / agentes externos)
 IA_API_TOKEN = os.getenv('IA_API_TOKEN', '')
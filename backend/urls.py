@@ -22,6 +22,7 @@ urlpatterns = [
     path('logout/', core_views.logout_view, name='logout'),
     path('perfil/', core_views.perfil_usuario, name='perfil'),
     path('api/kpi/<str:estado>/', core_views.api_kpi_detalle, name='api_kpi_detalle'),
+    path('api/kpi/solicitud/<int:solicitud_id>/detalles/', core_views.api_kpi_detalle_lineas, name='api_kpi_detalle_lineas'),
     path('ia/chat/', ia_views.ia_chat, name='ia_chat'),
     
     # Gestión de Bodegas (Admin)
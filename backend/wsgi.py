@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_wsgi_application()
+
+# Precalentar cachés y módulos pesados antes del primer request
+# (una sola vez en el maestro si gunicorn usa preload_app)
+from django.conf import settings  # noqa: E402
+
+if settings.PRECALENTAR_AL_INICIAR:
+    from core.precarga import precalentar
+
+    precalentar()
@@ -1,12 +1,13 @@
-import pandas as pd
 import os
 from django.db import connection
 from django.conf import settings
-from supabase import create_client, Client
 from .models import Stock, CargaStock
 
 def get_supabase_client():
     """Retorna cliente de Supabase configurado"""
+    # supabase (y sus dependencias) solo se importan si se va a usar
+    from supabase import create_client
+
     url = os.getenv("SUPABASE_URL")
     key = os.getenv("SUPABASE_KEY")
     if not url or not key:
@@ -20,6 +21,8 @@ def procesar_archivo_stock(archivo, usuario):
     2. Limpia stock antiguo
     3. Carga nuevo stock
     """
+    import pandas as pd
+
     # 1. Crear registro de carga
     carga = CargaStock.objects.create(
         usuario=usuario,
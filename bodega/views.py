@@ -6,14 +6,16 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
 from django.db import IntegrityError, transaction
-from django.db.models import Q, Prefetch
+from django.db.models import F, Prefetch
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
 from django.urls import reverse
 
+from core.busqueda import buscar_detalles, buscar_stock
 from core.decorators import role_required
 from core.models import Bodega
+from core.paginacion import paginar
 from solicitudes.models import SolicitudDetalle, Solicitud
 
 from .forms import TransferenciaForm
@@ -121,20 +123,13 @@ def consultar_stock(request):
     
     # Optimización: Búsqueda más eficiente
     if query:
-        # Si parece un código (corto, sin espacios), búsqueda exacta (más rápida)
-        if len(query) < 20 and ' ' not in query:
-            stock_list = stock_list.filter(codigo__istartswith=query)
-        else:
-            # Para descripciones, usar icontains (más lento pero necesario)
-            stock_list = stock_list.filter(descripcion__icontains=query)
+        stock_list = buscar_stock(stock_list, query)
         
     if bodega:
         stock_list = stock_list.filter(bodega=bodega)
         
-    # Paginación
-    paginator = Paginator(stock_list, 50)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Paginación por keyset sobre (codigo, bodega): sin COUNT(*) ni OFFSET por página
+    page_obj = paginar(stock_list, ('codigo', 'bodega', 'id'), request.GET, limite=50)
     
     # Obtener lista de bodegas para el filtro
     bodegas = Stock.objects.values_list('bodega', 'bodega_nombre').distinct().order_by('bodega')
@@ -189,11 +184,7 @@ def gestion_pedidos(request):
             detalles_qs = detalles_qs.none()
 
     if q:
-        detalles_qs = detalles_qs.filter(
-            Q(solicitud__cliente__icontains=q)
-            | Q(solicitud__numero_pedido__icontains=q)
-            | Q(codigo__icontains=q)
-        )
+        detalles_qs = buscar_detalles(detalles_qs, q)
 
     if bodega_filtro:
         detalles_qs = detalles_qs.filter(bodega=bodega_filtro)
@@ -382,8 +373,10 @@ def registrar_transferencia(request, detalle_id):
                 mover_stock(detalle.codigo, bodega_origen, detalle.cantidad, solicitud=detalle.solicitud)
 
                 # Si todas las líneas están preparadas, mover solicitud a en_despacho
-                solicitud = detalle.solicitud
-                if not solicitud.detalles.exclude(estado_bodega='preparado').exists():
+                solicitud = Solicitud.objects.filter(
+                    pk=detalle.solicitud_id, lineas_preparadas=F('lineas_total')
+                ).first()
+                if solicitud:
                     solicitud.estado = 'en_despacho'
                     solicitud.save(update_fields=['estado'])
 
@@ -502,11 +495,13 @@ def registrar_transferencia_multiple(request):
                 mover_stock(detalle.codigo, bodega_origen, detalle.cantidad, solicitud=detalle.solicitud)
                 solicitudes_afectadas.add(detalle.solicitud_id)
 
-            for solicitud_id in solicitudes_afectadas:
-                solicitud = Solicitud.objects.get(pk=solicitud_id)
-                if not solicitud.detalles.exclude(estado_bodega='preparado').exists():
-                    solicitud.estado = 'en_despacho'
-                    solicitud.save(update_fields=['estado'])
+            # Los contadores de avance ya incluyen las líneas recién preparadas
+            completas = Solicitud.objects.filter(
+                pk__in=solicitudes_afectadas, lineas_preparadas=F('lineas_total')
+            )
+            for solicitud in completas:
+                solicitud.estado = 'en_despacho'
+                solicitud.save(update_fields=['estado'])
 
     except IntegrityError as exc:
         return JsonResponse({'success': False, 'message': f'Error al registrar transferencias: {exc}'}, status=400)
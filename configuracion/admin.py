@@ -0,0 +1,11 @@
+from django.contrib import admin
+
+from .models import Feriado
+
+
+@admin.register(Feriado)
+class FeriadoAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'nombre', 'es_inamovible', 'activo')
+    list_filter = ('activo', 'es_inamovible')
+    search_fields = ('nombre',)
+    date_hierarchy = 'fecha'
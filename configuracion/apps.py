@@ -6,3 +6,6 @@ class ConfiguracionConfig(AppConfig):
     name = 'configuracion'
     verbose_name = 'Configuración del Sistema'
 
+    def ready(self):
+        # Invalidación de cachés de configuración entre procesos
+        from . import signals  # noqa: F401
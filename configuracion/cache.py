@@ -0,0 +1,87 @@
+"""
+Invalidación entre procesos de las cachés en memoria de configuración.
+
+EstadoWorkflow, TransporteConfig, TipoSolicitud, ClienteCanonico y Feriado
+guardan sus filas en atributos de clase por proceso. Cada cambio (señales en
+configuracion.signals) graba una "versión de configuración" nueva (un token
+único, core.cache_datos.nueva_version) en la caché compartida;
+ConfigCacheMiddleware compara esa versión una vez por request y solo si
+cambió limpia las cachés locales, que se recargan al siguiente uso.
+"""
+
+import logging
+import threading
+
+from django.core.cache import cache
+from django.db import transaction
+
+from core.cache_datos import nueva_version
+
+logger = logging.getLogger(__name__)
+
+CLAVE_VERSION_CONFIG = 'config_version'
+
+# Versión con la que se cargaron las cachés de este proceso
+_version_local = None
+_lock = threading.Lock()
+_pendiente = threading.local()
+
+
+def _modelos_cacheados():
+    from .models import ClienteCanonico, EstadoWorkflow, Feriado, TipoSolicitud, TransporteConfig
+    return (EstadoWorkflow, TransporteConfig, TipoSolicitud, ClienteCanonico, Feriado)
+
+
+def version_config():
+    """Versión actual de la configuración (compartida entre workers)."""
+    version = cache.get(CLAVE_VERSION_CONFIG)
+    if version is None:
+        # Si la clave se pierde, la nueva versión nunca coincide con una anterior
+        cache.add(CLAVE_VERSION_CONFIG, nueva_version(), timeout=None)
+        version = cache.get(CLAVE_VERSION_CONFIG)
+    return version
+
+
+def incrementar_version_config():
+    """Agenda el cambio de versión para después del commit (uno por transacción)."""
+    _pendiente.activo = True
+    transaction.on_commit(_incrementar_pendiente)
+
+
+def _incrementar_pendiente():
+    if not getattr(_pendiente, 'activo', False):
+        return
+    _pendiente.activo = False
+    # set() de un token nuevo: incr() no es atómico en FileBasedCache y dos
+    # cambios simultáneos podían quedar en una sola versión
+    cache.set(CLAVE_VERSION_CONFIG, nueva_version(), timeout=None)
+
+
+def limpiar_caches_locales():
+    for modelo in _modelos_cacheados():
+        modelo.limpiar_cache()
+
+
+def sincronizar_caches_config():
+    """
+    Limpia las cachés de configuración de este proceso si otro proceso
+    modificó la configuración desde la última verificación.
+
+    Returns:
+        bool: True si se limpiaron.
+    """
+    global _version_local
+    try:
+        version = version_config()
+    except Exception as e:
+        # Sin caché compartida no hay con qué comparar: seguir con la caché local
+        logger.warning(f"No se pudo leer la versión de configuración: {e}")
+        return False
+    if version == _version_local:
+        return False
+    with _lock:
+        if version == _version_local:
+            return False
+        limpiar_caches_locales()
+        _version_local = version
+    return True
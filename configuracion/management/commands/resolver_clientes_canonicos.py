@@ -0,0 +1,44 @@
+"""
+Vuelve a resolver Solicitud.cliente_canonico para todas las solicitudes.
+
+Necesario después de agregar/editar clientes canónicos o sus aliases: las
+solicitudes solo se resuelven al grabarse.
+
+Uso:
+  python manage.py resolver_clientes_canonicos
+"""
+
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from configuracion.models import ClienteCanonico
+from core.cache_datos import incrementar_version_datos
+from solicitudes.models import Solicitud
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el cliente canónico (sucursal/taller) de todas las solicitudes.'
+
+    def handle(self, *args, **options):
+        ClienteCanonico.limpiar_cache()
+
+        clientes_por_canonico = defaultdict(list)
+        for cliente in Solicitud.objects.values_list('cliente', flat=True).distinct():
+            clientes_por_canonico[ClienteCanonico.resolver_id(cliente)].append(cliente)
+
+        actualizadas = 0
+        for cliente_id, clientes in clientes_por_canonico.items():
+            for i in range(0, len(clientes), 500):
+                actualizadas += (
+                    Solicitud.objects
+                    .filter(cliente__in=clientes[i:i + 500])
+                    .exclude(cliente_canonico_id=cliente_id)
+                    .update(cliente_canonico_id=cliente_id)
+                )
+
+        incrementar_version_datos()
+        self.stdout.write(self.style.SUCCESS(
+            f'Clientes distintos: {sum(len(c) for c in clientes_por_canonico.values())} | '
+            f'Solicitudes actualizadas: {actualizadas}'
+        ))
@@ -0,0 +1,15 @@
+from .cache import sincronizar_caches_config
+
+
+class ConfigCacheMiddleware:
+    """
+    Verifica la versión de configuración una vez por request y, si otro
+    worker la cambió, limpia las cachés de configuración de este proceso.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sincronizar_caches_config()
+        return self.get_response(request)
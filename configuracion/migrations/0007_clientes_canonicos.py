@@ -0,0 +1,70 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+CLIENTES_CANONICOS = [
+    # (nombre, categoria, orden, aliases) - migrado desde sucursales_map del dashboard
+    ('SUC ANTOFAGASTA', 'sucursal', 10, ['SUC ANTOFAGASTA', 'SUCURSAL ANTOFAGASTA', 'SUC ANTOFA']),
+    ('SUC CALAMA', 'sucursal', 20, ['SUC CALAMA', 'SUCURSAL CALAMA']),
+    ('SUC PTO MONTT', 'sucursal', 30, ['SUC PTO MONTT', 'SUC PTO. MONTT', 'SUC PUERTO MONTT', 'SUCURSAL PTO MONTT']),
+    ('SUC LOS ANGELES', 'sucursal', 40, ['SUC LOS ANGELES', 'SUCURSAL LOS ANGELES', 'SUC LOS ÁNGELES']),
+    ('TALLER HMS', 'taller', 50, ['HMS', 'TALLER HMS']),
+    ('TALLER OLEOHTEC', 'taller', 60, ['OLEOHTEC', 'TALLER OLEOHTEC']),
+]
+
+
+def seed_clientes(apps, schema_editor):
+    ClienteCanonico = apps.get_model('configuracion', 'ClienteCanonico')
+    AliasCliente = apps.get_model('configuracion', 'AliasCliente')
+
+    for nombre, categoria, orden, aliases in CLIENTES_CANONICOS:
+        cliente, _ = ClienteCanonico.objects.update_or_create(
+            nombre=nombre,
+            defaults={'categoria': categoria, 'orden': orden, 'activo': True},
+        )
+        for i, alias in enumerate(aliases):
+            AliasCliente.objects.get_or_create(alias=alias, defaults={'cliente': cliente, 'orden': i})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('configuracion', '0006_remove_feriado_idx_feriado_fecha_activo_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClienteCanonico',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, unique=True, verbose_name='Nombre canónico')),
+                ('categoria', models.CharField(choices=[('sucursal', 'Sucursal'), ('taller', 'Taller')], default='sucursal', max_length=20)),
+                ('orden', models.PositiveIntegerField(default=0, help_text='Orden en gráficos y prioridad de resolución')),
+                ('activo', models.BooleanField(default=True)),
+            ],
+            options={
+                'verbose_name': 'Cliente canónico',
+                'verbose_name_plural': 'Clientes canónicos',
+                'db_table': 'config_clientes_canonicos',
+                'ordering': ['orden', 'nombre'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AliasCliente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alias', models.CharField(help_text='Se compara en mayúsculas', max_length=200, unique=True)),
+                ('orden', models.PositiveIntegerField(default=0)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='configuracion.clientecanonico')),
+            ],
+            options={
+                'verbose_name': 'Alias de cliente',
+                'verbose_name_plural': 'Aliases de clientes',
+                'db_table': 'config_clientes_aliases',
+                'ordering': ['cliente', 'orden', 'alias'],
+            },
+        ),
+        migrations.RunPython(seed_clientes, migrations.RunPython.noop),
+    ]
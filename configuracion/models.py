@@ -1,5 +1,10 @@
+import unicodedata
+
 from django.db import models
 
+# Textos libres (transporte, cliente) resueltos que se memorizan por proceso
+MAX_RESOLUCIONES = 2000
+
 
 class EstadoWorkflow(models.Model):
     TIPO_SOLICITUD = 'solicitud'
@@ -115,9 +120,22 @@ class TransporteConfig(models.Model):
     activo = models.BooleanField(default=True)
     requiere_ot = models.BooleanField(default=False)
 
+    # Variantes de escritura vistas en planillas y payloads → slug.
+    # Solo se usan si el transporte destino existe y está activo.
+    ALIASES = {
+        'camion pesco': 'PESCO',
+        'retira cliente': 'RETIRA_CLIENTE',
+        'av logistica': 'OTRO',
+        'geomail': 'OTRO',
+        'exportacion': 'OTRO',
+    }
+
     # Caché en memoria para evitar queries repetidas
     _cache_objetos = {}
     _cache_etiquetas = {}
+    _cache_activos = []
+    _cache_indice = {}
+    _cache_resoluciones = {}
     _cache_cargado = False
 
     class Meta:
@@ -135,17 +153,74 @@ class TransporteConfig(models.Model):
         if cls._cache_cargado:
             return
         
-        transportes = cls.objects.all()
+        transportes = cls.objects.order_by('orden', 'nombre')
         for transporte in transportes:
             cls._cache_objetos[transporte.slug] = transporte
             cls._cache_etiquetas[transporte.slug] = transporte.nombre
+
+        # Índice de normalización: slug / nombre / alias (sin tildes, minúsculas) → slug
+        cls._cache_activos = [t for t in transportes if t.activo]
+        indice = {}
+        for transporte in cls._cache_activos:
+            indice.setdefault(cls.normalizar_clave(transporte.slug), transporte.slug)
+            indice.setdefault(cls.normalizar_clave(transporte.nombre), transporte.slug)
+        slugs_activos = {t.slug for t in cls._cache_activos}
+        for alias, slug in cls.ALIASES.items():
+            if slug in slugs_activos:
+                indice.setdefault(alias, slug)
+        cls._cache_indice = indice
+        cls._cache_resoluciones = {}
         
         cls._cache_cargado = True
 
+    @staticmethod
+    def normalizar_clave(texto):
+        """'Camión  PESCO' / 'RETIRA_CLIENTE' → 'camion pesco' / 'retira cliente'"""
+        texto = unicodedata.normalize('NFKD', str(texto))
+        texto = ''.join(c for c in texto if not unicodedata.combining(c))
+        return ' '.join(texto.replace('_', ' ').lower().split())
+
     @classmethod
     def activos(cls):
         return cls.objects.filter(activo=True).order_by('orden', 'nombre')
 
+    @classmethod
+    def opciones(cls):
+        """(slug, nombre) de los transportes activos, desde la caché"""
+        cls._cargar_cache()
+        return [(t.slug, t.nombre) for t in cls._cache_activos]
+
+    @classmethod
+    def slug_por_defecto(cls):
+        """Primer transporte activo según orden (PESCO si no hay configuración)"""
+        cls._cargar_cache()
+        return cls._cache_activos[0].slug if cls._cache_activos else 'PESCO'
+
+    @classmethod
+    def resolver(cls, valor):
+        """
+        Slug del transporte activo que corresponde a un texto libre, o None.
+
+        Primero coincidencia exacta de slug, nombre o alias; si no, la clave
+        más larga contenida en el texto ('CAMION PESCO 2' → PESCO). Solo se
+        memorizan los aciertos, hasta MAX_RESOLUCIONES textos por proceso: el
+        texto libre de importaciones no hace crecer la caché sin límite.
+        """
+        clave = cls.normalizar_clave(valor or '')
+        if not clave:
+            return None
+        cls._cargar_cache()
+        slug = cls._cache_indice.get(clave) or cls._cache_resoluciones.get(clave)
+        if slug is not None:
+            return slug
+        contenidas = [k for k in cls._cache_indice if f' {k} ' in f' {clave} ']
+        if not contenidas:
+            return None
+        slug = cls._cache_indice[max(contenidas, key=len)]
+        if len(cls._cache_resoluciones) < MAX_RESOLUCIONES:
+            cls._cache_resoluciones[clave] = slug
+        return slug
+
     @classmethod
     def obtener(cls, slug):
         """Obtiene un transporte usando caché en memoria"""
@@ -165,6 +240,9 @@ class TransporteConfig(models.Model):
         """Limpia el caché (útil para testing o después de cambios)"""
         cls._cache_objetos.clear()
         cls._cache_etiquetas.clear()
+        cls._cache_activos = []
+        cls._cache_indice = {}
+        cls._cache_resoluciones = {}
         cls._cache_cargado = False
 
 
@@ -184,6 +262,7 @@ class TipoSolicitud(models.Model):
     # Caché en memoria para evitar queries repetidas
     _cache_objetos = {}
     _cache_etiquetas = {}
+    _cache_activos = []
     _cache_cargado = False
 
     class Meta:
@@ -201,10 +280,11 @@ class TipoSolicitud(models.Model):
         if cls._cache_cargado:
             return
         
-        tipos = cls.objects.all()
+        tipos = cls.objects.order_by('orden', 'codigo')
         for tipo in tipos:
             cls._cache_objetos[tipo.codigo] = tipo
             cls._cache_etiquetas[tipo.codigo] = tipo.nombre
+        cls._cache_activos = [tipo for tipo in tipos if tipo.activo]
         
         cls._cache_cargado = True
 
@@ -214,6 +294,12 @@ class TipoSolicitud(models.Model):
         cls._cargar_cache()
         return cls.objects.filter(activo=True).order_by('orden', 'codigo')
 
+    @classmethod
+    def opciones(cls):
+        """(codigo, nombre) de los tipos activos, desde la caché"""
+        cls._cargar_cache()
+        return [(t.codigo, t.nombre) for t in cls._cache_activos]
+
     @classmethod
     def obtener(cls, codigo):
         """Obtiene un tipo usando caché en memoria"""
@@ -233,4 +319,187 @@ class TipoSolicitud(models.Model):
         """Limpia el caché (útil para testing o después de cambios)"""
         cls._cache_objetos.clear()
         cls._cache_etiquetas.clear()
+        cls._cache_activos = []
         cls._cache_cargado = False
+
+
+class ClienteCanonico(models.Model):
+    """
+    Dimensión de clientes internos (sucursales y talleres) con nombre canónico.
+
+    Solicitud.cliente es texto libre; cada solicitud guarda el cliente canónico
+    resuelto al grabarse (Solicitud.cliente_canonico), de modo que los gráficos
+    del dashboard agrupan con GROUP BY en lugar de comparar textos en Python.
+    """
+
+    CATEGORIA_SUCURSAL = 'sucursal'
+    CATEGORIA_TALLER = 'taller'
+    CATEGORIAS = [
+        (CATEGORIA_SUCURSAL, 'Sucursal'),
+        (CATEGORIA_TALLER, 'Taller'),
+    ]
+
+    nombre = models.CharField(max_length=100, unique=True, verbose_name='Nombre canónico')
+    categoria = models.CharField(max_length=20, choices=CATEGORIAS, default=CATEGORIA_SUCURSAL)
+    orden = models.PositiveIntegerField(default=0, help_text='Orden en gráficos y prioridad de resolución')
+    activo = models.BooleanField(default=True)
+
+    # Caché en memoria: aliases ordenados + resoluciones ya calculadas
+    _cache_aliases = []
+    _cache_resoluciones = {}
+    _cache_cargado = False
+
+    class Meta:
+        db_table = 'config_clientes_canonicos'
+        ordering = ['orden', 'nombre']
+        verbose_name = 'Cliente canónico'
+        verbose_name_plural = 'Clientes canónicos'
+
+    def __str__(self):
+        return self.nombre
+
+    @classmethod
+    def _cargar_cache(cls):
+        """Carga los aliases activos una sola vez, en orden de prioridad"""
+        if cls._cache_cargado:
+            return
+
+        aliases = (
+            AliasCliente.objects
+            .filter(cliente__activo=True)
+            .select_related('cliente')
+            .order_by('cliente__orden', 'cliente__nombre', 'orden', 'id')
+        )
+        cls._cache_aliases = [(alias.alias.upper(), alias.cliente_id) for alias in aliases]
+        # Los aliases exactos se resuelven directo, sin comparar textos
+        cls._cache_resoluciones = {}
+        for alias, cliente_id in cls._cache_aliases:
+            cls._cache_resoluciones.setdefault(alias, cls._resolver_texto(alias))
+        cls._cache_cargado = True
+
+    @classmethod
+    def _resolver_texto(cls, cliente_upper):
+        # Un alias coincide si está contenido en el cliente o el cliente en el alias
+        # (ej: "SUCURSAL CALAMA - REPUESTOS" y "HMS"); gana el primero en orden
+        for alias, cliente_id in cls._cache_aliases:
+            if alias in cliente_upper or cliente_upper in alias:
+                return cliente_id
+        return None
+
+    @classmethod
+    def resolver_id(cls, cliente):
+        """
+        Retorna el id del cliente canónico para un texto libre de cliente (o None).
+        Los aliases configurados y los aciertos (hasta MAX_RESOLUCIONES) se
+        memorizan por proceso; un texto sin cliente se vuelve a comparar.
+        """
+        cliente_upper = (cliente or '').upper().strip()
+        if not cliente_upper:
+            return None
+        cls._cargar_cache()
+        try:
+            return cls._cache_resoluciones[cliente_upper]
+        except KeyError:
+            cliente_id = cls._resolver_texto(cliente_upper)
+            if cliente_id is not None and len(cls._cache_resoluciones) < MAX_RESOLUCIONES:
+                cls._cache_resoluciones[cliente_upper] = cliente_id
+            return cliente_id
+
+    @classmethod
+    def limpiar_cache(cls):
+        """Limpia el caché (útil para testing o después de cambios)"""
+        cls._cache_aliases = []
+        cls._cache_resoluciones = {}
+        cls._cache_cargado = False
+
+
+class AliasCliente(models.Model):
+    """Variación de escritura de un cliente canónico (ej: 'SUC ANTOFA')."""
+
+    cliente = models.ForeignKey(ClienteCanonico, on_delete=models.CASCADE, related_name='aliases')
+    alias = models.CharField(max_length=200, unique=True, help_text='Se compara en mayúsculas')
+    orden = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'config_clientes_aliases'
+        ordering = ['cliente', 'orden', 'alias']
+        verbose_name = 'Alias de cliente'
+        verbose_name_plural = 'Aliases de clientes'
+
+    def __str__(self):
+        return f"{self.alias} → {self.cliente}"
+
+    def save(self, *args, **kwargs):
+        self.alias = self.alias.upper().strip()
+        super().save(*args, **kwargs)
+
+
+class Feriado(models.Model):
+    """
+    Feriados de Chile: días sin jornada para el calendario laboral
+    (core.business_hours) y los días hábiles (core.business_days).
+
+    El calendario carga los feriados una vez por año y por proceso; grabar o
+    eliminar un feriado limpia esa caché (configuracion.signals). Las horas ya materializadas en la
+    tabla de lead times no cambian solas: tras cargar feriados pasados, correr
+    reconstruir_lead_times y actualizar_rollups_kpi --reconstruir.
+    """
+
+    fecha = models.DateField(unique=True, db_index=True, verbose_name='Fecha del feriado')
+    nombre = models.CharField(
+        max_length=100,
+        verbose_name='Nombre del feriado',
+        help_text='Ej: Año Nuevo, Fiestas Patrias, etc.',
+    )
+    descripcion = models.TextField(
+        blank=True,
+        verbose_name='Descripción',
+        help_text='Información adicional sobre el feriado',
+    )
+    es_inamovible = models.BooleanField(
+        default=True,
+        verbose_name='¿Es inamovible?',
+        help_text='Si es False, puede moverse al lunes siguiente',
+    )
+    activo = models.BooleanField(
+        default=True,
+        verbose_name='Activo',
+        help_text='Desmarcar para ignorar este feriado en cálculos',
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Caché en memoria: año → frozenset de fechas activas
+    _cache_por_año = {}
+
+    class Meta:
+        db_table = 'config_feriados'
+        ordering = ['fecha']
+        verbose_name = 'Feriado'
+        verbose_name_plural = 'Feriados'
+        indexes = [
+            models.Index(fields=['fecha', 'activo'], name='idx_feriado_fecha_activo'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha:%d/%m/%Y} - {self.nombre}"
+
+    @classmethod
+    def fechas_del_año(cls, año):
+        """Fechas de feriados activos del año (frozenset, una consulta por año)."""
+        try:
+            return cls._cache_por_año[año]
+        except KeyError:
+            fechas = frozenset(
+                cls.objects.filter(fecha__year=año, activo=True).values_list('fecha', flat=True)
+            )
+            cls._cache_por_año[año] = fechas
+            return fechas
+
+    @classmethod
+    def limpiar_cache(cls):
+        """Limpia el caché y el calendario laboral que lo usa"""
+        from core.business_hours import reiniciar_calendario_laboral
+
+        cls._cache_por_año = {}
+        reiniciar_calendario_laboral()
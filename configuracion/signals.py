@@ -0,0 +1,43 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.cache_datos import invalidar_cache_datos
+from .cache import incrementar_version_config
+from .models import AliasCliente, ClienteCanonico, EstadoWorkflow, Feriado, TipoSolicitud, TransporteConfig
+
+
+@receiver(post_save, sender=EstadoWorkflow)
+@receiver(post_delete, sender=EstadoWorkflow)
+@receiver(post_save, sender=TransporteConfig)
+@receiver(post_delete, sender=TransporteConfig)
+@receiver(post_save, sender=TipoSolicitud)
+@receiver(post_delete, sender=TipoSolicitud)
+@receiver(post_save, sender=ClienteCanonico)
+@receiver(post_delete, sender=ClienteCanonico)
+def configuracion_modificada(sender, raw=False, **kwargs):
+    """Limpia la caché de este proceso y avisa al resto con la versión de configuración."""
+    if raw:
+        return
+    sender.limpiar_cache()
+    incrementar_version_config()
+
+
+@receiver(post_save, sender=AliasCliente)
+@receiver(post_delete, sender=AliasCliente)
+def alias_modificado(sender, raw=False, **kwargs):
+    """Los aliases se cachean dentro de ClienteCanonico."""
+    if raw:
+        return
+    ClienteCanonico.limpiar_cache()
+    incrementar_version_config()
+
+
+@receiver(post_save, sender=Feriado)
+@receiver(post_delete, sender=Feriado)
+def feriado_modificado(sender, raw=False, **kwargs):
+    """Los feriados cambian el calendario laboral: también caducan los indicadores."""
+    if raw:
+        return
+    Feriado.limpiar_cache()
+    incrementar_version_config()
+    invalidar_cache_datos()
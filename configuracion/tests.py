@@ -0,0 +1,116 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from core.cache_datos import nueva_version
+from solicitudes.services import SolicitudServiceError, _normalizar_transporte
+
+from . import cache as config_cache, models
+from .models import AliasCliente, ClienteCanonico, TransporteConfig
+
+
+class ResolucionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        TransporteConfig.objects.bulk_create([
+            TransporteConfig(slug='PESCO', nombre='Camión PESCO', orden=0),
+            TransporteConfig(slug='RETIRA_CLIENTE', nombre='Retira cliente', orden=1),
+            TransporteConfig(slug='STARKEN', nombre='Starken', orden=2),
+            TransporteConfig(slug='VIEJO', nombre='Viejo', activo=False),
+        ])
+        calama = ClienteCanonico.objects.create(nombre='SUC CALAMA', orden=0)
+        taller = ClienteCanonico.objects.create(nombre='TALLER HMS', orden=1, categoria='taller')
+        inactivo = ClienteCanonico.objects.create(nombre='SUC CERRADA', activo=False)
+        AliasCliente.objects.create(cliente=calama, alias='calama')
+        AliasCliente.objects.create(cliente=taller, alias='HMS')
+        AliasCliente.objects.create(cliente=inactivo, alias='CERRADA')
+        cls.calama, cls.taller = calama, taller
+
+    def setUp(self):
+        TransporteConfig.limpiar_cache()
+        ClienteCanonico.limpiar_cache()
+
+    def test_transporte(self):
+        casos = {
+            'PESCO': 'PESCO',
+            'camion pesco': 'PESCO',
+            'CAMIÓN  PESCO 2': 'PESCO',
+            'retira_cliente': 'RETIRA_CLIENTE',
+            'starken sucursal': 'STARKEN',
+            'viejo': None,
+            'desconocido': None,
+            '': None,
+        }
+        for texto, esperado in casos.items():
+            self.assertEqual(TransporteConfig.resolver(texto), esperado, texto)
+
+    def test_transporte_desconocido_es_error(self):
+        self.assertEqual(_normalizar_transporte(''), 'PESCO')
+        self.assertEqual(_normalizar_transporte('Starken'), 'STARKEN')
+        with self.assertRaises(SolicitudServiceError):
+            _normalizar_transporte('desconocido')
+
+    def test_cliente(self):
+        self.assertEqual(ClienteCanonico.resolver_id('Sucursal Calama - Repuestos'), self.calama.pk)
+        self.assertEqual(ClienteCanonico.resolver_id('hms'), self.taller.pk)
+        self.assertIsNone(ClienteCanonico.resolver_id('SUC CERRADA'))
+        self.assertIsNone(ClienteCanonico.resolver_id('otro cliente'))
+
+    def test_memo_acotada(self):
+        with mock.patch.object(models, 'MAX_RESOLUCIONES', 3):
+            for n in range(10):
+                TransporteConfig.resolver(f'starken {n}')
+                TransporteConfig.resolver(f'nadie {n}')
+                ClienteCanonico.resolver_id(f'calama {n}')
+                ClienteCanonico.resolver_id(f'nadie {n}')
+        self.assertEqual(len(TransporteConfig._cache_resoluciones), 3)
+        # Los aliases configurados ya estaban (2 activos) y se agregó un acierto
+        self.assertEqual(len(ClienteCanonico._cache_resoluciones), 3)
+        self.assertNotIn('NADIE 0', ClienteCanonico._cache_resoluciones)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class VersionConfigTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        TransporteConfig.objects.create(slug='STARKEN', nombre='Starken')
+
+    def setUp(self):
+        cache.clear()
+        config_cache.sincronizar_caches_config()
+
+    def test_cambio_en_otro_proceso_limpia_la_cache_local(self):
+        self.assertEqual(TransporteConfig.etiqueta('STARKEN'), 'Starken')
+        # Otro worker cambia la fila: aquí sin señales, la caché local no se entera
+        TransporteConfig.objects.filter(slug='STARKEN').update(nombre='Starken Express')
+        self.assertFalse(config_cache.sincronizar_caches_config())
+        self.assertEqual(TransporteConfig.etiqueta('STARKEN'), 'Starken')
+
+        # ...hasta que ese worker publica la nueva versión
+        cache.set(config_cache.CLAVE_VERSION_CONFIG, nueva_version(), timeout=None)
+        self.assertTrue(config_cache.sincronizar_caches_config())
+        self.assertEqual(TransporteConfig.etiqueta('STARKEN'), 'Starken Express')
+        self.assertFalse(config_cache.sincronizar_caches_config())
+
+    def test_una_version_nueva_por_transaccion_al_commit(self):
+        anterior = config_cache.version_config()
+        with mock.patch.object(config_cache, 'nueva_version', wraps=nueva_version) as generar, \
+                self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                for nombre in ('Starken 1', 'Starken 2'):
+                    transporte = TransporteConfig.objects.get(slug='STARKEN')
+                    transporte.nombre = nombre
+                    transporte.save()
+                # Antes del commit el resto de los procesos sigue con la versión anterior
+                self.assertEqual(config_cache.version_config(), anterior)
+        self.assertEqual(generar.call_count, 1)
+        self.assertNotEqual(config_cache.version_config(), anterior)
+        self.assertTrue(config_cache.sincronizar_caches_config())
+
+    def test_version_perdida_fuerza_recarga(self):
+        cache.delete(config_cache.CLAVE_VERSION_CONFIG)
+        self.assertTrue(config_cache.sincronizar_caches_config())
@@ -5,27 +5,52 @@ Este módulo proporciona funciones para:
 - Calcular días hábiles entre dos fechas
 - Considerar feriados de Chile
 - Aplicar hora de corte (14:30) para conteo de días
+
+Todo se apoya en el calendario de core.business_hours (acumulados de días
+hábiles por día, feriados de configuracion.Feriado en caché por año), así que
+contar o avanzar días hábiles es O(1) en vez de recorrer día por día.
 """
 
 from datetime import datetime, time, timedelta
+from functools import lru_cache
+
 from django.utils import timezone
 import pytz
 
+from .business_hours import CalendarioLaboral, obtener_calendario_laboral
+
+
+@lru_cache(maxsize=8)
+def _calendario_con_feriados(feriados):
+    return CalendarioLaboral(feriados=feriados)
+
+
+def _calendario(feriados_list=None):
+    """Calendario compartido (feriados configurados) o uno con la lista explícita."""
+    if feriados_list is None:
+        return obtener_calendario_laboral()
+    return _calendario_con_feriados(frozenset(feriados_list))
+
 
-def ajustar_fecha_por_hora_corte(fecha_hora, hora_corte_str='14:30'):
+def _a_date(fecha):
+    return fecha.date() if isinstance(fecha, datetime) else fecha
+
+
+def ajustar_fecha_por_hora_corte(fecha_hora, hora_corte_str='14:30', feriados_list=None):
     """
     Ajusta la fecha inicial según la hora de corte.
-    
+
     Si la solicitud se crea después de la hora de corte (14:30),
     se considera que inicia el siguiente día hábil.
-    
+
     Args:
         fecha_hora: datetime con timezone (aware)
         hora_corte_str: hora de corte en formato 'HH:MM' (default: '14:30')
-    
+        feriados_list: fechas feriadas (default: feriados configurados)
+
     Returns:
         datetime ajustado al siguiente día hábil si aplica
-    
+
     Example:
         >>> # Solicitud a las 15:00 del viernes
         >>> fecha = datetime(2026, 1, 3, 15, 0)
@@ -38,128 +63,96 @@ def ajustar_fecha_por_hora_corte(fecha_hora, hora_corte_str='14:30'):
         fecha_chile = fecha_hora.astimezone(chile_tz)
     else:
         fecha_chile = chile_tz.localize(fecha_hora)
-    
+
     # Parsear hora de corte
     hora_corte_partes = hora_corte_str.split(':')
     hora_corte = time(int(hora_corte_partes[0]), int(hora_corte_partes[1]))
-    
+
     # Si es después de la hora de corte, mover al siguiente día
     if fecha_chile.time() >= hora_corte:
         fecha_chile = fecha_chile + timedelta(days=1)
         # Resetear a inicio del día (00:00)
         fecha_chile = fecha_chile.replace(hour=0, minute=0, second=0, microsecond=0)
-    
-    # Si cae en fin de semana, mover al siguiente lunes
-    while fecha_chile.weekday() >= 5:  # 5=sábado, 6=domingo
-        fecha_chile = fecha_chile + timedelta(days=1)
-    
+
+    # Si cae en fin de semana o feriado, mover al siguiente día hábil
+    dia = fecha_chile.date()
+    habil = _calendario(feriados_list).siguiente_habil(dia)
+    if habil != dia:
+        fecha_chile = fecha_chile + timedelta(days=(habil - dia).days)
+
     return fecha_chile
 
 
 def es_dia_habil(fecha, feriados_list=None):
     """
     Verifica si una fecha es día hábil en Chile.
-    
+
     Args:
         fecha: date o datetime
-        feriados_list: lista de fechas (date) que son feriados
-    
+        feriados_list: fechas (date) feriadas (default: feriados configurados)
+
     Returns:
         bool: True si es día hábil, False si no
     """
-    if feriados_list is None:
-        feriados_list = []
-    
-    # Convertir datetime a date si es necesario
-    if isinstance(fecha, datetime):
-        fecha_date = fecha.date()
-    else:
-        fecha_date = fecha
-    
-    # Verificar si es fin de semana (sábado=5, domingo=6)
-    if fecha_date.weekday() >= 5:
-        return False
-    
-    # Verificar si es feriado
-    if fecha_date in feriados_list:
-        return False
-    
-    return True
+    return _calendario(feriados_list).es_habil(_a_date(fecha))
 
 
 def calcular_dias_habiles(fecha_inicio, fecha_fin, feriados_list=None):
     """
     Calcula el número de días hábiles entre dos fechas.
-    
+
     Excluye:
     - Sábados y domingos
     - Feriados de Chile
-    
+
     Args:
         fecha_inicio: datetime con timezone (aware)
         fecha_fin: datetime con timezone (aware)
-        feriados_list: lista de fechas (date) que son feriados
-    
+        feriados_list: fechas (date) feriadas (default: feriados configurados)
+
     Returns:
         float: número de días hábiles (puede incluir decimales para horas)
-    
+
     Example:
         >>> inicio = datetime(2026, 1, 5, 14, 0)  # Lunes
         >>> fin = datetime(2026, 1, 9, 10, 0)     # Viernes
         >>> dias = calcular_dias_habiles(inicio, fin)
         >>> # Retorna: ~3.83 días hábiles
     """
-    if feriados_list is None:
-        feriados_list = []
-    
+    calendario = _calendario(feriados_list)
+
     # Convertir a zona horaria de Chile
     chile_tz = pytz.timezone('America/Santiago')
-    
+
     if timezone.is_aware(fecha_inicio):
         fecha_inicio_chile = fecha_inicio.astimezone(chile_tz)
     else:
         fecha_inicio_chile = chile_tz.localize(fecha_inicio)
-    
+
     if timezone.is_aware(fecha_fin):
         fecha_fin_chile = fecha_fin.astimezone(chile_tz)
     else:
         fecha_fin_chile = chile_tz.localize(fecha_fin)
-    
+
     # Si las fechas son iguales o fecha_fin es anterior, retornar 0
     if fecha_fin_chile <= fecha_inicio_chile:
         return 0.0
-    
-    # Calcular días completos
-    fecha_actual = fecha_inicio_chile.replace(hour=0, minute=0, second=0, microsecond=0)
-    fecha_limite = fecha_fin_chile.replace(hour=0, minute=0, second=0, microsecond=0)
-    
-    dias_habiles_completos = 0
-    
-    while fecha_actual < fecha_limite:
-        if es_dia_habil(fecha_actual, feriados_list):
-            dias_habiles_completos += 1
-        fecha_actual += timedelta(days=1)
-    
-    # Ajustar por horas parciales
-    # Calcular fracción del primer día (si no empieza a las 00:00)
-    horas_primer_dia = 0
-    if fecha_inicio_chile.time() != time(0, 0):
-        if es_dia_habil(fecha_inicio_chile, feriados_list):
-            # Restar las horas que ya pasaron del primer día
-            hora_inicio_decimal = fecha_inicio_chile.hour + fecha_inicio_chile.minute / 60
-            # Asumiendo jornada de 8 horas (9:00 - 18:00)
-            if hora_inicio_decimal < 9:
-                horas_disponibles = 8
-            elif hora_inicio_decimal > 18:
-                horas_disponibles = 0
-            else:
-                horas_disponibles = 18 - hora_inicio_decimal
-            horas_primer_dia = horas_disponibles / 8  # Como fracción de día
-    
+
+    # Si el inicio y fin están en el mismo día
+    if fecha_inicio_chile.date() == fecha_fin_chile.date():
+        if calendario.es_habil(fecha_inicio_chile.date()):
+            delta_horas = (fecha_fin_chile - fecha_inicio_chile).total_seconds() / 3600
+            # Convertir horas a fracción de jornada (8 horas)
+            return max(0.0, delta_horas / 8)
+        return 0.0
+
+    # Días completos: hábiles desde el día de inicio hasta el día de fin (excluido)
+    dias_habiles_completos = calendario.dias_habiles(fecha_inicio_chile.date(), fecha_fin_chile.date())
+
     # Calcular fracción del último día (si no termina a las 00:00)
     horas_ultimo_dia = 0
     if fecha_fin_chile.time() != time(0, 0):
-        if es_dia_habil(fecha_fin_chile, feriados_list):
+        if calendario.es_habil(fecha_fin_chile.date()):
             # Sumar las horas trabajadas del último día
             hora_fin_decimal = fecha_fin_chile.hour + fecha_fin_chile.minute / 60
             # Asumiendo jornada de 9:00 - 18:00
@@ -170,43 +163,49 @@ def calcular_dias_habiles(fecha_inicio, fecha_fin, feriados_list=None):
             else:
                 horas_trabajadas = hora_fin_decimal - 9
             horas_ultimo_dia = horas_trabajadas / 8  # Como fracción de día
-    
-    # Total de días hábiles con fracciones
-    total_dias_habiles = dias_habiles_completos + horas_ultimo_dia
-    
-    # Si el inicio y fin están en el mismo día
-    if fecha_inicio_chile.date() == fecha_fin_chile.date():
-        if es_dia_habil(fecha_inicio_chile, feriados_list):
-            delta_horas = (fecha_fin_chile - fecha_inicio_chile).total_seconds() / 3600
-            # Convertir horas a fracción de jornada (8 horas)
-            total_dias_habiles = delta_horas / 8
-        else:
-            total_dias_habiles = 0.0
-    
-    return max(0.0, total_dias_habiles)
+
+    return max(0.0, dias_habiles_completos + horas_ultimo_dia)
+
+
+def dias_habiles_lote(fechas_inicio, fechas_fin, feriados_list=None):
+    """
+    Días hábiles completos en [inicio, fin) para muchos pares de fechas.
+
+    Args:
+        fechas_inicio, fechas_fin: arrays datetime64 o secuencias de date/datetime.
+
+    Returns:
+        numpy.ndarray int64
+    """
+    return _calendario(feriados_list).dias_habiles_lote(fechas_inicio, fechas_fin)
+
+
+def sumar_dias_habiles(fecha, dias, feriados_list=None):
+    """
+    Fecha (date) que resulta de avanzar `dias` días hábiles desde `fecha`
+    (sin contarla); negativo retrocede.
+    """
+    return _calendario(feriados_list).sumar_dias_habiles(_a_date(fecha), dias)
+
+
+def sumar_dias_habiles_lote(fechas, dias, feriados_list=None):
+    """Versión vectorizada de sumar_dias_habiles() (dias: entero o array)."""
+    return _calendario(feriados_list).sumar_dias_habiles_lote(fechas, dias)
 
 
 def obtener_feriados_chile(año=None):
     """
-    Obtiene la lista de feriados de Chile desde la base de datos.
-    
+    Obtiene los feriados de Chile desde la base de datos.
+
     Args:
         año: año específico (int), si es None usa el año actual
-    
+
     Returns:
-        list: lista de objetos date con los feriados
+        frozenset: fechas (date) de los feriados activos, en caché por año
     """
     from configuracion.models import Feriado
-    from datetime import date
-    
+
     if año is None:
-        año = date.today().year
-    
-    # Obtener feriados del año desde la BD
-    feriados = Feriado.objects.filter(
-        fecha__year=año,
-        activo=True
-    ).values_list('fecha', flat=True)
-    
-    return list(feriados)
+        año = timezone.localdate().year
 
+    return Feriado.fechas_del_año(año)
@@ -0,0 +1,582 @@
+"""
+Motor de horas laborales (calendario de jornada de la empresa).
+
+Jornada:
+- Lunes a jueves: 08:00 a 17:45
+- Viernes: 08:00 a 13:00
+- Sábado, domingo y feriados: no laboral
+
+En lugar de recorrer día por día, el calendario precalcula los microsegundos
+laborales acumulados al inicio de cada día. Así, las horas laborales entre dos
+instantes son H(fin) - H(inicio), con H calculado en O(1):
+
+    H(t) = acumulado[dia(t)] + clamp(t - apertura(dia), 0, duracion(dia))
+
+Los cálculos se hacen en hora "de pared" local (America/Santiago), igual que
+la implementación original día a día: los datetimes aware se convierten con
+timezone.localtime() y se comparan sin offset.
+
+La misma tabla guarda el conteo acumulado de días hábiles y la lista de
+índices hábiles, de modo que contar días hábiles entre dos fechas o avanzar
+N días hábiles también es O(1) (ver core.business_days).
+
+Los feriados salen de configuracion.Feriado (un set por año, en caché);
+Feriado.limpiar_cache() reinicia el calendario compartido.
+"""
+
+from bisect import bisect_left, bisect_right
+from datetime import datetime, time, timedelta
+import logging
+import threading
+
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+# weekday(): lunes=0 ... domingo=6 → (apertura, cierre)
+JORNADA_SEMANAL = {
+    0: (time(8, 0), time(17, 45)),
+    1: (time(8, 0), time(17, 45)),
+    2: (time(8, 0), time(17, 45)),
+    3: (time(8, 0), time(17, 45)),
+    4: (time(8, 0), time(13, 0)),
+}
+
+_US_POR_SEGUNDO = 1_000_000
+# Días extra que se precalculan a cada lado al ampliar la tabla
+_MARGEN_DIAS = 366
+
+
+def _time_a_us(t):
+    return ((t.hour * 60 + t.minute) * 60 + t.second) * _US_POR_SEGUNDO + t.microsecond
+
+
+def _a_hora_local(dt):
+    """Convierte un datetime a hora de pared local (naive)."""
+    if timezone.is_aware(dt):
+        dt = timezone.localtime(dt)
+    return dt.replace(tzinfo=None)
+
+
+class _Tabla:
+    """Tabla inmutable de acumulados para un rango de días [base, base + n)."""
+
+    __slots__ = (
+        'base', 'n', 'apertura', 'duracion', 'acumulado',
+        'dias_acumulados', 'indices_habiles', '_np', '_np_dias',
+    )
+
+    def __init__(self, base, n, jornada, feriados):
+        self.base = base
+        self.n = n
+        apertura = [0] * n
+        duracion = [0] * n
+        acumulado = [0] * (n + 1)
+        # dias_acumulados[i] = días hábiles en [base, base + i)
+        dias_acumulados = [0] * (n + 1)
+        indices_habiles = []
+        total = 0
+        dia = base
+        for i in range(n):
+            limites = jornada.get(dia.weekday())
+            if limites and dia not in feriados:
+                inicio_us = _time_a_us(limites[0])
+                apertura[i] = inicio_us
+                duracion[i] = max(0, _time_a_us(limites[1]) - inicio_us)
+                indices_habiles.append(i)
+            total += duracion[i]
+            acumulado[i + 1] = total
+            dias_acumulados[i + 1] = len(indices_habiles)
+            dia += timedelta(days=1)
+        self.apertura = apertura
+        self.duracion = duracion
+        self.acumulado = acumulado
+        self.dias_acumulados = dias_acumulados
+        self.indices_habiles = indices_habiles
+        self._np = None
+        self._np_dias = None
+
+    @property
+    def fin(self):
+        return self.base + timedelta(days=self.n)
+
+    def cubre(self, dia_min, dia_max):
+        return self.base <= dia_min and dia_max < self.fin
+
+    def arrays(self):
+        """Versión NumPy de la tabla (se construye una sola vez)."""
+        if self._np is None:
+            import numpy as np
+            self._np = (
+                np.asarray(self.apertura, dtype=np.int64),
+                np.asarray(self.duracion, dtype=np.int64),
+                np.asarray(self.acumulado, dtype=np.int64),
+            )
+        return self._np
+
+    def arrays_dias(self):
+        """(dias_acumulados, indices_habiles) como arrays NumPy."""
+        if self._np_dias is None:
+            import numpy as np
+            self._np_dias = (
+                np.asarray(self.dias_acumulados, dtype=np.int64),
+                np.asarray(self.indices_habiles, dtype=np.int64),
+            )
+        return self._np_dias
+
+
+class CalendarioLaboral:
+    """
+    Calendario de jornada con consultas O(1) sobre acumulados por día.
+
+    Args:
+        jornada: dict weekday → (apertura, cierre). Default: JORNADA_SEMANAL.
+        feriados: fechas (date) no laborales adicionales a sábado/domingo.
+        feriados_por_año: callable año → fechas feriadas de ese año (None si
+            no se pueden leer); se consulta una vez por año al construir la tabla.
+    """
+
+    def __init__(self, jornada=None, feriados=None, feriados_por_año=None):
+        self.jornada = dict(JORNADA_SEMANAL if jornada is None else jornada)
+        self.feriados = frozenset(feriados or ())
+        self._feriados_por_año = feriados_por_año
+        self._tabla = None
+        self._lock = threading.Lock()
+
+    def _feriados_rango(self, base, fin):
+        """(feriados, completos): completos es False si algún año no se pudo leer."""
+        if self._feriados_por_año is None:
+            return self.feriados, True
+        feriados = set(self.feriados)
+        completos = True
+        for año in range(base.year, fin.year + 1):
+            del_año = self._feriados_por_año(año)
+            if del_año is None:
+                completos = False
+                continue
+            feriados.update(del_año)
+        return feriados, completos
+
+    def _tabla_para(self, dia_min, dia_max):
+        tabla = self._tabla
+        if tabla is not None and tabla.cubre(dia_min, dia_max):
+            return tabla
+        with self._lock:
+            tabla = self._tabla
+            if tabla is not None and tabla.cubre(dia_min, dia_max):
+                return tabla
+            base = dia_min - timedelta(days=_MARGEN_DIAS)
+            fin = dia_max + timedelta(days=_MARGEN_DIAS)
+            if tabla is not None:
+                base = min(base, tabla.base)
+                fin = max(fin, tabla.fin)
+            feriados, completos = self._feriados_rango(base, fin)
+            tabla = _Tabla(base, (fin - base).days, self.jornada, feriados)
+            # Sin feriados (tabla aún no migrada) la tabla sirve para esta
+            # consulta, pero no se guarda: la siguiente vuelve a leerlos
+            if completos:
+                self._tabla = tabla
+            return tabla
+
+    # ------------------------------------------------------------------
+    # Días hábiles
+    # ------------------------------------------------------------------
+
+    def es_habil(self, dia):
+        """True si el día (date) tiene jornada y no es feriado."""
+        tabla = self._tabla_para(dia, dia)
+        i = (dia - tabla.base).days
+        return tabla.dias_acumulados[i + 1] > tabla.dias_acumulados[i]
+
+    def dias_habiles(self, desde, hasta):
+        """Días hábiles en [desde, hasta) (fechas date); 0 si hasta <= desde."""
+        if hasta <= desde:
+            return 0
+        tabla = self._tabla_para(desde, hasta)
+        return tabla.dias_acumulados[(hasta - tabla.base).days] - tabla.dias_acumulados[(desde - tabla.base).days]
+
+    def sumar_dias_habiles(self, dia, n):
+        """
+        Día hábil que se alcanza avanzando n días hábiles desde `dia` (sin
+        contarlo). n negativo retrocede; n=0 devuelve el mismo día.
+        """
+        if n == 0:
+            return dia
+        # Margen holgado: 5 días hábiles cada 7 más feriados
+        holgura = timedelta(days=abs(n) * 2 + 30)
+        tabla = self._tabla_para(dia - holgura, dia + holgura)
+        i = (dia - tabla.base).days
+        if n > 0:
+            posicion = tabla.dias_acumulados[i + 1] + n - 1
+        else:
+            posicion = tabla.dias_acumulados[i] + n
+        return tabla.base + timedelta(days=tabla.indices_habiles[posicion])
+
+    def siguiente_habil(self, dia):
+        """El mismo día si es hábil; si no, el próximo día hábil."""
+        if self.es_habil(dia):
+            return dia
+        return self.sumar_dias_habiles(dia, 1)
+
+    def dias_habiles_lote(self, desdes, hastas):
+        """
+        Versión vectorizada de dias_habiles().
+
+        Args:
+            desdes, hastas: arrays datetime64[D] o secuencias de date del mismo largo.
+
+        Returns:
+            numpy.ndarray int64 (0 donde falta alguna fecha o hasta <= desde).
+        """
+        import numpy as np
+
+        d_ini = _a_datetime64_dias(desdes)
+        d_fin = _a_datetime64_dias(hastas)
+        if d_ini.shape != d_fin.shape:
+            raise ValueError('desdes y hastas deben tener el mismo largo')
+
+        resultado = np.zeros(d_ini.shape, dtype=np.int64)
+        validos = ~(np.isnat(d_ini) | np.isnat(d_fin))
+        validos &= d_fin > d_ini
+        if not validos.any():
+            return resultado
+
+        d_ini = d_ini[validos]
+        d_fin = d_fin[validos]
+        tabla = self._tabla_para(d_ini.min().astype(object), d_fin.max().astype(object))
+        dias_acumulados, _ = tabla.arrays_dias()
+        base = np.datetime64(tabla.base, 'D')
+        resultado[validos] = (
+            dias_acumulados[(d_fin - base).astype(np.int64)]
+            - dias_acumulados[(d_ini - base).astype(np.int64)]
+        )
+        return resultado
+
+    def sumar_dias_habiles_lote(self, dias, n):
+        """
+        Versión vectorizada de sumar_dias_habiles().
+
+        Args:
+            dias: array datetime64[D] o secuencia de date.
+            n: entero o array de enteros del mismo largo.
+
+        Returns:
+            numpy.ndarray datetime64[D] (NaT donde falta la fecha).
+        """
+        import numpy as np
+
+        d = _a_datetime64_dias(dias)
+        n = np.broadcast_to(np.asarray(n, dtype=np.int64), d.shape)
+        resultado = np.full(d.shape, np.datetime64('NaT'), dtype='datetime64[D]')
+        validos = ~np.isnat(d)
+        if not validos.any():
+            return resultado
+
+        d = d[validos]
+        n = n[validos]
+        holgura = timedelta(days=int(np.abs(n).max()) * 2 + 30)
+        tabla = self._tabla_para(d.min().astype(object) - holgura, d.max().astype(object) + holgura)
+        dias_acumulados, indices_habiles = tabla.arrays_dias()
+        base = np.datetime64(tabla.base, 'D')
+        idx = (d - base).astype(np.int64)
+        posicion = np.where(
+            n > 0,
+            dias_acumulados[idx + 1] + n - 1,
+            dias_acumulados[idx] + n,
+        )
+        # n == 0 conserva el día
+        destino = np.where(n == 0, idx, indices_habiles[np.clip(posicion, 0, len(indices_habiles) - 1)])
+        resultado[validos] = base + destino.astype('timedelta64[D]')
+        return resultado
+
+    @staticmethod
+    def _acumulado_en(tabla, t):
+        i = (t.date() - tabla.base).days
+        medianoche = datetime.combine(t.date(), time(0, 0))
+        us_dia = (t - medianoche) // timedelta(microseconds=1)
+        tramo = min(max(us_dia - tabla.apertura[i], 0), tabla.duracion[i])
+        return tabla.acumulado[i] + tramo
+
+    def horas(self, fecha_inicio, fecha_fin):
+        """
+        Horas laborales entre dos datetimes (aware o naive).
+
+        Returns:
+            float: horas laborales; 0 si falta alguna fecha o fin < inicio.
+        """
+        if not fecha_inicio or not fecha_fin:
+            return 0
+        inicio = _a_hora_local(fecha_inicio)
+        fin = _a_hora_local(fecha_fin)
+        if fin < inicio:
+            return 0
+        tabla = self._tabla_para(inicio.date(), fin.date())
+        total_us = self._acumulado_en(tabla, fin) - self._acumulado_en(tabla, inicio)
+        return (total_us / _US_POR_SEGUNDO) / 3600
+
+    def horas_lote(self, inicios, fines):
+        """
+        Versión vectorizada de horas().
+
+        Args:
+            inicios, fines: arrays numpy datetime64 (hora local) o secuencias
+                de datetimes (aware/naive/None) del mismo largo.
+
+        Returns:
+            numpy.ndarray float64 con las horas laborales de cada par
+            (0 donde falta alguna fecha o fin < inicio).
+        """
+        import numpy as np
+
+        t_ini = _a_datetime64(inicios)
+        t_fin = _a_datetime64(fines)
+        if t_ini.shape != t_fin.shape:
+            raise ValueError('inicios y fines deben tener el mismo largo')
+
+        resultado = np.zeros(t_ini.shape, dtype=np.float64)
+        validos = ~(np.isnat(t_ini) | np.isnat(t_fin))
+        validos &= t_fin >= t_ini
+        if not validos.any():
+            return resultado
+
+        t_ini = t_ini[validos]
+        t_fin = t_fin[validos]
+        dias_ini = t_ini.astype('datetime64[D]')
+        dias_fin = t_fin.astype('datetime64[D]')
+        tabla = self._tabla_para(
+            dias_ini.min().astype(object),
+            dias_fin.max().astype(object),
+        )
+        apertura, duracion, acumulado = tabla.arrays()
+        base = np.datetime64(tabla.base, 'D')
+
+        def acumulado_en(t, dias):
+            idx = (dias - base).astype(np.int64)
+            us_dia = (t - dias).astype('timedelta64[us]').astype(np.int64)
+            tramo = np.minimum(np.maximum(us_dia - apertura[idx], 0), duracion[idx])
+            return acumulado[idx] + tramo
+
+        total_us = acumulado_en(t_fin, dias_fin) - acumulado_en(t_ini, dias_ini)
+        resultado[validos] = (total_us / _US_POR_SEGUNDO) / 3600
+        return resultado
+
+    # ------------------------------------------------------------------
+    # Inversa: instante a N horas laborales de otro
+    # ------------------------------------------------------------------
+    #
+    # Con objetivo = H(t) ± N, se busca el día cuyo acumulado contiene el
+    # objetivo (búsqueda binaria sobre la tabla) y se suma el resto a la
+    # apertura de ese día. Si el objetivo cae justo en un borde (fin de una
+    # jornada = inicio de la siguiente), sumar devuelve el cierre y restar la
+    # apertura: el instante más cercano al de partida.
+
+    def _tabla_para_horas(self, dia_min, dia_max, horas):
+        # Jornada semanal ~44 h: medio día calendario por hora sobra incluso con feriados
+        holgura = timedelta(days=int(horas / 2) + 30)
+        return self._tabla_para(dia_min - holgura, dia_max + holgura)
+
+    @staticmethod
+    def _instante_en(tabla, objetivo, hacia_adelante):
+        if hacia_adelante:
+            i = bisect_left(tabla.acumulado, objetivo) - 1
+        else:
+            i = bisect_right(tabla.acumulado, objetivo) - 1
+        if not 0 <= i < tabla.n:
+            raise ValueError('Objetivo fuera del calendario laboral')
+        us_dia = tabla.apertura[i] + (objetivo - tabla.acumulado[i])
+        return datetime.combine(tabla.base + timedelta(days=i), time(0, 0)) + timedelta(microseconds=us_dia)
+
+    @staticmethod
+    def _como_entrada(resultado, original):
+        if timezone.is_aware(original):
+            return timezone.make_aware(resultado, timezone.get_current_timezone())
+        return resultado
+
+    def sumar_horas(self, inicio, horas):
+        """
+        Primer instante en que se completan `horas` laborales desde `inicio`.
+
+        Inversa de horas(): horas(inicio, sumar_horas(inicio, h)) == h.
+        Devuelve aware si `inicio` es aware (hora local), naive si no.
+        """
+        if horas < 0:
+            return self.restar_horas(inicio, -horas)
+        if not horas:
+            return inicio
+        local = _a_hora_local(inicio)
+        tabla = self._tabla_para_horas(local.date(), local.date(), horas)
+        objetivo = self._acumulado_en(tabla, local) + round(horas * 3600 * _US_POR_SEGUNDO)
+        return self._como_entrada(self._instante_en(tabla, objetivo, True), inicio)
+
+    def restar_horas(self, fin, horas):
+        """
+        Último instante desde el que quedan `horas` laborales hasta `fin`.
+
+        horas(restar_horas(fin, h), fin) == h.
+        """
+        if horas < 0:
+            return self.sumar_horas(fin, -horas)
+        if not horas:
+            return fin
+        local = _a_hora_local(fin)
+        tabla = self._tabla_para_horas(local.date(), local.date(), horas)
+        objetivo = self._acumulado_en(tabla, local) - round(horas * 3600 * _US_POR_SEGUNDO)
+        return self._como_entrada(self._instante_en(tabla, objetivo, False), fin)
+
+    def _desplazar_lote(self, instantes, horas, signo):
+        import numpy as np
+
+        t = _a_datetime64(instantes)
+        h = np.broadcast_to(np.asarray(horas, dtype=np.float64), t.shape)
+        resultado = np.full(t.shape, np.datetime64('NaT'), dtype='datetime64[us]')
+        validos = ~np.isnat(t) & ~np.isnan(h)
+        if not validos.any():
+            return resultado
+
+        t = t[validos]
+        delta_us = np.rint(signo * h[validos] * 3600 * _US_POR_SEGUNDO).astype(np.int64)
+        dias = t.astype('datetime64[D]')
+        tabla = self._tabla_para_horas(
+            dias.min().astype(object),
+            dias.max().astype(object),
+            float(np.abs(delta_us).max()) / _US_POR_SEGUNDO / 3600,
+        )
+        apertura, duracion, acumulado = tabla.arrays()
+        base = np.datetime64(tabla.base, 'D')
+
+        idx = (dias - base).astype(np.int64)
+        us_dia = (t - dias).astype('timedelta64[us]').astype(np.int64)
+        objetivo = acumulado[idx] + np.minimum(np.maximum(us_dia - apertura[idx], 0), duracion[idx]) + delta_us
+
+        # Adelante: borde → cierre del día anterior; atrás: borde → apertura del siguiente
+        i = np.where(
+            delta_us >= 0,
+            np.searchsorted(acumulado, objetivo, side='left') - 1,
+            np.searchsorted(acumulado, objetivo, side='right') - 1,
+        )
+        if (i < 0).any() or (i >= tabla.n).any():
+            raise ValueError('Objetivo fuera del calendario laboral')
+        destino = (
+            base + i.astype('timedelta64[D]')
+            + (apertura[i] + objetivo - acumulado[i]).astype('timedelta64[us]')
+        )
+        # Desplazamiento 0 conserva el instante original
+        resultado[validos] = np.where(delta_us == 0, t, destino)
+        return resultado
+
+    def sumar_horas_lote(self, inicios, horas):
+        """
+        Versión vectorizada de sumar_horas().
+
+        Args:
+            inicios: array datetime64 (hora local) o secuencia de datetimes.
+            horas: número o array del mismo largo.
+
+        Returns:
+            numpy.ndarray datetime64[us] en hora local (NaT donde falta la fecha).
+        """
+        return self._desplazar_lote(inicios, horas, 1)
+
+    def restar_horas_lote(self, fines, horas):
+        """Versión vectorizada de restar_horas() (mismo formato que sumar_horas_lote)."""
+        return self._desplazar_lote(fines, horas, -1)
+
+
+def _a_datetime64(valores):
+    """Normaliza la entrada de horas_lote() a un array datetime64[us] en hora local."""
+    import numpy as np
+
+    if isinstance(valores, np.ndarray) and np.issubdtype(valores.dtype, np.datetime64):
+        return valores.astype('datetime64[us]')
+    return np.array(
+        [
+            np.datetime64(_a_hora_local(v), 'us') if v else np.datetime64('NaT', 'us')
+            for v in valores
+        ],
+        dtype='datetime64[us]',
+    )
+
+
+def _a_datetime64_dias(valores):
+    """Normaliza fechas (date/datetime/None o datetime64) a un array datetime64[D]."""
+    import numpy as np
+
+    if isinstance(valores, np.ndarray) and np.issubdtype(valores.dtype, np.datetime64):
+        return valores.astype('datetime64[D]')
+    return np.array(
+        [
+            np.datetime64(v.date() if isinstance(v, datetime) else v, 'D') if v else np.datetime64('NaT', 'D')
+            for v in valores
+        ],
+        dtype='datetime64[D]',
+    )
+
+
+# La tabla de feriados, una vez vista, no desaparece: se introspecta una vez por proceso
+_tabla_feriados_existe = False
+
+
+def _feriados_configurados(año):
+    """
+    Feriados activos del año desde configuracion.Feriado; None si la tabla
+    aún no existe (migrate). Cualquier otro error de base se propaga: un
+    calendario sin feriados grabaría horas erróneas en lead times y rollups.
+    """
+    global _tabla_feriados_existe
+    from django.db import connection
+    from configuracion.models import Feriado
+
+    if not _tabla_feriados_existe:
+        if Feriado._meta.db_table not in connection.introspection.table_names():
+            logger.warning(f"Tabla de feriados no disponible: año {año} sin feriados")
+            return None
+        _tabla_feriados_existe = True
+    return Feriado.fechas_del_año(año)
+
+
+_calendario = None
+
+
+def obtener_calendario_laboral():
+    """Retorna el calendario laboral compartido del proceso."""
+    global _calendario
+    if _calendario is None:
+        _calendario = CalendarioLaboral(feriados_por_año=_feriados_configurados)
+    return _calendario
+
+
+def reiniciar_calendario_laboral():
+    """Descarta el calendario compartido (se reconstruye con los feriados vigentes)."""
+    global _calendario
+    _calendario = None
+
+
+def horas_laborales(fecha_inicio, fecha_fin):
+    """Horas laborales entre dos datetimes usando el calendario compartido."""
+    return obtener_calendario_laboral().horas(fecha_inicio, fecha_fin)
+
+
+def horas_laborales_lote(inicios, fines):
+    """Horas laborales para muchos pares (inicio, fin) en una sola llamada vectorizada."""
+    return obtener_calendario_laboral().horas_lote(inicios, fines)
+
+
+def sumar_horas_laborales(inicio, horas):
+    """Instante en que se cumplen `horas` laborales desde `inicio` (p. ej. plazos SLA)."""
+    return obtener_calendario_laboral().sumar_horas(inicio, horas)
+
+
+def restar_horas_laborales(fin, horas):
+    """Instante desde el que quedan `horas` laborales hasta `fin`."""
+    return obtener_calendario_laboral().restar_horas(fin, horas)
+
+
+def sumar_horas_laborales_lote(inicios, horas):
+    """sumar_horas_laborales() para muchos instantes en una llamada vectorizada."""
+    return obtener_calendario_laboral().sumar_horas_lote(inicios, horas)
+
+
+def restar_horas_laborales_lote(fines, horas):
+    """restar_horas_laborales() para muchos instantes en una llamada vectorizada."""
+    return obtener_calendario_laboral().restar_horas_lote(fines, horas)
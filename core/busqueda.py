@@ -0,0 +1,191 @@
+"""
+Búsqueda de texto libre en solicitudes, detalles y stock.
+
+Solicitud y SolicitudDetalle guardan en `texto_busqueda` sus campos buscables
+normalizados (minúsculas, sin tildes, espacios simples), recalculado en cada
+save(). Buscar es `texto_busqueda LIKE '%termino%'` por cada término de la
+consulta (todos deben aparecer), así "camion pesco" encuentra "Camión PESCO":
+
+- En PostgreSQL un índice GIN de trigramas (pg_trgm) sobre esa columna evita
+  el recorrido secuencial (ver crear_indices_trigram()).
+- En SQLite (desarrollo) es el mismo LIKE, sin índice.
+
+Stock es una tabla administrada fuera de Django (managed=False), sin columna
+normalizada: se busca con icontains sobre código y descripción (sensible a
+tildes), con índices de trigramas sobre UPPER(codigo) / UPPER(descripcion)
+en PostgreSQL.
+"""
+
+import logging
+import unicodedata
+
+from django.db import DatabaseError, transaction
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+MAX_TERMINOS = 6
+# Mayor id posible (bigint): un número más largo no puede ser un id
+MAX_ID = 2 ** 63 - 1
+
+# Índices de trigramas: (nombre, tabla, expresión)
+INDICES_TRIGRAM = [
+    ('idx_sol_busqueda_trgm', 'solicitudes', 'texto_busqueda'),
+    ('idx_det_busqueda_trgm', 'solicitudes_detalle', 'texto_busqueda'),
+    ('idx_stock_codigo_trgm', 'stock', 'UPPER(codigo)'),
+    ('idx_stock_descripcion_trgm', 'stock', 'UPPER(descripcion)'),
+]
+
+
+def normalizar(texto):
+    """'Camión  PESCO Ñuñoa' → 'camion pesco nunoa'"""
+    texto = unicodedata.normalize('NFKD', str(texto or ''))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.lower().split())
+
+
+def componer(*valores):
+    """Texto de búsqueda de un registro a partir de sus campos buscables."""
+    return ' | '.join(normalizar(v) for v in valores if v not in (None, ''))
+
+
+def terminos(q):
+    """Términos normalizados de la consulta (máximo MAX_TERMINOS, sin repetir)."""
+    vistos = []
+    for termino in normalizar(q).split():
+        if termino not in vistos:
+            vistos.append(termino)
+    return vistos[:MAX_TERMINOS]
+
+
+def filtro(q, *campos):
+    """
+    Q que exige cada término de `q` en alguno de los campos de texto normalizado
+    (default: texto_busqueda). Un número suelto también coincide con el id.
+    """
+    campos = campos or ('texto_busqueda',)
+    condicion = Q()
+    for termino in terminos(q):
+        alguno = Q()
+        for campo in campos:
+            alguno |= Q(**{f'{campo}__contains': termino})
+        condicion &= alguno
+    q = (q or '').strip()
+    if q.isdigit() and int(q) <= MAX_ID:
+        condicion |= Q(pk=int(q))
+    return condicion
+
+
+# ============================================================================
+# API por modelo
+# ============================================================================
+
+CAMPOS_SOLICITUD = ('cliente', 'numero_pedido', 'numero_st', 'numero_ot', 'codigo', 'descripcion')
+CAMPOS_DETALLE = ('codigo', 'descripcion')
+
+
+def texto_solicitud(solicitud):
+    return componer(*(getattr(solicitud, campo) for campo in CAMPOS_SOLICITUD))
+
+
+def texto_detalle(detalle):
+    return componer(*(getattr(detalle, campo) for campo in CAMPOS_DETALLE))
+
+
+def recalcular_textos(modelo, campos, lote=1000):
+    """
+    Recalcula texto_busqueda de todo `modelo` en lotes, para filas escritas
+    con queryset.update() o SQL directo (no pasan por save()).
+
+    Returns:
+        int: filas cuyo texto cambió.
+    """
+    cambiados = 0
+    pendientes = []
+    for obj in modelo.objects.only('texto_busqueda', *campos).order_by('pk').iterator(chunk_size=lote):
+        texto = componer(*(getattr(obj, campo) for campo in campos))
+        if texto != obj.texto_busqueda:
+            obj.texto_busqueda = texto
+            pendientes.append(obj)
+        if len(pendientes) >= lote:
+            modelo.objects.bulk_update(pendientes, ['texto_busqueda'])
+            cambiados += len(pendientes)
+            pendientes = []
+    if pendientes:
+        modelo.objects.bulk_update(pendientes, ['texto_busqueda'])
+        cambiados += len(pendientes)
+    return cambiados
+
+
+def buscar_solicitudes(queryset, q):
+    """
+    Filtra solicitudes por cliente, números (pedido/ST/OT), código o descripción.
+
+    Mantiene el orden del queryset: los listados paginan por keyset sobre él.
+    """
+    if not (q or '').strip():
+        return queryset
+    return queryset.filter(filtro(q))
+
+
+def buscar_detalles(queryset, q):
+    """Filtra detalles por su código/descripción o por el texto de su solicitud."""
+    if not (q or '').strip():
+        return queryset
+    return queryset.filter(filtro(q, 'texto_busqueda', 'solicitud__texto_busqueda'))
+
+
+def buscar_stock(queryset, q):
+    """
+    Stock por código o descripción; si la consulta parece descripción
+    (espacios o larga) cada término debe aparecer en la descripción.
+    """
+    q = (q or '').strip()
+    if not q:
+        return queryset
+    if len(q) < 20 and ' ' not in q:
+        return queryset.filter(Q(codigo__icontains=q) | Q(descripcion__icontains=q))
+    condicion = Q()
+    for termino in q.split()[:MAX_TERMINOS]:
+        condicion &= Q(descripcion__icontains=termino)
+    return queryset.filter(condicion)
+
+
+# ============================================================================
+# Índices (PostgreSQL)
+# ============================================================================
+
+def crear_indices_trigram(connection, indices=None):
+    """
+    Crea la extensión pg_trgm y los índices GIN de INDICES_TRIGRAM que falten.
+    No hace nada fuera de PostgreSQL. Las tablas inexistentes se omiten.
+
+    Returns:
+        list[str]: nombres de los índices creados o ya existentes.
+    """
+    if connection.vendor != 'postgresql':
+        return []
+    indices = INDICES_TRIGRAM if indices is None else indices
+    tablas = set(connection.introspection.table_names())
+    listos = []
+    try:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except DatabaseError as e:
+        logger.warning(f"No se pudo habilitar pg_trgm, búsqueda sin índices de trigramas: {e}")
+        return listos
+    for nombre, tabla, expresion in indices:
+        if tabla not in tablas:
+            continue
+        try:
+            with transaction.atomic(using=connection.alias):
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f'CREATE INDEX IF NOT EXISTS {nombre} ON {connection.ops.quote_name(tabla)} '
+                        f'USING gin ({expresion} gin_trgm_ops)'
+                    )
+            listos.append(nombre)
+        except DatabaseError as e:
+            logger.warning(f"No se pudo crear el índice {nombre}: {e}")
+    return listos
@@ -0,0 +1,190 @@
+"""
+Caché compartida de datos derivados (dashboard, informes) invalidada por versión.
+
+Las claves llevan la "versión de datos" actual. Las señales de Solicitud,
+SolicitudDetalle, Bulto y cargas de stock cambian la versión (una vez por
+transacción, al hacer commit), así que ninguna entrada calculada con datos
+anteriores vuelve a leerse: no hace falta borrar por patrón ni cache.clear().
+Las entradas huérfanas expiran solas por su TTL.
+
+Cada cambio graba un token nuevo (nueva_version()) y no cache.incr(): en
+FileBasedCache incr no es atómico y dos commits simultáneos podían dejar la
+misma versión. Un token único nunca repite una versión ya leída.
+
+obtener_con_revalidacion() agrega el modo stale-while-revalidate: mientras un
+worker recalcula en segundo plano, el resto sigue sirviendo el último
+resultado (con su antigüedad) en lugar de pagar el cálculo en la request.
+Un solo worker recalcula cada entrada: en PostgreSQL lo garantiza un advisory
+lock de transacción; sin PostgreSQL solo si el backend de caché tiene un
+add() atómico (no FileBasedCache), y si no se calcula en la request.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.db import close_old_connections, connection, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+CLAVE_VERSION = 'datos_version'
+
+_pendiente = threading.local()
+
+
+def nueva_version():
+    """Token de versión único entre procesos y reinicios."""
+    return uuid.uuid4().hex
+
+
+def version_datos():
+    """Versión actual de los datos operacionales (compartida entre workers)."""
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        cache.add(CLAVE_VERSION, nueva_version(), timeout=None)
+        version = cache.get(CLAVE_VERSION)
+    return version
+
+
+def incrementar_version_datos():
+    """Cambia la versión de inmediato (fuera de transacción o desde comandos)."""
+    version = nueva_version()
+    cache.set(CLAVE_VERSION, version, timeout=None)
+    return version
+
+
+def invalidar_cache_datos():
+    """
+    Agenda el cambio de versión para después del commit.
+
+    Varias señales en la misma transacción (ej: crear_bulto con muchos
+    detalles) producen un solo cambio.
+    """
+    _pendiente.activo = True
+    transaction.on_commit(_incrementar_pendiente)
+
+
+def _incrementar_pendiente():
+    if not getattr(_pendiente, 'activo', False):
+        return
+    _pendiente.activo = False
+    try:
+        incrementar_version_datos()
+    except Exception as e:
+        logger.error(f"No se pudo incrementar la versión de datos de caché: {e}", exc_info=True)
+
+
+def clave_cache(prefijo, parametros):
+    """
+    Clave de caché versionada: {prefijo}_v{version}_{md5(parametros)}.
+
+    Args:
+        prefijo: nombre lógico (ej: 'indicadores_productividad')
+        parametros: dict serializable con los filtros del cálculo
+    """
+    parametros_str = json.dumps(parametros, sort_keys=True)
+    parametros_hash = hashlib.md5(parametros_str.encode()).hexdigest()
+    return f'{prefijo}_v{version_datos()}_{parametros_hash}'
+
+
+# ============================================================================
+# Stale-while-revalidate
+# ============================================================================
+
+# Tiempo máximo que puede tomar un recálculo antes de liberar el lock (timeout de gunicorn)
+_TTL_LOCK_RECALCULO = 180
+
+
+def _clave_estable(prefijo, parametros):
+    parametros_str = json.dumps(parametros, sort_keys=True)
+    parametros_hash = hashlib.md5(parametros_str.encode()).hexdigest()
+    return f'{prefijo}_swr_{parametros_hash}'
+
+
+def _calcular_y_guardar(clave, calcular, version, max_desfase):
+    entrada = {
+        'valor': calcular(),
+        'generado_en': time.time(),
+        # Versión leída ANTES de calcular: si los datos cambian durante el cálculo
+        # la entrada nace obsoleta y se vuelve a calcular en la siguiente lectura
+        'version': version,
+    }
+    cache.set(clave, entrada, timeout=max_desfase)
+    return entrada
+
+
+def _lock_atomico():
+    """¿Hay un lock confiable entre workers para el recálculo en segundo plano?"""
+    return connection.vendor == 'postgresql' or not isinstance(caches['default'], FileBasedCache)
+
+
+def _tomar_lock_transaccion(clave):
+    """
+    pg_try_advisory_xact_lock sobre un hash de la clave: atómico entre procesos
+    y se libera solo al terminar la transacción (también si el worker muere).
+    """
+    if connection.vendor != 'postgresql':
+        return True  # El lock en caché es atómico (ver _lock_atomico)
+    llave = int.from_bytes(hashlib.md5(clave.encode()).digest()[:8], 'big', signed=True)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_xact_lock(%s)', [llave])
+        return cursor.fetchone()[0]
+
+
+def _recalcular_en_segundo_plano(clave, calcular, version, max_desfase):
+    clave_lock = f'{clave}_lock'
+    # Filtro barato para no lanzar un hilo por request; en FileBasedCache add()
+    # no es atómico y el lock real es el advisory lock de _tomar_lock_transaccion
+    if not cache.add(clave_lock, 1, timeout=_TTL_LOCK_RECALCULO):
+        return False  # Otro worker ya lo está recalculando
+
+    def tarea():
+        close_old_connections()
+        try:
+            with transaction.atomic():
+                if _tomar_lock_transaccion(clave):
+                    _calcular_y_guardar(clave, calcular, version, max_desfase)
+        except Exception as e:
+            logger.error(f"Error al recalcular en segundo plano {clave}: {e}", exc_info=True)
+        finally:
+            cache.delete(clave_lock)
+            connections.close_all()
+
+    threading.Thread(target=tarea, name=f'revalidar-{clave}', daemon=True).start()
+    return True
+
+
+def obtener_con_revalidacion(prefijo, parametros, calcular, ttl_fresco=300, max_desfase=3600,
+                             en_segundo_plano=True, forzar=False):
+    """
+    Lee un resultado cacheado con modo stale-while-revalidate.
+
+    - Fresco (misma versión de datos y edad < ttl_fresco): se retorna tal cual.
+    - Obsoleto pero con edad < max_desfase: se retorna y un solo worker
+      (advisory lock o lock en caché) lo recalcula en segundo plano.
+    - Sin entrada, demasiado antiguo, en_segundo_plano=False, forzar=True o
+      sin lock atómico disponible (FileBasedCache sin PostgreSQL): se calcula
+      en la request.
+
+    Returns:
+        dict {'valor', 'generado_en' (epoch), 'version', 'fresco' (bool)}
+    """
+    clave = _clave_estable(prefijo, parametros)
+    version = version_datos()
+
+    entrada = None if forzar else cache.get(clave)
+    if entrada is not None:
+        edad = time.time() - entrada['generado_en']
+        if entrada['version'] == version and edad < ttl_fresco:
+            return dict(entrada, fresco=True)
+        if en_segundo_plano and edad < max_desfase and _lock_atomico():
+            _recalcular_en_segundo_plano(clave, calcular, version, max_desfase)
+            return dict(entrada, fresco=False)
+
+    entrada = _calcular_y_guardar(clave, calcular, version, max_desfase)
+    return dict(entrada, fresco=True)
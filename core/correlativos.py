@@ -0,0 +1,75 @@
+"""
+Asignación de correlativos por serie y año (números ST, códigos de bulto).
+
+Antes cada INSERT buscaba el último código con ORDER BY ... DESC LIMIT 1
+sobre el texto: dos requests simultáneas obtenían el mismo número, y a
+partir de 10.000 el orden de texto ('9999' > '10000') se equivocaba.
+
+reservar() incrementa la fila (serie, año) de core.Correlativo con un solo
+UPDATE ... RETURNING: la fila queda bloqueada hasta que termina la
+transacción del llamador, así que los números no se repiten y un rollback
+los devuelve. Se pueden reservar bloques de N números en el mismo viaje
+(creación de varios bultos, seeds, importaciones).
+"""
+
+from django.db import IntegrityError, connection, transaction
+
+from .models import Correlativo
+
+
+def reservar(serie, anio, cantidad=1, semilla=None):
+    """
+    Reserva `cantidad` números consecutivos de la serie en el año.
+
+    Llamar dentro de la transacción que va a grabar los números: si esa
+    transacción hace rollback, la reserva también se deshace (sin huecos).
+
+    Args:
+        semilla: callable que retorna el último número ya usado; solo se
+            llama la primera vez que la serie se usa en el año (datos
+            anteriores a la tabla de correlativos).
+
+    Returns:
+        range con los números reservados.
+    """
+    if cantidad < 1:
+        raise ValueError('cantidad debe ser >= 1')
+
+    with transaction.atomic():
+        ultimo = _incrementar(serie, anio, cantidad)
+        if ultimo is None:
+            _crear(serie, anio, semilla() if semilla else 0)
+            ultimo = _incrementar(serie, anio, cantidad)
+    return range(ultimo - cantidad + 1, ultimo + 1)
+
+
+def ultimo_sufijo(codigos):
+    """Mayor sufijo numérico ('ST-2026-014' → 14) de una lista de códigos; 0 si no hay."""
+    ultimo = 0
+    for codigo in codigos:
+        try:
+            ultimo = max(ultimo, int(str(codigo).rsplit('-', 1)[-1]))
+        except ValueError:
+            continue
+    return ultimo
+
+
+def _incrementar(serie, anio, cantidad):
+    q = connection.ops.quote_name
+    sql = (
+        f"UPDATE {q(Correlativo._meta.db_table)} SET {q('ultimo')} = {q('ultimo')} + %s "
+        f"WHERE {q('serie')} = %s AND {q('anio')} = %s RETURNING {q('ultimo')}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [cantidad, serie, anio])
+        fila = cursor.fetchone()
+    return fila[0] if fila else None
+
+
+def _crear(serie, anio, ultimo):
+    try:
+        with transaction.atomic():
+            Correlativo.objects.create(serie=serie, anio=anio, ultimo=ultimo)
+    except IntegrityError:
+        # Otro proceso creó la fila primero: el UPDATE siguiente la usa
+        pass
@@ -0,0 +1,260 @@
+"""
+Repite las consultas de las vistas principales y revisa sus planes de
+ejecución, para ajustar los índices contra los datos reales.
+
+Llama cada vista (dashboard, listado de solicitudes, gestión de pedidos de
+bodega, gestión de despacho, emisión de guías, informe completo) como un
+usuario real y sin caché, captura los SELECT que ejecuta y corre EXPLAIN
+sobre cada uno. Informa:
+
+- recorridos secuenciales sobre tablas de más de --min-filas filas, con la
+  vista y la consulta que los producen;
+- índices de las tablas leídas que ningún plan usó y, en PostgreSQL, los
+  que pg_stat_user_indexes registra sin uso desde el último reset, con su
+  tamaño (sin contar claves primarias ni índices únicos).
+
+Todo corre en una transacción que se revierte. En PostgreSQL usa
+EXPLAIN (ANALYZE, BUFFERS): las consultas se ejecutan de verdad; con
+--sin-analyze solo se planifican. En SQLite usa EXPLAIN QUERY PLAN.
+
+Uso:
+  python manage.py asesor_indices
+  python manage.py asesor_indices --usuario admin --usuario bodega1
+  python manage.py asesor_indices --vistas dashboard gestion_pedidos --sin-analyze
+"""
+
+import json
+import re
+from collections import defaultdict
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import resolve, reverse
+
+VISTAS = {
+    'dashboard': 'dashboard',
+    'solicitudes': 'solicitudes:lista',
+    'gestion_pedidos': 'bodega:gestion_pedidos',
+    'gestion_despacho': 'despacho:gestion',
+    'emision_guias': 'guias:emision_guias',
+    'informe_completo': 'reportes:informe_completo',
+}
+
+SIN_CACHE = {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+
+# EXPLAIN QUERY PLAN de SQLite: "SCAN tabla", "SEARCH tabla USING INDEX idx (...)"
+_PATRON_SQLITE = re.compile(r'^(SCAN|SEARCH) (\S+)(?: AS \S+)?(?: USING (?:COVERING )?INDEX (\S+))?')
+
+
+def _capturar(nombre_url, usuario):
+    """Ejecuta la vista como `usuario`; devuelve (status, [SELECT ejecutados])."""
+    ruta = reverse(nombre_url)
+    request = RequestFactory().get(ruta)
+    request.user = usuario
+    request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+    request._messages = FallbackStorage(request)
+    with CaptureQueriesContext(connection) as capturadas:
+        respuesta = resolve(ruta).func(request)
+        if hasattr(respuesta, 'render') and not getattr(respuesta, 'is_rendered', True):
+            respuesta.render()
+    consultas = [
+        consulta['sql'] for consulta in capturadas.captured_queries
+        if consulta['sql'].lstrip().upper().startswith('SELECT')
+    ]
+    return respuesta.status_code, consultas
+
+
+def _nodos_postgresql(nodo):
+    """Recorre el plan JSON de PostgreSQL: (tipo, tabla, índice, filas, ms) por nodo de acceso."""
+    loops = nodo.get('Actual Loops', 1) or 1
+    filas = nodo['Actual Rows'] * loops if 'Actual Rows' in nodo else nodo.get('Plan Rows')
+    ms = nodo['Actual Total Time'] * loops if 'Actual Total Time' in nodo else None
+    if nodo['Node Type'] == 'Seq Scan':
+        yield 'seq', nodo['Relation Name'], None, filas, ms
+    elif 'Index Name' in nodo:
+        yield 'indice', nodo.get('Relation Name'), nodo['Index Name'], filas, ms
+    for hijo in nodo.get('Plans', []):
+        yield from _nodos_postgresql(hijo)
+
+
+def _explicar(cursor, sql, analizar):
+    if connection.vendor == 'postgresql':
+        opciones = 'ANALYZE, BUFFERS, FORMAT JSON' if analizar else 'FORMAT JSON'
+        cursor.execute(f'EXPLAIN ({opciones}) {sql}')
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return list(_nodos_postgresql(plan[0]['Plan']))
+
+    cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+    nodos = []
+    for fila in cursor.fetchall():
+        coincidencia = _PATRON_SQLITE.match(fila[-1])
+        if coincidencia:
+            accion, tabla, indice = coincidencia.groups()
+            if indice:
+                nodos.append(('indice', tabla, indice, None, None))
+            elif accion == 'SCAN':
+                nodos.append(('seq', tabla, None, None, None))
+    return nodos
+
+
+def _filas_por_tabla(cursor, tablas):
+    """Filas de cada tabla: estimación del planificador en PostgreSQL, COUNT(*) en SQLite."""
+    if connection.vendor == 'postgresql':
+        cursor.execute(
+            'SELECT relname, reltuples::bigint FROM pg_class WHERE relkind = %s AND relname = ANY(%s)',
+            ['r', list(tablas)],
+        )
+        return dict(cursor.fetchall())
+    filas = {}
+    for tabla in tablas:
+        cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(tabla)}')
+        filas[tabla] = cursor.fetchone()[0]
+    return filas
+
+
+def _indices_secundarios(cursor, tablas):
+    """{nombre: (tabla, columnas)} de los índices que no son PK ni únicos."""
+    indices = {}
+    for tabla in tablas:
+        for nombre, datos in connection.introspection.get_constraints(cursor, tabla).items():
+            if datos['index'] and not datos['primary_key'] and not datos['unique']:
+                indices[nombre] = (tabla, datos['columns'])
+    return indices
+
+
+def _sin_uso_postgresql(cursor, tablas):
+    cursor.execute(
+        """
+        SELECT s.indexrelname, s.relname, pg_size_pretty(pg_relation_size(s.indexrelid))
+        FROM pg_stat_user_indexes s
+        JOIN pg_index i ON i.indexrelid = s.indexrelid
+        WHERE s.idx_scan = 0 AND NOT i.indisunique AND NOT i.indisprimary AND s.relname = ANY(%s)
+        ORDER BY pg_relation_size(s.indexrelid) DESC
+        """,
+        [list(tablas)],
+    )
+    return cursor.fetchall()
+
+
+class Command(BaseCommand):
+    help = 'Repite las consultas de las vistas principales con EXPLAIN e informa recorridos secuenciales e índices sin uso.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', action='append', default=[],
+                            help='Usuario con el que se llaman las vistas; repetible (default: el primer admin activo)')
+        parser.add_argument('--vistas', nargs='+', choices=sorted(VISTAS), default=list(VISTAS),
+                            help='Vistas a repetir (default: todas)')
+        parser.add_argument('--min-filas', type=int, default=1000,
+                            help='Ignora recorridos secuenciales en tablas más chicas (default: 1000)')
+        parser.add_argument('--sin-analyze', action='store_true',
+                            help='PostgreSQL: solo planificar, sin ejecutar las consultas')
+        parser.add_argument('--mostrar-sql', action='store_true',
+                            help='Muestra la consulta que produce cada recorrido secuencial')
+
+    def handle(self, *args, **options):
+        usuarios = self._usuarios(options['usuario'])
+        analizar = not options['sin_analyze']
+
+        secuenciales = defaultdict(lambda: {'vistas': set(), 'filas': 0, 'ms': 0.0, 'sql': ''})
+        usados = set()
+        tablas = set()
+
+        with transaction.atomic(), override_settings(CACHES={alias: SIN_CACHE for alias in settings.CACHES}):
+            with connection.cursor() as cursor:
+                for usuario in usuarios:
+                    for vista in options['vistas']:
+                        etiqueta = f'{vista} ({usuario.get_username()})'
+                        status, consultas = _capturar(VISTAS[vista], usuario)
+                        if status != 200:
+                            self.stdout.write(self.style.WARNING(f'  {etiqueta}: respuesta {status}, se omite'))
+                            continue
+                        ms_vista = 0.0
+                        for sql in consultas:
+                            for tipo, tabla, indice, filas, ms in _explicar(cursor, sql, analizar):
+                                ms_vista += ms or 0
+                                if tabla:
+                                    tablas.add(tabla)
+                                if tipo == 'indice':
+                                    usados.add(indice)
+                                    continue
+                                recorrido = secuenciales[tabla]
+                                recorrido['vistas'].add(etiqueta)
+                                recorrido['filas'] = max(recorrido['filas'], filas or 0)
+                                recorrido['ms'] += ms or 0
+                                recorrido['sql'] = recorrido['sql'] or sql
+                        tiempo = f', {ms_vista:.1f} ms en planes' if analizar and connection.vendor == 'postgresql' else ''
+                        self.stdout.write(f'  {etiqueta}: {len(consultas)} consultas{tiempo}')
+
+                tablas = {tabla for tabla in tablas if tabla in connection.introspection.table_names(cursor)}
+                filas_tabla = _filas_por_tabla(cursor, tablas)
+                indices = _indices_secundarios(cursor, tablas)
+                sin_uso_pg = _sin_uso_postgresql(cursor, tablas) if connection.vendor == 'postgresql' else []
+            transaction.set_rollback(True)
+
+        self._informar_secuenciales(secuenciales, filas_tabla, options)
+        self._informar_indices(indices, usados, sin_uso_pg)
+
+    def _usuarios(self, nombres):
+        Usuario = get_user_model()
+        if nombres:
+            usuarios = list(Usuario.objects.filter(username__in=nombres, is_active=True))
+            faltan = set(nombres) - {usuario.get_username() for usuario in usuarios}
+            if faltan:
+                raise CommandError(f"Usuarios no encontrados o inactivos: {', '.join(sorted(faltan))}")
+            return usuarios
+        admin = (
+            Usuario.objects.filter(is_active=True, rol='admin').order_by('pk').first()
+            or Usuario.objects.filter(is_active=True, is_superuser=True).order_by('pk').first()
+        )
+        if admin is None:
+            raise CommandError('No hay un usuario admin activo: indique --usuario')
+        return [admin]
+
+    def _informar_secuenciales(self, secuenciales, filas_tabla, options):
+        relevantes = sorted(
+            (
+                (tabla, datos) for tabla, datos in secuenciales.items()
+                if filas_tabla.get(tabla, 0) >= options['min_filas']
+            ),
+            key=lambda item: -filas_tabla.get(item[0], 0),
+        )
+        self.stdout.write('')
+        if not relevantes:
+            self.stdout.write(self.style.SUCCESS(
+                f"Sin recorridos secuenciales en tablas de {options['min_filas']} filas o más"
+            ))
+            return
+        self.stdout.write(self.style.WARNING('Recorridos secuenciales:'))
+        for tabla, datos in relevantes:
+            tiempo = f", {datos['ms']:.1f} ms" if datos['ms'] else ''
+            self.stdout.write(
+                f"  {tabla} ({filas_tabla[tabla]} filas{tiempo}): {', '.join(sorted(datos['vistas']))}"
+            )
+            if options['mostrar_sql']:
+                self.stdout.write(f"    {datos['sql'][:500]}")
+
+    def _informar_indices(self, indices, usados, sin_uso_pg):
+        no_usados = sorted(
+            (tabla, nombre, columnas) for nombre, (tabla, columnas) in indices.items() if nombre not in usados
+        )
+        self.stdout.write('')
+        if no_usados:
+            self.stdout.write(self.style.WARNING('Índices que ningún plan usó (tablas leídas por las vistas):'))
+            for tabla, nombre, columnas in no_usados:
+                self.stdout.write(f"  {tabla}.{nombre} ({', '.join(columnas)})")
+        else:
+            self.stdout.write(self.style.SUCCESS('Todos los índices de las tablas leídas se usaron'))
+
+        if sin_uso_pg:
+            self.stdout.write('')
+            self.stdout.write(self.style.WARNING('Sin uso según pg_stat_user_indexes (desde el último reset):'))
+            for nombre, tabla, tamano in sin_uso_pg:
+                self.stdout.write(f'  {tabla}.{nombre} ({tamano})')
@@ -0,0 +1,55 @@
+"""
+Crea los índices de trigramas de la búsqueda y recalcula texto_busqueda.
+
+La migración solicitudes/0024 crea los índices de solicitudes y detalles;
+la tabla stock no la administra Django (managed=False), así que sus índices
+se crean con este comando después de cada recarga de la tabla. Solo aplica
+en PostgreSQL (requiere la extensión pg_trgm).
+
+--recalcular vuelve a calcular texto_busqueda de solicitudes y detalles
+escritos con queryset.update() o SQL directo (cargas masivas, scripts).
+
+Uso:
+  python manage.py crear_indices_busqueda
+  python manage.py crear_indices_busqueda --recalcular
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.busqueda import (
+    CAMPOS_DETALLE,
+    CAMPOS_SOLICITUD,
+    INDICES_TRIGRAM,
+    crear_indices_trigram,
+    recalcular_textos,
+)
+
+
+class Command(BaseCommand):
+    help = 'Crea los índices de trigramas de búsqueda (PostgreSQL) y opcionalmente recalcula texto_busqueda.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recalcular',
+            action='store_true',
+            help='Recalcular texto_busqueda de solicitudes y detalles',
+        )
+
+    def handle(self, *args, **options):
+        from solicitudes.models import Solicitud, SolicitudDetalle
+
+        if connection.vendor != 'postgresql':
+            self.stdout.write(f'  {connection.vendor}: sin índices de trigramas (la búsqueda usa LIKE)')
+        else:
+            listos = crear_indices_trigram(connection)
+            for nombre, tabla, _ in INDICES_TRIGRAM:
+                estado = 'OK' if nombre in listos else 'omitido'
+                self.stdout.write(f'  {nombre} ({tabla}): {estado}')
+
+        if options['recalcular']:
+            n_sol = recalcular_textos(Solicitud, CAMPOS_SOLICITUD)
+            n_det = recalcular_textos(SolicitudDetalle, CAMPOS_DETALLE)
+            self.stdout.write(f'  texto_busqueda actualizado: {n_sol} solicitudes, {n_det} detalles')
+
+        self.stdout.write(self.style.SUCCESS('Índices de búsqueda listos'))
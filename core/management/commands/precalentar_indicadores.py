@@ -0,0 +1,46 @@
+"""
+Precalienta la caché de indicadores de productividad del dashboard.
+
+Calcula (en el proceso del comando, no en una request) las combinaciones
+más usadas: períodos 7/30/90 días × todos los transportes y cada transporte
+del filtro. Pensado para cron cada pocos minutos.
+
+Uso:
+  python manage.py precalentar_indicadores
+  python manage.py precalentar_indicadores --periodos 7 30 60 90
+  python manage.py precalentar_indicadores --sin-transportes
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.views import calcular_indicadores_productividad
+
+
+class Command(BaseCommand):
+    help = 'Precalcula los indicadores del dashboard para los períodos y transportes más usados.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--periodos', type=int, nargs='+', default=[7, 30, 90])
+        parser.add_argument(
+            '--sin-transportes',
+            action='store_true',
+            help='Solo "todos los transportes" (sin una entrada por transporte)',
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        inicio = time.time()
+        for periodo in options['periodos']:
+            indicadores = calcular_indicadores_productividad(periodo, None, en_segundo_plano=False, forzar=True)
+            total += 1
+            transportes = [] if options['sin_transportes'] else indicadores.get('transportes_disponibles', [])
+            for transporte in transportes:
+                calcular_indicadores_productividad(periodo, transporte, en_segundo_plano=False, forzar=True)
+                total += 1
+            self.stdout.write(f'  {periodo} días: {1 + len(transportes)} combinaciones')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Indicadores precalentados: {total} combinaciones en {time.time() - inicio:.1f}s'
+        ))
@@ -0,0 +1,123 @@
+"""
+Reporte del costo de importación de cada módulo al cargar la aplicación.
+
+Lanza un intérprete nuevo con `python -X importtime` que hace django.setup()
+e importa la URLconf (lo que paga un worker antes de su primer request) y
+ordena los módulos por tiempo acumulado. El precalentamiento se desactiva en
+ese proceso para medir solo las importaciones.
+
+Uso:
+  python manage.py reporte_importaciones
+  python manage.py reporte_importaciones --top 40
+  python manage.py reporte_importaciones --por-paquete
+  python manage.py reporte_importaciones --modulo pandas --modulo openpyxl
+"""
+
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+LINEA_IMPORTTIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)\s*$')
+
+SCRIPT_CARGA = (
+    "import importlib, django\n"
+    "from django.conf import settings\n"
+    "django.setup()\n"
+    "importlib.import_module(settings.ROOT_URLCONF)\n"
+)
+
+
+def medir_importaciones(script=SCRIPT_CARGA, entorno=None):
+    """
+    Ejecuta `script` con -X importtime en un proceso nuevo.
+
+    Returns:
+        list[(modulo, propio_us, acumulado_us, nivel)] en orden de importación.
+    """
+    env = dict(os.environ)
+    env.setdefault('DJANGO_SETTINGS_MODULE', os.environ.get('DJANGO_SETTINGS_MODULE', 'backend.settings'))
+    env['PRECALENTAR_AL_INICIAR'] = 'False'
+    env.update(entorno or {})
+    proceso = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', script],
+        cwd=str(settings.BASE_DIR),
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if proceso.returncode != 0:
+        ultimas = '\n'.join(proceso.stderr.strip().splitlines()[-10:])
+        raise CommandError(f'La carga de la aplicación falló:\n{ultimas}')
+
+    filas = []
+    for linea in proceso.stderr.splitlines():
+        m = LINEA_IMPORTTIME.match(linea)
+        if m:
+            propio, acumulado, sangria, modulo = m.groups()
+            filas.append((modulo, int(propio), int(acumulado), len(sangria) // 2))
+    return filas
+
+
+class Command(BaseCommand):
+    help = 'Lista el costo de importación de cada módulo al cargar la aplicación (python -X importtime).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=25, help='Cantidad de filas a mostrar (default: 25)')
+        parser.add_argument(
+            '--por-paquete',
+            action='store_true',
+            help='Agrupar por paquete de primer nivel (suma del tiempo propio de sus módulos)',
+        )
+        parser.add_argument(
+            '--modulo',
+            action='append',
+            default=[],
+            help='Mostrar solo estos módulos/paquetes (repetible)',
+        )
+
+    def handle(self, *args, **options):
+        filas = medir_importaciones()
+        if not filas:
+            raise CommandError('No se obtuvo salida de -X importtime')
+
+        total_us = sum(propio for _, propio, _, _ in filas)
+
+        if options['por_paquete']:
+            por_paquete = defaultdict(lambda: [0, 0])
+            for modulo, propio, _, _ in filas:
+                paquete = modulo.split('.')[0]
+                por_paquete[paquete][0] += propio
+                por_paquete[paquete][1] += 1
+            ranking = sorted(
+                ((paquete, us, n) for paquete, (us, n) in por_paquete.items()),
+                key=lambda fila: fila[1],
+                reverse=True,
+            )
+            ranking = self._filtrar(ranking, options['modulo'])
+            self.stdout.write(f"{'ms':>9}  {'%':>5}  {'módulos':>7}  paquete")
+            for paquete, us, n in ranking[:options['top']]:
+                self.stdout.write(f"{us / 1000:9.1f}  {100 * us / total_us:5.1f}  {n:7d}  {paquete}")
+        else:
+            ranking = sorted(filas, key=lambda fila: fila[2], reverse=True)
+            ranking = self._filtrar(ranking, options['modulo'])
+            self.stdout.write(f"{'acum ms':>9}  {'propio ms':>9}  módulo")
+            for modulo, propio, acumulado, _ in ranking[:options['top']]:
+                self.stdout.write(f"{acumulado / 1000:9.1f}  {propio / 1000:9.1f}  {modulo}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(filas)} módulos importados en {total_us / 1e6:.2f}s (suma de tiempos propios)'
+        ))
+
+    @staticmethod
+    def _filtrar(ranking, modulos):
+        if not modulos:
+            return ranking
+        return [
+            fila for fila in ranking
+            if any(fila[0] == m or fila[0].startswith(m + '.') for m in modulos)
+        ]
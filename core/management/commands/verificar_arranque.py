@@ -0,0 +1,106 @@
+"""
+Verifica que el arranque de la aplicación se mantenga dentro de presupuesto.
+
+Mide en procesos nuevos el tiempo de `manage.py check` y de cargar la
+aplicación WSGI con su URLconf (sin precalentamiento), y comprueba que esa
+carga no importe librerías pesadas (settings.MODULOS_PRECARGA: pandas, openpyxl...):
+deben importarse dentro de las funciones que las usan. Termina con error si
+algo se pasa, para usarlo en CI o antes de desplegar.
+
+La parte de importaciones también la cubre core.tests.ArranqueTests dentro
+de la suite (manage.py test); los tiempos dependen de la máquina, así que
+solo los mide este comando.
+
+Uso:
+  python manage.py verificar_arranque
+  python manage.py verificar_arranque --repeticiones 5
+  python manage.py verificar_arranque --presupuesto-check 4 --presupuesto-wsgi 3
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+PRESUPUESTO_CHECK = 2.5  # segundos
+PRESUPUESTO_WSGI = 2.0  # segundos
+
+SCRIPT_WSGI = (
+    "import importlib, json, sys\n"
+    "import backend.wsgi\n"
+    "from django.conf import settings\n"
+    "importlib.import_module(settings.ROOT_URLCONF)\n"
+    "pesados = {pesados!r}\n"
+    "print(json.dumps([m for m in pesados if m in sys.modules]))\n"
+)
+
+
+def _ejecutar(argumentos):
+    """Corre un intérprete nuevo y devuelve (segundos, stdout)."""
+    env = dict(os.environ)
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    env['PRECALENTAR_AL_INICIAR'] = 'False'
+    inicio = time.perf_counter()
+    proceso = subprocess.run(
+        [sys.executable, *argumentos],
+        cwd=str(settings.BASE_DIR),
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    segundos = time.perf_counter() - inicio
+    if proceso.returncode != 0:
+        ultimas = '\n'.join(proceso.stderr.strip().splitlines()[-10:])
+        raise CommandError(f"Falló `{' '.join(argumentos[:2])}`:\n{ultimas}")
+    return segundos, proceso.stdout
+
+
+class Command(BaseCommand):
+    help = 'Falla si manage.py check o la carga WSGI superan su presupuesto de tiempo o importan librerías pesadas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--presupuesto-check', type=float, default=PRESUPUESTO_CHECK,
+                            help=f'Segundos máximos para manage.py check (default: {PRESUPUESTO_CHECK})')
+        parser.add_argument('--presupuesto-wsgi', type=float, default=PRESUPUESTO_WSGI,
+                            help=f'Segundos máximos para cargar WSGI + URLs (default: {PRESUPUESTO_WSGI})')
+        parser.add_argument('--repeticiones', type=int, default=3,
+                            help='Mediciones por objetivo; se usa la mejor (default: 3)')
+
+    def handle(self, *args, **options):
+        repeticiones = max(1, options['repeticiones'])
+        pesados = sorted({modulo.split('.')[0] for modulo in settings.MODULOS_PRECARGA})
+        script = SCRIPT_WSGI.format(pesados=pesados)
+
+        tiempos_check = [_ejecutar(['manage.py', 'check'])[0] for _ in range(repeticiones)]
+        mediciones_wsgi = [_ejecutar(['-c', script]) for _ in range(repeticiones)]
+        tiempos_wsgi = [segundos for segundos, _ in mediciones_wsgi]
+        importados = json.loads(mediciones_wsgi[-1][1].strip().splitlines()[-1])
+
+        errores = []
+        for nombre, tiempos, presupuesto in (
+            ('manage.py check', tiempos_check, options['presupuesto_check']),
+            ('carga WSGI + URLs', tiempos_wsgi, options['presupuesto_wsgi']),
+        ):
+            mejor = min(tiempos)
+            estado = 'OK' if mejor <= presupuesto else 'EXCEDIDO'
+            self.stdout.write(f'  {nombre}: {mejor:.2f}s (presupuesto {presupuesto:.2f}s) {estado}')
+            if mejor > presupuesto:
+                errores.append(f'{nombre} tardó {mejor:.2f}s (presupuesto {presupuesto:.2f}s)')
+
+        if importados:
+            self.stdout.write(f"  Librerías pesadas cargadas al arrancar: {', '.join(importados)}")
+            errores.append(
+                f"la carga WSGI importa {', '.join(importados)}; "
+                "muévelas dentro de las funciones que las usan "
+                "(python manage.py reporte_importaciones --modulo <nombre> muestra su costo)"
+            )
+        else:
+            self.stdout.write('  Librerías pesadas cargadas al arrancar: ninguna')
+
+        if errores:
+            raise CommandError('Arranque fuera de presupuesto: ' + '; '.join(errores))
+        self.stdout.write(self.style.SUCCESS('Arranque dentro de presupuesto'))
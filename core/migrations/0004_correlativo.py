@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_bodega_usuario_bodegas_asignadas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Correlativo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('serie', models.CharField(max_length=20)),
+                ('anio', models.PositiveIntegerField(verbose_name='Año')),
+                ('ultimo', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Correlativo',
+                'verbose_name_plural': 'Correlativos',
+                'db_table': 'core_correlativos',
+                'unique_together': {('serie', 'anio')},
+            },
+        ),
+    ]
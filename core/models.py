@@ -162,3 +162,27 @@ class Usuario(AbstractUser):
         if self.es_admin():
             return list(Bodega.objects.filter(activa=True).values_list('codigo', flat=True))
         return list(self.bodegas_asignadas.filter(activa=True).values_list('codigo', flat=True))
+
+
+class Correlativo(models.Model):
+    """
+    Último correlativo entregado por serie y año (ST-2026-001, BUL-2026-0001...).
+
+    Se asigna con core.correlativos.reservar(): un UPDATE ... RETURNING que
+    bloquea la fila hasta el commit de la transacción que lo pide, así que
+    dos requests concurrentes nunca reciben el mismo número y un rollback no
+    deja huecos.
+    """
+
+    serie = models.CharField(max_length=20)
+    anio = models.PositiveIntegerField(verbose_name='Año')
+    ultimo = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'core_correlativos'
+        verbose_name = 'Correlativo'
+        verbose_name_plural = 'Correlativos'
+        unique_together = ('serie', 'anio')
+
+    def __str__(self):
+        return f"{self.serie}-{self.anio}: {self.ultimo}"
@@ -0,0 +1,253 @@
+"""
+Paginación por keyset (seek) para listados y APIs.
+
+En vez de OFFSET, cada página continúa desde los valores de orden de la
+última fila de la anterior: WHERE (a, b, id) > (va, vb, vid). Con un índice
+sobre las columnas de orden, la página N cuesta lo mismo que la primera.
+
+El cursor es opaco para el cliente (base64 de los valores de orden).
+
+Para las vistas HTML, paginar() devuelve una PaginaKeyset con la misma
+interfaz que usan las plantillas con Paginator (has_next, number, ...) y un
+total aproximado que no requiere COUNT(*) por página.
+"""
+
+import base64
+import json
+import logging
+import math
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, connections
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+
+class CursorInvalido(ValueError):
+    """El cursor recibido no se puede decodificar para este orden."""
+
+
+def codificar_cursor(valores):
+    texto = json.dumps(list(valores), cls=DjangoJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor, modelo, orden):
+    """
+    Devuelve los valores del cursor convertidos al tipo de cada campo de orden.
+
+    Raises:
+        CursorInvalido: si el cursor está corrupto o no corresponde al orden.
+    """
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno).decode())
+        if not isinstance(valores, list) or len(valores) != len(orden):
+            raise ValueError('largo distinto al orden')
+        return [
+            modelo._meta.get_field(campo.lstrip('-')).to_python(valor)
+            for campo, valor in zip(orden, valores)
+        ]
+    except Exception as e:
+        raise CursorInvalido(f'Cursor inválido: {e}') from e
+
+
+def filtro_despues_de(orden, valores):
+    """
+    Q equivalente a (c1, c2, ..., cn) > (v1, v2, ..., vn) respetando el sentido
+    de cada campo ('-campo' = descendente). El último campo debe ser único (id).
+    """
+    condicion = Q()
+    for i, (campo, valor) in enumerate(zip(orden, valores)):
+        nombre = campo.lstrip('-')
+        lookup = f'{nombre}__lt' if campo.startswith('-') else f'{nombre}__gt'
+        iguales = {c.lstrip('-'): v for c, v in zip(orden[:i], valores[:i])}
+        condicion |= Q(**iguales, **{lookup: valor})
+    return condicion
+
+
+def pagina_keyset(queryset, orden, cursor=None, limite=50):
+    """
+    Una página de `queryset` ordenada por `orden`, continuando desde `cursor`.
+
+    Trae limite + 1 filas para saber si hay más sin un COUNT(*).
+
+    Returns:
+        (filas, siguiente_cursor): siguiente_cursor es None en la última página.
+
+    Raises:
+        CursorInvalido
+    """
+    orden = list(orden)
+    queryset = queryset.order_by(*orden)
+    if cursor:
+        queryset = queryset.filter(filtro_despues_de(orden, decodificar_cursor(cursor, queryset.model, orden)))
+
+    filas = list(queryset[:limite + 1])
+    if len(filas) <= limite:
+        return filas, None
+
+    filas = filas[:limite]
+    return filas, _cursor_de(filas[-1], orden)
+
+
+def _valor_orden(fila, campo):
+    if isinstance(fila, dict):
+        return fila[campo]
+    return getattr(fila, campo)
+
+
+def _cursor_de(fila, orden):
+    return codificar_cursor(_valor_orden(fila, campo.lstrip('-')) for campo in orden)
+
+
+def _invertir(orden):
+    return [campo[1:] if campo.startswith('-') else f'-{campo}' for campo in orden]
+
+
+def estimar_total(queryset):
+    """
+    Cantidad de filas del queryset sin COUNT(*) en producción.
+
+    En PostgreSQL usa la estimación del planificador (EXPLAIN, estadísticas
+    de ANALYZE); en otros motores (SQLite de desarrollo) hace el COUNT.
+
+    Returns:
+        (total, exacto)
+    """
+    queryset = queryset.order_by()
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        try:
+            sql, params = queryset.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]['Plan']['Plan Rows']), False
+        except (DatabaseError, LookupError, TypeError, ValueError) as e:
+            logger.warning(f"No se pudo estimar el total con EXPLAIN: {e}")
+    return queryset.count(), True
+
+
+class PaginaKeyset:
+    """
+    Página de un listado por keyset con la interfaz de django.core.paginator.Page
+    que usan las plantillas (iterable, has_next, number, ...).
+
+    El número de página viaja en la URL (n) y num_pages sale del total
+    aproximado: son orientativos, la navegación es siempre por cursor.
+    """
+
+    def __init__(self, filas, numero, limite, total, siguiente_cursor=None, anterior_cursor=None, exacto=True):
+        self.object_list = filas
+        self.number = numero
+        self.limite = limite
+        self.total_aproximado = total
+        self.total_exacto = exacto
+        self.siguiente_cursor = siguiente_cursor
+        self.anterior_cursor = anterior_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.siguiente_cursor is not None
+
+    def has_previous(self):
+        return self.anterior_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return max(1, self.number - 1)
+
+    @property
+    def num_pages(self):
+        estimadas = math.ceil(self.total_aproximado / self.limite) if self.total_aproximado else 1
+        # La estimación puede quedarse corta: nunca menos de las páginas ya recorridas
+        return max(estimadas, self.number + (1 if self.has_next() else 0))
+
+    @property
+    def paginator(self):
+        # Compatibilidad con plantillas que usan page_obj.paginator.num_pages / count
+        return self
+
+    @property
+    def count(self):
+        return self.total_aproximado
+
+
+def paginar(queryset, orden, parametros, limite=50, total=None):
+    """
+    Página de `queryset` según los parámetros de la URL:
+
+      - cursor=<c>&n=<k>: página k, siguiente a la fila del cursor
+      - antes=<c>&n=<k>:  página k, anterior a la fila del cursor
+      - ultima=1:         última página
+      - (nada):           primera página
+
+    Un cursor inválido vuelve a la primera página.
+
+    Args:
+        total: total conocido (ej. tabla de contadores); si es None se usa
+            estimar_total(queryset).
+    """
+    orden = list(orden)
+    try:
+        numero = max(1, int(parametros.get('n') or 1))
+    except (TypeError, ValueError):
+        numero = 1
+    exacto = True
+    if total is None:
+        total, exacto = estimar_total(queryset)
+
+    cursor = parametros.get('cursor')
+    antes = parametros.get('antes')
+    try:
+        if antes or parametros.get('ultima'):
+            # Recorrer hacia atrás con el orden invertido y dar vuelta el resultado
+            invertido = _invertir(orden)
+            qs = queryset.order_by(*invertido)
+            if antes:
+                qs = qs.filter(filtro_despues_de(invertido, decodificar_cursor(antes, queryset.model, orden)))
+            filas = list(qs[:limite + 1])
+            if not filas:
+                raise CursorInvalido('sin filas antes del cursor')
+            hay_anteriores = len(filas) > limite
+            filas = filas[:limite][::-1]
+            if parametros.get('ultima') and not antes:
+                numero = max(1, math.ceil(total / limite)) if total else 1
+            if not hay_anteriores:
+                numero = 1
+            return PaginaKeyset(
+                filas, numero, limite, total,
+                siguiente_cursor=_cursor_de(filas[-1], orden) if filas and antes else None,
+                anterior_cursor=_cursor_de(filas[0], orden) if filas and hay_anteriores else None,
+                exacto=exacto,
+            )
+
+        filas, siguiente = pagina_keyset(queryset, orden, cursor=cursor, limite=limite)
+        if cursor and not filas:
+            raise CursorInvalido('sin filas después del cursor')
+    except CursorInvalido:
+        filas, siguiente = pagina_keyset(queryset, orden, limite=limite)
+        cursor, numero = None, 1
+
+    if not cursor:
+        numero = 1
+    return PaginaKeyset(
+        filas, numero, limite, total,
+        siguiente_cursor=siguiente,
+        anterior_cursor=_cursor_de(filas[0], orden) if filas and cursor else None,
+        exacto=exacto,
+    )
@@ -0,0 +1,100 @@
+"""
+Precalentamiento al arrancar un proceso web.
+
+Cada worker nuevo pagaba en sus primeras requests la carga de las cachés de
+configuración (EstadoWorkflow, TransporteConfig, TipoSolicitud, ...), del
+calendario laboral y la importación de librerías pesadas. precalentar() lo
+hace al cargar la aplicación (backend.wsgi); con `preload_app` de gunicorn
+(gunicorn.conf.py) ocurre una sola vez en el proceso maestro y los workers
+heredan todo por copy-on-write.
+
+Se controla con PRECALENTAR_AL_INICIAR y MODULOS_PRECARGA en settings.
+"""
+
+import importlib
+import logging
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+def precargar_modulos(modulos=None):
+    """
+    Importa los módulos indicados y mide cuánto cuesta cada uno.
+
+    Returns:
+        list[(modulo, segundos, error)]: error es None si se importó bien.
+    """
+    if modulos is None:
+        modulos = settings.MODULOS_PRECARGA
+    resultados = []
+    for modulo in modulos:
+        inicio = time.perf_counter()
+        try:
+            importlib.import_module(modulo)
+            error = None
+        except Exception as e:
+            # Una dependencia opcional ausente no debe impedir el arranque
+            error = str(e)
+        resultados.append((modulo, time.perf_counter() - inicio, error))
+    return resultados
+
+
+def precalentar_caches():
+    """
+    Carga las cachés de configuración y el calendario laboral del proceso.
+
+    La versión de configuración se lee antes de cargar: si otro proceso cambia
+    algo entre medio, el primer request verá una versión distinta y recargará.
+    """
+    from django.utils import timezone
+
+    from configuracion import cache as cache_config
+    from configuracion.models import EstadoWorkflow, Feriado, TipoSolicitud, TransporteConfig
+    from core.business_hours import obtener_calendario_laboral
+
+    try:
+        version = cache_config.version_config()
+    except Exception as e:
+        logger.warning(f"Precalentamiento: no se pudo leer la versión de configuración: {e}")
+        version = None
+
+    EstadoWorkflow._cargar_cache()
+    TransporteConfig._cargar_cache()
+    TipoSolicitud._cargar_cache()
+
+    hoy = timezone.localdate()
+    for año in (hoy.year, hoy.year + 1):
+        Feriado.fechas_del_año(año)
+    obtener_calendario_laboral().es_habil(hoy)
+
+    if version is not None:
+        cache_config._version_local = version
+
+
+def precalentar():
+    """
+    Precalienta cachés y módulos pesados según settings. Nunca lanza: un
+    fallo (BD no disponible, migraciones pendientes) solo deja el trabajo
+    para el primer request, como antes.
+    """
+    inicio = time.perf_counter()
+    try:
+        precalentar_caches()
+    except DatabaseError as e:
+        logger.warning(f"Precalentamiento: cachés de configuración omitidas: {e}")
+    except Exception:
+        logger.exception("Precalentamiento: error cargando cachés de configuración")
+    finally:
+        # Las conexiones abiertas aquí no deben compartirse con procesos hijos (fork)
+        connections.close_all()
+
+    for modulo, segundos, error in precargar_modulos():
+        if error:
+            logger.info(f"Precalentamiento: {modulo} no disponible ({error})")
+        else:
+            logger.debug(f"Precalentamiento: {modulo} importado en {segundos * 1000:.0f} ms")
+
+    logger.info(f"Precalentamiento completado en {time.perf_counter() - inicio:.2f}s")
@@ -0,0 +1,30 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from bodega.models import CargaStock
+from despacho.models import Bulto
+from inventario.models import CargaStock as CargaStockSAP
+from solicitudes.models import Solicitud, SolicitudDetalle
+from .cache_datos import invalidar_cache_datos
+
+
+@receiver(post_save, sender=Solicitud)
+@receiver(post_delete, sender=Solicitud)
+@receiver(post_save, sender=SolicitudDetalle)
+@receiver(post_delete, sender=SolicitudDetalle)
+@receiver(post_save, sender=Bulto)
+@receiver(post_delete, sender=Bulto)
+def datos_operacionales_modificados(sender, raw=False, **kwargs):
+    """Cualquier cambio en solicitudes, detalles o bultos invalida dashboard e informes."""
+    if raw:
+        return
+    invalidar_cache_datos()
+
+
+@receiver(post_save, sender=CargaStock)
+@receiver(post_save, sender=CargaStockSAP)
+def carga_stock_guardada(sender, instance, raw=False, **kwargs):
+    """Las cargas de stock terminan guardando su registro de carga (activo/completado)."""
+    if raw or instance.estado == 'procesando':
+        return
+    invalidar_cache_datos()
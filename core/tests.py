@@ -1,3 +1,375 @@
-from django.test import TestCase
+import json
+import random
+import tempfile
+import threading
+import time
+from datetime import date, datetime, time as dt_time, timedelta, timezone as dt_timezone
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from . import business_hours, cache_datos
+from .business_hours import CalendarioLaboral
+
+
+def horas_dia_a_dia(fecha_inicio, fecha_fin, feriados=frozenset()):
+    """
+    Copia del calcular_horas_laborales original (recorrido día por día) como
+    referencia; solo agrega el salto de feriados.
+    """
+    if not fecha_inicio or not fecha_fin:
+        return 0
+    if timezone.is_aware(fecha_inicio):
+        fecha_inicio = timezone.localtime(fecha_inicio)
+    if timezone.is_aware(fecha_fin):
+        fecha_fin = timezone.localtime(fecha_fin)
+    if fecha_fin < fecha_inicio:
+        return 0
+
+    total_segundos = 0.0
+    dia_cursor = fecha_inicio.date()
+    dia_fin = fecha_fin.date()
+    while dia_cursor <= dia_fin:
+        weekday = dia_cursor.weekday()
+        if weekday <= 3:
+            inicio_jornada = datetime.combine(dia_cursor, dt_time(8, 0, 0))
+            fin_jornada = datetime.combine(dia_cursor, dt_time(17, 45, 0))
+        elif weekday == 4:
+            inicio_jornada = datetime.combine(dia_cursor, dt_time(8, 0, 0))
+            fin_jornada = datetime.combine(dia_cursor, dt_time(13, 0, 0))
+        else:
+            dia_cursor += timedelta(days=1)
+            continue
+        if dia_cursor in feriados:
+            dia_cursor += timedelta(days=1)
+            continue
+
+        if timezone.is_aware(fecha_inicio):
+            inicio_jornada = timezone.make_aware(inicio_jornada, timezone.get_current_timezone())
+            fin_jornada = timezone.make_aware(fin_jornada, timezone.get_current_timezone())
+        tramo_inicio = max(fecha_inicio, inicio_jornada)
+        tramo_fin = min(fecha_fin, fin_jornada)
+        if tramo_fin > tramo_inicio:
+            total_segundos += (tramo_fin - tramo_inicio).total_seconds()
+        dia_cursor += timedelta(days=1)
+
+    return total_segundos / 3600
+
+
+class RevalidacionTests(SimpleTestCase):
+    # El recálculo en segundo plano abre su propia conexión
+    databases = {'default'}
+
+    def setUp(self):
+        cache.clear()
+
+    def sembrar_obsoleta(self):
+        clave = cache_datos._clave_estable('prueba', {'a': 1})
+        cache.set(clave, {'valor': 'viejo', 'generado_en': time.time() - 600, 'version': 'otra'})
+
+    def test_filebased_sin_postgresql_calcula_en_la_request(self):
+        # add() de FileBasedCache no es atómico: no se confía en él como lock
+        with tempfile.TemporaryDirectory() as carpeta, override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': carpeta,
+        }}):
+            self.sembrar_obsoleta()
+            entrada = cache_datos.obtener_con_revalidacion('prueba', {'a': 1}, lambda: 'nuevo')
+        self.assertEqual((entrada['valor'], entrada['fresco']), ('nuevo', True))
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_lock_atomico_sirve_obsoleto_y_recalcula_uno(self):
+        self.sembrar_obsoleta()
+        entrada = cache_datos.obtener_con_revalidacion('prueba', {'a': 1}, lambda: 'nuevo')
+        self.assertEqual((entrada['valor'], entrada['fresco']), ('viejo', False))
+        # Con el lock tomado, otro worker no lanza un segundo recálculo
+        clave = cache_datos._clave_estable('prueba', {'a': 1})
+        cache.add(f'{clave}_lock', 1)
+        self.assertFalse(cache_datos._recalcular_en_segundo_plano(clave, lambda: 'otro', 'v', 60))
+
+
+class CalendarioLaboralTests(SimpleTestCase):
+    FERIADOS = frozenset({date(2025, 9, 18), date(2025, 9, 19), date(2025, 12, 25), date(2026, 1, 1)})
+
+    def setUp(self):
+        self.calendario = CalendarioLaboral(feriados=self.FERIADOS)
+
+    def assertParidad(self, inicio, fin):
+        esperado = horas_dia_a_dia(inicio, fin, self.FERIADOS)
+        self.assertAlmostEqual(self.calendario.horas(inicio, fin), esperado, places=9, msg=f'{inicio} → {fin}')
+        self.assertAlmostEqual(
+            float(self.calendario.horas_lote([inicio], [fin])[0]), esperado, places=9, msg=f'{inicio} → {fin}'
+        )
+
+    def test_casos_borde(self):
+        casos = [
+            # Fin de semana completo y tramos que empiezan o terminan en él
+            (datetime(2025, 9, 6, 10), datetime(2025, 9, 7, 18)),
+            (datetime(2025, 9, 5, 12), datetime(2025, 9, 8, 9)),
+            (datetime(2025, 9, 6, 9), datetime(2025, 9, 8, 8, 30)),
+            # Viernes: cierre a las 13:00
+            (datetime(2025, 9, 5, 12, 30), datetime(2025, 9, 5, 17)),
+            (datetime(2025, 9, 5, 13), datetime(2025, 9, 8, 8)),
+            (datetime(2025, 9, 5, 14), datetime(2025, 9, 5, 16)),
+            # Feriados (jueves/viernes de Fiestas Patrias, Navidad, Año Nuevo)
+            (datetime(2025, 9, 17, 17), datetime(2025, 9, 22, 9)),
+            (datetime(2025, 9, 18, 10), datetime(2025, 9, 18, 12)),
+            (datetime(2025, 12, 24, 16), datetime(2026, 1, 2, 10)),
+            # Inicio o fin fuera de jornada
+            (datetime(2025, 9, 8, 6), datetime(2025, 9, 8, 20)),
+            (datetime(2025, 9, 8, 19), datetime(2025, 9, 9, 7)),
+            (datetime(2025, 9, 8, 17, 45), datetime(2025, 9, 9, 8)),
+            (datetime(2025, 9, 9, 23, 59, 59, 999999), datetime(2025, 9, 10, 8, 0, 0, 1)),
+            # Varios años
+            (datetime(2023, 3, 15, 11, 20), datetime(2026, 7, 2, 15, 5)),
+            # Mismo instante y fin antes que inicio
+            (datetime(2025, 9, 8, 10), datetime(2025, 9, 8, 10)),
+            (datetime(2025, 9, 9, 10), datetime(2025, 9, 8, 10)),
+        ]
+        for inicio, fin in casos:
+            self.assertParidad(inicio, fin)
+            # Mismos instantes aware (America/Santiago)
+            self.assertParidad(timezone.make_aware(inicio), timezone.make_aware(fin))
+
+    def test_aware_en_otra_zona(self):
+        # Aware en UTC se lleva a hora local antes de comparar con la jornada
+        inicio = datetime(2025, 9, 8, 11, tzinfo=dt_timezone.utc)
+        fin = datetime(2025, 9, 12, 22, tzinfo=dt_timezone.utc)
+        self.assertParidad(inicio, fin)
+
+    def test_lote_aleatorio(self):
+        azar = random.Random(20251017)
+        origen = datetime(2024, 1, 1)
+        inicios, fines = [], []
+        for _ in range(2000):
+            inicio = origen + timedelta(minutes=azar.randrange(0, 3 * 365 * 24 * 60))
+            fin = inicio + timedelta(minutes=azar.randrange(-600, 60 * 24 * 60))
+            inicios.append(inicio)
+            fines.append(fin)
+        inicios.append(None)
+        fines.append(datetime(2025, 1, 1))
+
+        lote = self.calendario.horas_lote(inicios, fines)
+        for inicio, fin, horas in zip(inicios, fines, lote.tolist()):
+            esperado = horas_dia_a_dia(inicio, fin, self.FERIADOS)
+            self.assertAlmostEqual(horas, esperado, places=9, msg=f'{inicio} → {fin}')
+            self.assertAlmostEqual(self.calendario.horas(inicio, fin), esperado, places=9)
+
+        # Entrada ya en datetime64 (hora local), como la arman los informes
+        import numpy as np
+        desde = np.array(inicios[:-1], dtype='datetime64[us]')
+        hasta = np.array(fines[:-1], dtype='datetime64[us]')
+        self.assertEqual(self.calendario.horas_lote(desde, hasta).tolist(), lote[:-1].tolist())
+
+    def test_sumar_y_restar_son_inversas_de_horas(self):
+        instantes = [
+            datetime(2025, 9, 5, 12),  # viernes, una hora antes del cierre
+            datetime(2025, 9, 5, 15),  # viernes después del cierre
+            datetime(2025, 9, 6, 10),  # sábado
+            datetime(2025, 9, 7, 23),  # domingo
+            datetime(2025, 9, 17, 16, 30),  # víspera de feriados
+            datetime(2025, 9, 18, 9),  # feriado
+            datetime(2025, 9, 8, 7),  # antes de abrir
+            datetime(2025, 9, 8, 17, 45),  # justo al cierre
+            datetime(2025, 12, 24, 11, 15),
+        ]
+        for t in instantes + [timezone.make_aware(t) for t in instantes]:
+            for h in (0.25, 1, 4.75, 9.75, 44, 47.5, 500):
+                with self.subTest(t=t, h=h):
+                    fin = self.calendario.sumar_horas(t, h)
+                    inicio = self.calendario.restar_horas(t, h)
+                    self.assertAlmostEqual(self.calendario.horas(t, fin), h, places=9)
+                    self.assertAlmostEqual(self.calendario.horas(inicio, t), h, places=9)
+                    # El resultado nunca cae en fin de semana ni feriado
+                    for instante in (fin, inicio):
+                        local = timezone.localtime(instante) if timezone.is_aware(instante) else instante
+                        self.assertLess(local.weekday(), 5)
+                        self.assertNotIn(local.date(), self.FERIADOS)
+
+    def test_sin_tabla_de_feriados(self):
+        with mock.patch.object(business_hours, '_tabla_feriados_existe', False), \
+                mock.patch.object(connection.introspection, 'table_names', return_value=[]):
+            self.assertIsNone(business_hours._feriados_configurados(2025))
+
+
+class FeriadosConfiguradosTests(TestCase):
+
+    def test_introspecta_una_vez_por_proceso(self):
+        from configuracion.models import Feriado
+
+        Feriado.objects.create(fecha=date(2025, 9, 18), nombre='Independencia')
+        with mock.patch.object(business_hours, '_tabla_feriados_existe', False), \
+                mock.patch.object(connection.introspection, 'table_names', wraps=connection.introspection.table_names) as introspeccion:
+            for año in (2025, 2026, 2027):
+                business_hours._feriados_configurados(año)
+            self.assertEqual(introspeccion.call_count, 1)
+            self.assertIn(date(2025, 9, 18), business_hours._feriados_configurados(2025))
+
+
+class BusquedaTests(SimpleTestCase):
+
+    def test_numero_fuera_de_rango_no_filtra_por_id(self):
+        from .busqueda import MAX_ID, filtro
+
+        self.assertIn(('pk', MAX_ID), filtro(str(MAX_ID)).children)
+        # Un número más largo que un bigint (p. ej. un código de barras) solo busca en el texto
+        self.assertEqual(filtro(str(MAX_ID + 1)).children, [('texto_busqueda__contains', str(MAX_ID + 1))])
+
+
+class ArranqueTests(SimpleTestCase):
+
+    def test_carga_wsgi_no_importa_librerias_pesadas(self):
+        from .management.commands.verificar_arranque import SCRIPT_WSGI, _ejecutar
+
+        pesados = sorted({modulo.split('.')[0] for modulo in settings.MODULOS_PRECARGA})
+        _, salida = _ejecutar(['-c', SCRIPT_WSGI.format(pesados=pesados)])
+        self.assertEqual(json.loads(salida.strip().splitlines()[-1]), [])
+
+
+class CorrelativosTests(TestCase):
+
+    def test_bloques_consecutivos_sin_repetir(self):
+        from .correlativos import reservar
+
+        llamadas = []
+
+        def semilla():
+            llamadas.append(1)
+            return 9998
+
+        bloques = [reservar('ST', 2026, cantidad, semilla=semilla) for cantidad in (1, 3, 1, 5)]
+        numeros = [n for bloque in bloques for n in bloque]
+        self.assertEqual(numeros, list(range(9999, 10009)))
+        # La semilla solo se consulta al crear la fila de la serie/año
+        self.assertEqual(len(llamadas), 1)
+        # Otra serie u otro año parten de cero
+        self.assertEqual(reservar('BUL', 2026, 2), range(1, 3))
+        self.assertEqual(reservar('ST', 2027), range(1, 2))
+
+    def test_rollback_devuelve_los_numeros(self):
+        from django.db import transaction
+
+        from .correlativos import reservar
+
+        reservar('ST', 2026, 2)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            reservar('ST', 2026, 4)
+            raise RuntimeError
+        self.assertEqual(reservar('ST', 2026), range(3, 4))
+
+    def test_ultimo_sufijo_numerico(self):
+        from .correlativos import ultimo_sufijo
+
+        self.assertEqual(ultimo_sufijo(['ST-2026-9999', 'ST-2026-10000', 'ST-2026-abc']), 10000)
+        self.assertEqual(ultimo_sufijo([]), 0)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'concurrencia real requiere PostgreSQL')
+class CorrelativosConcurrentesTests(TransactionTestCase):
+
+    def test_reservas_simultaneas_no_repiten(self):
+        from django.db import connections
+
+        from .correlativos import reservar
+
+        inicio = threading.Barrier(8)
+        resultados = []
+
+        def reservar_en_hilo():
+            try:
+                inicio.wait()
+                for _ in range(10):
+                    resultados.extend(reservar('ST', 2026, 3))
+            finally:
+                connections.close_all()
+
+        hilos = [threading.Thread(target=reservar_en_hilo) for _ in range(8)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(sorted(resultados), list(range(1, 8 * 10 * 3 + 1)))
+
+
+class PaginacionKeysetTests(TestCase):
+    ORDEN = ('serie', '-ultimo', 'id')
+
+    @classmethod
+    def setUpTestData(cls):
+        from .models import Correlativo
+
+        # Empates en (serie, ultimo) para que el desempate por id importe
+        for i in range(23):
+            Correlativo.objects.create(serie=f'S{i % 3}', anio=2000 + i, ultimo=i % 2)
+        cls.esperado = list(Correlativo.objects.order_by(*cls.ORDEN).values_list('pk', flat=True))
+
+    def queryset(self):
+        from .models import Correlativo
+
+        return Correlativo.objects.all()
+
+    def recorrer(self, limite):
+        from .paginacion import pagina_keyset
+
+        paginas, cursor = [], None
+        while True:
+            filas, cursor = pagina_keyset(self.queryset(), self.ORDEN, cursor=cursor, limite=limite)
+            paginas.append([fila.pk for fila in filas])
+            if cursor is None:
+                return paginas
+
+    def test_recorrido_completo_sin_repetir_ni_saltar(self):
+        for limite in (1, 4, 5, 22, 23, 24, 100):
+            with self.subTest(limite=limite):
+                paginas = self.recorrer(limite)
+                self.assertEqual([pk for pagina in paginas for pk in pagina], self.esperado)
+                # Si el total es múltiplo del límite no queda una página vacía al final
+                self.assertTrue(all(paginas))
+                self.assertEqual(len(paginas), -(-len(self.esperado) // limite))
+
+    def test_paginar_ida_y_vuelta(self):
+        from .paginacion import paginar
+
+        ida = [paginar(self.queryset(), self.ORDEN, {}, limite=5, total=23)]
+        while ida[-1].has_next():
+            ida.append(paginar(self.queryset(), self.ORDEN, {
+                'cursor': ida[-1].siguiente_cursor, 'n': ida[-1].next_page_number(),
+            }, limite=5, total=23))
+        self.assertEqual([pagina.number for pagina in ida], [1, 2, 3, 4, 5])
+        self.assertEqual([len(pagina) for pagina in ida], [5, 5, 5, 5, 3])
+        self.assertFalse(ida[0].has_previous())
+
+        vuelta = [paginar(self.queryset(), self.ORDEN, {'ultima': '1'}, limite=5, total=23)]
+        while vuelta[-1].has_previous():
+            vuelta.append(paginar(self.queryset(), self.ORDEN, {
+                'antes': vuelta[-1].anterior_cursor, 'n': vuelta[-1].previous_page_number(),
+            }, limite=5, total=23))
+        # Hacia atrás las páginas se cortan desde el final: mismas filas, otros cortes
+        self.assertEqual([fila.pk for pagina in reversed(vuelta) for fila in pagina], self.esperado)
+        self.assertEqual([pagina.number for pagina in vuelta], [5, 4, 3, 2, 1])
+        self.assertEqual(len(vuelta[0]), 5)
+
+    def test_cursor_invalido_o_agotado_vuelve_a_la_primera(self):
+        from .paginacion import codificar_cursor, paginar
+
+        primera = [fila.pk for fila in paginar(self.queryset(), self.ORDEN, {}, limite=5, total=23)]
+        ultima_fila = self.queryset().get(pk=self.esperado[-1])
+        for parametros in (
+            {'cursor': 'no-es-base64!', 'n': '3'},
+            {'cursor': codificar_cursor(['S0']), 'n': '2'},
+            {'cursor': codificar_cursor([ultima_fila.serie, ultima_fila.ultimo, ultima_fila.pk]), 'n': '6'},
+            {'antes': codificar_cursor(['S0', 9, 0]), 'n': '2'},
+        ):
+            with self.subTest(parametros=parametros):
+                pagina = paginar(self.queryset(), self.ORDEN, parametros, limite=5, total=23)
+                self.assertEqual([fila.pk for fila in pagina], primera)
+                self.assertEqual(pagina.number, 1)
+
+    def test_listado_vacio(self):
+        from .paginacion import paginar
+
+        pagina = paginar(self.queryset().none(), self.ORDEN, {}, limite=5)
+        self.assertEqual((len(pagina), pagina.has_next(), pagina.has_previous(), pagina.num_pages), (0, False, False, 1))
@@ -8,19 +8,24 @@ from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
-from django.db.models import Count, Q, Avg, Min, Max, Sum, F, ExpressionWrapper, DurationField, OuterRef, Subquery, Case, When, DecimalField
+from django.db.models import Count, Q, Avg, Min, Max, Sum, F, Value, ExpressionWrapper, DateField, DurationField, OuterRef, Subquery, Case, When, DecimalField
 from django.db.models.functions import Coalesce, Greatest
 from django.utils import timezone
-from django.core.cache import cache
 from datetime import timedelta, datetime, date, time as dt_time
 from decimal import Decimal
 import json
 import zoneinfo
-from despacho.models import Bulto
 from bodega.models import Stock
-from solicitudes.models import Solicitud, SolicitudDetalle
+from solicitudes.archivo import alcanza_archivo
+from solicitudes.contadores import conteos_por_estado, pendientes_en_bodega
+from solicitudes.models import Solicitud, SolicitudDetalle, SolicitudTransporte, TransporteEnUso
 from .models import Usuario
-from configuracion.models import TransporteConfig
+from configuracion.models import ClienteCanonico, TransporteConfig
+from .business_hours import horas_laborales, horas_laborales_lote
+from .cache_datos import obtener_con_revalidacion
+from .paginacion import CursorInvalido, pagina_keyset
+from reportes.models import SolicitudLeadTime, SolicitudLeadTimeArchivada
+from reportes.rollups import estadisticas_lead_time
 
 _CHILE_TZ = zoneinfo.ZoneInfo('America/Santiago')
 
@@ -49,11 +54,6 @@ def inicio_efectivo_lead_time(solicitud):
     return max(inicio_negocio, creado)
 
 
-def _lead_horas_validas(delta_horas):
-    """Excluye solo deltas negativos (fechas incoherentes)."""
-    return delta_horas >= 0
-
-
 def calcular_horas_laborales(fecha_inicio, fecha_fin):
     """
     Calcula las horas laborales entre dos fechas.
@@ -62,6 +62,9 @@ def calcular_horas_laborales(fecha_inicio, fecha_fin):
     - Viernes: 08:00 a 13:00
     - Sábado y domingo: no laboral
     
+    Delegado al calendario de core.business_hours (acumulados por día, O(1)).
+    Para muchos pares usar horas_laborales_lote().
+    
     Args:
         fecha_inicio: datetime - Fecha de inicio
         fecha_fin: datetime - Fecha de fin
@@ -69,52 +72,7 @@ def calcular_horas_laborales(fecha_inicio, fecha_fin):
     Returns:
         float: Total de horas laborales
     """
-    if not fecha_inicio or not fecha_fin:
-        return 0
-    
-    # Asegurar que trabajamos con fechas aware en la zona horaria local
-    if timezone.is_aware(fecha_inicio):
-        fecha_inicio = timezone.localtime(fecha_inicio)
-    if timezone.is_aware(fecha_fin):
-        fecha_fin = timezone.localtime(fecha_fin)
-    
-    # Si fecha_fin es menor que fecha_inicio, retornar 0
-    if fecha_fin < fecha_inicio:
-        return 0
-    
-    total_segundos = 0.0
-
-    dia_cursor = fecha_inicio.date()
-    dia_fin = fecha_fin.date()
-
-    while dia_cursor <= dia_fin:
-        # Construir límites de jornada según día de semana
-        # weekday(): lunes=0 ... domingo=6
-        weekday = dia_cursor.weekday()
-        if weekday <= 3:  # lunes a jueves
-            inicio_jornada = datetime.combine(dia_cursor, dt_time(8, 0, 0))
-            fin_jornada = datetime.combine(dia_cursor, dt_time(17, 45, 0))
-        elif weekday == 4:  # viernes
-            inicio_jornada = datetime.combine(dia_cursor, dt_time(8, 0, 0))
-            fin_jornada = datetime.combine(dia_cursor, dt_time(13, 0, 0))
-        else:  # sábado/domingo
-            dia_cursor += timedelta(days=1)
-            continue
-
-        # Mantener consistencia de timezone con los datetimes de entrada
-        if timezone.is_aware(fecha_inicio):
-            inicio_jornada = timezone.make_aware(inicio_jornada, timezone.get_current_timezone())
-            fin_jornada = timezone.make_aware(fin_jornada, timezone.get_current_timezone())
-
-        tramo_inicio = max(fecha_inicio, inicio_jornada)
-        tramo_fin = min(fecha_fin, fin_jornada)
-
-        if tramo_fin > tramo_inicio:
-            total_segundos += (tramo_fin - tramo_inicio).total_seconds()
-
-        dia_cursor += timedelta(days=1)
-
-    return total_segundos / 3600
+    return horas_laborales(fecha_inicio, fecha_fin)
 
 
 def login_view(request):
@@ -182,20 +140,23 @@ def dashboard(request):
     }
     
     if user.es_admin():
-        # Admin ve todo - Optimizado: 1 query en lugar de 6
-        stats = Solicitud.objects.aggregate(
-            total=Count('id'),
-            pendientes=Count('id', filter=Q(estado='pendiente')),
-            en_despacho=Count('id', filter=Q(estado='en_despacho')),
-            listo_despacho=Count('id', filter=Q(estado='listo_despacho')),
+        # Admin ve todo - Contadores mantenidos por señales (solicitudes.contadores):
+        # unas pocas filas en vez de agregar toda la tabla de solicitudes
+        conteos = conteos_por_estado()
+        
+        def _total_estado(estado):
+            return conteos.get(estado, {}).get('total', 0)
+        
+        stats = {
+            'total': sum(fila['total'] for fila in conteos.values()),
+            'pendientes': _total_estado('pendiente'),
+            'en_despacho': _total_estado('en_despacho'),
+            'listo_despacho': _total_estado('listo_despacho'),
             # embaladas: omitido de KPI; listo_despacho ya refleja pedido embalado/listo. Reactivar ambas líneas abajo si se quiere tarjeta propia.
-            # embaladas=Count('id', filter=Q(estado='embalado')),
-            despachadas=Count('id', filter=Q(estado='despachado')),
-            urgentes=Count('id', filter=Q(
-                urgente=True,
-                estado='pendiente'
-            ))
-        )
+            # 'embaladas': _total_estado('embalado'),
+            'despachadas': _total_estado('despachado'),
+            'urgentes': conteos.get('pendiente', {}).get('urgentes', 0),
+        }
         
         # Calcular indicadores de productividad
         try:
@@ -229,9 +190,11 @@ def dashboard(request):
             'solicitudes_recientes': Solicitud.objects.select_related('solicitante')[:10],
             
             # Estadísticas por estado
-            'stats_por_estado': Solicitud.objects.values('estado').annotate(
-                total=Count('id')
-            ).order_by('estado'),
+            'stats_por_estado': [
+                {'estado': estado, 'total': fila['total']}
+                for estado, fila in sorted(conteos.items())
+                if fila['total']
+            ],
             
             # Indicadores de productividad
             'indicadores': indicadores,
@@ -260,8 +223,14 @@ def dashboard(request):
                 .filter(tiene_pendientes=True)
             )
             
-            # Conteo total real para la tarjeta
-            total_pendientes = queryset_bodega.count()
+            # Conteo total real para la tarjeta: con una sola bodega sale del
+            # contador mantenido; con varias, una solicitud puede estar en más de
+            # una bodega y los contadores no se pueden sumar
+            bodegas_conteo = [b for b in bodegas_usuario if b != '013']
+            if len(bodegas_conteo) == 1:
+                total_pendientes = pendientes_en_bodega(bodegas_conteo[0])
+            else:
+                total_pendientes = queryset_bodega.count()
             
             # Listado limitado para el dashboard (15 más antiguos)
             solicitudes_pendientes = list(
@@ -285,8 +254,8 @@ def dashboard(request):
         # Despacho solo ve en_despacho
         queryset_despacho = Solicitud.objects.filter(estado='en_despacho')
         
-        # Conteo total real para la tarjeta
-        total_despacho = queryset_despacho.count()
+        # Conteo total real para la tarjeta (contador mantenido por señales)
+        total_despacho = conteos_por_estado().get('en_despacho', {}).get('total', 0)
         
         # Listado limitado para el dashboard (para no sobrecargar)
         solicitudes_en_despacho = list(
@@ -337,97 +306,79 @@ def perfil_usuario(request):
     return render(request, 'perfil.html', context)
 
 
-def calcular_indicadores_productividad(periodo_dias=30, transporte_filtro=None):
+def calcular_indicadores_productividad(periodo_dias=30, transporte_filtro=None, en_segundo_plano=True, forzar=False):
     """
     Calcula los indicadores de productividad para el dashboard.
     
     Args:
         periodo_dias: Número de días hacia atrás para filtrar (default: 30)
         transporte_filtro: Filtro opcional por transporte (None = todos)
+        en_segundo_plano: Si el resultado cacheado está obsoleto, servirlo y
+            recalcular en segundo plano (stale-while-revalidate)
+        forzar: Recalcular siempre en la request (usado por precalentar_indicadores)
     
     Returns:
-        Dict con todos los indicadores calculados
-    
-    Nota: Los resultados están cacheados por 5 minutos para mejorar performance.
+        Dict con todos los indicadores calculados, más:
+        - generado_en: datetime del cálculo
+        - datos_desactualizados: True si se sirvió un resultado obsoleto
+    
+    Nota: Los resultados se cachean (caché compartida, ver core.cache_datos).
+    Un cambio de datos o un TTL de 5 minutos (la ventana ahora - periodo se
+    desplaza) marcan el resultado como obsoleto; mientras un solo worker lo
+    recalcula, el resto sigue sirviendo el último resultado.
     """
+    entrada = obtener_con_revalidacion(
+        'indicadores_productividad',
+        {
+            'periodo': periodo_dias,
+            'transporte': transporte_filtro or 'todos',
+        },
+        lambda: _calcular_indicadores_productividad(periodo_dias, transporte_filtro),
+        ttl_fresco=300,
+        en_segundo_plano=en_segundo_plano,
+        forzar=forzar,
+    )
+    return dict(
+        entrada['valor'],
+        generado_en=datetime.fromtimestamp(entrada['generado_en'], tz=_CHILE_TZ),
+        datos_desactualizados=not entrada['fresco'],
+    )
+
+
+def _calcular_indicadores_productividad(periodo_dias, transporte_filtro):
+    """Cálculo sin caché de calcular_indicadores_productividad()."""
     from datetime import datetime, timedelta
-    import hashlib
     import json
     
-    # Crear clave de caché única basada en parámetros
-    cache_key_data = {
-        'periodo': periodo_dias,
-        'transporte': transporte_filtro or 'todos',
-    }
-    cache_key_str = json.dumps(cache_key_data, sort_keys=True)
-    cache_key_hash = hashlib.md5(cache_key_str.encode()).hexdigest()
-    cache_key = f'indicadores_productividad_{cache_key_hash}'
-    
-    # Intentar obtener del caché (TTL: 5 minutos = 300 segundos)
-    cached_result = cache.get(cache_key)
-    if cached_result is not None:
-        return cached_result
-    
     ahora = timezone.now()
     fecha_inicio = ahora - timedelta(days=periodo_dias)
     
     # ============================================================================
-    # OPTIMIZACIÓN: 3 CONSULTAS MASIVAS + PROCESAMIENTO EN PYTHON
-    # Reducimos de 900+ queries a solo 3 consultas masivas
+    # OPTIMIZACIÓN: lead times precalculados (reportes.SolicitudLeadTime)
+    # Las solicitudes despachadas se leen de la tabla de hechos mantenida por
+    # señales: un solo range scan sobre (estado, fin_despacho).
     # ============================================================================
     
     # Constantes para bodegas del dashboard
     BODEGAS_DASHBOARD = ['013-01', '013-03', '013-05', '013-08', '013-09', '013-PP', '013-PS']
     
-    # Base queryset para solicitudes del período.
-    # El despacho oficial para KPI es Solicitud.fecha_despachado.
-    solicitudes_base = Solicitud.objects.filter(
-        fecha_despachado__gte=fecha_inicio,
-        estado='despachado'
+    # CONSULTA 1: Lead times de solicitudes despachadas en el período.
+    # El despacho oficial para KPI es Solicitud.fecha_despachado (= fin_despacho).
+    lead_times_base = SolicitudLeadTime.objects.filter(
+        estado='despachado',
+        fin_despacho__gte=fecha_inicio,
     )
     
-    # Aplicar filtro de transporte si existe
+    # Aplicar filtro de transporte si existe (conjunto de transportes de solicitud y bultos,
+    # denormalizado en solicitudes_transportes con índice (transporte, solicitud))
     if transporte_filtro:
-        solicitudes_base = solicitudes_base.filter(
-            Q(bultos__transportista=transporte_filtro) | 
-            Q(bultos__transportista_extra=transporte_filtro) |
-            Q(detalles__bulto__transportista=transporte_filtro) |
-            Q(detalles__bulto__transportista_extra=transporte_filtro) |
-            Q(transporte=transporte_filtro)
-        ).distinct()
-    
-    # CONSULTA 1: Solicitudes completas con detalles y bultos precargados
-    # PRECARGAR TODO: detalles y bultos en una sola query
-    solicitudes_completas = solicitudes_base.prefetch_related(
-        'detalles',
-        'detalles__bulto',
-        'bultos'
-    )
-    
-    # Convertir a lista UNA VEZ (evalúa la query y carga todo en memoria)
-    solicitudes_list = list(solicitudes_completas)
-    
-    # CONSULTA 2: Detalles por bodega (para Lead Time Bodegas)
-    
-    detalles_bodegas = SolicitudDetalle.objects.filter(
-        solicitud__fecha_despachado__gte=fecha_inicio,
-        solicitud__estado='despachado',
-        fecha_preparacion__isnull=False,
-        bodega__in=BODEGAS_DASHBOARD
-    ).select_related('solicitud')
-    
-    if transporte_filtro:
-        detalles_bodegas = detalles_bodegas.filter(
-            Q(solicitud__transporte=transporte_filtro) |
-            Q(solicitud__bultos__transportista=transporte_filtro) |
-            Q(solicitud__bultos__transportista_extra=transporte_filtro) |
-            Q(bulto__transportista=transporte_filtro) |
-            Q(bulto__transportista_extra=transporte_filtro)
-        ).distinct()
-    
-    detalles_bodegas_list = list(detalles_bodegas)
+        lead_times_base = lead_times_base.filter(
+            solicitud_id__in=SolicitudTransporte.objects
+            .filter(transporte=transporte_filtro)
+            .values('solicitud_id')
+        )
     
-    # CONSULTA 3: Solicitudes listas para despacho (para Solicitudes en Despacho)
+    # CONSULTA 2: Solicitudes listas para despacho (para Solicitudes en Despacho)
     # IMPORTANTE: Este indicador es diferente a los otros KPIs
     # - Los otros KPIs trabajan con solicitudes DESPACHADAS (completadas)
     # - Este indicador mide SOLICITUDES PENDIENTES (listo_despacho, aún no despachadas)
@@ -436,20 +387,13 @@ def calcular_indicadores_productividad(periodo_dias=30, transporte_filtro=None):
     solicitudes_listas = Solicitud.objects.filter(
         estado='listo_despacho',
         created_at__gte=fecha_inicio
-    ).select_related('solicitante').prefetch_related(
-        'bultos',
-        'detalles',
-        'detalles__bulto'
-    )
+    ).select_related('solicitante').prefetch_related('detalles')
     
     if transporte_filtro:
+        # (solicitud, transporte) es único: el JOIN no duplica filas, sin DISTINCT
         solicitudes_listas = solicitudes_listas.filter(
-            Q(transporte=transporte_filtro) |
-            Q(bultos__transportista=transporte_filtro) |
-            Q(bultos__transportista_extra=transporte_filtro) |
-            Q(detalles__bulto__transportista=transporte_filtro) |
-            Q(detalles__bulto__transportista_extra=transporte_filtro)
-        ).distinct()
+            transportes_involucrados__transporte=transporte_filtro
+        )
     
     solicitudes_listas_list = list(solicitudes_listas)
     
@@ -458,77 +402,31 @@ def calcular_indicadores_productividad(periodo_dias=30, transporte_filtro=None):
     # Todos los datos ya están precargados en memoria
     # ============================================================================
     
-    # Fechas reales por solicitud (capturadas por usuarios):
-    # - Preparación real: MAX(detalle.fecha_preparacion)
-    # - Embalaje real: MAX(bulto.fecha_embalaje) [sin cancelados]
-    # - Despacho oficial: solicitud.fecha_despachado
-    fechas_reales_por_solicitud = {}
-    for solicitud in solicitudes_list:
-        fechas_prep = [
-            d.fecha_preparacion
-            for d in solicitud.detalles.all()
-            if d.fecha_preparacion
-        ]
-        fecha_fin_prep_real = max(fechas_prep) if fechas_prep else None
-
-        bultos_validos = [
-            b for b in solicitud.get_bultos()
-            if b.estado != 'cancelado'
-        ]
-        fechas_emb = [b.fecha_embalaje for b in bultos_validos if b.fecha_embalaje]
-        fecha_fin_emb_real = max(fechas_emb) if fechas_emb else None
-
-        fecha_fin_despacho_real = solicitud.fecha_despachado
-
-        fechas_reales_por_solicitud[solicitud.id] = {
-            'prep_fin': fecha_fin_prep_real,
-            'emb_fin': fecha_fin_emb_real,
-            'desp_fin': fecha_fin_despacho_real,
-        }
+    # Fechas reales por solicitud (capturadas por usuarios), precalculadas en la fila:
+    # - Preparación real: MAX(detalle.fecha_preparacion)        → fin_preparacion
+    # - Embalaje real: MAX(bulto.fecha_embalaje) [sin cancelados] → fin_embalaje
+    # - Despacho oficial: solicitud.fecha_despachado              → fin_despacho
 
     # 1. LEAD TIME DE PREPARACIÓN
     # Mide: fin_preparación_real − inicio_efectivo en HORAS LABORALES.
     # Semántica: tiempo operativo real hasta terminar preparación.
     
-    lead_times_prep = []
-    lead_times_por_semana = {}
+    # OPTIMIZADO: preparación, embalaje, total, tendencia semanal y bodegas salen
+    # de los rollups diarios/semanales (reportes.rollups): días cerrados
+    # materializados + día parcial y día actual en vivo.
+    estadisticas = estadisticas_lead_time(fecha_inicio, transporte_filtro, ahora)
+    stats_prep = estadisticas['preparacion']
 
-    for solicitud in solicitudes_list:
-        fecha_fin_prep = fechas_reales_por_solicitud[solicitud.id]['prep_fin']
-        if not fecha_fin_prep:
-            continue
-        inicio = inicio_efectivo_lead_time(solicitud)
-        if not inicio:
-            continue
-        horas = calcular_horas_laborales(inicio, fecha_fin_prep)
-        if not _lead_horas_validas(horas):
-            continue
-        lead_times_prep.append(horas)
-
-        # Agrupar por SEMANA ISO (referencia: fecha real de término de preparación)
-        fecha_ref = fecha_fin_prep.date()
-        iso_year, iso_week, _ = fecha_ref.isocalendar()
-        semana_key = f"{iso_year}-W{iso_week:02d}"
-        if semana_key not in lead_times_por_semana:
-            lead_times_por_semana[semana_key] = {
-                'valores': [],
-                'iso_year': iso_year,
-                'iso_week': iso_week,
-            }
-        lead_times_por_semana[semana_key]['valores'].append(horas)
-    
-    lt_prep_promedio = sum(lead_times_prep) / len(lead_times_prep) if lead_times_prep else 0
-    lt_prep_min = min(lead_times_prep) if lead_times_prep else 0
-    lt_prep_max = max(lead_times_prep) if lead_times_prep else 0
+    lt_prep_promedio = stats_prep.promedio
+    lt_prep_min = stats_prep.minimo or 0
+    lt_prep_max = stats_prep.maximo or 0
     
     # Calcular datos semanales para el gráfico de tendencia
-    # Ordenar por semana y calcular promedio, mínimo y máximo por semana
+    # Ordenar por semana ISO (referencia: fecha real de término de preparación)
     tendencia_semanal_prep = []
-    for semana_key in sorted(lead_times_por_semana.keys()):
-        datos_semana = lead_times_por_semana[semana_key]
-        valores = datos_semana['valores']
-        iso_year = datos_semana['iso_year']
-        iso_week = datos_semana['iso_week']
+    for semana_key in sorted(estadisticas['semanas'].keys()):
+        datos_semana = estadisticas['semanas'][semana_key]
+        iso_year, iso_week = int(semana_key[:4]), int(semana_key[6:])
         
         # Calcular primer y último día de la semana para display
         # ISO: lunes es día 1, domingo es día 7
@@ -544,10 +442,11 @@ def calcular_indicadores_productividad(periodo_dias=30, transporte_filtro=None):
             'fecha_display': fecha_display,  # "Sem 2: 06/01-12/01"
             'fecha_inicio': primer_dia.strftime('%Y-%m-%d'),
             'fecha_fin': ultimo_dia.strftime('%Y-%m-%d'),
-            'promedio': float(sum(valores) / len(valores)),
-            'minimo': float(min(valores)),
-            'maximo': float(max(valores)),
-            'cantidad': len(valores)
+            'promedio': float(datos_semana.promedio),
+            'minimo': float(datos_semana.minimo),
+            'maximo': float(datos_semana.maximo),
+            'mediana': float(datos_semana.cuantil(0.5)),
+            'cantidad': datos_semana.cantidad
         })
     
     # Serializar a JSON string para el template (siempre una lista, aunque esté vacía)
@@ -557,51 +456,72 @@ def calcular_indicadores_productividad(periodo_dias=30, transporte_filtro=None):
     # Agrupar solicitudes por cliente para calcular porcentajes
     from collections import defaultdict
     
-    # Definir sucursales con sus variaciones posibles
-    sucursales_map = {
-        'SUC CALAMA': ['SUC CALAMA', 'SUCURSAL CALAMA', 'SUC CALAMA', 'Suc Calama', 'suc calama'],
-        'SUC ANTOFAGASTA': ['SUC ANTOFAGASTA', 'SUCURSAL ANTOFAGASTA', 'SUC ANTOFA', 'Suc Antofagasta', 'suc antofagasta', 'sucursal antofagasta'],
-        'SUC PTO MONTT': ['SUC PTO MONTT', 'SUC PTO. MONTT', 'SUC PUERTO MONTT', 'SUCURSAL PTO MONTT', 'Suc Pto Montt', 'suc pto montt'],
-        'SUC LOS ANGELES': ['SUC LOS ANGELES', 'SUCURSAL LOS ANGELES', 'SUC LOS ÁNGELES', 'Suc Los Angeles', 'suc los angeles'],
-        'TALLER HMS': ['HMS', 'TALLER HMS', 'taller hms'],
-        'TALLER OLEOHTEC': ['OLEOHTEC', 'TALLER OLEOHTEC', 'taller oleohtec'],
-    }
+    # OPTIMIZADO: el cliente canónico (sucursal/taller) se resuelve al grabar la
+    # solicitud (configuracion.ClienteCanonico); aquí basta un GROUP BY por
+    # transporte + cliente que entrega operaciones y kilos en una sola consulta.
+    grupos_cliente = list(
+        lead_times_base
+        .values('transporte', 'cliente', sucursal=F('solicitud__cliente_canonico__nombre'))
+        .annotate(operaciones=Count('pk'), kilos=Sum('kilos_cobrables'))
+        .order_by()
+    )
+    # Período que llega al archivo histórico: mismo GROUP BY sobre los lead times
+    # archivados (la sucursal quedó grabada al archivar)
+    if alcanza_archivo(fecha_inicio):
+        archivados = SolicitudLeadTimeArchivada.objects.filter(
+            estado='despachado',
+            fin_despacho__gte=fecha_inicio,
+        )
+        if transporte_filtro:
+            archivados = archivados.filter(transportes__contains=f'|{transporte_filtro}|')
+        grupos_cliente += list(
+            archivados
+            .values('transporte', 'cliente', 'sucursal')
+            .annotate(operaciones=Count('pk'), kilos=Sum('kilos_cobrables'))
+            .order_by()
+        )
     
-    def normalizar_cliente(cliente):
-        """Normaliza el nombre del cliente para identificar sucursales"""
-        cliente_upper = cliente.upper().strip()
-        # Buscar coincidencias para cada sucursal
-        for sucursal_norm, variaciones in sucursales_map.items():
-            for variacion in variaciones:
-                if variacion.upper() in cliente_upper or cliente_upper in variacion.upper():
-                    return sucursal_norm
-        return None
-    
-    # Estadísticas de operaciones por categoría (sucursal, Camión PESCO, Retira cliente, u OTROS)
+    # Estadísticas por categoría (sucursal, Camión PESCO, Retira cliente, u OTROS)
     # Camión PESCO / Retira cliente: se separan de OTROS para visibilidad en las tortas del dashboard
     operaciones_sucursales = defaultdict(int)
     operaciones_camion_pesco = 0
     operaciones_retira_cliente = 0
     operaciones_otros = []
     operaciones_otros_por_cliente = defaultdict(int)
+    kilos_por_cliente = defaultdict(lambda: Decimal('0.00'))
+    kilos_camion_pesco = Decimal('0.00')
+    kilos_retira_cliente = Decimal('0.00')
+    kilos_otros_detalle = defaultdict(lambda: Decimal('0.00'))
+    total_operaciones = 0
     
-    for solicitud in solicitudes_list:
-        cliente = solicitud.cliente
-        transporte = (solicitud.transporte or '').strip().upper()
+    # Orden fijo para los gráficos: sucursales/talleres activos según ClienteCanonico.orden,
+    # luego Camión PESCO, Retira cliente y OTROS. Un cliente canónico desactivado
+    # deja de ser categoría: sus solicitudes (ya resueltas a él) van a OTROS
+    ORDEN_SUCURSALES = list(ClienteCanonico.objects.filter(activo=True).values_list('nombre', flat=True))
+    sucursales_activas = set(ORDEN_SUCURSALES)
+
+    for grupo in grupos_cliente:
+        cliente = grupo['cliente']
+        transporte = (grupo['transporte'] or '').strip().upper()
+        operaciones = grupo['operaciones']
+        # max(peso real, L·A·H/6000) por bulto, precalculado en la tabla de hechos
+        kilos = grupo['kilos'] or Decimal('0.00')
+        total_operaciones += operaciones
         
         if transporte == 'PESCO':
-            operaciones_camion_pesco += 1
-        elif _es_transporte_retira_cliente(solicitud.transporte):
-            operaciones_retira_cliente += 1
-        elif normalizar_cliente(cliente):
-            sucursal_norm = normalizar_cliente(cliente)
-            operaciones_sucursales[sucursal_norm] += 1
+            operaciones_camion_pesco += operaciones
+            kilos_camion_pesco += kilos
+        elif _es_transporte_retira_cliente(grupo['transporte']):
+            operaciones_retira_cliente += operaciones
+            kilos_retira_cliente += kilos
+        elif grupo['sucursal'] in sucursales_activas:
+            operaciones_sucursales[grupo['sucursal']] += operaciones
+            kilos_por_cliente[grupo['sucursal']] += kilos
         else:
-            operaciones_otros_por_cliente[cliente] += 1
+            operaciones_otros_por_cliente[cliente] += operaciones
+            kilos_otros_detalle[cliente] += kilos
     
-    total_operaciones = len(solicitudes_list)
-    
-    for cliente, operaciones in operaciones_otros_por_cliente.items():
+    for cliente, operaciones in sorted(operaciones_otros_por_cliente.items(), key=lambda x: (-x[1], x[0])):
         porcentaje = (operaciones / total_operaciones * 100) if total_operaciones > 0 else 0
         operaciones_otros.append({
             'cliente': cliente,
@@ -613,24 +533,11 @@ def calcular_indicadores_productividad(periodo_dias=30, transporte_filtro=None):
     porcentajes_operaciones = []
     total_otros = sum(item['operaciones'] for item in operaciones_otros)
     
-    # Orden fijo para los gráficos (sucursales + Camión PESCO + OTROS)
-    ORDEN_SUCURSALES = [
-        'SUC ANTOFAGASTA',
-        'SUC CALAMA',
-        'SUC PTO MONTT',
-        'SUC LOS ANGELES',
-        'TALLER HMS',
-        'TALLER OLEOHTEC',
-        'Camión PESCO',  # Transporte propio - separado de OTROS
-        'Retira cliente',
-        'OTROS'
-    ]
-    
     # Usar un set para evitar duplicados
     categorias_agregadas = set()
     
     # Agregar sucursales en el orden especificado
-    for sucursal in ['SUC ANTOFAGASTA', 'SUC CALAMA', 'SUC PTO MONTT', 'SUC LOS ANGELES', 'TALLER HMS', 'TALLER OLEOHTEC']:
+    for sucursal in ORDEN_SUCURSALES:
         if sucursal in operaciones_sucursales and sucursal not in categorias_agregadas:
             ops = operaciones_sucursales[sucursal]
             porcentaje = (ops / total_operaciones * 100) if total_operaciones > 0 else 0
@@ -678,41 +585,10 @@ def calcular_indicadores_productividad(periodo_dias=30, transporte_filtro=None):
             'porcentaje': round(porcentaje_otros, 2)
         })
     
-    # Estadísticas de kilos volumétricos por categoría (sucursal, Camión PESCO, Retira cliente, u OTROS)
-    kilos_por_cliente = defaultdict(lambda: Decimal('0.00'))
-    kilos_camion_pesco = Decimal('0.00')
-    kilos_retira_cliente = Decimal('0.00')
-    kilos_otros_detalle = defaultdict(lambda: Decimal('0.00'))
+    # Kilos volumétricos por categoría: ya acumulados en el mismo GROUP BY
     clientes_sin_medidas = set()
     clientes_otros_sin_medidas = set()
     
-    for solicitud in solicitudes_list:
-        cliente = solicitud.cliente
-        transporte = (solicitud.transporte or '').strip().upper()
-        kilos_solicitud = Decimal('0.00')
-        
-        for bulto in solicitud.get_bultos():
-            if bulto.largo_cm and bulto.ancho_cm and bulto.alto_cm and \
-               bulto.largo_cm > 0 and bulto.ancho_cm > 0 and bulto.alto_cm > 0:
-                volumen_cm3 = bulto.largo_cm * bulto.ancho_cm * bulto.alto_cm
-                peso_volumetrico = volumen_cm3 / Decimal('6000')
-                peso_real = bulto.peso_total if bulto.peso_total else Decimal('0.00')
-                peso_cobrable = max(peso_real, peso_volumetrico)
-            else:
-                peso_cobrable = bulto.peso_total if bulto.peso_total else Decimal('0.00')
-            
-            kilos_solicitud += peso_cobrable
-        
-        if transporte == 'PESCO':
-            kilos_camion_pesco += kilos_solicitud
-        elif _es_transporte_retira_cliente(solicitud.transporte):
-            kilos_retira_cliente += kilos_solicitud
-        elif normalizar_cliente(cliente):
-            sucursal_norm = normalizar_cliente(cliente)
-            kilos_por_cliente[sucursal_norm] += kilos_solicitud
-        else:
-            kilos_otros_detalle[cliente] += kilos_solicitud
-    
     # Calcular total de kilos (sucursales + Camión PESCO + Retira cliente + OTROS)
     total_kilos = (
         sum(kilos_por_cliente.values())
@@ -812,38 +688,18 @@ def calcular_indicadores_productividad(periodo_dias=30, transporte_filtro=None):
     # 2. LEAD TIME DE EMBALAJE
     # Mide: fin_embalaje_real − fin_preparación_real en HORAS LABORALES.
     # Semántica: tiempo operativo real de embalaje/consolidación.
-    lead_times_emb = []
-    for solicitud in solicitudes_list:
-        inicio_emb = fechas_reales_por_solicitud[solicitud.id]['prep_fin']
-        fin_emb = fechas_reales_por_solicitud[solicitud.id]['emb_fin']
-        if not inicio_emb or not fin_emb:
-            continue
-        horas = calcular_horas_laborales(inicio_emb, fin_emb)
-        if _lead_horas_validas(horas):
-            lead_times_emb.append(horas)
-
-    lt_emb_promedio = sum(lead_times_emb) / len(lead_times_emb) if lead_times_emb else 0
-    lt_emb_min = min(lead_times_emb) if lead_times_emb else 0
-    lt_emb_max = max(lead_times_emb) if lead_times_emb else 0
+    stats_emb = estadisticas['embalaje']
+    lt_emb_promedio = stats_emb.promedio
+    lt_emb_min = stats_emb.minimo or 0
+    lt_emb_max = stats_emb.maximo or 0
 
     # 3. LEAD TIME TOTAL (SOLICITUD COMPLETA)
     # Mide: fin_despacho_real − inicio_efectivo en HORAS LABORALES.
     # Invariante natural: Total ≈ Preparación + Embalaje por solicitud.
-    lead_times_total = []
-    for solicitud in solicitudes_list:
-        fin_total = fechas_reales_por_solicitud[solicitud.id]['desp_fin']
-        if not fin_total:
-            continue
-        inicio = inicio_efectivo_lead_time(solicitud)
-        if not inicio:
-            continue
-        horas = calcular_horas_laborales(inicio, fin_total)
-        if _lead_horas_validas(horas):
-            lead_times_total.append(horas)
-
-    lt_total_promedio = sum(lead_times_total) / len(lead_times_total) if lead_times_total else 0
-    lt_total_min = min(lead_times_total) if lead_times_total else 0
-    lt_total_max = max(lead_times_total) if lead_times_total else 0
+    stats_total = estadisticas['total']
+    lt_total_promedio = stats_total.promedio
+    lt_total_min = stats_total.minimo or 0
+    lt_total_max = stats_total.maximo or 0
     
     # Obtener nombres de bodegas desde el modelo (una sola query)
     from .models import Bodega
@@ -852,59 +708,32 @@ def calcular_indicadores_productividad(periodo_dias=30, transporte_filtro=None):
         for b in Bodega.objects.filter(activa=True)
     }
     
-    # Calcular LEAD TIME DE PREPARACIÓN por bodega
-    # INICIALIZAR TODAS las bodegas con 0 operaciones
-    lead_times_por_bodega = {}
-    for bodega_codigo in BODEGAS_DASHBOARD:
-        lead_times_por_bodega[bodega_codigo] = {
-            'codigo': bodega_codigo,
-            'nombre': bodegas_info.get(bodega_codigo, 'Nombre no disponible'),
-            'lead_times_horas': [],
-            'cantidad_operaciones': 0
-        }
-    
-    # OPTIMIZADO: Usar detalles_bodegas_list (ya precargados en consulta 2)
-    # Agregar lead times calculados
-    for detalle in detalles_bodegas_list:
-        bodega_codigo = detalle.bodega.strip() if detalle.bodega else ''
-        
-        # Filtrar: solo bodegas de uso cotidiano
-        if not bodega_codigo or bodega_codigo not in BODEGAS_DASHBOARD:
-            continue
-        
-        if detalle.fecha_preparacion:
-            sol = detalle.solicitud
-            inicio = inicio_efectivo_lead_time(sol)
-            if inicio:
-                horas = calcular_horas_laborales(inicio, detalle.fecha_preparacion)
-                if _lead_horas_validas(horas):
-                    lead_times_por_bodega[bodega_codigo]['lead_times_horas'].append(horas)
-                    lead_times_por_bodega[bodega_codigo]['cantidad_operaciones'] += 1
-    
-    # Formatear datos de lead time por bodega - INCLUIR TODAS
+    # Calcular LEAD TIME DE PREPARACIÓN por bodega (rollups por bodega)
+    # INCLUIR TODAS las bodegas del dashboard, con 0 operaciones si no hay datos
     lead_time_bodegas = []
     for bodega_codigo in BODEGAS_DASHBOARD:  # Iterar en el orden definido
-        datos = lead_times_por_bodega[bodega_codigo]
+        datos = estadisticas['bodegas'].get(bodega_codigo)
         
-        if datos['lead_times_horas']:
-            # Calcular promedio si hay datos
-            horas_prom = sum(datos['lead_times_horas']) / len(datos['lead_times_horas'])
+        if datos and datos.cantidad:
+            horas_prom = datos.promedio
             dias_prom = horas_prom / 8  # Convertir a días laborales (8h = 1 día)
-            horas_min = min(datos['lead_times_horas'])
-            horas_max = max(datos['lead_times_horas'])
+            horas_min = datos.minimo
+            horas_max = datos.maximo
+            cantidad = datos.cantidad
         else:
             # Sin datos: 0 operaciones
             horas_prom = 0
             dias_prom = 0
             horas_min = 0
             horas_max = 0
+            cantidad = 0
         
         lead_time_bodegas.append({
             'bodega_codigo': bodega_codigo,
-            'bodega_nombre': datos['nombre'],
+            'bodega_nombre': bodegas_info.get(bodega_codigo, 'Nombre no disponible'),
             'lead_time_horas': horas_prom,
             'lead_time_dias': dias_prom,
-            'cantidad_operaciones': datos['cantidad_operaciones'],
+            'cantidad_operaciones': cantidad,
             'horas_min': horas_min,
             'horas_max': horas_max,
         })
@@ -920,7 +749,7 @@ def calcular_indicadores_productividad(periodo_dias=30, transporte_filtro=None):
     # Agrupar por transporte y calcular métricas
     solicitudes_por_transporte = {}
     
-    # OPTIMIZADO: Usar solicitudes_listas_list (ya precargados en consulta 3)
+    # OPTIMIZADO: Usar solicitudes_listas_list (ya precargados en consulta 2)
     # Primero, recopilar todos los códigos únicos para hacer batch query de precios
     todos_codigos = set()
     for solicitud in solicitudes_listas_list:
@@ -936,9 +765,13 @@ def calcular_indicadores_productividad(periodo_dias=30, transporte_filtro=None):
                 precios_cache[stock['codigo']] = stock['precio']
     
     # Procesar SOLICITUDES (no bultos)
+    # Las horas laborales se calculan al final en un solo lote vectorizado
+    transportes_pendientes = []
+    fechas_prep_pendientes = []
     for solicitud in solicitudes_listas_list:
-        # Determinar transporte (prioridad: bulto.transportista_extra > bulto.transportista > solicitud.transporte)
-        transporte_slug = 'Sin transporte'
+        # Transporte efectivo (bulto.transportista_extra > bulto.transportista >
+        # solicitud.transporte), denormalizado en la solicitud
+        transporte_slug = solicitud.transporte_efectivo or 'Sin transporte'
         fecha_preparacion_solicitud = None
         
         # Buscar la fecha_preparacion más reciente de los detalles
@@ -956,22 +789,6 @@ def calcular_indicadores_productividad(periodo_dias=30, transporte_filtro=None):
             )
             fecha_preparacion_solicitud = detalle_mas_reciente.fecha_preparacion
         
-        # Determinar transporte desde bultos o solicitud
-        bultos_solicitud = solicitud.get_bultos()
-        if bultos_solicitud:
-            # Tomar el primer bulto con transporte definido
-            for bulto in bultos_solicitud:
-                transporte_slug = (
-                    bulto.transportista_extra or 
-                    bulto.transportista or 
-                    solicitud.transporte or 
-                    'Sin transporte'
-                )
-                if transporte_slug != 'Sin transporte':
-                    break
-        else:
-            transporte_slug = solicitud.transporte or 'Sin transporte'
-        
         # Obtener nombre legible del transporte
         transporte = TransporteConfig.etiqueta(transporte_slug) if transporte_slug != 'Sin transporte' else 'Sin transporte'
         
@@ -989,9 +806,9 @@ def calcular_indicadores_productividad(periodo_dias=30, transporte_filtro=None):
         # Calcular horas laborales y días calendario desde fecha_preparacion
         # (cuando el producto pasa a bodega 013)
         if fecha_preparacion_solicitud:
-            # Horas laborales (excluyendo fines de semana, 8h/día)
-            horas_lab = calcular_horas_laborales(fecha_preparacion_solicitud, ahora)
-            solicitudes_por_transporte[transporte]['horas_laborales'].append(horas_lab)
+            # Horas laborales (excluyendo fines de semana, 8h/día): se calculan en lote abajo
+            transportes_pendientes.append(transporte)
+            fechas_prep_pendientes.append(fecha_preparacion_solicitud)
             
             # Días calendario (para referencia)
             dias_cal = (ahora - fecha_preparacion_solicitud).total_seconds() / 86400
@@ -1004,6 +821,12 @@ def calcular_indicadores_productividad(periodo_dias=30, transporte_filtro=None):
                 valor = Decimal(str(precio)) * detalle.cantidad
                 solicitudes_por_transporte[transporte]['valor_usd'] += valor
     
+    horas_pendientes = horas_laborales_lote(
+        fechas_prep_pendientes, [ahora] * len(fechas_prep_pendientes)
+    ).tolist()
+    for transporte, horas_lab in zip(transportes_pendientes, horas_pendientes):
+        solicitudes_por_transporte[transporte]['horas_laborales'].append(horas_lab)
+    
     # Formatear datos de solicitudes en despacho
     solicitudes_despacho = []
     for transporte, datos in solicitudes_por_transporte.items():
@@ -1029,12 +852,8 @@ def calcular_indicadores_productividad(periodo_dias=30, transporte_filtro=None):
     solicitudes_despacho.sort(key=lambda x: x['cantidad_solicitudes'], reverse=True)
     
     # Obtener lista de transportes únicos para el dropdown
-    transportes_disponibles = list(set(
-        list(Bulto.objects.exclude(transportista='').values_list('transportista', flat=True)) +
-        list(Bulto.objects.exclude(transportista_extra='').values_list('transportista_extra', flat=True)) +
-        list(Solicitud.objects.exclude(transporte='').values_list('transporte', flat=True))
-    ))
-    transportes_disponibles = [t for t in transportes_disponibles if t]  # Filtrar vacíos
+    # (registro mantenido de transportes de solicitudes y bultos, sin recorrer ambas tablas)
+    transportes_disponibles = TransporteEnUso.disponibles()
     # Siempre incluir PESCO (Camión PESCO) en el filtro por ser transporte clave de la operación
     if 'PESCO' not in transportes_disponibles:
         transportes_disponibles.append('PESCO')
@@ -1053,7 +872,7 @@ def calcular_indicadores_productividad(periodo_dias=30, transporte_filtro=None):
             'min_dias': lt_prep_min / 8,
             'max_horas': lt_prep_max,
             'max_dias': lt_prep_max / 8,
-            'total_registros': len(lead_times_prep),
+            'total_registros': stats_prep.cantidad,
             'tendencia_semanal': tendencia_semanal_prep,
             'tendencia_semanal_json': tendencia_semanal_json
         },
@@ -1064,7 +883,7 @@ def calcular_indicadores_productividad(periodo_dias=30, transporte_filtro=None):
             'min_dias': lt_emb_min / 8,
             'max_horas': lt_emb_max,
             'max_dias': lt_emb_max / 8,
-            'total_registros': len(lead_times_emb)
+            'total_registros': stats_emb.cantidad
         },
         'lead_time_total': {
             'promedio_horas': lt_total_promedio,
@@ -1073,7 +892,7 @@ def calcular_indicadores_productividad(periodo_dias=30, transporte_filtro=None):
             'min_dias': lt_total_min / 8,
             'max_horas': lt_total_max,
             'max_dias': lt_total_max / 8,
-            'total_registros': len(lead_times_total)
+            'total_registros': stats_total.cantidad
         },
         'lead_time_bodegas': lead_time_bodegas,
         'solicitudes_en_despacho': solicitudes_despacho,
@@ -1090,43 +909,62 @@ def calcular_indicadores_productividad(periodo_dias=30, transporte_filtro=None):
         'porcentajes_kilos_otros': porcentajes_otros_detalle_kilos
     }
     
-    # Guardar en caché por 5 minutos (300 segundos)
-    cache.set(cache_key, result, timeout=300)
-    
     return result
 
 
+# Panel offcanvas de KPIs (api_kpi_detalle)
+KPI_ESTADOS_CONFIG = {
+    'total':           {'label': 'Total Solicitudes',    'color': 'primary'},
+    'pendiente':       {'label': 'Pendientes',            'color': 'warning'},
+    'en_despacho':     {'label': 'En Despacho',           'color': 'info'},
+    'listo_despacho':  {'label': 'Listo para Despacho',   'color': 'secondary'},
+    'despachado':      {'label': 'Despachadas',           'color': 'success'},
+    'urgente':         {'label': 'Urgentes (pendientes)', 'color': 'danger'},
+}
+KPI_CAMPOS = (
+    'id', 'cliente', 'tipo', 'fecha_solicitud', 'dias_en_sistema',
+    'urgente', 'transporte', 'estado', 'n_detalles',
+)
+KPI_ORDEN = ('fecha_solicitud', 'hora_solicitud', 'id')
+KPI_LIMITE_DEFECTO = 50
+KPI_LIMITE_MAXIMO = 200
+
+
 @login_required
 def api_kpi_detalle(request, estado):
     """
     API JSON para el panel offcanvas del dashboard.
     Devuelve las solicitudes de un estado dado + métricas de demora.
     Solo accesible por administradores.
+
+    Paginada por keyset sobre (fecha_solicitud, hora_solicitud, id):
+      ?cursor=<opaco>   página siguiente (siguiente_cursor de la respuesta anterior)
+      ?limite=N         filas por página (máx. 200)
+      ?campos=a,b,c     solo esos campos por solicitud (id siempre incluido)
+    El resumen (total, promedio_dias, urgentes_count) se calcula con un solo
+    aggregate y solo en la primera página. Las líneas de detalle se piden por
+    solicitud a api_kpi_detalle_lineas.
     """
     if not request.user.es_admin():
         return JsonResponse({'error': 'Acceso denegado'}, status=403)
 
-    ESTADOS_CONFIG = {
-        'total':           {'label': 'Total Solicitudes',    'color': 'primary'},
-        'pendiente':       {'label': 'Pendientes',            'color': 'warning'},
-        'en_despacho':     {'label': 'En Despacho',           'color': 'info'},
-        'listo_despacho':  {'label': 'Listo para Despacho',   'color': 'secondary'},
-        'despachado':      {'label': 'Despachadas',           'color': 'success'},
-        'urgente':         {'label': 'Urgentes (pendientes)', 'color': 'danger'},
-    }
-
-    if estado not in ESTADOS_CONFIG:
+    if estado not in KPI_ESTADOS_CONFIG:
         return JsonResponse({'error': 'Estado no válido'}, status=400)
 
-    meta = ESTADOS_CONFIG[estado]
+    meta = KPI_ESTADOS_CONFIG[estado]
 
-    # Siempre incluir detalles (códigos + bodegas) para todos los estados
-    qs = (
-        Solicitud.objects
-        .select_related('solicitante')
-        .prefetch_related('detalles')
-        .order_by('fecha_solicitud', 'hora_solicitud')
-    )
+    campos_param = request.GET.get('campos', '')
+    campos = [c for c in campos_param.split(',') if c] if campos_param else list(KPI_CAMPOS)
+    desconocidos = set(campos) - set(KPI_CAMPOS)
+    if desconocidos:
+        return JsonResponse({'error': f'Campos no válidos: {", ".join(sorted(desconocidos))}'}, status=400)
+    try:
+        limite = min(max(int(request.GET.get('limite', KPI_LIMITE_DEFECTO)), 1), KPI_LIMITE_MAXIMO)
+    except ValueError:
+        return JsonResponse({'error': 'limite debe ser un entero'}, status=400)
+    cursor = request.GET.get('cursor') or None
+
+    qs = Solicitud.objects.all()
     if estado == 'urgente':
         qs = qs.filter(urgente=True, estado='pendiente')
     elif estado != 'total':
@@ -1134,47 +972,85 @@ def api_kpi_detalle(request, estado):
 
     hoy_chile = timezone.now().astimezone(_CHILE_TZ).date()
 
+    columnas = {'id', 'fecha_solicitud', 'hora_solicitud'}
+    columnas.update(c for c in campos if c not in ('dias_en_sistema', 'n_detalles'))
+    pagina_qs = qs.values(*columnas)
+    if 'n_detalles' in campos:
+        pagina_qs = pagina_qs.annotate(n_detalles=Count('detalles'))
+    try:
+        filas, siguiente_cursor = pagina_keyset(pagina_qs, KPI_ORDEN, cursor, limite)
+    except CursorInvalido:
+        return JsonResponse({'error': 'Cursor inválido'}, status=400)
+
     items = []
-    total_dias = 0
-    urgentes_count = 0
+    for fila in filas:
+        item = {'id': fila['id']}
+        for campo in campos:
+            if campo == 'fecha_solicitud':
+                item[campo] = fila[campo].strftime('%d/%m/%Y') if fila[campo] else '-'
+            elif campo == 'dias_en_sistema':
+                item[campo] = (hoy_chile - fila['fecha_solicitud']).days if fila['fecha_solicitud'] else 0
+            elif campo == 'transporte':
+                item[campo] = fila[campo] or '-'
+            elif campo != 'id':
+                item[campo] = fila[campo]
+        items.append(item)
 
-    for s in qs[:200]:
-        dias = (hoy_chile - s.fecha_solicitud).days if s.fecha_solicitud else 0
-        total_dias += dias
-        if s.urgente:
-            urgentes_count += 1
+    respuesta = {
+        'estado': estado,
+        'label': meta['label'],
+        'color': meta['color'],
+        'hay_mas': siguiente_cursor is not None,
+        'siguiente_cursor': siguiente_cursor,
+        'solicitudes': items,
+    }
 
-        items.append({
-            'id': s.id,
-            'cliente': s.cliente,
-            'tipo': s.tipo,
-            'fecha_solicitud': s.fecha_solicitud.strftime('%d/%m/%Y') if s.fecha_solicitud else '-',
-            'dias_en_sistema': dias,
-            'urgente': s.urgente,
-            'transporte': s.transporte or '-',
-            'estado': s.estado,
-            'detalles': [
-                {
-                    'codigo': d.codigo,
-                    'descripcion': d.descripcion[:60] if d.descripcion else '-',
-                    'cantidad': d.cantidad,
-                    'bodega': d.bodega or '-',
-                    'estado_bodega': d.estado_bodega or '-',
-                }
-                for d in s.detalles.all()
-            ],
+    if not cursor:
+        # Resumen del estado completo (no solo de la página) en una consulta
+        dias_en_sistema = ExpressionWrapper(
+            Value(hoy_chile, output_field=DateField()) - F('fecha_solicitud'),
+            output_field=DurationField(),
+        )
+        resumen = qs.aggregate(
+            total=Count('id'),
+            promedio=Avg(dias_en_sistema),
+            urgentes=Count('id', filter=Q(urgente=True)),
+        )
+        promedio = resumen['promedio']
+        respuesta.update({
+            'total': resumen['total'],
+            'promedio_dias': round(promedio.total_seconds() / 86400, 1) if promedio is not None else 0,
+            'urgentes_count': resumen['urgentes'],
         })
 
-    total = len(items)
-    promedio_dias = round(total_dias / total, 1) if total > 0 else 0
+    return JsonResponse(respuesta)
+
+
+@login_required
+def api_kpi_detalle_lineas(request, solicitud_id):
+    """
+    Líneas de detalle (códigos + bodegas) de una solicitud para el panel KPI.
+    Se piden al expandir la fila, no con el listado.
+    """
+    if not request.user.es_admin():
+        return JsonResponse({'error': 'Acceso denegado'}, status=403)
 
+    detalles = (
+        SolicitudDetalle.objects
+        .filter(solicitud_id=solicitud_id)
+        .order_by('id')
+        .values('codigo', 'descripcion', 'cantidad', 'bodega', 'estado_bodega')
+    )
     return JsonResponse({
-        'estado': estado,
-        'label': meta['label'],
-        'color': meta['color'],
-        'total': total,
-        'promedio_dias': promedio_dias,
-        'urgentes_count': urgentes_count,
-        'hay_mas': qs.count() > 200,
-        'solicitudes': items,
+        'solicitud_id': solicitud_id,
+        'detalles': [
+            {
+                'codigo': d['codigo'],
+                'descripcion': d['descripcion'][:60] if d['descripcion'] else '-',
+                'cantidad': d['cantidad'],
+                'bodega': d['bodega'] or '-',
+                'estado_bodega': d['estado_bodega'] or '-',
+            }
+            for d in detalles
+        ],
     })
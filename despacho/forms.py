@@ -43,7 +43,7 @@ class BultoForm(forms.ModelForm):
         self.fields['numero_guia_transportista'].required = False
 
     def _transportes_choices(self):
-        choices = [(t.slug, t.nombre) for t in TransporteConfig.activos()]
+        choices = TransporteConfig.opciones()
         if not choices:
             choices = [('PESCO', 'Camión PESCO')]
         return choices
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:30
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('despacho', '0005_alter_bulto_solicitud'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bulto',
+            name='peso_cobrable',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(alto_cm__gt=0, ancho_cm__gt=0, largo_cm__gt=0, then=django.db.models.functions.comparison.Greatest(models.F('peso_total'), models.Func(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('largo_cm'), '*', models.F('ancho_cm')), '*', models.F('alto_cm')), output_field=models.DecimalField(decimal_places=6, max_digits=18), template='(%(expressions)s) / 6000.0'))), default=models.F('peso_total')), output_field=models.DecimalField(decimal_places=6, max_digits=18), verbose_name='Peso cobrable (kg)'),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, Func, When
+from django.db.models.functions import Greatest
 from django.utils import timezone
 
 from solicitudes.models import Solicitud
@@ -40,6 +42,28 @@ class Bulto(models.Model):
     largo_cm = models.DecimalField(max_digits=8, decimal_places=2, default=0)
     ancho_cm = models.DecimalField(max_digits=8, decimal_places=2, default=0)
     alto_cm = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    # Peso cobrable = max(peso real, peso volumétrico L·A·H/6000); solo peso real si faltan medidas.
+    # Columna generada por la BD: se puede sumar/agrupar en SQL sin traer bultos a Python.
+    peso_cobrable = models.GeneratedField(
+        expression=Case(
+            When(
+                largo_cm__gt=0, ancho_cm__gt=0, alto_cm__gt=0,
+                then=Greatest(
+                    F('peso_total'),
+                    # Divisor literal decimal: evita división entera en SQLite (desarrollo)
+                    Func(
+                        F('largo_cm') * F('ancho_cm') * F('alto_cm'),
+                        template='(%(expressions)s) / 6000.0',
+                        output_field=models.DecimalField(max_digits=18, decimal_places=6),
+                    ),
+                ),
+            ),
+            default=F('peso_total'),
+        ),
+        output_field=models.DecimalField(max_digits=18, decimal_places=6),
+        db_persist=True,
+        verbose_name='Peso cobrable (kg)',
+    )
     observaciones = models.TextField(blank=True)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_embalaje = models.DateTimeField(null=True, blank=True, verbose_name='Fecha embalaje')
@@ -70,22 +94,38 @@ class Bulto(models.Model):
         return self.codigo
 
     def save(self, *args, **kwargs):
-        if not self.codigo:
-            self.codigo = self._generar_codigo()
-        super().save(*args, **kwargs)
+        if self.codigo:
+            super().save(*args, **kwargs)
+            return
+        # Código e INSERT en la misma transacción (sin huecos si el INSERT falla)
+        try:
+            with transaction.atomic():
+                self.codigo = self._generar_codigo()
+                super().save(*args, **kwargs)
+        except Exception:
+            self.codigo = ''
+            raise
 
     def _generar_codigo(self):
-        año = timezone.now().year
+        return self.generar_codigos(1)[0]
+
+    @classmethod
+    def generar_codigos(cls, cantidad, año=None):
+        """
+        Reserva `cantidad` códigos consecutivos (BUL-2026-0001, ...) en un solo
+        viaje a la BD, para asignarlos antes de crear varios bultos. Llamar
+        dentro de la transacción que los graba.
+        """
+        from core.correlativos import reservar, ultimo_sufijo
+
+        if año is None:
+            año = timezone.localdate().year
         prefix = f"BUL-{año}-"
-        ultimo = Bulto.objects.filter(codigo__startswith=prefix).order_by('-codigo').first()
-        if ultimo:
-            try:
-                correlativo = int(ultimo.codigo.split('-')[-1]) + 1
-            except (ValueError, IndexError):
-                correlativo = 1
-        else:
-            correlativo = 1
-        return f"{prefix}{correlativo:04d}"
+
+        def semilla():
+            return ultimo_sufijo(cls.objects.filter(codigo__startswith=prefix).values_list('codigo', flat=True))
+
+        return [f"{prefix}{n:04d}" for n in reservar('BUL', año, cantidad, semilla=semilla)]
 
     @property
     def volumen_m3(self):
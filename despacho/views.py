@@ -3,11 +3,12 @@ import json
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import F
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
 
+from core.busqueda import buscar_solicitudes
 from core.decorators import role_required
 from configuracion.models import TransporteConfig
 from solicitudes.models import Solicitud, SolicitudDetalle
@@ -50,13 +51,7 @@ def gestion_despacho(request):
     )
 
     if q:
-        solicitudes = solicitudes.filter(
-            Q(cliente__icontains=q)
-            | Q(numero_pedido__icontains=q)
-            | Q(numero_st__icontains=q)
-            | Q(numero_ot__icontains=q)
-            | Q(id__icontains=q)
-        )
+        solicitudes = buscar_solicitudes(solicitudes, q)
 
     if transporte:
         solicitudes = solicitudes.filter(transporte=transporte)
@@ -223,10 +218,12 @@ def crear_bulto(request):
                     if resto > 0:
                         bultos_a_crear.append((resto, True))
                 
+                # Todos los códigos del lote en una sola reserva
+                codigos = Bulto.generar_codigos(len(bultos_a_crear))
                 for idx, (cant_asignar, es_resto) in enumerate(bultos_a_crear):
                     bulto = form.save(commit=False)
                     bulto.pk = None # Instancia nueva
-                    bulto.codigo = ''
+                    bulto.codigo = codigos[idx]
                     bulto.creado_por = request.user
                     bulto.estado = 'listo_despacho' if es_despachador else 'embalado'
                     bulto.solicitud = solicitudes_afectadas.first()
@@ -284,11 +281,10 @@ def crear_bulto(request):
                         detalle.bulto = bulto
                         detalle.save(update_fields=['bulto'])
             
-            # Actualizar estado de TODAS las solicitudes involucradas
-            for sol in solicitudes_afectadas:
-                if not sol.detalles.filter(bulto__isnull=True).exists():
-                    sol.estado = 'listo_despacho'
-                    sol.save(update_fields=['estado'])
+            # Actualizar estado de las solicitudes involucradas con todas sus líneas embaladas
+            for sol in solicitudes_afectadas.filter(lineas_embaladas=F('lineas_total')):
+                sol.estado = 'listo_despacho'
+                sol.save(update_fields=['estado'])
 
             if len(bultos_creados) > 1:
                 messages.success(request, f'Se crearon {len(bultos_creados)} bultos automáticamente.')
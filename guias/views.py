@@ -1,9 +1,11 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q, Prefetch
+from django.db.models import Prefetch
 from django.http import JsonResponse
+from core.busqueda import buscar_solicitudes
 from core.decorators import role_required
+from core.paginacion import paginar
 from solicitudes.models import Solicitud, SolicitudDetalle
 from bodega.models import Stock
 
@@ -31,17 +33,11 @@ def emision_guias(request):
             'detalles',
             queryset=SolicitudDetalle.objects.select_related('bulto').order_by('id')
         )
-    ).order_by('-fecha_solicitud', '-hora_solicitud')
+    )
     
     # Aplicar filtros
     if q:
-        solicitudes = solicitudes.filter(
-            Q(numero_pedido__icontains=q) |
-            Q(numero_st__icontains=q) |
-            Q(numero_ot__icontains=q) |
-            Q(cliente__icontains=q) |
-            Q(id__icontains=q)
-        )
+        solicitudes = buscar_solicitudes(solicitudes, q)
     
     if estado_filtro:
         solicitudes = solicitudes.filter(estado=estado_filtro)
@@ -59,14 +55,10 @@ def emision_guias(request):
         estado__in=estados_para_guia
     ).values_list('estado', flat=True).distinct()
     
-    # Paginación
-    from django.core.paginator import Paginator
-    paginator = Paginator(solicitudes, 50)  # 50 por página
-    page = request.GET.get('page', 1)
-    try:
-        solicitudes_paginadas = paginator.page(page)
-    except:
-        solicitudes_paginadas = paginator.page(1)
+    # Paginación por keyset (más recientes primero): sin COUNT(*) ni OFFSET por página
+    solicitudes_paginadas = paginar(
+        solicitudes, ('-fecha_solicitud', '-hora_solicitud', '-id'), request.GET, limite=50
+    )
     
     context = {
         'solicitudes': solicitudes_paginadas,
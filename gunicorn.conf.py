@@ -0,0 +1,15 @@
+"""
+Configuración de gunicorn (se lee automáticamente desde el directorio de trabajo).
+
+Con preload_app la aplicación Django se importa y precalienta (backend/wsgi.py,
+core/precarga.py) una sola vez en el proceso maestro; los workers se crean
+por fork y comparten esas páginas de memoria. Las opciones de la línea de
+comandos (Procfile / render.yaml) tienen prioridad sobre este archivo.
+
+Desactivar con GUNICORN_PRELOAD=False (cada worker precalienta al arrancar).
+"""
+
+import os
+
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+
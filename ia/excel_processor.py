@@ -3,11 +3,15 @@ Procesador de archivos Excel para el asistente IA.
 Extrae códigos de productos y cantidades de un archivo Excel simple.
 """
 
-from typing import List, Dict, Any
-import pandas as pd
+from typing import TYPE_CHECKING, List, Dict, Any
 from io import BytesIO
 import os
 
+# pandas se importa dentro de las funciones que lo usan: importar este módulo
+# (lo hacen las vistas y las URLs) no debe cargarlo en cada worker.
+if TYPE_CHECKING:
+    import pandas as pd
+
 # Variable para controlar logging (solo en desarrollo)
 DEBUG_MODE = os.getenv('DEBUG', 'False') == 'True'
 
@@ -41,6 +45,8 @@ def procesar_excel_productos(
     Raises:
         ExcelProcessorError: Si no se puede procesar el archivo
     """
+    import pandas as pd
+
     try:
         # Leer Excel desde bytes
         df = pd.read_excel(BytesIO(archivo_bytes))
@@ -316,12 +322,14 @@ def _enriquecer_con_inventario(
         return productos
 
 
-def detectar_columnas(df: pd.DataFrame) -> Dict[str, str]:
+def detectar_columnas(df: 'pd.DataFrame') -> Dict[str, str]:
     """
     Detecta automáticamente las columnas de Código, Cantidad y Descripción.
     
     Busca nombres comunes en español e inglés.
     """
+    import pandas as pd
+
     columnas_originales = [str(col).lower() for col in df.columns]
     
     resultado = {}
@@ -435,6 +443,8 @@ def validar_excel_estructura(archivo_bytes: bytes) -> Dict[str, Any]:
     Returns:
         Dict con información del archivo: total_filas, columnas_detectadas, etc.
     """
+    import pandas as pd
+
     try:
         df = pd.read_excel(BytesIO(archivo_bytes))
         columnas = detectar_columnas(df)
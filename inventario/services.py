@@ -1,4 +1,3 @@
-import pandas as pd
 from django.db import transaction, connection
 from django.utils import timezone
 from .models import StockSAP, CargaStock
@@ -24,6 +23,8 @@ class StockService:
         """
         Procesar archivo de stock y volcarlo a la base de datos
         """
+        import pandas as pd
+
         inicio = time.time()
         carga = None
         
@@ -97,6 +98,8 @@ class StockService:
             raise ValueError(f"Faltan columnas: {', '.join(columnas_faltantes)}")
 
     def _limpiar_datos(self, df):
+        import pandas as pd
+
         df = df.where(pd.notna(df), None)
         # Convertir Stock a numérico, default 0
         if 'Stock' in df.columns:
@@ -108,6 +111,8 @@ class StockService:
         Crea objetos Stock optimizado usando itertuples() en lugar de groupby().
         Agrupa por Codigo y Bodega, sumando stock y concatenando ubicaciones.
         """
+        import pandas as pd
+
         stock_objects = []
         
         # Diccionario para agrupar por (codigo, bodega) - más eficiente que groupby()
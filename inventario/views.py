@@ -1,6 +1,7 @@
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from core.busqueda import buscar_stock
 from core.decorators import role_required
 from .services import StockService
 from .models import CargaStock, StockSAP
@@ -66,7 +67,6 @@ def cargar_stock(request):
 
 
 from django.core.paginator import Paginator
-from django.db.models import Q
 
 @login_required
 def consultar_stock(request):
@@ -79,10 +79,7 @@ def consultar_stock(request):
     
     # Filtrar si hay búsqueda
     if query:
-        stock_list = stock_list.filter(
-            Q(codigo__icontains=query) | 
-            Q(descripcion__icontains=query)
-        )
+        stock_list = buscar_stock(stock_list, query)
     
     # Filtrar por bodega si se selecciona
     if bodega:
@@ -0,0 +1,64 @@
+"""
+Mantiene los rollups diarios/semanales de lead times (kpi_lead_time_rollup).
+
+Materializa los días y semanas cerrados que falten y recalcula el rollup del
+día actual. El dashboard también materializa lo que falte al leer, así que el
+cron solo adelanta ese trabajo.
+
+Uso:
+  python manage.py actualizar_rollups_kpi
+  python manage.py actualizar_rollups_kpi --dias 400
+  python manage.py actualizar_rollups_kpi --reconstruir
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Min
+from django.utils import timezone
+
+from reportes.models import LeadTimeRollup, SolicitudLeadTime, SolicitudLeadTimeArchivada
+from reportes.rollups import actualizar_rollup_hoy, asegurar_rollups_cerrados
+
+
+class Command(BaseCommand):
+    help = 'Materializa los rollups de lead time de días cerrados y actualiza el del día actual.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=None,
+            help='Solo los últimos N días (default: desde el primer despacho registrado)',
+        )
+        parser.add_argument(
+            '--reconstruir',
+            action='store_true',
+            help='Elimina todos los rollups antes de materializar (tras reconstruir_lead_times)',
+        )
+
+    def handle(self, *args, **options):
+        hoy = timezone.localdate()
+
+        if options['reconstruir']:
+            eliminados, _ = LeadTimeRollup.objects.all().delete()
+            self.stdout.write(f'Rollups eliminados: {eliminados}')
+
+        if options['dias']:
+            desde = hoy - timedelta(days=options['dias'])
+        else:
+            # Los días de solicitudes archivadas también tienen rollup
+            primeros = [
+                modelo.objects.filter(estado='despachado').aggregate(minimo=Min('fin_despacho'))['minimo']
+                for modelo in (SolicitudLeadTime, SolicitudLeadTimeArchivada)
+            ]
+            primer_despacho = min((fecha for fecha in primeros if fecha), default=None)
+            desde = timezone.localdate(primer_despacho) if primer_despacho else hoy
+
+        ayer = hoy - timedelta(days=1)
+        if desde <= ayer:
+            semanas, dias = asegurar_rollups_cerrados(desde, ayer)
+            self.stdout.write(f'Días cerrados al día: {desde} a {ayer} ({len(semanas)} semanas, {len(dias)} días sueltos)')
+
+        actualizar_rollup_hoy(hoy)
+        self.stdout.write(self.style.SUCCESS(f'Rollups de lead time actualizados (hoy: {hoy})'))
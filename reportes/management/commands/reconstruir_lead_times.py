@@ -0,0 +1,53 @@
+"""
+Construye (o reconstruye) la tabla de hechos kpi_lead_time_solicitud a partir
+del historial de solicitudes, detalles y bultos.
+
+Necesario una vez tras la migración, y útil después de correcciones masivas
+hechas con QuerySet.update() (no disparan señales).
+
+Uso:
+  python manage.py reconstruir_lead_times
+  python manage.py reconstruir_lead_times --dias 90
+  python manage.py reconstruir_lead_times --batch-size 500
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from core.cache_datos import incrementar_version_datos
+from reportes.services import recalcular_lead_times
+from solicitudes.models import Solicitud
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye la tabla de lead times por solicitud usada por el dashboard.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=None,
+            help='Solo solicitudes creadas o despachadas en los últimos N días (default: todo el historial)',
+        )
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        qs = Solicitud.objects.order_by('id')
+        if options['dias']:
+            desde = timezone.now() - timedelta(days=options['dias'])
+            qs = qs.filter(Q(created_at__gte=desde) | Q(fecha_despachado__gte=desde))
+
+        ids = list(qs.values_list('id', flat=True))
+        self.stdout.write(f'Solicitudes a procesar: {len(ids)}')
+
+        escritas = 0
+        for i in range(0, len(ids), batch_size):
+            escritas += recalcular_lead_times(ids[i:i + batch_size])
+            self.stdout.write(f'  {escritas}/{len(ids)}')
+
+        incrementar_version_datos()
+        self.stdout.write(self.style.SUCCESS(f'Lead times reconstruidos: {escritas}'))
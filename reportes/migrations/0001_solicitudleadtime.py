@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('solicitudes', '0018_fix_fecha_despachado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SolicitudLeadTime',
+            fields=[
+                ('solicitud', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='lead_time', serialize=False, to='solicitudes.solicitud', verbose_name='Solicitud')),
+                ('estado', models.CharField(max_length=50, verbose_name='Estado')),
+                ('cliente', models.CharField(blank=True, max_length=200, verbose_name='Cliente')),
+                ('transporte', models.CharField(blank=True, max_length=50, verbose_name='Transporte de la solicitud')),
+                ('transporte_efectivo', models.CharField(blank=True, help_text='Prioridad: bulto.transportista_extra > bulto.transportista > solicitud.transporte', max_length=100, verbose_name='Transporte efectivo')),
+                ('transportes', models.CharField(blank=True, help_text='Conjunto delimitado por "|" (ej: "|PESCO|STARKEN|") para filtrar por transporte', max_length=500, verbose_name='Transportes involucrados')),
+                ('inicio_efectivo', models.DateTimeField(blank=True, null=True, verbose_name='Inicio efectivo')),
+                ('fin_preparacion', models.DateTimeField(blank=True, null=True, verbose_name='Fin preparación')),
+                ('fin_embalaje', models.DateTimeField(blank=True, null=True, verbose_name='Fin embalaje')),
+                ('fin_despacho', models.DateTimeField(blank=True, null=True, verbose_name='Fin despacho')),
+                ('horas_preparacion', models.FloatField(blank=True, null=True)),
+                ('horas_embalaje', models.FloatField(blank=True, null=True)),
+                ('horas_total', models.FloatField(blank=True, null=True)),
+                ('horas_por_bodega', models.JSONField(blank=True, default=list, help_text='Lista [bodega, horas] por detalle preparado')),
+                ('kilos_cobrables', models.DecimalField(decimal_places=6, default=0, help_text='Suma de max(peso real, L·A·H/6000) de los bultos de la solicitud', max_digits=18, verbose_name='Kilos cobrables')),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Lead time de solicitud',
+                'verbose_name_plural': 'Lead times de solicitudes',
+                'db_table': 'kpi_lead_time_solicitud',
+                'indexes': [models.Index(fields=['estado', 'fin_despacho'], name='idx_kpi_lt_estado_desp')],
+            },
+        ),
+    ]
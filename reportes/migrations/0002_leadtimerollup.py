@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportes', '0001_solicitudleadtime'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeadTimeRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularidad', models.CharField(choices=[('dia', 'Día'), ('semana', 'Semana ISO')], max_length=10)),
+                ('periodo', models.DateField(help_text='Día de despacho (hora Chile) o lunes de la semana ISO', verbose_name='Periodo')),
+                ('metrica', models.CharField(choices=[('preparacion', 'Lead time preparación'), ('embalaje', 'Lead time embalaje'), ('total', 'Lead time total'), ('bodega', 'Lead time preparación por bodega')], max_length=20)),
+                ('bodega', models.CharField(blank=True, help_text='Vacío = todas', max_length=50)),
+                ('transporte', models.CharField(blank=True, help_text='Vacío = todos', max_length=100)),
+                ('semana_preparacion', models.CharField(blank=True, help_text='Semana ISO de término de preparación (ej: 2026-W02), para la tendencia', max_length=8)),
+                ('cantidad', models.PositiveIntegerField(default=0)),
+                ('suma', models.FloatField(default=0)),
+                ('minimo', models.FloatField(blank=True, null=True)),
+                ('maximo', models.FloatField(blank=True, null=True)),
+                ('sketch', models.JSONField(blank=True, default=dict)),
+                ('cerrado', models.BooleanField(default=False, help_text='Periodo cerrado: no se recalcula')),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Rollup de lead time',
+                'verbose_name_plural': 'Rollups de lead time',
+                'db_table': 'kpi_lead_time_rollup',
+                'indexes': [models.Index(fields=['granularidad', 'transporte', 'periodo'], name='idx_kpi_rollup_gran_tr_per')],
+                'unique_together': {('granularidad', 'periodo', 'metrica', 'bodega', 'transporte', 'semana_preparacion')},
+            },
+        ),
+    ]
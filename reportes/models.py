@@ -1,3 +1,181 @@
 from django.db import models
 
-# Create your models here.
+from solicitudes.models import Solicitud
+
+
+class CamposLeadTime(models.Model):
+    """Columnas de la tabla de hechos de lead time (vigente y archivo)."""
+
+    estado = models.CharField(max_length=50, verbose_name='Estado')
+    cliente = models.CharField(max_length=200, blank=True, verbose_name='Cliente')
+    transporte = models.CharField(
+        max_length=50,
+        blank=True,
+        verbose_name='Transporte de la solicitud'
+    )
+    transporte_efectivo = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name='Transporte efectivo',
+        help_text='Prioridad: bulto.transportista_extra > bulto.transportista > solicitud.transporte'
+    )
+    transportes = models.CharField(
+        max_length=500,
+        blank=True,
+        verbose_name='Transportes involucrados',
+        help_text='Conjunto delimitado por "|" (ej: "|PESCO|STARKEN|") para filtrar por transporte'
+    )
+
+    # Hitos del flujo
+    inicio_efectivo = models.DateTimeField(null=True, blank=True, verbose_name='Inicio efectivo')
+    fin_preparacion = models.DateTimeField(null=True, blank=True, verbose_name='Fin preparación')
+    fin_embalaje = models.DateTimeField(null=True, blank=True, verbose_name='Fin embalaje')
+    fin_despacho = models.DateTimeField(null=True, blank=True, verbose_name='Fin despacho')
+
+    # Lead times en horas laborales (null si falta algún hito)
+    horas_preparacion = models.FloatField(null=True, blank=True)
+    horas_embalaje = models.FloatField(null=True, blank=True)
+    horas_total = models.FloatField(null=True, blank=True)
+    horas_por_bodega = models.JSONField(
+        default=list,
+        blank=True,
+        help_text='Lista [bodega, horas] por detalle preparado'
+    )
+
+    kilos_cobrables = models.DecimalField(
+        max_digits=18,
+        decimal_places=6,
+        default=0,
+        verbose_name='Kilos cobrables',
+        help_text='Suma de max(peso real, L·A·H/6000) de los bultos de la solicitud'
+    )
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+
+class SolicitudLeadTime(CamposLeadTime):
+    """
+    Tabla de hechos desnormalizada con los lead times de cada solicitud.
+
+    Se mantiene desde las señales de Solicitud, SolicitudDetalle y Bulto
+    (ver reportes.signals) y se reconstruye con:
+        python manage.py reconstruir_lead_times
+    El dashboard lee estos valores precalculados en lugar de recalcularlos.
+    """
+
+    solicitud = models.OneToOneField(
+        Solicitud,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='lead_time',
+        verbose_name='Solicitud'
+    )
+
+    class Meta:
+        db_table = 'kpi_lead_time_solicitud'
+        verbose_name = 'Lead time de solicitud'
+        verbose_name_plural = 'Lead times de solicitudes'
+        indexes = [
+            # Rango principal del dashboard: estado='despachado' AND fin_despacho >= X
+            models.Index(fields=['estado', 'fin_despacho'], name='idx_kpi_lt_estado_desp'),
+        ]
+
+    def __str__(self):
+        return f"Lead time solicitud #{self.solicitud_id}"
+
+
+class SolicitudLeadTimeArchivada(CamposLeadTime):
+    """
+    Lead time de una solicitud archivada (solicitudes.archivo), ya no cambia.
+    Los rollups y el dashboard la leen junto con SolicitudLeadTime cuando el
+    período llega al archivo.
+    """
+
+    solicitud_id = models.BigIntegerField(primary_key=True, verbose_name='Solicitud')
+    sucursal = models.CharField(
+        max_length=200,
+        blank=True,
+        verbose_name='Sucursal',
+        help_text='Cliente canónico de la solicitud al archivarla'
+    )
+
+    class Meta:
+        db_table = 'kpi_lead_time_solicitud_archivo'
+        verbose_name = 'Lead time de solicitud archivada'
+        verbose_name_plural = 'Lead times de solicitudes archivadas'
+        indexes = [
+            models.Index(fields=['estado', 'fin_despacho'], name='idx_kpi_lt_arch_estado_desp'),
+        ]
+
+    def __str__(self):
+        return f"Lead time solicitud archivada #{self.solicitud_id}"
+
+
+class LeadTimeRollup(models.Model):
+    """
+    Agregados materializados de lead times por día y por semana ISO de despacho.
+
+    Cada fila guarda cantidad/suma/mínimo/máximo y un sketch de cuantiles
+    fusionable para una combinación (métrica, bodega, transporte). Los días
+    cerrados son inmutables; ver reportes.rollups.
+    """
+
+    GRANULARIDAD_DIA = 'dia'
+    GRANULARIDAD_SEMANA = 'semana'
+    GRANULARIDADES = [
+        (GRANULARIDAD_DIA, 'Día'),
+        (GRANULARIDAD_SEMANA, 'Semana ISO'),
+    ]
+
+    METRICA_PREPARACION = 'preparacion'
+    METRICA_EMBALAJE = 'embalaje'
+    METRICA_TOTAL = 'total'
+    METRICA_BODEGA = 'bodega'
+    METRICAS = [
+        (METRICA_PREPARACION, 'Lead time preparación'),
+        (METRICA_EMBALAJE, 'Lead time embalaje'),
+        (METRICA_TOTAL, 'Lead time total'),
+        (METRICA_BODEGA, 'Lead time preparación por bodega'),
+    ]
+
+    granularidad = models.CharField(max_length=10, choices=GRANULARIDADES)
+    periodo = models.DateField(
+        verbose_name='Periodo',
+        help_text='Día de despacho (hora Chile) o lunes de la semana ISO'
+    )
+    metrica = models.CharField(max_length=20, choices=METRICAS)
+    bodega = models.CharField(max_length=50, blank=True, help_text='Vacío = todas')
+    transporte = models.CharField(max_length=100, blank=True, help_text='Vacío = todos')
+    semana_preparacion = models.CharField(
+        max_length=8,
+        blank=True,
+        help_text='Semana ISO de término de preparación (ej: 2026-W02), para la tendencia'
+    )
+
+    cantidad = models.PositiveIntegerField(default=0)
+    suma = models.FloatField(default=0)
+    minimo = models.FloatField(null=True, blank=True)
+    maximo = models.FloatField(null=True, blank=True)
+    sketch = models.JSONField(default=dict, blank=True)
+
+    cerrado = models.BooleanField(default=False, help_text='Periodo cerrado: no se recalcula')
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'kpi_lead_time_rollup'
+        verbose_name = 'Rollup de lead time'
+        verbose_name_plural = 'Rollups de lead time'
+        unique_together = (
+            'granularidad', 'periodo', 'metrica', 'bodega', 'transporte', 'semana_preparacion',
+        )
+        indexes = [
+            models.Index(
+                fields=['granularidad', 'transporte', 'periodo'],
+                name='idx_kpi_rollup_gran_tr_per'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_metrica_display()} {self.granularidad} {self.periodo}"
@@ -0,0 +1,399 @@
+"""
+Rollups diarios y semanales de lead times (tendencia semanal y paneles por bodega).
+
+Los agregados se construyen desde la tabla de hechos SolicitudLeadTime (y su
+archivo, SolicitudLeadTimeArchivada, si el rango lo alcanza) y se indexan por
+día de despacho (hora Chile):
+
+- Días cerrados (anteriores a hoy): se materializan una sola vez y no cambian.
+- Semanas ISO completas: se materializan fusionando sus 7 días.
+- El día parcial al inicio del período y el día actual se leen en vivo desde
+  la tabla de hechos, así el resultado es exacto para cualquier período.
+
+Cada agregado guarda cantidad/suma/mínimo/máximo y un sketch de cuantiles
+(histograma logarítmico con error relativo acotado) que se fusiona sumando
+buckets, por lo que leer 7, 30 o 365 días cuesta unos cientos de filas.
+
+Uso (cron):
+  python manage.py actualizar_rollups_kpi
+"""
+
+import math
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from itertools import chain
+
+from django.utils import timezone
+
+from .models import LeadTimeRollup, SolicitudLeadTime, SolicitudLeadTimeArchivada
+
+# Error relativo del sketch de cuantiles (2%)
+_PRECISION_SKETCH = 0.02
+_GAMMA = (1 + _PRECISION_SKETCH) / (1 - _PRECISION_SKETCH)
+_LOG_GAMMA = math.log(_GAMMA)
+_MINIMO_POSITIVO = 1e-9
+
+
+class SketchCuantiles:
+    """
+    Sketch de cuantiles fusionable (histograma con buckets logarítmicos).
+
+    Dos sketches se combinan sumando los conteos de cada bucket, de modo que
+    el sketch de una semana es exactamente la suma de los de sus días.
+    """
+
+    __slots__ = ('ceros', 'buckets')
+
+    def __init__(self, data=None):
+        data = data or {}
+        self.ceros = int(data.get('z', 0))
+        self.buckets = defaultdict(int, {int(k): int(v) for k, v in data.get('b', {}).items()})
+
+    def agregar(self, valor):
+        if valor <= _MINIMO_POSITIVO:
+            self.ceros += 1
+        else:
+            self.buckets[math.ceil(math.log(valor) / _LOG_GAMMA)] += 1
+
+    def fusionar(self, otro):
+        self.ceros += otro.ceros
+        for indice, conteo in otro.buckets.items():
+            self.buckets[indice] += conteo
+
+    def cuantil(self, q):
+        total = self.ceros + sum(self.buckets.values())
+        if total == 0:
+            return 0.0
+        rango = q * (total - 1)
+        acumulado = self.ceros
+        if rango < acumulado:
+            return 0.0
+        for indice in sorted(self.buckets):
+            acumulado += self.buckets[indice]
+            if rango < acumulado:
+                return 2 * _GAMMA ** indice / (_GAMMA + 1)
+        return 2 * _GAMMA ** max(self.buckets) / (_GAMMA + 1)
+
+    def a_dict(self):
+        return {'z': self.ceros, 'b': {str(k): v for k, v in self.buckets.items() if v}}
+
+
+class Acumulador:
+    """count/sum/min/max + sketch de una serie de lead times (en horas)."""
+
+    __slots__ = ('cantidad', 'suma', 'minimo', 'maximo', 'sketch')
+
+    def __init__(self):
+        self.cantidad = 0
+        self.suma = 0.0
+        self.minimo = None
+        self.maximo = None
+        self.sketch = SketchCuantiles()
+
+    @classmethod
+    def desde_rollup(cls, rollup):
+        acc = cls()
+        acc.cantidad = rollup.cantidad
+        acc.suma = rollup.suma
+        acc.minimo = rollup.minimo
+        acc.maximo = rollup.maximo
+        acc.sketch = SketchCuantiles(rollup.sketch)
+        return acc
+
+    def agregar(self, valor):
+        self.cantidad += 1
+        self.suma += valor
+        self.minimo = valor if self.minimo is None else min(self.minimo, valor)
+        self.maximo = valor if self.maximo is None else max(self.maximo, valor)
+        self.sketch.agregar(valor)
+
+    def fusionar(self, otro):
+        if not otro.cantidad:
+            return
+        self.cantidad += otro.cantidad
+        self.suma += otro.suma
+        self.minimo = otro.minimo if self.minimo is None else min(self.minimo, otro.minimo)
+        self.maximo = otro.maximo if self.maximo is None else max(self.maximo, otro.maximo)
+        self.sketch.fusionar(otro.sketch)
+
+    @property
+    def promedio(self):
+        return self.suma / self.cantidad if self.cantidad else 0
+
+    def cuantil(self, q):
+        return self.sketch.cuantil(q)
+
+
+def semana_iso(fecha):
+    iso_year, iso_week, _ = fecha.isocalendar()
+    return f"{iso_year}-W{iso_week:02d}"
+
+
+def _inicio_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def _claves_transporte(fila):
+    """'' (todos) más cada transporte involucrado en la solicitud."""
+    return [''] + [t for t in fila.transportes.split('|') if t]
+
+
+def _acumular_fila(acumuladores, fila, transporte=None):
+    """
+    Suma una fila de hechos a los acumuladores {(metrica, bodega, transporte, semana): Acumulador}.
+    Con transporte=None acumula todas las claves de transporte; si no, solo esa.
+    """
+    for clave_transporte in _claves_transporte(fila):
+        if transporte is not None and clave_transporte != transporte:
+            continue
+        if fila.horas_preparacion is not None and fila.horas_preparacion >= 0:
+            # Semana de referencia: fecha real de término de preparación (igual que el dashboard)
+            semana = semana_iso(fila.fin_preparacion.date())
+            acumuladores[(LeadTimeRollup.METRICA_PREPARACION, '', clave_transporte, semana)].agregar(
+                fila.horas_preparacion
+            )
+        if fila.horas_embalaje is not None and fila.horas_embalaje >= 0:
+            acumuladores[(LeadTimeRollup.METRICA_EMBALAJE, '', clave_transporte, '')].agregar(
+                fila.horas_embalaje
+            )
+        if fila.horas_total is not None and fila.horas_total >= 0:
+            acumuladores[(LeadTimeRollup.METRICA_TOTAL, '', clave_transporte, '')].agregar(fila.horas_total)
+        for bodega, horas in fila.horas_por_bodega:
+            if horas >= 0:
+                acumuladores[(LeadTimeRollup.METRICA_BODEGA, bodega, clave_transporte, '')].agregar(horas)
+
+
+def _filas_rollup(granularidad, periodo, acumuladores, cerrado):
+    filas = [
+        LeadTimeRollup(
+            granularidad=granularidad,
+            periodo=periodo,
+            metrica=metrica,
+            bodega=bodega,
+            transporte=transporte,
+            semana_preparacion=semana,
+            cantidad=acc.cantidad,
+            suma=acc.suma,
+            minimo=acc.minimo,
+            maximo=acc.maximo,
+            sketch=acc.sketch.a_dict(),
+            cerrado=cerrado,
+        )
+        for (metrica, bodega, transporte, semana), acc in acumuladores.items()
+    ]
+    # Fila marcador: todo periodo materializado tiene al menos su 'total' global
+    if (LeadTimeRollup.METRICA_TOTAL, '', '', '') not in acumuladores:
+        filas.append(LeadTimeRollup(
+            granularidad=granularidad,
+            periodo=periodo,
+            metrica=LeadTimeRollup.METRICA_TOTAL,
+            cerrado=cerrado,
+        ))
+    return filas
+
+
+def _filas_hechos(desde, hasta=None):
+    """Hechos despachados en [desde, hasta), más los archivados si el rango llega al archivo."""
+    from solicitudes.archivo import alcanza_archivo
+
+    modelos = [SolicitudLeadTime]
+    if alcanza_archivo(desde):
+        modelos.append(SolicitudLeadTimeArchivada)
+    consultas = []
+    for modelo in modelos:
+        qs = modelo.objects.filter(estado='despachado', fin_despacho__gte=desde)
+        if hasta is not None:
+            qs = qs.filter(fin_despacho__lt=hasta)
+        consultas.append(qs.only(
+            'fin_despacho', 'fin_preparacion', 'transportes',
+            'horas_preparacion', 'horas_embalaje', 'horas_total', 'horas_por_bodega',
+        ))
+    return chain.from_iterable(consultas)
+
+
+def _materializar_dias(dias):
+    """Materializa (cerrados) los días indicados con una sola lectura de hechos."""
+    dias = sorted(dias)
+    por_dia = defaultdict(lambda: defaultdict(Acumulador))
+    for fila in _filas_hechos(_inicio_dia(dias[0]), _inicio_dia(dias[-1] + timedelta(days=1))):
+        _acumular_fila(por_dia[timezone.localdate(fila.fin_despacho)], fila)
+
+    filas = []
+    for dia in dias:
+        filas.extend(_filas_rollup(LeadTimeRollup.GRANULARIDAD_DIA, dia, por_dia.get(dia, {}), True))
+    # Un día que era "hoy" pudo quedar con un rollup abierto: se reemplaza por el cerrado
+    LeadTimeRollup.objects.filter(
+        granularidad=LeadTimeRollup.GRANULARIDAD_DIA, periodo__in=dias, cerrado=False
+    ).delete()
+    LeadTimeRollup.objects.bulk_create(filas, batch_size=500, ignore_conflicts=True)
+
+
+def _materializar_semanas(lunes_semanas):
+    """Materializa semanas ISO completas fusionando sus rollups diarios (ya cerrados)."""
+    lunes_semanas = sorted(lunes_semanas)
+    rollups = LeadTimeRollup.objects.filter(
+        granularidad=LeadTimeRollup.GRANULARIDAD_DIA,
+        periodo__gte=lunes_semanas[0],
+        periodo__lt=lunes_semanas[-1] + timedelta(days=7),
+        cerrado=True,
+    )
+    por_semana = defaultdict(lambda: defaultdict(Acumulador))
+    for rollup in rollups:
+        lunes = rollup.periodo - timedelta(days=rollup.periodo.weekday())
+        clave = (rollup.metrica, rollup.bodega, rollup.transporte, rollup.semana_preparacion)
+        por_semana[lunes][clave].fusionar(Acumulador.desde_rollup(rollup))
+
+    filas = []
+    for lunes in lunes_semanas:
+        filas.extend(_filas_rollup(LeadTimeRollup.GRANULARIDAD_SEMANA, lunes, por_semana.get(lunes, {}), True))
+    LeadTimeRollup.objects.bulk_create(filas, batch_size=500, ignore_conflicts=True)
+
+
+def _periodos_materializados(granularidad, periodos):
+    return set(LeadTimeRollup.objects.filter(
+        granularidad=granularidad,
+        periodo__in=periodos,
+        metrica=LeadTimeRollup.METRICA_TOTAL,
+        bodega='', transporte='', semana_preparacion='',
+        cerrado=True,
+    ).values_list('periodo', flat=True))
+
+
+def asegurar_rollups_cerrados(dia_desde, dia_hasta):
+    """
+    Materializa los días y semanas cerrados de [dia_desde, dia_hasta] que falten.
+    Barato cuando ya están al día: dos consultas sobre las filas marcador.
+
+    Returns:
+        (lunes_semanas, dias): segmentación del rango en semanas ISO completas y días sueltos.
+    """
+    semanas, dias = _segmentos_cerrados(dia_desde, dia_hasta)
+
+    faltan_semanas = set(semanas) - _periodos_materializados(LeadTimeRollup.GRANULARIDAD_SEMANA, semanas)
+    dias_necesarios = set(dias)
+    for lunes in faltan_semanas:
+        dias_necesarios.update(lunes + timedelta(days=i) for i in range(7))
+    faltan_dias = dias_necesarios - _periodos_materializados(LeadTimeRollup.GRANULARIDAD_DIA, dias_necesarios)
+
+    if faltan_dias:
+        _materializar_dias(faltan_dias)
+    if faltan_semanas:
+        _materializar_semanas(faltan_semanas)
+    return semanas, dias
+
+
+def invalidar_rollups(dias):
+    """
+    Descarta los rollups de los días indicados (y de sus semanas ISO).
+
+    Se usa cuando cambia una solicitud cuyo despacho cae en un día ya cerrado
+    (correcciones tardías); el día se vuelve a materializar en la próxima lectura.
+    """
+    dias = set(dias)
+    if not dias:
+        return
+    lunes = {dia - timedelta(days=dia.weekday()) for dia in dias}
+    LeadTimeRollup.objects.filter(granularidad=LeadTimeRollup.GRANULARIDAD_DIA, periodo__in=dias).delete()
+    LeadTimeRollup.objects.filter(granularidad=LeadTimeRollup.GRANULARIDAD_SEMANA, periodo__in=lunes).delete()
+
+
+def invalidar_despachos(despachos):
+    """invalidar_rollups() de los días ya cerrados de esos instantes de despacho (fin_despacho)."""
+    hoy = timezone.localdate()
+    invalidar_rollups({timezone.localdate(d) for d in despachos if d} - {hoy})
+
+
+def actualizar_rollup_hoy(hoy=None):
+    """Recalcula el rollup (abierto) del día actual; los días anteriores no se tocan."""
+    hoy = hoy or timezone.localdate()
+    acumuladores = defaultdict(Acumulador)
+    for fila in _filas_hechos(_inicio_dia(hoy)):
+        _acumular_fila(acumuladores, fila)
+    LeadTimeRollup.objects.filter(
+        granularidad=LeadTimeRollup.GRANULARIDAD_DIA, periodo=hoy, cerrado=False
+    ).delete()
+    LeadTimeRollup.objects.bulk_create(
+        _filas_rollup(LeadTimeRollup.GRANULARIDAD_DIA, hoy, acumuladores, False),
+        ignore_conflicts=True,
+    )
+
+
+def _segmentos_cerrados(dia_desde, dia_hasta):
+    """
+    Divide [dia_desde, dia_hasta] en semanas ISO completas y días sueltos.
+
+    Returns:
+        (lunes_semanas, dias)
+    """
+    semanas, dias = [], []
+    dia = dia_desde
+    while dia <= dia_hasta:
+        if dia.weekday() == 0 and dia + timedelta(days=6) <= dia_hasta:
+            semanas.append(dia)
+            dia += timedelta(days=7)
+        else:
+            dias.append(dia)
+            dia += timedelta(days=1)
+    return semanas, dias
+
+
+def estadisticas_lead_time(fecha_inicio, transporte=None, ahora=None):
+    """
+    Estadísticas de lead time de solicitudes despachadas desde fecha_inicio.
+
+    Returns:
+        dict con Acumulador por métrica:
+            'preparacion', 'embalaje', 'total',
+            'semanas': {semana_iso_preparacion: Acumulador},
+            'bodegas': {codigo_bodega: Acumulador}
+    """
+    ahora = ahora or timezone.now()
+    hoy = timezone.localdate(ahora)
+    dia_inicio = timezone.localdate(fecha_inicio)
+    transporte = transporte or ''
+
+    resultado = {
+        'preparacion': Acumulador(),
+        'embalaje': Acumulador(),
+        'total': Acumulador(),
+        'semanas': defaultdict(Acumulador),
+        'bodegas': defaultdict(Acumulador),
+    }
+
+    def sumar(metrica, bodega, semana, acc):
+        if metrica == LeadTimeRollup.METRICA_PREPARACION:
+            resultado['preparacion'].fusionar(acc)
+            resultado['semanas'][semana].fusionar(acc)
+        elif metrica == LeadTimeRollup.METRICA_BODEGA:
+            resultado['bodegas'][bodega].fusionar(acc)
+        else:
+            resultado[metrica].fusionar(acc)
+
+    # 1. Días completos cerrados: rollups materializados (semanas + días sueltos)
+    primer_cerrado = dia_inicio + timedelta(days=1)
+    ultimo_cerrado = hoy - timedelta(days=1)
+    hay_cerrados = primer_cerrado <= ultimo_cerrado
+    if hay_cerrados:
+        semanas, dias = asegurar_rollups_cerrados(primer_cerrado, ultimo_cerrado)
+        rollups = list(LeadTimeRollup.objects.filter(
+            granularidad=LeadTimeRollup.GRANULARIDAD_SEMANA, periodo__in=semanas, transporte=transporte,
+        )) + list(LeadTimeRollup.objects.filter(
+            granularidad=LeadTimeRollup.GRANULARIDAD_DIA, periodo__in=dias, transporte=transporte,
+        ))
+        for rollup in rollups:
+            if rollup.cantidad:
+                sumar(rollup.metrica, rollup.bodega, rollup.semana_preparacion, Acumulador.desde_rollup(rollup))
+
+    # 2. Día parcial inicial y día actual: en vivo desde la tabla de hechos
+    if hay_cerrados:
+        filas = list(_filas_hechos(fecha_inicio, _inicio_dia(primer_cerrado)))
+        filas += list(_filas_hechos(_inicio_dia(hoy)))
+    else:
+        filas = _filas_hechos(fecha_inicio)
+    acumuladores = defaultdict(Acumulador)
+    for fila in filas:
+        _acumular_fila(acumuladores, fila, transporte)
+    for (metrica, bodega, _, semana), acc in acumuladores.items():
+        sumar(metrica, bodega, semana, acc)
+
+    return resultado
@@ -0,0 +1,280 @@
+"""
+Servicios de KPIs: mantenimiento de la tabla de hechos de lead times.
+
+Cada fila de SolicitudLeadTime se recalcula completa a partir de la solicitud,
+sus detalles y sus bultos, así que es idempotente: recalcular de más nunca
+deja datos inconsistentes.
+"""
+
+import logging
+import threading
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from core.business_hours import horas_laborales_lote
+from despacho.models import Bulto
+from solicitudes.models import Solicitud, SolicitudDetalle
+from solicitudes.services import sincronizar_transportes
+from .models import SolicitudLeadTime
+from .rollups import invalidar_despachos
+
+logger = logging.getLogger(__name__)
+
+CENTAVOS = Decimal('0.01')
+
+CAMPOS_LEAD_TIME = [
+    'estado', 'cliente', 'transporte', 'transporte_efectivo', 'transportes',
+    'inicio_efectivo', 'fin_preparacion', 'fin_embalaje', 'fin_despacho',
+    'horas_preparacion', 'horas_embalaje', 'horas_total', 'horas_por_bodega',
+    'kilos_cobrables', 'actualizado_en',
+]
+
+# Campos de Solicitud que afectan la fila de lead time (para filtrar saves irrelevantes)
+CAMPOS_SOLICITUD_RELEVANTES = frozenset({
+    'estado', 'cliente', 'transporte', 'fecha_solicitud', 'hora_solicitud',
+    'fecha_en_despacho', 'fecha_listo_despacho', 'fecha_despachado',
+})
+
+
+def _construir_fila(solicitud):
+    """
+    Arma la fila (sin horas) desde una solicitud con
+    prefetch_related('detalles', 'detalles__bulto', 'bultos').
+
+    Returns:
+        (SolicitudLeadTime, [(bodega, fecha_preparacion), ...])
+    """
+    from core.views import inicio_efectivo_lead_time
+
+    detalles = list(solicitud.detalles.all())
+    bultos = solicitud.get_bultos()
+
+    fechas_prep = [d.fecha_preparacion for d in detalles if d.fecha_preparacion]
+    fechas_emb = [
+        b.fecha_embalaje for b in bultos
+        if b.estado != 'cancelado' and b.fecha_embalaje
+    ]
+
+    transportes = solicitud.calcular_transportes_involucrados(bultos)
+
+    fila = SolicitudLeadTime(
+        solicitud=solicitud,
+        estado=solicitud.estado,
+        cliente=solicitud.cliente or '',
+        transporte=solicitud.transporte or '',
+        transporte_efectivo=solicitud.calcular_transporte_efectivo(bultos),
+        transportes=('|' + '|'.join(sorted(transportes)) + '|') if transportes else '',
+        inicio_efectivo=inicio_efectivo_lead_time(solicitud),
+        fin_preparacion=max(fechas_prep) if fechas_prep else None,
+        fin_embalaje=max(fechas_emb) if fechas_emb else None,
+        fin_despacho=solicitud.fecha_despachado,
+    )
+    preparados = [
+        (d.bodega.strip(), d.fecha_preparacion)
+        for d in detalles
+        if d.bodega and d.bodega.strip() and d.fecha_preparacion
+    ]
+    return fila, preparados
+
+
+def kilos_cobrables_por_solicitud(solicitud_ids):
+    """
+    Suma Bulto.peso_cobrable (columna generada) por solicitud en una sola consulta.
+
+    Un bulto pertenece a la solicitud directamente (bulto.solicitud) o vía sus
+    detalles (detalle.bulto); el UNION deja un par (solicitud, bulto) único,
+    así un bulto con varios detalles (o en ambos caminos) se cuenta una vez.
+    Un bulto compartido por varias solicitudes se reparte en partes iguales
+    entre ellas, para que sumar kilos_cobrables de varias filas (categorías
+    del dashboard) no lo cuente dos veces.
+
+    Returns:
+        dict {solicitud_id: Decimal}
+    """
+    ids = [int(i) for i in solicitud_ids]
+    if not ids:
+        return {}
+
+    tabla_bultos = connection.ops.quote_name(Bulto._meta.db_table)
+    tabla_detalles = connection.ops.quote_name(SolicitudDetalle._meta.db_table)
+    marcadores = ', '.join(['%s'] * len(ids))
+    sql = f"""
+        WITH objetivo AS (
+            SELECT id AS bulto_id
+            FROM {tabla_bultos}
+            WHERE solicitud_id IN ({marcadores})
+            UNION
+            SELECT bulto_id
+            FROM {tabla_detalles}
+            WHERE bulto_id IS NOT NULL AND solicitud_id IN ({marcadores})
+        ),
+        pares AS (
+            SELECT solicitud_id, id AS bulto_id
+            FROM {tabla_bultos}
+            WHERE solicitud_id IS NOT NULL AND id IN (SELECT bulto_id FROM objetivo)
+            UNION
+            SELECT solicitud_id, bulto_id
+            FROM {tabla_detalles}
+            WHERE bulto_id IN (SELECT bulto_id FROM objetivo)
+        ),
+        compartidos AS (
+            SELECT bulto_id, COUNT(*) AS solicitudes
+            FROM pares
+            GROUP BY bulto_id
+        )
+        SELECT pares.solicitud_id, SUM(b.peso_cobrable / c.solicitudes)
+        FROM pares
+        JOIN {tabla_bultos} b ON b.id = pares.bulto_id
+        JOIN compartidos c ON c.bulto_id = pares.bulto_id
+        WHERE pares.solicitud_id IN ({marcadores})
+        GROUP BY pares.solicitud_id
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, ids + ids + ids)
+        return {
+            solicitud_id: Decimal(str(total)).quantize(CENTAVOS) if total is not None else Decimal('0.00')
+            for solicitud_id, total in cursor.fetchall()
+        }
+
+
+def solicitudes_con_bultos_compartidos(solicitud_ids, bulto_ids=()):
+    """
+    Ids de las solicitudes que comparten algún bulto con `solicitud_ids` o que
+    tienen alguno de `bulto_ids`: su parte de kilos cobrables cambia con ellas.
+    """
+    bultos = Bulto.objects.filter(
+        Q(solicitud_id__in=solicitud_ids)
+        | Q(id__in=bulto_ids)
+        | Q(id__in=SolicitudDetalle.objects.filter(
+            solicitud_id__in=solicitud_ids, bulto__isnull=False,
+        ).values('bulto_id'))
+    ).values('id')
+    ids = set(
+        Bulto.objects.filter(id__in=bultos, solicitud__isnull=False).values_list('solicitud_id', flat=True)
+    )
+    ids.update(SolicitudDetalle.objects.filter(bulto_id__in=bultos).values_list('solicitud_id', flat=True))
+    return ids
+
+
+def _calcular_horas(filas, preparaciones):
+    """Completa las horas laborales de todas las filas con llamadas vectorizadas."""
+    pares = []
+    for fila in filas:
+        pares.append((fila.inicio_efectivo, fila.fin_preparacion))
+        pares.append((fila.fin_preparacion, fila.fin_embalaje))
+        pares.append((fila.inicio_efectivo, fila.fin_despacho))
+    horas = horas_laborales_lote([p[0] for p in pares], [p[1] for p in pares]).tolist() if pares else []
+
+    for i, fila in enumerate(filas):
+        h_prep, h_emb, h_total = horas[3 * i:3 * i + 3]
+        fila.horas_preparacion = h_prep if fila.inicio_efectivo and fila.fin_preparacion else None
+        fila.horas_embalaje = h_emb if fila.fin_preparacion and fila.fin_embalaje else None
+        fila.horas_total = h_total if fila.inicio_efectivo and fila.fin_despacho else None
+
+    pares_bodega = [
+        (fila.inicio_efectivo, fecha, bodega, fila)
+        for fila, detalles in zip(filas, preparaciones)
+        if fila.inicio_efectivo
+        for bodega, fecha in detalles
+    ]
+    for fila in filas:
+        fila.horas_por_bodega = []
+    if pares_bodega:
+        horas_bodega = horas_laborales_lote(
+            [p[0] for p in pares_bodega], [p[1] for p in pares_bodega]
+        ).tolist()
+        for (_, _, bodega, fila), h in zip(pares_bodega, horas_bodega):
+            fila.horas_por_bodega.append([bodega, h])
+
+
+def recalcular_lead_times(solicitud_ids, bulto_ids=()):
+    """
+    Recalcula (upsert) las filas de lead time de las solicitudes indicadas y
+    de las que comparten bultos con ellas (o tienen alguno de `bulto_ids`):
+    el reparto de kilos cobrables de esos bultos cambia para todas.
+
+    Returns:
+        int: cantidad de filas escritas.
+    """
+    ids = {i for i in solicitud_ids if i}
+    bulto_ids = {i for i in bulto_ids if i}
+    if not ids and not bulto_ids:
+        return 0
+    ids |= solicitudes_con_bultos_compartidos(ids, bulto_ids)
+
+    solicitudes = list(
+        Solicitud.objects
+        .filter(id__in=ids)
+        .prefetch_related('detalles', 'detalles__bulto', 'bultos')
+    )
+    # Mismos bultos precargados: transporte efectivo y transportes involucrados
+    sincronizar_transportes(solicitudes)
+
+    filas = []
+    preparaciones = []
+    for solicitud in solicitudes:
+        fila, detalles_preparados = _construir_fila(solicitud)
+        filas.append(fila)
+        preparaciones.append(detalles_preparados)
+
+    _calcular_horas(filas, preparaciones)
+
+    kilos = kilos_cobrables_por_solicitud(ids)
+    for fila in filas:
+        fila.kilos_cobrables = kilos.get(fila.solicitud_id, Decimal('0.00'))
+
+    # Días de despacho (anterior y nuevo) ya cerrados cuyos rollups quedan obsoletos
+    despachos = list(
+        SolicitudLeadTime.objects.filter(solicitud_id__in=ids).values_list('fin_despacho', flat=True)
+    )
+    despachos += [fila.fin_despacho for fila in filas]
+
+    SolicitudLeadTime.objects.bulk_create(
+        filas,
+        update_conflicts=True,
+        unique_fields=['solicitud'],
+        update_fields=CAMPOS_LEAD_TIME,
+    )
+    invalidar_despachos(despachos)
+    return len(filas)
+
+
+# ============================================================================
+# Programación diferida (una sola pasada por transacción)
+# ============================================================================
+
+_pendientes = threading.local()
+
+
+def programar_recalculo_lead_time(*solicitud_ids, bultos=()):
+    """
+    Agenda el recálculo de lead times para después del commit.
+
+    Varias señales dentro de la misma transacción (p. ej. crear_bulto con muchos
+    detalles) se agrupan en un solo recálculo por solicitud. `bultos` agrega las
+    solicitudes que tengan esos bultos al momento del recálculo (p. ej. el bulto
+    del que salió un detalle).
+    """
+    ids = getattr(_pendientes, 'ids', None)
+    if ids is None:
+        ids = _pendientes.ids = set()
+        _pendientes.bultos = set()
+    ids.update(i for i in solicitud_ids if i)
+    _pendientes.bultos.update(i for i in bultos if i)
+    transaction.on_commit(_procesar_pendientes)
+
+
+def _procesar_pendientes():
+    ids = getattr(_pendientes, 'ids', None)
+    bultos = getattr(_pendientes, 'bultos', None)
+    if not ids and not bultos:
+        return
+    _pendientes.ids = set()
+    _pendientes.bultos = set()
+    try:
+        recalcular_lead_times(ids, bultos)
+    except Exception as e:
+        # El KPI se puede reconstruir con reconstruir_lead_times; no bloquear la operación
+        logger.error(f"Error al recalcular lead times {sorted(ids)}: {e}", exc_info=True)
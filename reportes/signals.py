@@ -0,0 +1,76 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from despacho.models import Bulto
+from solicitudes.models import Solicitud, SolicitudDetalle
+from .models import SolicitudLeadTime
+from .rollups import invalidar_despachos
+from .services import CAMPOS_SOLICITUD_RELEVANTES, programar_recalculo_lead_time
+
+
+@receiver(post_save, sender=Solicitud)
+def solicitud_guardada(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    """
+    Recalcula el lead time en transiciones de estado (Solicitud.save estampa
+    fecha_en_despacho / fecha_listo_despacho / fecha_despachado) y cambios de
+    campos que afectan el KPI.
+    """
+    if raw:
+        return
+    if update_fields is not None and not (set(update_fields) & CAMPOS_SOLICITUD_RELEVANTES):
+        return
+    programar_recalculo_lead_time(instance.pk)
+
+
+@receiver(pre_save, sender=SolicitudDetalle)
+def detalle_por_guardar(sender, instance, raw=False, **kwargs):
+    # Bulto grabado (ver solicitudes.signals): si el detalle sale de un bulto
+    # compartido, cambia el reparto de kilos de las otras solicitudes
+    original = getattr(instance, '_avance_original', None)
+    instance._bulto_lead_time = original[2] if original else None
+
+
+@receiver(post_save, sender=SolicitudDetalle)
+@receiver(post_delete, sender=SolicitudDetalle)
+def detalle_modificado(sender, instance, raw=False, **kwargs):
+    """fecha_preparacion, bodega y bulto del detalle alimentan preparación, embalaje y kilos."""
+    if raw:
+        return
+    programar_recalculo_lead_time(
+        instance.solicitud_id,
+        bultos=(instance.bulto_id, getattr(instance, '_bulto_lead_time', None)),
+    )
+
+
+def _solicitudes_de_bulto(bulto):
+    solicitud_ids = set(
+        SolicitudDetalle.objects
+        .filter(bulto_id=bulto.pk)
+        .values_list('solicitud_id', flat=True)
+    )
+    solicitud_ids.add(bulto.solicitud_id)
+    return solicitud_ids
+
+
+@receiver(pre_delete, sender=Bulto)
+def bulto_por_eliminar(sender, instance, **kwargs):
+    # Al borrar el bulto los detalles quedan con bulto=NULL (SET_NULL): capturar antes
+    instance._solicitudes_lead_time = _solicitudes_de_bulto(instance)
+
+
+@receiver(post_save, sender=Bulto)
+@receiver(post_delete, sender=Bulto)
+def bulto_modificado(sender, instance, raw=False, **kwargs):
+    """fecha_embalaje, estado, transporte y medidas del bulto alimentan embalaje y kilos."""
+    if raw:
+        return
+    solicitud_ids = getattr(instance, '_solicitudes_lead_time', None)
+    if solicitud_ids is None:
+        solicitud_ids = _solicitudes_de_bulto(instance)
+    programar_recalculo_lead_time(*solicitud_ids)
+
+
+@receiver(post_delete, sender=SolicitudLeadTime)
+def lead_time_eliminado(sender, instance, **kwargs):
+    """Al eliminar una solicitud (cascada) su despacho sale de los rollups ya cerrados."""
+    invalidar_despachos([instance.fin_despacho])
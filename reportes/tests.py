@@ -1,3 +1,74 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.db.models import Sum
+from django.utils import timezone
+
+from despacho.models import Bulto
+from solicitudes.models import Solicitud, SolicitudDetalle
+from solicitudes.tests import ContadoresTestCase
+
+from .models import LeadTimeRollup, SolicitudLeadTime
+from .services import kilos_cobrables_por_solicitud
+
+
+class KilosCobrablesTests(ContadoresTestCase):
+
+    def test_bulto_compartido_se_reparte(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            propia = self.crear_solicitud(estado='embalado', lineas=[('A1', '013-01', 1, 'preparado')])
+            otra = self.crear_solicitud(estado='embalado', lineas=[('A2', '013-01', 1, 'preparado')])
+            compartido = Bulto.objects.create(solicitud=propia, peso_total=Decimal('10.00'))
+            Bulto.objects.create(solicitud=propia, peso_total=Decimal('4.00'))
+            for detalle in SolicitudDetalle.objects.all():
+                detalle.bulto = compartido
+                detalle.save()
+
+        self.assertEqual(
+            kilos_cobrables_por_solicitud([propia.pk, otra.pk]),
+            {propia.pk: Decimal('9.00'), otra.pk: Decimal('5.00')},
+        )
+        # Las filas de lead time suman cada bulto una sola vez
+        self.assertEqual(
+            SolicitudLeadTime.objects.aggregate(total=Sum('kilos_cobrables'))['total'],
+            Decimal('14.00'),
+        )
+
+        # Al salir la línea de la otra solicitud, el bulto vuelve entero a la propia
+        with self.captureOnCommitCallbacks(execute=True):
+            detalle = otra.detalles.get()
+            detalle.bulto = None
+            detalle.save()
+        self.assertEqual(
+            dict(SolicitudLeadTime.objects.values_list('solicitud_id', 'kilos_cobrables')),
+            {propia.pk: Decimal('14.00'), otra.pk: Decimal('0.00')},
+        )
+
+
+class RollupsTests(ContadoresTestCase):
+
+    def setUp(self):
+        self.despacho = timezone.now() - timedelta(days=800)
+        self.dia = timezone.localdate(self.despacho)
+        self.solicitud = self.crear_solicitud(estado='despachado')
+        SolicitudLeadTime.objects.update_or_create(
+            solicitud=self.solicitud, defaults={'estado': 'despachado', 'fin_despacho': self.despacho},
+        )
+        lunes = self.dia - timedelta(days=self.dia.weekday())
+        LeadTimeRollup.objects.bulk_create([
+            LeadTimeRollup(granularidad=LeadTimeRollup.GRANULARIDAD_DIA, periodo=self.dia,
+                           metrica=LeadTimeRollup.METRICA_TOTAL, cantidad=1, cerrado=True),
+            LeadTimeRollup(granularidad=LeadTimeRollup.GRANULARIDAD_SEMANA, periodo=lunes,
+                           metrica=LeadTimeRollup.METRICA_TOTAL, cantidad=1, cerrado=True),
+        ])
+
+    def test_eliminar_invalida_dia_cerrado(self):
+        self.solicitud.delete()
+        self.assertFalse(LeadTimeRollup.objects.exists())
+
+    def test_archivar_invalida_dia_cerrado(self):
+        from solicitudes.archivo import archivar, fecha_corte
+
+        Solicitud.objects.filter(pk=self.solicitud.pk).update(fecha_despachado=self.despacho)
+        self.assertEqual(archivar(fecha_corte(12))['lead_times'], 1)
+        self.assertFalse(LeadTimeRollup.objects.exists())
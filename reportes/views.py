@@ -4,14 +4,14 @@ from django.db.models import Q, Prefetch
 from django.core.cache import cache
 from django.utils import timezone
 from datetime import datetime
-import hashlib
-import json
 import pytz
 
 from solicitudes.models import Solicitud, SolicitudDetalle
 from despacho.models import Bulto
 from bodega.models import BodegaTransferencia
 from configuracion.models import TipoSolicitud
+from core.cache_datos import clave_cache
+from solicitudes.archivo import alcanza_archivo, filtrar_archivadas, reconstruir
 
 # Zona horaria de Chile (UTC-4 en verano, UTC-3 en invierno — pytz lo maneja automáticamente)
 CHILE_TZ = pytz.timezone('America/Santiago')
@@ -75,18 +75,15 @@ def informe_completo(request):
     tipo_solicitud = request.GET.get('tipo', '')
     estado = request.GET.get('estado', '')
     
-    # Crear clave de caché única basada en los filtros
-    cache_key_data = {
+    # Clave de caché versionada por datos + filtros (invalidación exacta, ver core.cache_datos)
+    cache_key = clave_cache('informe_completo', {
         'fecha_desde': fecha_desde or 'all',
         'fecha_hasta': fecha_hasta or 'all',
         'tipo': tipo_solicitud or 'all',
         'estado': estado or 'all',
-    }
-    cache_key_str = json.dumps(cache_key_data, sort_keys=True)
-    cache_key_hash = hashlib.md5(cache_key_str.encode()).hexdigest()
-    cache_key = f'informe_completo_{cache_key_hash}'
+    })
     
-    # Intentar obtener del caché (TTL: 10 minutos = 600 segundos)
+    # Intentar obtener del caché
     datos_cache = cache.get(cache_key)
     if datos_cache is not None:
         registros = datos_cache
@@ -96,6 +93,7 @@ def informe_completo(request):
         solicitudes_qs = Solicitud.objects.all().select_related('solicitante')
         
         # Aplicar filtros
+        fecha_desde_dt = fecha_hasta_dt = None
         if fecha_desde:
             try:
                 fecha_desde_dt = datetime.strptime(fecha_desde, '%Y-%m-%d').date()
@@ -147,6 +145,19 @@ def informe_completo(request):
             bultos_prefetch
         ).order_by('-fecha_solicitud', '-hora_solicitud')
         
+        # Si el rango llega al archivo histórico, sus solicitudes se reconstruyen
+        # con la misma forma (detalles_list, bultos_list) y se intercalan por fecha
+        if alcanza_archivo(fecha_desde_dt, campo='fecha_solicitud'):
+            archivadas = [
+                reconstruir(archivada)
+                for archivada in filtrar_archivadas(fecha_desde_dt, fecha_hasta_dt, tipo_solicitud, estado)
+            ]
+            solicitudes = sorted(
+                list(solicitudes) + archivadas,
+                key=lambda s: (s.fecha_solicitud, s.hora_solicitud),
+                reverse=True,
+            )
+        
         # Construir lista de registros (uno por detalle)
         registros = []
         
@@ -295,8 +306,8 @@ def informe_completo(request):
         
         total_registros = len(registros)
         
-        # Guardar en caché por 10 minutos
-        cache.set(cache_key, registros, 600)
+        # Guardar en caché: una nueva versión de datos la deja obsoleta, el TTL solo libera espacio
+        cache.set(cache_key, registros, 3600)
     
     # Obtener opciones para filtros
     tipos_activos = TipoSolicitud.activos()
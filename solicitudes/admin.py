@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Solicitud, SolicitudDetalle
+from .models import Solicitud, SolicitudArchivada, SolicitudDetalle
 
 
 class SolicitudDetalleInline(admin.TabularInline):
@@ -47,3 +47,20 @@ class SolicitudAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         qs = super().get_queryset(request)
         return qs.select_related('solicitante')
+
+
+@admin.register(SolicitudArchivada)
+class SolicitudArchivadaAdmin(admin.ModelAdmin):
+    """
+    Consulta del archivo histórico (solo lectura, ver solicitudes.archivo)
+    """
+    list_display = ('id', 'fecha_solicitud', 'cliente', 'numero_pedido', 'estado', 'cerrada_en', 'archivada_en')
+    list_filter = ('estado', 'tipo')
+    search_fields = ('numero_pedido', 'numero_st', 'cliente')
+    date_hierarchy = 'fecha_solicitud'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
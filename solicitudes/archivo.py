@@ -0,0 +1,282 @@
+"""
+Archivo histórico de solicitudes cerradas.
+
+Las vistas operativas filtran `solicitudes` y `solicitudes_detalle` por
+estado, y la historia crece sin límite: índices como idx_estado_id o
+idx_fecha_hora engordan y las consultas de estados activos cargan con años
+de pedidos cerrados.
+
+archivar() mueve las solicitudes despachadas o canceladas antes de una fecha
+de corte, con sus detalles, bultos, transferencias y reservas, a
+solicitudes_archivo (una fila por solicitud con las filas originales en
+JSON), y su lead time a kpi_lead_time_solicitud_archivo. Así las tablas
+vigentes quedan del tamaño del trabajo en curso.
+
+Los reportes leen el archivo solo si el rango de fechas lo alcanza
+(alcanza_archivo()): rollups y dashboard de KPI, informe completo y
+exportación de KPIs.
+"""
+
+import calendar
+import logging
+from collections import Counter, defaultdict
+from datetime import date, datetime, time
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import contadores
+from .models import Solicitud, SolicitudArchivada, SolicitudDetalle, SolicitudTransporte
+
+logger = logging.getLogger(__name__)
+
+ESTADOS_ARCHIVABLES = ('despachado', 'cancelado')
+LOTE = 500
+
+
+def fecha_corte(meses, ahora=None):
+    """Inicio del día, hace `meses` meses (hora Chile)."""
+    hoy = timezone.localdate(ahora)
+    indice = hoy.year * 12 + hoy.month - 1 - meses
+    anio, mes = divmod(indice, 12)
+    mes += 1
+    dia = min(hoy.day, calendar.monthrange(anio, mes)[1])
+    return timezone.make_aware(datetime.combine(date(anio, mes, dia), time.min))
+
+
+def archivables(corte):
+    """Solicitudes cerradas antes de `corte` (despacho, o última actualización si no lo tienen)."""
+    return (
+        Solicitud.objects
+        .filter(estado__in=ESTADOS_ARCHIVABLES)
+        .annotate(cerrada_en=Coalesce('fecha_despachado', 'updated_at'))
+        .filter(cerrada_en__lt=corte)
+    )
+
+
+def alcanza_archivo(desde=None, campo='cerrada_en'):
+    """
+    True si un rango que empieza en `desde` (None = sin límite) incluye
+    solicitudes archivadas. `campo`: 'cerrada_en' (el fin_despacho del lead
+    time) o 'fecha_solicitud'. Una consulta sobre índice.
+    """
+    archivadas = SolicitudArchivada.objects.all()
+    if desde is not None:
+        archivadas = archivadas.filter(**{f'{campo}__gte': desde})
+    return archivadas.exists()
+
+
+def archivar(corte, lote=LOTE, maximo=None):
+    """
+    Mueve al archivo las solicitudes cerradas antes de `corte`, una
+    transacción por cada `lote` solicitudes (se puede interrumpir y retomar).
+
+    Returns:
+        dict con la cantidad de solicitudes, detalles, bultos, transferencias,
+        reservas y lead_times archivados.
+    """
+    totales = Counter()
+    while maximo is None or totales['solicitudes'] < maximo:
+        tamano = lote if maximo is None else min(lote, maximo - totales['solicitudes'])
+        movidos = _archivar_lote(corte, tamano)
+        if not movidos['solicitudes']:
+            break
+        totales.update(movidos)
+
+    if totales['solicitudes']:
+        from core.cache_datos import invalidar_cache_datos
+
+        invalidar_cache_datos()
+    logger.info(f"Archivo de solicitudes cerradas antes de {corte:%Y-%m-%d}: {dict(totales)}")
+    return {clave: totales[clave] for clave in (
+        'solicitudes', 'detalles', 'bultos', 'transferencias', 'reservas', 'lead_times'
+    )}
+
+
+def _archivar_lote(corte, tamano):
+    from bodega.models import BodegaTransferencia, StockReserva
+    from despacho.models import Bulto
+    from reportes.models import SolicitudLeadTime, SolicitudLeadTimeArchivada
+    from reportes.rollups import invalidar_despachos
+
+    from .services import recontar_transportes_en_uso
+
+    with transaction.atomic():
+        ids = list(
+            archivables(corte)
+            .select_for_update()
+            .order_by('pk')
+            .values_list('pk', flat=True)[:tamano]
+        )
+        if not ids:
+            return Counter()
+
+        solicitudes = {fila['id']: fila for fila in Solicitud.objects.filter(pk__in=ids).values()}
+        detalles = list(SolicitudDetalle.objects.filter(solicitud_id__in=ids).values())
+        del_lote = Q(solicitud_id__in=ids) | Q(detalle__solicitud_id__in=ids)
+        reservas = list(StockReserva.objects.filter(del_lote).values())
+        transferencias = list(BodegaTransferencia.objects.filter(del_lote).values())
+
+        # Un bulto puede llevar líneas de varias solicitudes: se archiva solo si
+        # todas son del lote; si no, queda vigente (y en el archivo, una copia)
+        referencias = defaultdict(set)
+        for detalle in detalles:
+            if detalle['bulto_id']:
+                referencias[detalle['bulto_id']].add(detalle['solicitud_id'])
+        bultos = {
+            fila['id']: fila
+            for fila in Bulto.objects.filter(Q(pk__in=referencias) | Q(solicitud_id__in=ids)).values()
+        }
+        for bulto in bultos.values():
+            if bulto['solicitud_id']:
+                referencias[bulto['id']].add(bulto['solicitud_id'])
+        compartidos = {
+            pk for pk, solicitud_ids in referencias.items() if not solicitud_ids <= solicitudes.keys()
+        }
+        compartidos.update(
+            SolicitudDetalle.objects
+            .filter(bulto_id__in=bultos)
+            .exclude(solicitud_id__in=ids)
+            .values_list('bulto_id', flat=True)
+        )
+
+        documentos = {
+            pk: {'solicitud': fila, 'detalles': [], 'bultos': [], 'transferencias': [], 'reservas': []}
+            for pk, fila in solicitudes.items()
+        }
+        for detalle in detalles:
+            documentos[detalle['solicitud_id']]['detalles'].append(detalle)
+        for pk, bulto in bultos.items():
+            for solicitud_id in referencias[pk] & solicitudes.keys():
+                documentos[solicitud_id]['bultos'].append(bulto)
+        # Reservas y transferencias van con la solicitud de su detalle
+        dueno = {detalle['id']: detalle['solicitud_id'] for detalle in detalles}
+        for clave, filas in (('transferencias', transferencias), ('reservas', reservas)):
+            for fila in filas:
+                documentos[dueno.get(fila['detalle_id'], fila['solicitud_id'])][clave].append(fila)
+
+        SolicitudArchivada.objects.bulk_create([
+            SolicitudArchivada(
+                id=pk,
+                fecha_solicitud=fila['fecha_solicitud'],
+                tipo=fila['tipo'],
+                estado=fila['estado'],
+                urgente=fila['urgente'],
+                cliente=fila['cliente'],
+                numero_pedido=fila['numero_pedido'],
+                numero_st=fila['numero_st'],
+                numero_guia_despacho=fila['numero_guia_despacho'],
+                cerrada_en=fila['fecha_despachado'] or fila['updated_at'],
+                texto_busqueda=fila['texto_busqueda'],
+                datos=documentos[pk],
+            )
+            for pk, fila in solicitudes.items()
+        ])
+
+        sucursales = dict(
+            Solicitud.objects
+            .filter(pk__in=ids, cliente_canonico__isnull=False)
+            .values_list('pk', 'cliente_canonico__nombre')
+        )
+        lead_times = list(SolicitudLeadTime.objects.filter(solicitud_id__in=ids).values())
+        SolicitudLeadTimeArchivada.objects.bulk_create([
+            SolicitudLeadTimeArchivada(sucursal=sucursales.get(fila['solicitud_id'], ''), **fila)
+            for fila in lead_times
+        ])
+        # Los días cerrados de esos despachos se vuelven a materializar desde el archivo
+        invalidar_despachos(fila['fin_despacho'] for fila in lead_times)
+
+        transportes = set(
+            SolicitudTransporte.objects.filter(solicitud_id__in=ids).values_list('transporte', flat=True)
+        )
+
+        # Borrado directo (sin señales ni collector, en orden de FKs): las
+        # señales de delete liberarían reservas y recalcularían lead times y
+        # avance de filas que se van; los contadores se ajustan abajo
+        reserva_ids = [fila['id'] for fila in reservas]
+        _borrar(BodegaTransferencia.objects.filter(pk__in=[fila['id'] for fila in transferencias]))
+        BodegaTransferencia.objects.filter(reserva_id__in=reserva_ids).update(reserva=None)
+        _borrar(StockReserva.objects.filter(pk__in=reserva_ids))
+        Bulto.objects.filter(pk__in=compartidos, solicitud_id__in=ids).update(solicitud=None)
+        _borrar(SolicitudDetalle.objects.filter(solicitud_id__in=ids))
+        _borrar(Bulto.objects.filter(pk__in=bultos.keys() - compartidos))
+        _borrar(SolicitudTransporte.objects.filter(solicitud_id__in=ids))
+        _borrar(SolicitudLeadTime.objects.filter(solicitud_id__in=ids))
+        _borrar(Solicitud.objects.filter(pk__in=ids))
+
+        # Los contadores por bodega solo cuentan pendientes: no cambian
+        contadores.ajustar_solicitudes(((fila['estado'], fila['urgente']), None) for fila in solicitudes.values())
+        recontar_transportes_en_uso(transportes)
+
+    return Counter({
+        'solicitudes': len(solicitudes),
+        'detalles': len(detalles),
+        'bultos': len(bultos.keys() - compartidos),
+        'transferencias': len(transferencias),
+        'reservas': len(reservas),
+        'lead_times': len(lead_times),
+    })
+
+
+def _borrar(queryset):
+    return queryset._raw_delete(queryset.db)
+
+
+# ============================================================================
+# Lectura del archivo
+# ============================================================================
+
+def filtrar_archivadas(fecha_desde=None, fecha_hasta=None, tipo='', estado=''):
+    """Solicitudes archivadas con los mismos filtros del informe completo."""
+    queryset = SolicitudArchivada.objects.all()
+    if fecha_desde:
+        queryset = queryset.filter(fecha_solicitud__gte=fecha_desde)
+    if fecha_hasta:
+        queryset = queryset.filter(fecha_solicitud__lte=fecha_hasta)
+    if tipo:
+        queryset = queryset.filter(tipo=tipo)
+    if estado:
+        queryset = queryset.filter(estado=estado)
+    return queryset
+
+
+def reconstruir(archivada):
+    """
+    Instancias sin guardar de una solicitud archivada, con la forma que dejan
+    los prefetch del informe completo: solicitud.detalles_list (cada detalle
+    con .bulto y .transferencias_list) y solicitud.bultos_list.
+    """
+    from bodega.models import BodegaTransferencia
+    from despacho.models import Bulto
+
+    datos = archivada.datos
+    solicitud = _instancia(Solicitud, datos['solicitud'])
+    bultos = {fila['id']: _instancia(Bulto, fila) for fila in datos.get('bultos', [])}
+    transferencias = defaultdict(list)
+    for fila in datos.get('transferencias', []):
+        transferencias[fila['detalle_id']].append(_instancia(BodegaTransferencia, fila))
+
+    solicitud.detalles_list = []
+    for fila in datos.get('detalles', []):
+        detalle = _instancia(SolicitudDetalle, fila)
+        if detalle.bulto_id in bultos:
+            detalle.bulto = bultos[detalle.bulto_id]
+        detalle.transferencias_list = sorted(
+            transferencias[detalle.pk],
+            key=lambda t: (t.fecha_transferencia, t.hora_transferencia),
+            reverse=True,
+        )
+        solicitud.detalles_list.append(detalle)
+    solicitud.bultos_list = sorted(bultos.values(), key=lambda b: b.fecha_creacion, reverse=True)
+    return solicitud
+
+
+def _instancia(modelo, fila):
+    campos = {campo.attname: campo for campo in modelo._meta.concrete_fields if not campo.generated}
+    return modelo(**{
+        nombre: campos[nombre].to_python(valor)
+        for nombre, valor in fila.items()
+        if nombre in campos
+    })
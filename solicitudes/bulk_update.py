@@ -3,13 +3,21 @@ Actualización masiva de solicitudes desde Excel (base bruta despacho).
 Mapea columnas del archivo de la empresa y actualiza estado, guía, transporte, OT, etc.
 """
 
-import pandas as pd
+from collections import defaultdict
 from io import BytesIO
 from datetime import datetime
 from decimal import Decimal
-from typing import Dict, List, Any, Optional, Tuple
+from typing import TYPE_CHECKING, Dict, List, Any, Optional, Tuple
 from django.utils import timezone
 
+# pandas se importa dentro de las funciones que lo usan: importar este módulo
+# (lo hacen las vistas y las URLs) no debe cargarlo en cada worker.
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Solicitudes por transacción al aplicar cambios de estado
+LOTE_ESTADO = 200
+
 # Mapeo de columnas Excel (variaciones posibles)
 COLUMNAS_EXCEL = {
     'fecha': ['fecha', 'Fecha'],
@@ -33,7 +41,7 @@ COLUMNAS_EXCEL = {
 }
 
 
-def _find_column(df: pd.DataFrame, aliases: List[str]) -> Optional[str]:
+def _find_column(df: 'pd.DataFrame', aliases: List[str]) -> Optional[str]:
     """Encuentra la columna que coincida con alguno de los alias."""
     cols = [c.strip() for c in df.columns]
     for alias in aliases:
@@ -45,6 +53,8 @@ def _find_column(df: pd.DataFrame, aliases: List[str]) -> Optional[str]:
 
 def _normalizar_estado(estatus: Any) -> Optional[str]:
     """Mapea ESTATUS del Excel a estado del sistema."""
+    import pandas as pd
+
     if estatus is None or (isinstance(estatus, float) and pd.isna(estatus)):
         return None
     s = str(estatus).strip().upper()
@@ -69,6 +79,8 @@ def _normalizar_tipo(pc_of: Any) -> Optional[str]:
     Mapea 'PC / OF' del Excel al tipo del sistema.
     PC y OF pueden compartir el mismo número; el tipo los distingue.
     """
+    import pandas as pd
+
     if pc_of is None or (isinstance(pc_of, float) and pd.isna(pc_of)):
         return None
     t = str(pc_of).strip().upper()
@@ -86,33 +98,22 @@ def _normalizar_tipo(pc_of: Any) -> Optional[str]:
 
 
 def _normalizar_transporte(transporte: Any) -> Optional[str]:
-    """Mapea Transporte del Excel a slug del sistema."""
+    """
+    Mapea Transporte del Excel a slug del sistema (índice de TransporteConfig).
+    Retorna None si está vacío o no corresponde a ningún transporte activo.
+    """
+    import pandas as pd
+    from configuracion.models import TransporteConfig
+
     if transporte is None or (isinstance(transporte, float) and pd.isna(transporte)):
         return None
-    t = str(transporte).strip().upper()
-    mapa = {
-        'CAMION PESCO': 'PESCO',
-        'CAMION PESCO ': 'PESCO',
-        'PESCO': 'PESCO',
-        'STARKEN': 'STARKEN',
-        'STARKEN ': 'STARKEN',
-        'ESTAFETA': 'ESTAFETA',
-        'RETIRA CLIENTE': 'RETIRA_CLIENTE',
-        'VARMONTT': 'VARMONTT',
-        'KAIZEN': 'KAIZEN',
-        'KAIZEN ': 'KAIZEN',
-        'AV LOGISTICA': 'OTRO',
-        'GEOMAIL': 'OTRO',
-        'EXPORTACION': 'OTRO',
-    }
-    for k, v in mapa.items():
-        if k in t or t == k:
-            return v
-    return 'OTRO' if t else None
+    return TransporteConfig.resolver(str(transporte))
 
 
 def _to_date(val) -> Optional[datetime]:
     """Convierte valor a fecha."""
+    import pandas as pd
+
     if val is None or (isinstance(val, float) and pd.isna(val)):
         return None
     if isinstance(val, datetime):
@@ -130,6 +131,8 @@ def _fechas_posibles(fecha_val) -> List:
     Retorna lista de fechas posibles por ambigüedad DD/MM vs MM/DD.
     Excel 2/12 puede ser 2-dic (Chile) o 12-feb (US). Probamos ambas.
     """
+    import pandas as pd
+
     fechas = []
     if fecha_val is None or (isinstance(fecha_val, float) and pd.isna(fecha_val)):
         return fechas
@@ -148,6 +151,8 @@ def procesar_excel_bruto(archivo_bytes: bytes) -> Tuple[List[Dict], List[str]]:
     Lee el Excel y agrupa por pedido (numero + fecha + cliente).
     Retorna lista de diccionarios con datos a actualizar y lista de errores.
     """
+    import pandas as pd
+
     try:
         df = pd.read_excel(BytesIO(archivo_bytes))
     except Exception as e:
@@ -242,48 +247,38 @@ def procesar_excel_bruto(archivo_bytes: bytes) -> Tuple[List[Dict], List[str]]:
     return list(pedidos.values()), errores
 
 
-def _crear_bulto_si_falta(solicitud, transporte: str = 'PESCO') -> bool:
+def _crear_bultos_faltantes(transportes: Dict[int, str]) -> int:
     """
-    Si la solicitud no tiene bultos, crea uno y asigna todos los detalles.
-    Retorna True si se creó.
+    Crea un bulto 'listo_despacho' con todos los detalles para cada solicitud
+    de `transportes` ({solicitud_id: transporte}) que no tenga bultos.
+    Retorna cuántos se crearon.
     """
+    from django.db.models import Case, Value, When
     from despacho.models import Bulto
+    from solicitudes import contadores
+    from solicitudes.models import SolicitudDetalle
 
-    if Bulto.objects.filter(solicitud=solicitud).exists():
-        return False
-    bulto = Bulto.objects.create(
-        solicitud=solicitud,
-        transportista=transporte,
-        estado='listo_despacho',
-        creado_por=None,
+    con_bulto = set(
+        Bulto.objects.filter(solicitud_id__in=transportes).values_list('solicitud_id', flat=True)
     )
-    solicitud.detalles.all().update(bulto=bulto)
-    return True
-
-
-def _aplicar_despacho_completo(solicitud, transporte: str = 'PESCO') -> bool:
-    """
-    Aplica la lógica completa de despacho: crear bulto si falta, finalizar bultos, descontar stock.
-    Retorna True si se procesó correctamente.
-    """
-    from despacho.models import Bulto
-    from solicitudes.services import descontar_stock_despachado
-
-    if solicitud.estado != 'despachado':
-        return False
-    _crear_bulto_si_falta(solicitud, transporte)
-    bultos = Bulto.objects.filter(solicitud=solicitud)
-    ahora = timezone.now()
-    for bulto in bultos:
-        bulto.estado = 'finalizado'
-        if not bulto.fecha_entrega:
-            bulto.fecha_entrega = ahora
-        if not bulto.fecha_envio:
-            bulto.fecha_envio = ahora
-        bulto.save(update_fields=['estado', 'fecha_entrega', 'fecha_envio'])
-    solicitud.detalles.filter(bulto__isnull=False).exclude(estado_bodega='preparado').update(estado_bodega='preparado')
-    descontar_stock_despachado(solicitud)
-    return True
+    faltan = sorted(set(transportes) - con_bulto)
+    if not faltan:
+        return 0
+    codigos = Bulto.generar_codigos(len(faltan))
+    bultos = Bulto.objects.bulk_create([
+        Bulto(
+            solicitud_id=solicitud_id,
+            codigo=codigo,
+            transportista=transportes[solicitud_id],
+            estado='listo_despacho',
+        )
+        for solicitud_id, codigo in zip(faltan, codigos)
+    ])
+    SolicitudDetalle.objects.filter(solicitud_id__in=faltan).update(
+        bulto_id=Case(*[When(solicitud_id=b.solicitud_id, then=Value(b.pk)) for b in bultos])
+    )
+    contadores.recalcular_avance(faltan)
+    return len(bultos)
 
 
 def _normalizar_bodega(val: Any) -> str:
@@ -371,8 +366,7 @@ def ejecutar_fase_bodega(archivo_bytes: bytes) -> Dict[str, Any]:
                     detalles_preparados += 1
 
                 solicitud.refresh_from_db()
-                pendientes = solicitud.detalles.exclude(bodega='013').exclude(estado_bodega='preparado')
-                if not pendientes.exists():
+                if solicitud.lineas_por_preparar == 0:
                     solicitud.estado = 'en_despacho'
                     solicitud.save(update_fields=['estado'])
                     solicitudes_pasadas.add(solicitud.id)
@@ -391,7 +385,10 @@ def ejecutar_actualizacion_masiva(archivo_bytes: bytes, solo_despachados: bool =
     solo_despachados: si True, solo procesa filas con ESTATUS/STATUS = ENTREGADO/DESPACHADO.
     Retorna { actualizados: int, no_encontrados: [], errores: [] }
     """
+    from django.db import DatabaseError, transaction
     from solicitudes.models import Solicitud
+    from solicitudes.services import SolicitudServiceError
+    from solicitudes.transiciones import cambiar_estado
 
     pedidos, errores = procesar_excel_bruto(archivo_bytes)
     if solo_despachados:
@@ -399,9 +396,17 @@ def ejecutar_actualizacion_masiva(archivo_bytes: bytes, solo_despachados: bool =
     if errores:
         return {'actualizados': 0, 'no_encontrados': [], 'errores': errores}
 
-    actualizados = 0
+    actualizados = set()
     no_encontrados = []
-
+    transportes_desconocidos = set()
+    # Los cambios de estado se aplican al final, por conjunto (transiciones.cambiar_estado)
+    por_estado = defaultdict(list)
+    transportes_bulto = {}
+    sin_stock_013 = set()
+
+    # Sin transacción envolvente: cada fila graba guía/transporte/OT por su
+    # cuenta y cada lote de cambios de estado en una transacción corta, para no
+    # retener el correlativo de bultos ni el stock de 013 toda la importación
     for ped in pedidos:
         numero = ped['numero']
         tipo = ped.get('tipo', 'PC')
@@ -448,41 +453,62 @@ def ejecutar_actualizacion_masiva(archivo_bytes: bytes, solo_despachados: bool =
         nuevo_estado = estatus_val or status_val
 
         # Aplicar actualizaciones
-        cambiado = False
+        campos = []
         if nuevo_estado and solicitud.estado != nuevo_estado:
-            solicitud.estado = nuevo_estado
-            cambiado = True
+            por_estado[nuevo_estado].append(solicitud.pk)
+            if nuevo_estado == 'despachado':
+                transportes_bulto[solicitud.pk] = _normalizar_transporte(ped.get('transporte')) or 'PESCO'
 
         guia = ped.get('guia')
         if guia and solicitud.numero_guia_despacho != str(guia):
             solicitud.numero_guia_despacho = str(guia)[:100]
-            cambiado = True
+            campos.append('numero_guia_despacho')
 
         transporte = _normalizar_transporte(ped.get('transporte'))
+        if not transporte and ped.get('transporte'):
+            # Se informa en vez de mapearlo a un transporte cualquiera
+            transportes_desconocidos.add(str(ped['transporte']).strip())
         if transporte and solicitud.transporte != transporte:
             solicitud.transporte = transporte
-            cambiado = True
+            campos.append('transporte')
 
         ot = ped.get('ot')
         if ot and str(solicitud.numero_ot) != str(ot):
             solicitud.numero_ot = str(ot)[:100]
-            cambiado = True
-
-        if cambiado:
-            solicitud.save()
-            if nuevo_estado == 'despachado':
-                try:
-                    transp = _normalizar_transporte(ped.get('transporte')) or 'PESCO'
-                    _aplicar_despacho_completo(solicitud, transporte=transp)
-                except Exception:
-                    pass  # Log but don't fail the batch
-            actualizados += 1
+            campos.append('numero_ot')
+
+        if campos:
+            try:
+                solicitud.save(update_fields=campos + ['updated_at'])
+            except DatabaseError as e:
+                errores.append(f"No se pudo actualizar {tipo} {numero}: {e}")
+            else:
+                actualizados.add(solicitud.pk)
+
+    for estado, ids in por_estado.items():
+        for inicio in range(0, len(ids), LOTE_ESTADO):
+            lote = ids[inicio:inicio + LOTE_ESTADO]
+            try:
+                with transaction.atomic():
+                    if estado == 'despachado':
+                        _crear_bultos_faltantes({pk: transportes_bulto[pk] for pk in lote})
+                    reporte = cambiar_estado(lote, estado)
+            except (SolicitudServiceError, DatabaseError) as e:
+                # El lote se revierte entero (bultos creados incluidos); el resto sigue
+                errores.append(f"No se pudo pasar {len(lote)} solicitud(es) a '{estado}': {e}")
+                continue
+            for pk, fila in reporte.items():
+                if fila['cambio']:
+                    actualizados.add(pk)
+                sin_stock_013.update(fila['sin_stock_013'])
 
     return {
-        'actualizados': actualizados,
+        'actualizados': len(actualizados),
         'no_encontrados': no_encontrados[:50],
         'total_no_encontrados': len(no_encontrados),
         'errores': errores,
+        'transportes_desconocidos': sorted(transportes_desconocidos),
+        'sin_stock_013': sorted(sin_stock_013),
         'total_procesados': len(pedidos)
     }
 
@@ -501,4 +527,6 @@ def ejecutar_completo(archivo_bytes: bytes, solo_despachados: bool = False) -> D
         'detalles_preparados': resultado_bodega.get('detalles_preparados', 0),
         'solicitudes_en_despacho': resultado_bodega.get('solicitudes_en_despacho', 0),
         'actualizados': resultado_despacho.get('actualizados', 0),
+        'transportes_desconocidos': resultado_despacho.get('transportes_desconocidos', []),
+        'sin_stock_013': resultado_despacho.get('sin_stock_013', []),
     }
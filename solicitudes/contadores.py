@@ -0,0 +1,275 @@
+"""
+Contadores por estado mantenidos por señales (tarjetas KPI del dashboard).
+
+- ContadorSolicitudes: solicitudes por (estado, urgente).
+- ContadorBodega: solicitudes pendientes con líneas en (bodega, estado_bodega).
+- Avance de cada solicitud (Solicitud.lineas_*): líneas totales, preparadas,
+  embaladas y por preparar, para decidir el cambio de estado sin consultar
+  sus detalles.
+
+Los ajustes son incrementos F() dentro de la transacción del save/delete que
+los origina. Lo que no pasa por señales (QuerySet.update, SQL directo) se
+corrige con `python manage.py reconciliar_contadores`.
+"""
+
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import ContadorBodega, ContadorSolicitudes, Solicitud, SolicitudDetalle
+
+
+BODEGA_DESPACHO = '013'  # No requiere preparación de bodega
+
+
+def _ajustar(modelo, deltas):
+    for clave, delta in deltas.items():
+        if not delta:
+            continue
+        filtro = dict(clave)
+        if not modelo.objects.filter(**filtro).update(total=F('total') + delta):
+            fila, _ = modelo.objects.get_or_create(**filtro)
+            modelo.objects.filter(pk=fila.pk).update(total=F('total') + delta)
+
+
+def _clave_solicitud(estado, urgente):
+    return (('estado', estado), ('urgente', bool(urgente)))
+
+
+def _clave_bodega(bodega, estado_bodega):
+    return (('bodega', bodega), ('estado_bodega', estado_bodega))
+
+
+# ============================================================================
+# Solicitudes por (estado, urgente)
+# ============================================================================
+
+def estado_actual_solicitud(solicitud_id):
+    """(estado, urgente) grabado en la base, o None si la solicitud no existe."""
+    if solicitud_id is None:
+        return None
+    return Solicitud.objects.filter(pk=solicitud_id).values_list('estado', 'urgente').first()
+
+
+def ajustar_solicitud(anterior, nuevo):
+    """Mueve una solicitud entre claves; anterior/nuevo son (estado, urgente) o None."""
+    ajustar_solicitudes([(anterior, nuevo)])
+
+
+def ajustar_solicitudes(movimientos):
+    """Como ajustar_solicitud para varias solicitudes: [(anterior, nuevo), ...]."""
+    deltas = Counter()
+    for anterior, nuevo in movimientos:
+        if anterior == nuevo:
+            continue
+        if anterior is not None:
+            deltas[_clave_solicitud(*anterior)] -= 1
+        if nuevo is not None:
+            deltas[_clave_solicitud(*nuevo)] += 1
+    _ajustar(ContadorSolicitudes, deltas)
+
+
+# ============================================================================
+# Solicitudes pendientes por (bodega, estado_bodega)
+# ============================================================================
+
+def _consultar_claves_bodega(solicitud_id):
+    return set(
+        SolicitudDetalle.objects
+        .filter(solicitud_id=solicitud_id, solicitud__estado='pendiente')
+        .values_list('bodega', 'estado_bodega')
+        .distinct()
+    )
+
+
+def capturar_bodega(solicitud_id, portador):
+    """
+    Llamar antes de modificar detalles (o el estado) de la solicitud.
+
+    `portador` guarda el "antes" hasta ajustar_bodega: el objeto guardado o,
+    en deletes, el origen del delete. Un delete en cascada envía todos los
+    pre_delete antes de los post_delete; al compartir el origen, el "antes"
+    se captura una sola vez por solicitud y no se resta dos veces.
+    """
+    conocidas = portador.__dict__.setdefault('_claves_bodega', {})
+    if solicitud_id not in conocidas:
+        conocidas[solicitud_id] = _consultar_claves_bodega(solicitud_id)
+
+
+def ajustar_bodega(solicitud_id, portador):
+    """Llamar después de la modificación: aplica la diferencia con lo capturado."""
+    conocidas = portador.__dict__.setdefault('_claves_bodega', {})
+    antes = conocidas.pop(solicitud_id, set())
+    despues = _consultar_claves_bodega(solicitud_id)
+    if antes != despues:
+        deltas = Counter()
+        for clave in antes - despues:
+            deltas[_clave_bodega(*clave)] -= 1
+        for clave in despues - antes:
+            deltas[_clave_bodega(*clave)] += 1
+        _ajustar(ContadorBodega, deltas)
+
+
+def claves_bodega(solicitud_ids):
+    """
+    Counter {(bodega, estado_bodega): n° de solicitudes} de las pendientes entre
+    solicitud_ids, en una consulta. Para cambios por conjunto: contar antes y
+    después y aplicar la diferencia con ajustar_bodega_conjunto().
+    """
+    filas = (
+        SolicitudDetalle.objects
+        .filter(solicitud_id__in=solicitud_ids, solicitud__estado='pendiente')
+        .values_list('solicitud_id', 'bodega', 'estado_bodega')
+        .order_by()
+        .distinct()
+    )
+    return Counter((bodega, estado_bodega) for _, bodega, estado_bodega in filas)
+
+
+def ajustar_bodega_conjunto(antes, despues):
+    deltas = Counter()
+    for clave in set(antes) | set(despues):
+        deltas[_clave_bodega(*clave)] = despues.get(clave, 0) - antes.get(clave, 0)
+    _ajustar(ContadorBodega, deltas)
+
+
+# ============================================================================
+# Avance de líneas por solicitud (Solicitud.lineas_*)
+# ============================================================================
+
+def aporte_avance(estado_bodega, bulto_id, bodega):
+    """Lo que suma una línea a cada contador de avance de su solicitud."""
+    preparado = estado_bodega == 'preparado'
+    return {
+        'lineas_total': 1,
+        'lineas_preparadas': int(preparado),
+        'lineas_embaladas': int(bulto_id is not None),
+        'lineas_por_preparar': int(bodega != BODEGA_DESPACHO and not preparado),
+    }
+
+
+def ajustar_avance(anterior, nuevo):
+    """
+    Aplica con F() la diferencia entre dos valores de una línea;
+    anterior/nuevo son SolicitudDetalle.valores_avance() o None.
+    """
+    if anterior == nuevo:
+        return
+    deltas = defaultdict(Counter)
+    for valores, signo in ((anterior, -1), (nuevo, 1)):
+        if valores is None:
+            continue
+        solicitud_id, *resto = valores
+        for campo, n in aporte_avance(*resto).items():
+            deltas[solicitud_id][campo] += signo * n
+    for solicitud_id, cambios in deltas.items():
+        cambios = {campo: F(campo) + n for campo, n in cambios.items() if n}
+        if solicitud_id is not None and cambios:
+            Solicitud.objects.filter(pk=solicitud_id).update(**cambios)
+
+
+def _avance_real():
+    """Expresiones que cuentan los detalles de cada solicitud (subconsultas)."""
+    detalles = SolicitudDetalle.objects.filter(solicitud=OuterRef('pk')).order_by().values('solicitud')
+
+    def contar(condicion=Q()):
+        return Coalesce(Subquery(detalles.filter(condicion).annotate(n=Count('pk')).values('n')), 0)
+
+    return {
+        'lineas_total': contar(),
+        'lineas_preparadas': contar(Q(estado_bodega='preparado')),
+        'lineas_embaladas': contar(Q(bulto__isnull=False)),
+        'lineas_por_preparar': contar(~Q(bodega=BODEGA_DESPACHO) & ~Q(estado_bodega='preparado')),
+    }
+
+
+def recalcular_avance(solicitud_ids=None):
+    """
+    Recalcula el avance desde los detalles en un solo UPDATE. Usar después de
+    modificar detalles con QuerySet.update() (no pasa por señales).
+    """
+    solicitudes = Solicitud.objects.all()
+    if solicitud_ids is not None:
+        solicitudes = solicitudes.filter(pk__in=solicitud_ids)
+    return solicitudes.update(**_avance_real())
+
+
+def avance_desfasado():
+    """Ids de solicitudes cuyo avance grabado no coincide con sus detalles."""
+    reales = {f'real_{campo}': expresion for campo, expresion in _avance_real().items()}
+    distinto = Q()
+    for campo in Solicitud.CAMPOS_AVANCE:
+        distinto |= ~Q(**{campo: F(f'real_{campo}')})
+    return list(Solicitud.objects.annotate(**reales).filter(distinto).values_list('pk', flat=True))
+
+
+# ============================================================================
+# Lectura y reconciliación
+# ============================================================================
+
+def conteos_por_estado():
+    """{estado: {'total': n, 'urgentes': n}} desde la tabla de contadores."""
+    conteos = {}
+    for estado, urgente, total in ContadorSolicitudes.objects.values_list('estado', 'urgente', 'total'):
+        fila = conteos.setdefault(estado, {'total': 0, 'urgentes': 0})
+        fila['total'] += total
+        if urgente:
+            fila['urgentes'] += total
+    return conteos
+
+
+def total_solicitudes(estados=None, solo_urgentes=False):
+    """Cantidad de solicitudes en los estados indicados (todas si es None)."""
+    filas = ContadorSolicitudes.objects.all()
+    if estados is not None:
+        filas = filas.filter(estado__in=estados)
+    if solo_urgentes:
+        filas = filas.filter(urgente=True)
+    return filas.aggregate(total=Sum('total'))['total'] or 0
+
+
+def pendientes_en_bodega(bodega, estado_bodega='pendiente'):
+    return (
+        ContadorBodega.objects
+        .filter(bodega=bodega, estado_bodega=estado_bodega)
+        .aggregate(total=Sum('total'))['total']
+    ) or 0
+
+
+def reconciliar():
+    """
+    Recalcula ambas tablas desde cero, y el avance de las solicitudes desfasadas.
+
+    Returns:
+        (filas_estado, filas_bodega, solicitudes_con_avance_corregido)
+    """
+    por_estado = (
+        Solicitud.objects
+        .values('estado', 'urgente')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    por_bodega = (
+        SolicitudDetalle.objects
+        .filter(solicitud__estado='pendiente')
+        .values('bodega', 'estado_bodega')
+        .annotate(n=Count('solicitud_id', distinct=True))
+        .order_by()
+    )
+    with transaction.atomic():
+        ContadorSolicitudes.objects.all().delete()
+        ContadorSolicitudes.objects.bulk_create([
+            ContadorSolicitudes(estado=f['estado'], urgente=f['urgente'], total=f['n'])
+            for f in por_estado
+        ])
+        ContadorBodega.objects.all().delete()
+        ContadorBodega.objects.bulk_create([
+            ContadorBodega(bodega=f['bodega'], estado_bodega=f['estado_bodega'], total=f['n'])
+            for f in por_bodega
+        ])
+        desfasadas = avance_desfasado()
+        if desfasadas:
+            recalcular_avance(desfasadas)
+    return ContadorSolicitudes.objects.count(), ContadorBodega.objects.count(), len(desfasadas)
@@ -132,6 +132,7 @@ def exportar_kpis_excel(fecha_inicio, fecha_fin):
     Returns:
         HttpResponse con el archivo Excel
     """
+    from solicitudes.archivo import alcanza_archivo, filtrar_archivadas
     from solicitudes.models import Solicitud
     from django.db.models import Count, Avg, F, ExpressionWrapper, DurationField
     
@@ -149,8 +150,16 @@ def exportar_kpis_excel(fecha_inicio, fecha_fin):
     # Calcular KPIs
     total_solicitudes = solicitudes.count()
     urgentes = solicitudes.filter(urgente=True).count()
-    por_estado = solicitudes.values('estado').annotate(total=Count('id'))
-    por_tipo = solicitudes.values('tipo').annotate(total=Count('id'))
+    por_estado = list(solicitudes.values('estado').annotate(total=Count('id')).order_by())
+    por_tipo = list(solicitudes.values('tipo').annotate(total=Count('id')).order_by())
+    
+    # El rango puede llegar al archivo histórico (solicitudes.archivo)
+    if alcanza_archivo(fecha_inicio, campo='fecha_solicitud'):
+        archivadas = filtrar_archivadas(fecha_inicio, fecha_fin)
+        total_solicitudes += archivadas.count()
+        urgentes += archivadas.filter(urgente=True).count()
+        por_estado = _sumar_conteos(por_estado, archivadas.values('estado').annotate(total=Count('id')).order_by(), 'estado')
+        por_tipo = _sumar_conteos(por_tipo, archivadas.values('tipo').annotate(total=Count('id')).order_by(), 'tipo')
     
     # Escribir KPIs en Excel
     ws['A1'] = 'KPI'
@@ -205,4 +214,9 @@ def exportar_kpis_excel(fecha_inicio, fecha_fin):
     return response
 
 
-
+def _sumar_conteos(vigentes, archivadas, campo):
+    """Suma dos listas [{campo: valor, 'total': n}] por valor."""
+    totales = {}
+    for fila in list(vigentes) + list(archivadas):
+        totales[fila[campo]] = totales.get(fila[campo], 0) + fila['total']
+    return [{campo: valor, 'total': total} for valor, total in totales.items()]
@@ -39,17 +39,15 @@ class SolicitudForm(forms.ModelForm):
         self._load_tipos()
 
     def _load_transportes(self):
-        choices = [(t.slug, t.nombre) for t in TransporteConfig.activos()]
+        choices = TransporteConfig.opciones()
         if not choices:
             choices = [('PESCO', 'Camión PESCO')]
         self.fields['transporte'].choices = choices
 
     def _load_tipos(self):
         """Carga tipos de solicitud desde la base de datos"""
-        tipos = TipoSolicitud.activos()
-        if tipos.exists():
-            choices = [(t.codigo, t.nombre) for t in tipos]
-        else:
+        choices = TipoSolicitud.opciones()
+        if not choices:
             # Fallback a choices hardcodeados si no hay tipos en BD
             choices = Solicitud.TIPOS
         self.fields['tipo'].choices = choices
@@ -130,16 +128,14 @@ class SolicitudEdicionAdminForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        choices = [(t.slug, t.nombre) for t in TransporteConfig.activos()]
+        choices = TransporteConfig.opciones()
         if not choices:
             choices = [('PESCO', 'Camión PESCO')]
         self.fields['transporte'].choices = choices
         
         # Cargar tipos de solicitud
-        tipos = TipoSolicitud.activos()
-        if tipos.exists():
-            tipo_choices = [(t.codigo, t.nombre) for t in tipos]
-        else:
+        tipo_choices = TipoSolicitud.opciones()
+        if not tipo_choices:
             tipo_choices = Solicitud.TIPOS
         self.fields['tipo'].choices = tipo_choices
         
@@ -29,29 +29,18 @@ def _pick_fecha_preparacion(ahora, max_horas: float, rng: random.Random):
     """
     Elige fecha_preparacion en el pasado reciente tal que
     calcular_horas_laborales(fp, ahora) <= max_horas y cercana a un objetivo aleatorio.
+
+    Cálculo directo con la inversa del calendario laboral (sin bisección).
     """
-    from core.views import calcular_horas_laborales
-
-    target = rng.uniform(6.0, min(47.0, max_horas - 1.0))
-    lo = ahora - timedelta(days=21)
-    hi = ahora - timedelta(minutes=2)
-
-    for _ in range(64):
-        if hi - lo < timedelta(minutes=1):
-            break
-        mid = lo + (hi - lo) / 2
-        lab = calcular_horas_laborales(mid, ahora)
-        if lab > target:
-            lo = mid
-        else:
-            hi = mid
-
-    fp = hi
-    if calcular_horas_laborales(fp, ahora) > max_horas:
-        fp = ahora - timedelta(minutes=5)
-    if fp >= ahora:
-        fp = ahora - timedelta(minutes=5)
-    return fp
+    from core.business_hours import restar_horas_laborales
+
+    # Objetivo en [6, 47] horas y al menos una hora bajo el tope; con topes
+    # chicos el rango se acorta en vez de invertirse
+    alto = min(47.0, max_horas - 1.0)
+    if alto <= 0:
+        return ahora - timedelta(minutes=5)
+    target = rng.uniform(min(6.0, alto), alto)
+    return restar_horas_laborales(ahora, target)
 
 
 class Command(BaseCommand):
@@ -0,0 +1,51 @@
+"""
+Mueve al archivo histórico las solicitudes despachadas o canceladas hace más
+de N meses, con sus detalles, bultos, transferencias, reservas y lead time
+(ver solicitudes.archivo).
+
+Cada lote es una transacción: se puede interrumpir y volver a correr. Pensado
+para un cron mensual; los reportes siguen leyendo el archivo cuando su rango
+de fechas lo alcanza.
+
+Uso:
+  python manage.py archivar_solicitudes
+  python manage.py archivar_solicitudes --meses 18 --lote 200
+  python manage.py archivar_solicitudes --simular
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from solicitudes import archivo
+
+MESES_MINIMO = 3
+
+
+class Command(BaseCommand):
+    help = 'Archiva las solicitudes despachadas o canceladas hace más de N meses.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses', type=int, default=12,
+                            help=f'Antigüedad mínima del cierre, en meses (default: 12, mínimo {MESES_MINIMO})')
+        parser.add_argument('--lote', type=int, default=archivo.LOTE,
+                            help=f'Solicitudes por transacción (default: {archivo.LOTE})')
+        parser.add_argument('--maximo', type=int, default=None,
+                            help='Archivar como mucho N solicitudes en esta ejecución')
+        parser.add_argument('--simular', action='store_true',
+                            help='Solo informa cuántas solicitudes se archivarían')
+
+    def handle(self, *args, **options):
+        if options['meses'] < MESES_MINIMO:
+            raise CommandError(f'--meses debe ser al menos {MESES_MINIMO}')
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser mayor que 0')
+
+        corte = archivo.fecha_corte(options['meses'])
+        pendientes = archivo.archivables(corte).count()
+        self.stdout.write(f'Solicitudes cerradas antes del {corte:%d/%m/%Y}: {pendientes}')
+        if options['simular'] or not pendientes:
+            return
+
+        totales = archivo.archivar(corte, lote=options['lote'], maximo=options['maximo'])
+        self.stdout.write(self.style.SUCCESS(
+            'Archivadas: ' + ' | '.join(f'{cantidad} {nombre}' for nombre, cantidad in totales.items())
+        ))
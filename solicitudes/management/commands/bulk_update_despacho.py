@@ -107,6 +107,14 @@ class Command(BaseCommand):
             self.stdout.write(self.style.SUCCESS(f'Fase bodega - Solicitudes en_despacho: {resultado.get("solicitudes_en_despacho", 0)}'))
             self.stdout.write(self.style.SUCCESS(f'Fase despacho - Actualizados: {dep.get("actualizados", 0)}'))
             self.stdout.write(self.style.WARNING(f'No encontrados: {dep.get("total_no_encontrados", 0)}'))
+            if dep.get('transportes_desconocidos'):
+                self.stdout.write(self.style.WARNING(
+                    f'Transportes no reconocidos: {", ".join(dep["transportes_desconocidos"])}'
+                ))
+            if dep.get('sin_stock_013'):
+                self.stdout.write(self.style.WARNING(
+                    f'Códigos sin registro en bodega 013 (stock no descontado): {", ".join(dep["sin_stock_013"])}'
+                ))
             if dep.get('errores'):
                 for e in dep['errores']:
                     self.stdout.write(self.style.ERROR(e))
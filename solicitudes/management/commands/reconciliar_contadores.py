@@ -0,0 +1,52 @@
+"""
+Recalcula los contadores por estado del dashboard (ContadorSolicitudes y
+ContadorBodega) y el avance de líneas de cada solicitud (Solicitud.lineas_*)
+desde las tablas de solicitudes y detalles.
+
+Las señales los mantienen al día; este comando corrige la deriva que dejan
+las modificaciones masivas con QuerySet.update() o SQL directo.
+
+Uso:
+  python manage.py reconciliar_contadores
+  python manage.py reconciliar_contadores --verificar
+"""
+
+from django.core.management.base import BaseCommand
+
+from solicitudes import contadores
+from solicitudes.models import ContadorBodega, ContadorSolicitudes
+
+
+def _foto():
+    return (
+        set(ContadorSolicitudes.objects.filter(total__gt=0).values_list('estado', 'urgente', 'total')),
+        set(ContadorBodega.objects.filter(total__gt=0).values_list('bodega', 'estado_bodega', 'total')),
+    )
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los contadores por estado y por bodega del dashboard y el avance de líneas de cada solicitud.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verificar',
+            action='store_true',
+            help='Informa las diferencias encontradas además de corregirlas',
+        )
+
+    def handle(self, *args, **options):
+        antes = _foto() if options['verificar'] else None
+        filas_estado, filas_bodega, avance_corregido = contadores.reconciliar()
+
+        if antes is not None:
+            despues = _foto()
+            for nombre, previo, actual in zip(('estado', 'bodega'), antes, despues):
+                for fila in sorted(previo - actual, key=str):
+                    self.stdout.write(self.style.WARNING(f'  [{nombre}] corregido: {fila}'))
+                for fila in sorted(actual - previo, key=str):
+                    self.stdout.write(f'  [{nombre}] nuevo valor: {fila}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Contadores reconciliados: {filas_estado} por estado | {filas_bodega} por bodega | '
+            f'avance corregido en {avance_corregido} solicitudes'
+        ))
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_cliente_canonico(apps, schema_editor):
+    """Resuelve cada texto de cliente distinto una vez y actualiza en bloque."""
+    Solicitud = apps.get_model('solicitudes', 'Solicitud')
+    AliasCliente = apps.get_model('configuracion', 'AliasCliente')
+
+    aliases = [
+        (alias.upper(), cliente_id)
+        for alias, cliente_id in AliasCliente.objects
+        .filter(cliente__activo=True)
+        .order_by('cliente__orden', 'cliente__nombre', 'orden', 'id')
+        .values_list('alias', 'cliente_id')
+    ]
+
+    clientes_por_canonico = {}
+    for cliente in Solicitud.objects.values_list('cliente', flat=True).distinct():
+        cliente_upper = (cliente or '').upper().strip()
+        if not cliente_upper:
+            continue
+        for alias, cliente_id in aliases:
+            if alias in cliente_upper or cliente_upper in alias:
+                clientes_por_canonico.setdefault(cliente_id, []).append(cliente)
+                break
+
+    for cliente_id, clientes in clientes_por_canonico.items():
+        for i in range(0, len(clientes), 500):
+            Solicitud.objects.filter(cliente__in=clientes[i:i + 500]).update(cliente_canonico_id=cliente_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('configuracion', '0007_clientes_canonicos'),
+        ('solicitudes', '0018_fix_fecha_despachado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='solicitud',
+            name='cliente_canonico',
+            field=models.ForeignKey(blank=True, help_text='Sucursal/taller resuelto desde cliente al grabar (vacío = otro cliente)', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='configuracion.clientecanonico', verbose_name='Cliente canónico'),
+        ),
+        migrations.RunPython(backfill_cliente_canonico, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_transportes(apps, schema_editor):
+    """Misma regla que Solicitud.calcular_transporte_efectivo(), con modelos históricos."""
+    Solicitud = apps.get_model('solicitudes', 'Solicitud')
+    SolicitudTransporte = apps.get_model('solicitudes', 'SolicitudTransporte')
+
+    ids = list(Solicitud.objects.order_by('id').values_list('id', flat=True))
+    for i in range(0, len(ids), 500):
+        solicitudes = (
+            Solicitud.objects
+            .filter(id__in=ids[i:i + 500])
+            .prefetch_related('detalles__bulto', 'bultos')
+        )
+        por_actualizar = []
+        nuevos = []
+        for solicitud in solicitudes:
+            bultos = {}
+            for detalle in solicitud.detalles.all():
+                if detalle.bulto_id:
+                    bultos[detalle.bulto_id] = detalle.bulto
+            for bulto in solicitud.bultos.all():
+                bultos[bulto.id] = bulto
+
+            efectivo = solicitud.transporte or ''
+            for bulto in bultos.values():
+                valor = bulto.transportista_extra or bulto.transportista or solicitud.transporte
+                if valor:
+                    efectivo = valor
+                    break
+            solicitud.transporte_efectivo = efectivo
+            por_actualizar.append(solicitud)
+
+            transportes = {solicitud.transporte}
+            for bulto in bultos.values():
+                transportes.add(bulto.transportista)
+                transportes.add(bulto.transportista_extra)
+            nuevos.extend(
+                SolicitudTransporte(solicitud_id=solicitud.id, transporte=t)
+                for t in transportes if t
+            )
+        Solicitud.objects.bulk_update(por_actualizar, ['transporte_efectivo'])
+        SolicitudTransporte.objects.bulk_create(nuevos, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('configuracion', '0007_clientes_canonicos'),
+        ('solicitudes', '0019_solicitud_cliente_canonico'),
+        ('despacho', '0006_bulto_peso_cobrable'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SolicitudTransporte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transporte', models.CharField(max_length=100)),
+            ],
+            options={
+                'verbose_name': 'Transporte de solicitud',
+                'verbose_name_plural': 'Transportes de solicitudes',
+                'db_table': 'solicitudes_transportes',
+            },
+        ),
+        migrations.AddField(
+            model_name='solicitud',
+            name='transporte_efectivo',
+            field=models.CharField(blank=True, help_text='Mantenido por señales: bulto.transportista_extra > bulto.transportista > transporte', max_length=100, verbose_name='Transporte efectivo'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitud',
+            index=models.Index(fields=['transporte_efectivo', 'estado'], name='idx_transp_efectivo_estado'),
+        ),
+        migrations.AddField(
+            model_name='solicitudtransporte',
+            name='solicitud',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transportes_involucrados', to='solicitudes.solicitud'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitudtransporte',
+            index=models.Index(fields=['transporte', 'solicitud'], name='idx_sol_transp_transp_sol'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='solicitudtransporte',
+            unique_together={('solicitud', 'transporte')},
+        ),
+        migrations.RunPython(backfill_transportes, migrations.RunPython.noop),
+    ]
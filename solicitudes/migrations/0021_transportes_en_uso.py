@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:34
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def poblar_transportes_en_uso(apps, schema_editor):
+    SolicitudTransporte = apps.get_model('solicitudes', 'SolicitudTransporte')
+    TransporteEnUso = apps.get_model('solicitudes', 'TransporteEnUso')
+
+    filas = (
+        SolicitudTransporte.objects
+        .values('transporte')
+        .annotate(total=Count('pk'), ultimo=Max('solicitud__updated_at'))
+        .order_by()
+    )
+    TransporteEnUso.objects.bulk_create([
+        TransporteEnUso(transporte=f['transporte'], solicitudes=f['total'], ultimo_uso=f['ultimo'])
+        for f in filas
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solicitudes', '0020_transporte_efectivo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransporteEnUso',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transporte', models.CharField(max_length=100, unique=True)),
+                ('solicitudes', models.PositiveIntegerField(default=0)),
+                ('ultimo_uso', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Transporte en uso',
+                'verbose_name_plural': 'Transportes en uso',
+                'db_table': 'solicitudes_transportes_en_uso',
+                'ordering': ['transporte'],
+            },
+        ),
+        migrations.RunPython(poblar_transportes_en_uso, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('configuracion', '0007_clientes_canonicos'),
+        ('solicitudes', '0021_transportes_en_uso'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='solicitud',
+            index=models.Index(fields=['estado', 'fecha_solicitud', 'hora_solicitud', 'id'], name='idx_estado_fecha_hora_id'),
+        ),
+    ]
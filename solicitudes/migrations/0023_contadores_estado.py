@@ -0,0 +1,68 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:38
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def poblar_contadores(apps, schema_editor):
+    """Misma consulta que solicitudes.contadores.reconciliar(), con modelos históricos."""
+    Solicitud = apps.get_model('solicitudes', 'Solicitud')
+    SolicitudDetalle = apps.get_model('solicitudes', 'SolicitudDetalle')
+    ContadorSolicitudes = apps.get_model('solicitudes', 'ContadorSolicitudes')
+    ContadorBodega = apps.get_model('solicitudes', 'ContadorBodega')
+
+    ContadorSolicitudes.objects.bulk_create([
+        ContadorSolicitudes(estado=f['estado'], urgente=f['urgente'], total=f['n'])
+        for f in Solicitud.objects.values('estado', 'urgente').annotate(n=Count('id')).order_by()
+    ])
+    ContadorBodega.objects.bulk_create([
+        ContadorBodega(bodega=f['bodega'], estado_bodega=f['estado_bodega'], total=f['n'])
+        for f in (
+            SolicitudDetalle.objects
+            .filter(solicitud__estado='pendiente')
+            .values('bodega', 'estado_bodega')
+            .annotate(n=Count('solicitud_id', distinct=True))
+            .order_by()
+        )
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solicitudes', '0022_solicitud_idx_keyset_kpi'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorBodega',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bodega', models.CharField(max_length=50)),
+                ('estado_bodega', models.CharField(max_length=30)),
+                ('total', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Contador por bodega',
+                'verbose_name_plural': 'Contadores por bodega',
+                'db_table': 'solicitudes_contador_bodega',
+                'unique_together': {('bodega', 'estado_bodega')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ContadorSolicitudes',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado', models.CharField(max_length=50)),
+                ('urgente', models.BooleanField(default=False)),
+                ('total', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Contador de solicitudes',
+                'verbose_name_plural': 'Contadores de solicitudes',
+                'db_table': 'solicitudes_contador_estado',
+                'unique_together': {('estado', 'urgente')},
+            },
+        ),
+        migrations.RunPython(poblar_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:55
+
+import logging
+import unicodedata
+
+from django.db import DatabaseError, migrations, models, transaction
+
+logger = logging.getLogger(__name__)
+
+# Copia congelada de core.busqueda al momento de esta migración: si ese módulo
+# cambia (o se mueve), la migración sigue produciendo el mismo resultado
+CAMPOS_SOLICITUD = ('cliente', 'numero_pedido', 'numero_st', 'numero_ot', 'codigo', 'descripcion')
+CAMPOS_DETALLE = ('codigo', 'descripcion')
+
+# La tabla stock no la administra Django: sus índices los crea `crear_indices_busqueda`
+INDICES = [
+    ('idx_sol_busqueda_trgm', 'solicitudes', 'texto_busqueda'),
+    ('idx_det_busqueda_trgm', 'solicitudes_detalle', 'texto_busqueda'),
+]
+
+
+def normalizar(texto):
+    texto = unicodedata.normalize('NFKD', str(texto or ''))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.lower().split())
+
+
+def recalcular_textos(modelo, campos, lote=1000):
+    pendientes = []
+    for obj in modelo.objects.only('texto_busqueda', *campos).order_by('pk').iterator(chunk_size=lote):
+        obj.texto_busqueda = ' | '.join(
+            normalizar(valor) for valor in (getattr(obj, campo) for campo in campos) if valor not in (None, '')
+        )
+        pendientes.append(obj)
+        if len(pendientes) >= lote:
+            modelo.objects.bulk_update(pendientes, ['texto_busqueda'])
+            pendientes = []
+    if pendientes:
+        modelo.objects.bulk_update(pendientes, ['texto_busqueda'])
+
+
+def poblar_texto_busqueda(apps, schema_editor):
+    """Mismo cálculo que Solicitud/SolicitudDetalle.save(), con modelos históricos."""
+    recalcular_textos(apps.get_model('solicitudes', 'Solicitud'), CAMPOS_SOLICITUD)
+    recalcular_textos(apps.get_model('solicitudes', 'SolicitudDetalle'), CAMPOS_DETALLE)
+
+
+def crear_indices(apps, schema_editor):
+    """Índices GIN de trigramas en PostgreSQL; en otros motores no hace nada."""
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    # Sin permiso para pg_trgm la búsqueda funciona igual, solo sin índice
+    try:
+        with transaction.atomic(using=connection.alias):
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except DatabaseError as e:
+        logger.warning(f"No se pudo habilitar pg_trgm, búsqueda sin índices de trigramas: {e}")
+        return
+    for nombre, tabla, columna in INDICES:
+        try:
+            with transaction.atomic(using=connection.alias):
+                schema_editor.execute(
+                    f'CREATE INDEX IF NOT EXISTS {nombre} ON {schema_editor.quote_name(tabla)} '
+                    f'USING gin ({columna} gin_trgm_ops)'
+                )
+        except DatabaseError as e:
+            logger.warning(f"No se pudo crear el índice {nombre}: {e}")
+
+
+def eliminar_indices(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for nombre, _, _ in INDICES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {nombre}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solicitudes', '0023_contadores_estado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='solicitud',
+            name='texto_busqueda',
+            field=models.TextField(blank=True, editable=False, verbose_name='Texto de búsqueda'),
+        ),
+        migrations.AddField(
+            model_name='solicituddetalle',
+            name='texto_busqueda',
+            field=models.TextField(blank=True, editable=False, verbose_name='Texto de búsqueda'),
+        ),
+        migrations.RunPython(poblar_texto_busqueda, migrations.RunPython.noop),
+        migrations.RunPython(crear_indices, eliminar_indices),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:00
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def poblar_avance(apps, schema_editor):
+    """Misma consulta que solicitudes.contadores.recalcular_avance(), con modelos históricos."""
+    Solicitud = apps.get_model('solicitudes', 'Solicitud')
+    SolicitudDetalle = apps.get_model('solicitudes', 'SolicitudDetalle')
+    detalles = SolicitudDetalle.objects.filter(solicitud=OuterRef('pk')).order_by().values('solicitud')
+
+    def contar(condicion=Q()):
+        return Coalesce(Subquery(detalles.filter(condicion).annotate(n=Count('pk')).values('n')), 0)
+
+    Solicitud.objects.update(
+        lineas_total=contar(),
+        lineas_preparadas=contar(Q(estado_bodega='preparado')),
+        lineas_embaladas=contar(Q(bulto__isnull=False)),
+        lineas_por_preparar=contar(~Q(bodega='013') & ~Q(estado_bodega='preparado')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solicitudes', '0024_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='solicitud',
+            name='lineas_embaladas',
+            field=models.IntegerField(default=0, editable=False, help_text='Líneas con bulto asignado', verbose_name='Líneas embaladas'),
+        ),
+        migrations.AddField(
+            model_name='solicitud',
+            name='lineas_por_preparar',
+            field=models.IntegerField(default=0, editable=False, help_text='Líneas fuera de bodega 013 que bodega aún no prepara', verbose_name='Líneas por preparar'),
+        ),
+        migrations.AddField(
+            model_name='solicitud',
+            name='lineas_preparadas',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Líneas preparadas'),
+        ),
+        migrations.AddField(
+            model_name='solicitud',
+            name='lineas_total',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Líneas'),
+        ),
+        migrations.RunPython(poblar_avance, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:09
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solicitudes', '0025_avance_lineas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SolicitudArchivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID original')),
+                ('fecha_solicitud', models.DateField(verbose_name='Fecha de solicitud')),
+                ('tipo', models.CharField(max_length=10, verbose_name='Tipo de solicitud')),
+                ('estado', models.CharField(max_length=50, verbose_name='Estado')),
+                ('urgente', models.BooleanField(default=False, verbose_name='¿Es urgente?')),
+                ('cliente', models.CharField(max_length=200, verbose_name='Cliente')),
+                ('numero_pedido', models.CharField(blank=True, max_length=50, verbose_name='Número de pedido / OF')),
+                ('numero_st', models.CharField(blank=True, max_length=20, verbose_name='Número ST')),
+                ('numero_guia_despacho', models.CharField(blank=True, max_length=100, verbose_name='Número de Guía/Factura')),
+                ('cerrada_en', models.DateTimeField(help_text='fecha_despachado, o la última actualización si no la tiene (canceladas)', verbose_name='Cerrada el')),
+                ('texto_busqueda', models.TextField(blank=True, editable=False, verbose_name='Texto de búsqueda')),
+                ('datos', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, help_text='Filas originales: solicitud, detalles, bultos, transferencias y reservas')),
+                ('archivada_en', models.DateTimeField(auto_now_add=True, verbose_name='Archivada el')),
+            ],
+            options={
+                'verbose_name': 'Solicitud archivada',
+                'verbose_name_plural': 'Solicitudes archivadas',
+                'db_table': 'solicitudes_archivo',
+                'ordering': ['-fecha_solicitud'],
+                'indexes': [models.Index(fields=['fecha_solicitud'], name='idx_sol_arch_fecha'), models.Index(fields=['cerrada_en'], name='idx_sol_arch_cierre'), models.Index(fields=['numero_pedido'], name='idx_sol_arch_pedido')],
+            },
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('configuracion', '0008_feriado'),
+        ('despacho', '0006_bulto_peso_cobrable'),
+        ('solicitudes', '0026_archivo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='solicitud',
+            name='idx_cliente',
+        ),
+        migrations.RemoveIndex(
+            model_name='solicitud',
+            name='idx_codigo',
+        ),
+        migrations.RemoveIndex(
+            model_name='solicitud',
+            name='idx_estado',
+        ),
+        migrations.RemoveIndex(
+            model_name='solicitud',
+            name='idx_solicitante',
+        ),
+        migrations.RemoveIndex(
+            model_name='solicituddetalle',
+            name='idx_detalle_solicitud',
+        ),
+        migrations.RemoveIndex(
+            model_name='solicituddetalle',
+            name='idx_detalle_bodega',
+        ),
+        migrations.RemoveIndex(
+            model_name='solicituddetalle',
+            name='idx_detalle_estado_bod',
+        ),
+        migrations.AddIndex(
+            model_name='solicitud',
+            index=models.Index(condition=models.Q(('estado__in', ['pendiente', 'en_despacho', 'embalado', 'listo_despacho'])), fields=['fecha_solicitud', 'hora_solicitud', 'id'], name='idx_sol_activa_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitud',
+            index=models.Index(condition=models.Q(('estado__in', ['pendiente', 'en_despacho', 'embalado', 'listo_despacho'])), fields=['estado', 'id'], name='idx_sol_activa_estado_id'),
+        ),
+        migrations.AddIndex(
+            model_name='solicituddetalle',
+            index=models.Index(condition=models.Q(('estado_bodega__in', ['pendiente', 'preparando'])), fields=['bodega', 'id'], name='idx_det_activo_bod_id'),
+        ),
+        migrations.AddIndex(
+            model_name='solicituddetalle',
+            index=models.Index(condition=models.Q(('estado_bodega__in', ['pendiente', 'preparando'])), fields=['solicitud', 'bodega', 'estado_bodega'], name='idx_det_activo_sol_bod'),
+        ),
+        migrations.AddIndex(
+            model_name='solicituddetalle',
+            index=models.Index(condition=models.Q(('bulto__isnull', True)), fields=['solicitud'], name='idx_det_sin_bulto_sol'),
+        ),
+    ]
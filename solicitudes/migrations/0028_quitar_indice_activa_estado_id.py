@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:25
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solicitudes', '0027_indices_parciales'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='solicitud',
+            name='idx_sol_activa_estado_id',
+        ),
+    ]
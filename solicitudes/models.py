@@ -1,9 +1,10 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
 import pytz
 
-from configuracion.models import EstadoWorkflow, TransporteConfig, TipoSolicitud
+from configuracion.models import ClienteCanonico, EstadoWorkflow, TransporteConfig, TipoSolicitud
 
 
 def get_chile_date():
@@ -18,6 +19,12 @@ def get_chile_time():
     return timezone.now().astimezone(chile_tz).time()
 
 
+# Estados con trabajo pendiente: los paneles operativos solo consultan estas
+# filas, y los índices parciales cubren solo esta fracción de las tablas
+ESTADOS_ACTIVOS = ['pendiente', 'en_despacho', 'embalado', 'listo_despacho']
+ESTADOS_BODEGA_ACTIVOS = ['pendiente', 'preparando']
+
+
 class Solicitud(models.Model):
     """
     Modelo de Solicitud para Sistema PESCO
@@ -75,6 +82,15 @@ class Solicitud(models.Model):
         verbose_name='Cliente',
         db_index=True
     )
+    cliente_canonico = models.ForeignKey(
+        ClienteCanonico,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Cliente canónico',
+        help_text='Sucursal/taller resuelto desde cliente al grabar (vacío = otro cliente)'
+    )
     
     # Producto
     codigo = models.CharField(
@@ -100,6 +116,12 @@ class Solicitud(models.Model):
         default='PESCO',
         verbose_name='Transporte'
     )
+    transporte_efectivo = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name='Transporte efectivo',
+        help_text='Mantenido por señales: bulto.transportista_extra > bulto.transportista > transporte'
+    )
     observacion = models.TextField(
         blank=True,
         verbose_name='Observaciones'
@@ -158,6 +180,38 @@ class Solicitud(models.Model):
         verbose_name='Fecha despachada',
         help_text='Momento en que la solicitud pasó a estado despachado'
     )
+
+    # Avance de las líneas (solicitudes.contadores): los mantienen los detalles
+    # con incrementos F(), un save() de la solicitud no los escribe
+    lineas_total = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Líneas'
+    )
+    lineas_preparadas = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Líneas preparadas'
+    )
+    lineas_embaladas = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Líneas embaladas',
+        help_text='Líneas con bulto asignado'
+    )
+    lineas_por_preparar = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Líneas por preparar',
+        help_text='Líneas fuera de bodega 013 que bodega aún no prepara'
+    )
+
+    # Campos buscables normalizados (ver core.busqueda), recalculado en save()
+    texto_busqueda = models.TextField(
+        blank=True,
+        editable=False,
+        verbose_name='Texto de búsqueda'
+    )
     
     class Meta:
         db_table = 'solicitudes'
@@ -165,18 +219,9 @@ class Solicitud(models.Model):
         verbose_name = 'Solicitud'
         verbose_name_plural = 'Solicitudes'
         indexes = [
-            # Índice principal para filtros por estado (usado en TODOS los roles)
-            models.Index(fields=['estado'], name='idx_estado'),
-            
             # Índice compuesto para filtros de bodega/despacho (estado + id para ordenamiento)
             models.Index(fields=['estado', 'id'], name='idx_estado_id'),
             
-            # Índice para búsquedas por cliente (muy común)
-            models.Index(fields=['cliente'], name='idx_cliente'),
-            
-            # Índice para búsquedas por código de producto
-            models.Index(fields=['codigo'], name='idx_codigo'),
-            
             # Índice para búsquedas por número de pedido
             models.Index(fields=['numero_pedido'], name='idx_numero_pedido'),
             models.Index(fields=['numero_ot'], name='idx_numero_ot'),
@@ -196,17 +241,40 @@ class Solicitud(models.Model):
             # Índice para ordenamiento por fecha (reportes y KPIs)
             models.Index(fields=['-fecha_solicitud', '-hora_solicitud'], name='idx_fecha_hora'),
             
+            # Índice para paginación por keyset del panel KPI (estado + orden + id)
+            models.Index(fields=['estado', 'fecha_solicitud', 'hora_solicitud', 'id'], name='idx_estado_fecha_hora_id'),
+            
             # Índice para generación de números ST (tipo + numero_st)
             models.Index(fields=['tipo', 'numero_st'], name='idx_tipo_st'),
             
-            # Índice para relación con solicitante (JOIN optimization)
-            models.Index(fields=['solicitante'], name='idx_solicitante'),
+            # Índice para agrupar/filtrar por transporte efectivo (dashboard)
+            models.Index(fields=['transporte_efectivo', 'estado'], name='idx_transp_efectivo_estado'),
+
+            # Parcial, solo estados activos: paneles de bodega y despacho y emisión
+            # de guías por fecha (estado por id ya lo cubre idx_estado_id, que
+            # también sirve al listado filtrado por estados cerrados; estado,
+            # cliente, codigo y solicitante tienen el índice de db_index / la FK)
+            models.Index(
+                fields=['fecha_solicitud', 'hora_solicitud', 'id'],
+                condition=models.Q(estado__in=ESTADOS_ACTIVOS),
+                name='idx_sol_activa_fecha',
+            ),
         ]
     
+    CAMPOS_AVANCE = ('lineas_total', 'lineas_preparadas', 'lineas_embaladas', 'lineas_por_preparar')
+
+    # Estado → timestamp que se graba la primera vez que la solicitud entra en él
+    FECHAS_TRANSICION = {
+        'en_despacho': 'fecha_en_despacho',
+        'listo_despacho': 'fecha_listo_despacho',
+        'despachado': 'fecha_despachado',
+    }
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # Guarda el estado original para detectar transiciones en save()
         self._estado_original = self.estado
+        self._cliente_original = self.__dict__.get('cliente')
 
     def __str__(self):
         return f"Solicitud #{self.id} - {self.cliente} - {self.get_estado_display()}"
@@ -280,49 +348,81 @@ class Solicitud(models.Model):
         - Registra timestamps de transición de estado para KPIs de lead time.
         """
         if self.tipo == 'ST' and not self.numero_st:
-            self.numero_st = self._generar_numero_st()
+            # Número e INSERT en la misma transacción: si el INSERT falla,
+            # el correlativo se libera y no queda un hueco
+            anterior = self.numero_st
+            try:
+                with transaction.atomic():
+                    self.numero_st = self._generar_numero_st()
+                    self._guardar(*args, **kwargs)
+            except Exception:
+                self.numero_st = anterior
+                raise
+            return
+        self._guardar(*args, **kwargs)
 
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        # Un save completo no pisa los contadores de avance (la instancia puede
+        # haberse cargado antes de cambiar sus detalles); solo se graban si se
+        # piden en update_fields. El resto del save completo no cambia.
+        if update_fields is None:
+            values = [valor for valor in values if valor[0].name not in self.CAMPOS_AVANCE]
+        return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+
+    def _guardar(self, *args, **kwargs):
         # Detectar transición y grabar timestamp correspondiente
         estado_anterior = getattr(self, '_estado_original', None)
         campos_extra = []
 
-        if self.estado != estado_anterior:
-            ahora = timezone.now()
-            if self.estado == 'en_despacho' and not self.fecha_en_despacho:
-                self.fecha_en_despacho = ahora
-                campos_extra.append('fecha_en_despacho')
-            elif self.estado == 'listo_despacho' and not self.fecha_listo_despacho:
-                self.fecha_listo_despacho = ahora
-                campos_extra.append('fecha_listo_despacho')
-            elif self.estado == 'despachado' and not self.fecha_despachado:
-                self.fecha_despachado = ahora
-                campos_extra.append('fecha_despachado')
+        campo_fecha = self.FECHAS_TRANSICION.get(self.estado)
+        if self.estado != estado_anterior and campo_fecha and not getattr(self, campo_fecha):
+            setattr(self, campo_fecha, timezone.now())
+            campos_extra.append(campo_fecha)
+
+        # Resolver el cliente canónico solo si se graba un cliente nuevo o modificado
+        update_fields = kwargs.get('update_fields')
+        graba_cliente = 'cliente' in self.__dict__ and (update_fields is None or 'cliente' in update_fields)
+        if graba_cliente and (self.pk is None or self.cliente != self._cliente_original):
+            self.cliente_canonico_id = ClienteCanonico.resolver_id(self.cliente)
+            campos_extra.append('cliente_canonico')
+
+        # Texto de búsqueda: solo si se graba alguno de los campos buscables
+        from core.busqueda import CAMPOS_SOLICITUD, texto_solicitud
+        if update_fields is None or set(update_fields) & set(CAMPOS_SOLICITUD):
+            texto = texto_solicitud(self)
+            if texto != self.texto_busqueda:
+                self.texto_busqueda = texto
+                campos_extra.append('texto_busqueda')
 
         # Si el caller usó update_fields, añadir los campos extra para que persistan
-        if campos_extra and 'update_fields' in kwargs:
+        if campos_extra and update_fields is not None:
             kwargs['update_fields'] = list(kwargs['update_fields']) + campos_extra
 
         super().save(*args, **kwargs)
         self._estado_original = self.estado
+        self._cliente_original = self.__dict__.get('cliente')
 
     def _generar_numero_st(self):
-        chile_tz = pytz.timezone('America/Santiago')
-        year = timezone.now().astimezone(chile_tz).year
-        prefix = f"ST-{year}-"
-        ultimo = (
-            Solicitud.objects
-            .filter(tipo='ST', numero_st__startswith=prefix)
-            .order_by('-numero_st')
-            .first()
-        )
-        if ultimo and ultimo.numero_st:
-            try:
-                correlativo = int(ultimo.numero_st.split('-')[-1]) + 1
-            except ValueError:
-                correlativo = 1
-        else:
-            correlativo = 1
-        return f"{prefix}{correlativo:03d}"
+        return self.generar_numeros_st(1)[0]
+
+    @classmethod
+    def generar_numeros_st(cls, cantidad, año=None):
+        """
+        Reserva `cantidad` números ST consecutivos (ST-2026-001, ...) en un
+        solo viaje a la BD. Llamar dentro de la transacción que los graba.
+        """
+        from core.correlativos import reservar, ultimo_sufijo
+
+        if año is None:
+            año = get_chile_date().year
+        prefix = f"ST-{año}-"
+
+        def semilla():
+            return ultimo_sufijo(
+                cls.objects.filter(tipo='ST', numero_st__startswith=prefix).values_list('numero_st', flat=True)
+            )
+
+        return [f"{prefix}{n:03d}" for n in reservar('ST', año, cantidad, semilla=semilla)]
 
     def total_codigos(self):
         """
@@ -330,10 +430,15 @@ class Solicitud(models.Model):
         - Para solicitudes nuevas: cantidad de filas en SolicitudDetalle.
         - Para solicitudes antiguas sin detalles: al menos 1 si existe código en cabecera.
         """
-        count = self.detalles.count()
-        if count == 0 and self.codigo:
+        if self.lineas_total == 0 and self.codigo:
             return 1
-        return count
+        return self.lineas_total
+
+    def porcentaje_preparado(self):
+        """Porcentaje de líneas preparadas por bodega (0-100), sin consultar detalles."""
+        if not self.lineas_total:
+            return 0
+        return round(100 * self.lineas_preparadas / self.lineas_total)
 
     def get_bultos(self):
         """
@@ -355,6 +460,32 @@ class Solicitud(models.Model):
             
         return list(bultos_set.values())
 
+    def calcular_transporte_efectivo(self, bultos=None):
+        """
+        Regla única de transporte efectivo: primer bulto con transporte definido
+        (transportista_extra > transportista > solicitud.transporte); sin bultos,
+        el transporte de la solicitud.
+        """
+        if bultos is None:
+            bultos = self.get_bultos()
+        for bulto in bultos:
+            valor = bulto.transportista_extra or bulto.transportista or self.transporte
+            if valor:
+                return valor
+        return self.transporte or ''
+
+    def calcular_transportes_involucrados(self, bultos=None):
+        """Conjunto de transportes de la solicitud y de todos sus bultos."""
+        if bultos is None:
+            bultos = self.get_bultos()
+        transportes = {self.transporte}
+        for bulto in bultos:
+            transportes.add(bulto.transportista)
+            transportes.add(bulto.transportista_extra)
+        transportes.discard('')
+        transportes.discard(None)
+        return transportes
+
 
 class SolicitudDetalle(models.Model):
     """
@@ -419,6 +550,11 @@ class SolicitudDetalle(models.Model):
         auto_now_add=True,
         verbose_name='Creado el',
     )
+    texto_busqueda = models.TextField(
+        blank=True,
+        editable=False,
+        verbose_name='Texto de búsqueda',
+    )
 
     class Meta:
         db_table = 'solicitudes_detalle'
@@ -426,26 +562,229 @@ class SolicitudDetalle(models.Model):
         verbose_name_plural = 'Detalles de solicitud'
         ordering = ['id']
         indexes = [
-            # Índice para JOIN con solicitudes (usado en TODAS las consultas)
-            models.Index(fields=['solicitud'], name='idx_detalle_solicitud'),
-            
             # Índice compuesto para búsquedas por solicitud + código
             models.Index(fields=['solicitud', 'codigo'], name='idx_detalle_sol_codigo'),
             
             # Índice para búsquedas por código de producto
             models.Index(fields=['codigo'], name='idx_detalle_codigo'),
             
-            # NUEVOS: Índices para bodegas
-            models.Index(fields=['bodega'], name='idx_detalle_bodega'),
-            models.Index(fields=['estado_bodega'], name='idx_detalle_estado_bod'),
+            # Índices para bodegas (bodega y estado_bodega solos: db_index)
             models.Index(fields=['bodega', 'estado_bodega'], name='idx_detalle_bod_estado'),
+
+            # Parciales: líneas que bodega aún debe preparar (panel de pedidos, la
+            # clave incluye lo que consulta el dashboard de bodega) y líneas sin bulto
+            models.Index(
+                fields=['bodega', 'id'],
+                condition=models.Q(estado_bodega__in=ESTADOS_BODEGA_ACTIVOS),
+                name='idx_det_activo_bod_id',
+            ),
+            models.Index(
+                fields=['solicitud', 'bodega', 'estado_bodega'],
+                condition=models.Q(estado_bodega__in=ESTADOS_BODEGA_ACTIVOS),
+                name='idx_det_activo_sol_bod',
+            ),
+            models.Index(
+                fields=['solicitud'],
+                condition=models.Q(bulto__isnull=True),
+                name='idx_det_sin_bulto_sol',
+            ),
         ]
 
     def __str__(self):
         return f"{self.codigo} x {self.cantidad} (Solicitud #{self.solicitud_id})"
 
+    CAMPOS_AVANCE = ('solicitud_id', 'estado_bodega', 'bulto_id', 'bodega')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Valores grabados que cuentan en el avance de la solicitud (ver signals)
+        self._avance_original = self.valores_avance()
+
+    def valores_avance(self, update_fields=None):
+        """
+        (solicitud_id, estado_bodega, bulto_id, bodega) de la instancia, o None si
+        alguno está diferido. Con update_fields, los campos que no se graban
+        conservan su valor original.
+        """
+        original = getattr(self, '_avance_original', None)
+        valores = []
+        for i, attname in enumerate(self.CAMPOS_AVANCE):
+            nombre = attname[:-3] if attname.endswith('_id') else attname
+            if update_fields is not None and nombre not in update_fields and attname not in update_fields:
+                if original is None:
+                    return None
+                valores.append(original[i])
+            elif attname in self.__dict__:
+                valores.append(self.__dict__[attname])
+            else:
+                return None
+        return tuple(valores)
+
+    def save(self, *args, **kwargs):
+        from core.busqueda import CAMPOS_DETALLE, texto_detalle
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or set(update_fields) & set(CAMPOS_DETALLE):
+            self.texto_busqueda = texto_detalle(self)
+            if update_fields is not None:
+                kwargs['update_fields'] = list(update_fields) + ['texto_busqueda']
+        super().save(*args, **kwargs)
+
     def estado_bodega_config(self):
         return EstadoWorkflow.obtener(EstadoWorkflow.TIPO_DETALLE, self.estado_bodega)
 
     def get_estado_bodega_display(self):
         return EstadoWorkflow.etiqueta(EstadoWorkflow.TIPO_DETALLE, self.estado_bodega)
+
+
+class SolicitudTransporte(models.Model):
+    """
+    Transportes involucrados en una solicitud (el suyo y el de cada bulto).
+
+    Tabla mantenida por señales (ver solicitudes.services.sincronizar_transportes):
+    filtrar por transporte es un JOIN por índice (transporte, solicitud) en vez
+    de un OR sobre bultos y detalles con DISTINCT.
+    """
+
+    solicitud = models.ForeignKey(
+        Solicitud,
+        on_delete=models.CASCADE,
+        related_name='transportes_involucrados',
+    )
+    transporte = models.CharField(max_length=100)
+
+    class Meta:
+        db_table = 'solicitudes_transportes'
+        verbose_name = 'Transporte de solicitud'
+        verbose_name_plural = 'Transportes de solicitudes'
+        unique_together = ('solicitud', 'transporte')
+        indexes = [
+            models.Index(fields=['transporte', 'solicitud'], name='idx_sol_transp_transp_sol'),
+        ]
+
+    def __str__(self):
+        return f"{self.transporte} (Solicitud #{self.solicitud_id})"
+
+
+class TransporteEnUso(models.Model):
+    """
+    Registro de valores de transporte distintos que aparecen en solicitudes y
+    bultos, con la cantidad de solicitudes que los involucran.
+
+    Alimenta el filtro de transporte del dashboard sin recorrer Bulto y
+    Solicitud completos. Se mantiene en solicitudes.services.sincronizar_transportes
+    (y al eliminar solicitudes), recontando solo los transportes que cambian.
+    """
+
+    transporte = models.CharField(max_length=100, unique=True)
+    solicitudes = models.PositiveIntegerField(default=0)
+    ultimo_uso = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'solicitudes_transportes_en_uso'
+        verbose_name = 'Transporte en uso'
+        verbose_name_plural = 'Transportes en uso'
+        ordering = ['transporte']
+
+    def __str__(self):
+        return f"{self.transporte} ({self.solicitudes} solicitudes)"
+
+    @classmethod
+    def disponibles(cls):
+        """Transportes con al menos una solicitud, ordenados alfabéticamente."""
+        return list(
+            cls.objects
+            .filter(solicitudes__gt=0)
+            .order_by('transporte')
+            .values_list('transporte', flat=True)
+        )
+
+
+class ContadorSolicitudes(models.Model):
+    """
+    Cantidad de solicitudes por (estado, urgente) para las tarjetas del dashboard.
+
+    Se ajusta en la misma transacción que el save/delete de la solicitud
+    (ver solicitudes.contadores). Las modificaciones con QuerySet.update()
+    no pasan por señales: reconciliar con `python manage.py reconciliar_contadores`.
+    """
+
+    estado = models.CharField(max_length=50)
+    urgente = models.BooleanField(default=False)
+    total = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'solicitudes_contador_estado'
+        verbose_name = 'Contador de solicitudes'
+        verbose_name_plural = 'Contadores de solicitudes'
+        unique_together = ('estado', 'urgente')
+
+    def __str__(self):
+        return f"{self.estado}{' (urgente)' if self.urgente else ''}: {self.total}"
+
+
+class ContadorBodega(models.Model):
+    """
+    Solicitudes pendientes con al menos una línea en (bodega, estado_bodega).
+
+    Cuenta solicitudes, no líneas: es lo que muestra la tarjeta del usuario de
+    bodega. Se mantiene igual que ContadorSolicitudes.
+    """
+
+    bodega = models.CharField(max_length=50)
+    estado_bodega = models.CharField(max_length=30)
+    total = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'solicitudes_contador_bodega'
+        verbose_name = 'Contador por bodega'
+        verbose_name_plural = 'Contadores por bodega'
+        unique_together = ('bodega', 'estado_bodega')
+
+    def __str__(self):
+        return f"{self.bodega} / {self.estado_bodega}: {self.total}"
+
+
+class SolicitudArchivada(models.Model):
+    """
+    Solicitud cerrada (despachada o cancelada) movida fuera de las tablas
+    operativas por solicitudes.archivo, junto con sus detalles, bultos,
+    transferencias y reservas.
+
+    Las columnas son las que filtran los reportes; `datos` guarda las filas
+    originales completas (ver solicitudes.archivo.reconstruir).
+    """
+
+    id = models.BigIntegerField(primary_key=True, verbose_name='ID original')
+    fecha_solicitud = models.DateField(verbose_name='Fecha de solicitud')
+    tipo = models.CharField(max_length=10, verbose_name='Tipo de solicitud')
+    estado = models.CharField(max_length=50, verbose_name='Estado')
+    urgente = models.BooleanField(default=False, verbose_name='¿Es urgente?')
+    cliente = models.CharField(max_length=200, verbose_name='Cliente')
+    numero_pedido = models.CharField(max_length=50, blank=True, verbose_name='Número de pedido / OF')
+    numero_st = models.CharField(max_length=20, blank=True, verbose_name='Número ST')
+    numero_guia_despacho = models.CharField(max_length=100, blank=True, verbose_name='Número de Guía/Factura')
+    cerrada_en = models.DateTimeField(
+        verbose_name='Cerrada el',
+        help_text='fecha_despachado, o la última actualización si no la tiene (canceladas)'
+    )
+    texto_busqueda = models.TextField(blank=True, editable=False, verbose_name='Texto de búsqueda')
+    datos = models.JSONField(
+        encoder=DjangoJSONEncoder,
+        default=dict,
+        help_text='Filas originales: solicitud, detalles, bultos, transferencias y reservas'
+    )
+    archivada_en = models.DateTimeField(auto_now_add=True, verbose_name='Archivada el')
+
+    class Meta:
+        db_table = 'solicitudes_archivo'
+        ordering = ['-fecha_solicitud']
+        verbose_name = 'Solicitud archivada'
+        verbose_name_plural = 'Solicitudes archivadas'
+        indexes = [
+            models.Index(fields=['fecha_solicitud'], name='idx_sol_arch_fecha'),
+            models.Index(fields=['cerrada_en'], name='idx_sol_arch_cierre'),
+            models.Index(fields=['numero_pedido'], name='idx_sol_arch_pedido'),
+        ]
+
+    def __str__(self):
+        return f"Solicitud archivada #{self.pk} - {self.cliente}"
@@ -114,31 +114,116 @@ def descontar_stock_despachado(solicitud: Solicitud) -> Dict[str, Any]:
     return resultado
 
 
-class SolicitudServiceError(Exception):
-    """Error controlado en la creación de solicitudes."""
+def sincronizar_transportes(solicitudes: Iterable[Solicitud]) -> int:
+    """
+    Actualiza Solicitud.transporte_efectivo y la tabla SolicitudTransporte.
 
+    Recibe solicitudes con prefetch_related('detalles__bulto', 'bultos') para
+    no consultar bultos por solicitud. Se invoca junto al recálculo de lead
+    times (reportes.services.recalcular_lead_times), que ya se dispara ante
+    cambios de transporte en solicitudes, detalles y bultos.
 
-def _normalizar_transporte(valor: str) -> str:
+    Returns:
+        int: solicitudes cuyo transporte efectivo cambió.
     """
-    Normaliza la entrada de transporte utilizando la configuración dinámica.
+    from .models import SolicitudTransporte
+
+    solicitudes = list(solicitudes)
+    if not solicitudes:
+        return 0
+
+    cambiadas = []
+    deseados = {}
+    for solicitud in solicitudes:
+        bultos = solicitud.get_bultos()
+        efectivo = solicitud.calcular_transporte_efectivo(bultos)
+        if solicitud.transporte_efectivo != efectivo:
+            solicitud.transporte_efectivo = efectivo
+            cambiadas.append(solicitud)
+        deseados[solicitud.id] = solicitud.calcular_transportes_involucrados(bultos)
+
+    actuales = {}
+    for solicitud_id, transporte in (
+        SolicitudTransporte.objects
+        .filter(solicitud_id__in=deseados)
+        .values_list('solicitud_id', 'transporte')
+    ):
+        actuales.setdefault(solicitud_id, set()).add(transporte)
+
+    sobrantes = []
+    nuevos = []
+    for solicitud_id, transportes in deseados.items():
+        existentes = actuales.get(solicitud_id, set())
+        sobrantes.extend((solicitud_id, t) for t in existentes - transportes)
+        nuevos.extend(
+            SolicitudTransporte(solicitud_id=solicitud_id, transporte=t)
+            for t in transportes - existentes
+        )
+
+    with transaction.atomic():
+        if cambiadas:
+            # bulk_update no pasa por save() ni dispara señales
+            Solicitud.objects.bulk_update(cambiadas, ['transporte_efectivo'])
+        for solicitud_id, transporte in sobrantes:
+            SolicitudTransporte.objects.filter(solicitud_id=solicitud_id, transporte=transporte).delete()
+        if nuevos:
+            SolicitudTransporte.objects.bulk_create(nuevos, ignore_conflicts=True)
+        afectados = {t for _, t in sobrantes} | {n.transporte for n in nuevos}
+        if afectados:
+            recontar_transportes_en_uso(afectados, vistos={n.transporte for n in nuevos})
+
+    return len(cambiadas)
+
+
+def recontar_transportes_en_uso(transportes, vistos=()):
     """
-    activos = list(TransporteConfig.activos())
-    default_slug = activos[0].slug if activos else "PESCO"
+    Recalcula TransporteEnUso.solicitudes para los transportes indicados.
 
-    if not valor:
-        return default_slug
+    Cuenta sobre el índice (transporte, solicitud) de SolicitudTransporte solo
+    para los valores que cambiaron; los de `vistos` actualizan ultimo_uso.
+    """
+    from django.db.models import Count
+    from django.utils import timezone
+
+    from .models import SolicitudTransporte, TransporteEnUso
+
+    transportes = {t for t in transportes if t}
+    if not transportes:
+        return
+    conteos = dict(
+        SolicitudTransporte.objects
+        .filter(transporte__in=transportes)
+        .values('transporte')
+        .annotate(total=Count('pk'))
+        .order_by()
+        .values_list('transporte', 'total')
+    )
+    ahora = timezone.now()
+    for transporte in sorted(transportes):
+        valores = {'solicitudes': conteos.get(transporte, 0)}
+        if transporte in vistos:
+            valores['ultimo_uso'] = ahora
+        TransporteEnUso.objects.update_or_create(transporte=transporte, defaults=valores)
 
-    valor_norm = valor.strip()
 
-    slug_match = next((t.slug for t in activos if t.slug.lower() == valor_norm.lower()), None)
-    if slug_match:
-        return slug_match
+class SolicitudServiceError(Exception):
+    """Error controlado en la creación de solicitudes."""
 
-    nombre_match = next((t.slug for t in activos if t.nombre.lower() == valor_norm.lower()), None)
-    if nombre_match:
-        return nombre_match
 
-    return default_slug
+def _normalizar_transporte(valor: str) -> str:
+    """
+    Normaliza la entrada de transporte utilizando la configuración dinámica
+    (índice en caché de TransporteConfig: slug, nombre o alias).
+    Sin valor se usa el transporte por defecto; un valor desconocido es error.
+    """
+    if not valor or not str(valor).strip():
+        return TransporteConfig.slug_por_defecto()
+
+    slug = TransporteConfig.resolver(valor)
+    if not slug:
+        disponibles = ", ".join(s for s, _ in TransporteConfig.opciones())
+        raise SolicitudServiceError(f"Transporte no válido: {valor} (disponibles: {disponibles})")
+    return slug
 
 
 def _normalizar_tipo(valor: str) -> str:
@@ -196,6 +281,135 @@ def _normalizar_estado(valor: Optional[str]) -> str:
     return mapping.get(valor_norm, "pendiente")
 
 
+def validar_stock(lineas: Iterable[Dict[str, Any]]) -> tuple[list, list]:
+    """
+    Separa las líneas de un pedido en las que tienen stock y las que no.
+
+    Cada línea es un dict con codigo, descripcion, cantidad y bodega (los
+    productos del payload o el cleaned_data del formset). Las líneas de bodega
+    013 siempre pasan. El stock de todos los pares (codigo, bodega) se lee en
+    una sola consulta.
+
+    Returns:
+        (con_stock, sin_stock): con_stock son las líneas recibidas, en orden;
+        sin_stock, un dict por línea rechazada con codigo, descripcion,
+        cantidad, bodega, problema, stock_disponible (None si no tiene bodega)
+        y faltante si el stock es insuficiente.
+    """
+    from bodega.models import Stock
+
+    lineas = list(lineas)
+    por_validar = {
+        ((linea.get("codigo") or "SC"), (linea.get("bodega") or "").strip())
+        for linea in lineas
+    }
+    por_validar = {(codigo, bodega) for codigo, bodega in por_validar if bodega and bodega != "013"}
+    disponible = {}
+    if por_validar:
+        filas = Stock.objects.filter(
+            codigo__in={codigo for codigo, _ in por_validar},
+            bodega__in={bodega for _, bodega in por_validar},
+        ).values_list("codigo", "bodega", "stock_disponible")
+        disponible = {(codigo, bodega): stock for codigo, bodega, stock in filas}
+
+    con_stock = []
+    sin_stock = []
+    for linea in lineas:
+        codigo = linea.get("codigo") or "SC"
+        cantidad = linea.get("cantidad")
+        bodega_asignada = (linea.get("bodega") or "").strip()
+
+        # Bodega 013 no requiere validación de stock - siempre permitir
+        if bodega_asignada == "013":
+            con_stock.append(linea)
+            continue
+
+        error = {
+            "codigo": codigo,
+            "descripcion": linea.get("descripcion", ""),
+            "cantidad": cantidad,
+            "bodega": bodega_asignada,
+        }
+        stock_disponible = disponible.get((codigo, bodega_asignada))
+        if not bodega_asignada:
+            sin_stock.append(dict(
+                error, bodega="Sin asignar", problema="No tiene bodega asignada", stock_disponible=None
+            ))
+        elif stock_disponible is None:
+            sin_stock.append(dict(
+                error, problema=f"El código no existe en bodega {bodega_asignada}", stock_disponible=0
+            ))
+        elif stock_disponible < cantidad:
+            sin_stock.append(dict(
+                error,
+                problema=f"Stock insuficiente: tiene {stock_disponible}, se solicitan {cantidad}",
+                stock_disponible=stock_disponible,
+                faltante=cantidad - stock_disponible,
+            ))
+        else:
+            con_stock.append(linea)
+    return con_stock, sin_stock
+
+
+def crear_detalles(
+    solicitud: Solicitud,
+    lineas: Iterable[Dict[str, Any]],
+    estado_bodega: str = "pendiente",
+) -> list:
+    """
+    Inserta los detalles de una solicitud nueva y sus reservas de stock con
+    dos bulk_create, en vez de un create (y un get_or_create de reserva) por
+    línea.
+
+    bulk_create no pasa por save() ni por las señales de SolicitudDetalle; lo
+    que hacen para una línea nueva se hace aquí para todas: texto_busqueda,
+    reserva (consumida si la línea nace 'preparado'), contadores por bodega,
+    avance de la solicitud (lineas_*), lead time y caché del dashboard.
+    """
+    from bodega.models import StockReserva
+    from core.busqueda import texto_detalle
+    from core.cache_datos import invalidar_cache_datos
+    from reportes.services import programar_recalculo_lead_time
+
+    from . import contadores
+
+    detalles = []
+    for linea in lineas:
+        detalle = SolicitudDetalle(
+            solicitud=solicitud,
+            codigo=linea.get("codigo") or "SC",
+            descripcion=linea.get("descripcion") or "",
+            cantidad=linea.get("cantidad"),
+            bodega=(linea.get("bodega") or "").strip(),
+            estado_bodega=estado_bodega,
+        )
+        detalle.texto_busqueda = texto_detalle(detalle)
+        detalles.append(detalle)
+    if not detalles:
+        return detalles
+
+    with transaction.atomic():
+        bodega_antes = contadores.claves_bodega([solicitud.pk])
+        SolicitudDetalle.objects.bulk_create(detalles)
+        StockReserva.objects.bulk_create([
+            StockReserva(
+                detalle=detalle,
+                solicitud=solicitud,
+                codigo=detalle.codigo,
+                bodega=detalle.bodega,
+                cantidad=detalle.cantidad,
+                estado="consumida" if detalle.estado_bodega == "preparado" else "reservada",
+            )
+            for detalle in detalles
+            if detalle.bodega and detalle.codigo
+        ])
+        contadores.ajustar_bodega_conjunto(bodega_antes, contadores.claves_bodega([solicitud.pk]))
+        contadores.recalcular_avance([solicitud.pk])
+        programar_recalculo_lead_time(solicitud.pk)
+        invalidar_cache_datos()
+    return detalles
+
+
 @transaction.atomic
 def crear_solicitud_desde_payload(
     payload: Dict[str, Any],
@@ -273,63 +487,8 @@ def crear_solicitud_desde_payload(
         raise SolicitudServiceError("Debe haber al menos un producto en 'productos'.")
 
     # ⚠️ VALIDACIÓN DE STOCK: Separar códigos con stock de los que no tienen
-    from bodega.models import Stock
-    
-    productos_con_stock = []
-    productos_sin_stock = []
-    
-    for prod in productos_validos:
-        codigo = prod["codigo"]
-        cantidad = prod["cantidad"]
-        bodega_asignada = prod.get("bodega", "").strip()
-        
-        # Bodega 013 no requiere validación de stock - siempre permitir
-        if bodega_asignada == "013":
-            productos_con_stock.append(prod)
-            continue
-        
-        # Si no hay bodega asignada, no tiene stock
-        if not bodega_asignada:
-            productos_sin_stock.append({
-                'codigo': codigo,
-                'descripcion': prod.get('descripcion', ''),
-                'cantidad': cantidad,
-                'bodega': 'Sin asignar',
-                'problema': 'No tiene bodega asignada',
-                'stock_disponible': None
-            })
-            continue
-        
-        # Validar stock en la bodega asignada
-        stock_bodega = Stock.objects.filter(
-            codigo=codigo,
-            bodega=bodega_asignada
-        ).first()
-        
-        if not stock_bodega:
-            productos_sin_stock.append({
-                'codigo': codigo,
-                'descripcion': prod.get('descripcion', ''),
-                'cantidad': cantidad,
-                'bodega': bodega_asignada,
-                'problema': f'El código no existe en bodega {bodega_asignada}',
-                'stock_disponible': 0
-            })
-        elif stock_bodega.stock_disponible < cantidad:
-            faltante = cantidad - stock_bodega.stock_disponible
-            productos_sin_stock.append({
-                'codigo': codigo,
-                'descripcion': prod.get('descripcion', ''),
-                'cantidad': cantidad,
-                'bodega': bodega_asignada,
-                'problema': f'Stock insuficiente: tiene {stock_bodega.stock_disponible}, se solicitan {cantidad}',
-                'stock_disponible': stock_bodega.stock_disponible,
-                'faltante': faltante
-            })
-        else:
-            # Stock suficiente, agregar a los que tienen stock
-            productos_con_stock.append(prod)
-    
+    productos_con_stock, productos_sin_stock = validar_stock(productos_validos)
+
     # ⚠️ REGLA CRÍTICA: Si hay un solo código y no tiene stock, NO crear la solicitud
     if len(productos_validos) == 1 and len(productos_sin_stock) == 1:
         error = productos_sin_stock[0]
@@ -413,22 +572,16 @@ def crear_solicitud_desde_payload(
     print(f"   Productos: {len(productos_con_stock)} (de {len(productos_validos)} ingresados)")
     print(f"{'='*60}\n")
 
+    # Si todas las bodegas son '013', todos los detalles van a 'preparado'
+    # porque la solicitud ya está en 'en_despacho' y no requieren preparación
+    # Si no todas son 013, usan 'pendiente' (requieren preparación normal)
+    crear_detalles(
+        solicitud,
+        productos_con_stock,
+        estado_bodega="preparado" if todas_bodega_013 else "pendiente",
+    )
+
     for prod in productos_con_stock:
-        bodega_prod = (prod.get("bodega") or "").strip()
-        # Si todas las bodegas son '013', todos los detalles van a 'preparado'
-        # porque la solicitud ya está en 'en_despacho' y no requieren preparación
-        # Si no todas son 013, usan 'pendiente' (requieren preparación normal)
-        estado_bodega_inicial = "preparado" if todas_bodega_013 else "pendiente"
-        
-        detalle = SolicitudDetalle.objects.create(
-            solicitud=solicitud,
-            codigo=prod["codigo"],
-            descripcion=prod["descripcion"],
-            cantidad=prod["cantidad"],
-            bodega=bodega_prod,
-            estado_bodega=estado_bodega_inicial,
-        )
-        
         # Logging para ver bodega asignada
         bodega_info = f"Bodega: {prod.get('bodega', 'N/A')}" if prod.get('bodega') else "Sin bodega"
         auto_info = " (auto)" if prod.get('_bodega_auto') else ""
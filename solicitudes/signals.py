@@ -1,8 +1,11 @@
 from django.apps import apps
-from django.db.models.signals import post_delete, post_save
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 
-from .models import SolicitudDetalle
+from . import contadores
+from .models import Solicitud, SolicitudDetalle
+from .services import recontar_transportes_en_uso
 
 
 def _get_stock_reserva_model():
@@ -55,3 +58,147 @@ def liberar_reserva(sender, instance, **kwargs):
     StockReserva = _get_stock_reserva_model()
     StockReserva.objects.filter(detalle=instance).update(estado='liberada')
 
+
+@receiver(pre_delete, sender=Solicitud)
+def solicitud_por_eliminar(sender, instance, **kwargs):
+    # Las filas de SolicitudTransporte se borran en cascada: capturar antes
+    instance._transportes_en_uso = set(
+        instance.transportes_involucrados.values_list('transporte', flat=True)
+    )
+    instance._contador_anterior = contadores.estado_actual_solicitud(instance.pk)
+
+
+@receiver(post_delete, sender=Solicitud)
+def solicitud_eliminada(sender, instance, **kwargs):
+    """Descuenta la solicitud eliminada del registro de transportes en uso y de los contadores."""
+    transportes = getattr(instance, '_transportes_en_uso', None)
+    if transportes:
+        recontar_transportes_en_uso(transportes)
+    contadores.ajustar_solicitud(getattr(instance, '_contador_anterior', None), None)
+
+
+# ============================================================================
+# Contadores por estado (tarjetas del dashboard)
+# ============================================================================
+
+CAMPOS_CONTADOR_SOLICITUD = frozenset({'estado', 'urgente'})
+CAMPOS_CONTADOR_DETALLE = frozenset({'bodega', 'estado_bodega'})
+
+
+@receiver(pre_save, sender=Solicitud)
+def solicitud_por_guardar(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._contador_pendiente = False
+    if raw or (update_fields is not None and not (set(update_fields) & CAMPOS_CONTADOR_SOLICITUD)):
+        return
+    anterior = contadores.estado_actual_solicitud(instance.pk)
+    instance._contador_anterior = anterior
+    instance._contador_pendiente = True
+    # Entrar o salir de 'pendiente' cambia los contadores por bodega de sus detalles
+    instance._contador_bodega = (
+        anterior is not None
+        and anterior[0] != instance.estado
+        and 'pendiente' in (anterior[0], instance.estado)
+    )
+    if instance._contador_bodega:
+        contadores.capturar_bodega(instance.pk, instance)
+
+
+@receiver(post_save, sender=Solicitud)
+def solicitud_contada(sender, instance, raw=False, **kwargs):
+    """Mueve la solicitud entre (estado, urgente) en la misma transacción del save."""
+    if raw or not getattr(instance, '_contador_pendiente', False):
+        return
+    instance._contador_pendiente = False
+    contadores.ajustar_solicitud(instance._contador_anterior, (instance.estado, instance.urgente))
+    if instance._contador_bodega:
+        contadores.ajustar_bodega(instance.pk, instance)
+
+
+@receiver(pre_save, sender=SolicitudDetalle)
+def detalle_por_guardar(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._contador_pendiente = False
+    if raw or (update_fields is not None and not (set(update_fields) & CAMPOS_CONTADOR_DETALLE)):
+        return
+    instance._contador_pendiente = True
+    contadores.capturar_bodega(instance.solicitud_id, instance)
+
+
+@receiver(post_save, sender=SolicitudDetalle)
+def detalle_contado(sender, instance, raw=False, **kwargs):
+    """Actualiza los contadores por bodega de la solicitud del detalle."""
+    if raw or not getattr(instance, '_contador_pendiente', False):
+        return
+    instance._contador_pendiente = False
+    contadores.ajustar_bodega(instance.solicitud_id, instance)
+
+
+# ============================================================================
+# Avance de líneas de cada solicitud (Solicitud.lineas_*)
+# ============================================================================
+
+def _avance_grabado(detalle_id):
+    fila = SolicitudDetalle.objects.filter(pk=detalle_id).values_list(*SolicitudDetalle.CAMPOS_AVANCE).first()
+    return tuple(fila) if fila else None
+
+
+@receiver(pre_save, sender=SolicitudDetalle)
+def detalle_avance_por_guardar(sender, instance, raw=False, **kwargs):
+    # Instancia cargada con campos diferidos: leer los valores grabados
+    if not raw and instance.pk is not None and instance._avance_original is None:
+        instance._avance_original = _avance_grabado(instance.pk)
+
+
+@receiver(post_save, sender=SolicitudDetalle)
+def detalle_avance_guardado(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Mueve la línea en los contadores de avance de su solicitud (F(), misma transacción)."""
+    if raw:
+        return
+    nuevo = instance.valores_avance(update_fields) or _avance_grabado(instance.pk)
+    # Un clon (pk=None) conserva el _avance_original del detalle copiado
+    contadores.ajustar_avance(None if created else instance._avance_original, nuevo)
+    instance._avance_original = nuevo
+
+
+def _borra_solicitud(origin):
+    """¿El borrado viene de eliminar solicitudes (cascada a sus detalles)?"""
+    modelo = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(modelo, Solicitud)
+
+
+@receiver(pre_delete, sender=SolicitudDetalle)
+def detalle_avance_por_eliminar(sender, instance, origin=None, **kwargs):
+    # En cascada el detalle se acaba de leer; borrado directo: la instancia puede estar desactualizada
+    if origin is instance:
+        instance._avance_original = _avance_grabado(instance.pk)
+
+
+@receiver(post_delete, sender=SolicitudDetalle)
+def detalle_avance_eliminado(sender, instance, origin=None, **kwargs):
+    # Si se borra la solicitud, sus contadores de avance se van con ella: sin un UPDATE por línea
+    if origin is not None and _borra_solicitud(origin):
+        return
+    contadores.ajustar_avance(instance._avance_original or instance.valores_avance(), None)
+
+
+@receiver(pre_delete, sender='despacho.Bulto')
+def bulto_por_eliminar(sender, instance, **kwargs):
+    # on_delete=SET_NULL desasigna los detalles con un UPDATE, sin señales
+    instance._solicitudes_avance = list(
+        instance.detalles.order_by().values_list('solicitud_id', flat=True).distinct()
+    )
+
+
+@receiver(post_delete, sender='despacho.Bulto')
+def bulto_eliminado(sender, instance, **kwargs):
+    if getattr(instance, '_solicitudes_avance', None):
+        contadores.recalcular_avance(instance._solicitudes_avance)
+
+
+@receiver(pre_delete, sender=SolicitudDetalle)
+def detalle_por_eliminar(sender, instance, origin=None, **kwargs):
+    contadores.capturar_bodega(instance.solicitud_id, origin if origin is not None else instance)
+
+
+@receiver(post_delete, sender=SolicitudDetalle)
+def detalle_eliminado_contado(sender, instance, origin=None, **kwargs):
+    contadores.ajustar_bodega(instance.solicitud_id, origin if origin is not None else instance)
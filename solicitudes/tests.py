@@ -1,3 +1,349 @@
+from datetime import timedelta
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from bodega.models import Stock, StockReserva
+from configuracion.models import EstadoWorkflow
+from despacho.models import Bulto
+
+from . import contadores
+from .models import ContadorBodega, ContadorSolicitudes, Solicitud, SolicitudArchivada, SolicitudDetalle
+from .services import crear_detalles, validar_stock
+
+
+class ContadoresTestCase(TestCase):
+    """
+    Base: crea la tabla stock (no administrada por Django) y los estados del
+    workflow, y verifica los contadores contra un recálculo desde cero.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        # Fuera de la transacción del TestCase: SQLite no altera el esquema dentro de una
+        if Stock._meta.db_table not in connection.introspection.table_names():
+            with connection.schema_editor() as editor:
+                editor.create_model(Stock)
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        for tipo, slugs in (
+            (EstadoWorkflow.TIPO_SOLICITUD, ('pendiente', 'en_despacho', 'embalado', 'listo_despacho',
+                                             'en_ruta', 'despachado', 'cancelado')),
+            (EstadoWorkflow.TIPO_DETALLE, ('pendiente', 'preparando', 'preparado')),
+        ):
+            for orden, slug in enumerate(slugs):
+                EstadoWorkflow.objects.get_or_create(
+                    tipo=tipo, slug=slug, defaults={'nombre': slug.title(), 'orden': orden}
+                )
+        EstadoWorkflow.limpiar_cache()
+
+    def crear_solicitud(self, estado='pendiente', lineas=(), **campos):
+        solicitud = Solicitud.objects.create(
+            tipo='PC',
+            cliente='SUC PRUEBA',
+            estado=estado,
+            codigo='SC',
+            descripcion='',
+            cantidad_solicitada=1,
+            **campos,
+        )
+        for codigo, bodega, cantidad, estado_bodega in lineas:
+            SolicitudDetalle.objects.create(
+                solicitud=solicitud,
+                codigo=codigo,
+                descripcion=f'Producto {codigo}',
+                cantidad=cantidad,
+                bodega=bodega,
+                estado_bodega=estado_bodega,
+            )
+        return solicitud
+
+    def contadores_grabados(self):
+        # Las señales pueden dejar filas en 0; reconciliar() solo crea las que cuentan algo
+        return (
+            sorted(ContadorSolicitudes.objects.exclude(total=0).values_list('estado', 'urgente', 'total')),
+            sorted(ContadorBodega.objects.exclude(total=0).values_list('bodega', 'estado_bodega', 'total')),
+        )
+
+    def assertContadoresConsistentes(self):
+        self.assertEqual(contadores.avance_desfasado(), [])
+        grabados = self.contadores_grabados()
+        contadores.reconciliar()
+        self.assertEqual(self.contadores_grabados(), grabados)
+
+
+class ContadoresPorSenalesTests(ContadoresTestCase):
+
+    def test_crear_modificar_y_eliminar(self):
+        solicitud = self.crear_solicitud(lineas=[
+            ('A1', '013-01', 2, 'pendiente'),
+            ('A2', '013-03', 1, 'pendiente'),
+            ('A3', '013', 4, 'preparado'),
+        ])
+        self.crear_solicitud(estado='en_despacho', urgente=True, lineas=[('B1', '013-05', 1, 'preparado')])
+        self.assertContadoresConsistentes()
+
+        detalle = solicitud.detalles.get(codigo='A1')
+        detalle.estado_bodega = 'preparado'
+        detalle.save()
+        solicitud.detalles.get(codigo='A2').delete()
+        self.assertContadoresConsistentes()
+
+        solicitud.refresh_from_db()
+        self.assertEqual(
+            (solicitud.lineas_total, solicitud.lineas_preparadas, solicitud.lineas_por_preparar),
+            (2, 2, 0),
+        )
+
+        solicitud.estado = 'en_despacho'
+        solicitud.save()
+        self.assertContadoresConsistentes()
+
+        solicitud.delete()
+        self.assertContadoresConsistentes()
+
+    def test_save_completo_no_pisa_avance(self):
+        solicitud = self.crear_solicitud(lineas=[('A1', '013-01', 2, 'pendiente')])
+        vieja = Solicitud.objects.get(pk=solicitud.pk)
+        SolicitudDetalle.objects.create(solicitud=solicitud, codigo='A2', cantidad=1, bodega='013-01')
+
+        vieja.descripcion = 'editada'
+        vieja.save()
+        solicitud.refresh_from_db()
+        self.assertEqual((solicitud.descripcion, solicitud.lineas_total), ('editada', 2))
+        self.assertContadoresConsistentes()
+
+    def test_eliminar_solicitud_sin_update_por_linea(self):
+        solicitud = self.crear_solicitud(lineas=[
+            ('A1', '013-01', 1, 'pendiente'),
+            ('A2', '013-01', 1, 'preparado'),
+            ('A3', '013-03', 1, 'pendiente'),
+        ])
+        with CaptureQueriesContext(connection) as consultas:
+            solicitud.delete()
+        tabla = connection.ops.quote_name(Solicitud._meta.db_table)
+        self.assertEqual(
+            [c['sql'] for c in consultas.captured_queries if c['sql'].startswith(f'UPDATE {tabla}')],
+            [],
+        )
+        self.assertContadoresConsistentes()
+
+    def test_eliminar_bulto_desasigna_lineas(self):
+        solicitud = self.crear_solicitud(estado='embalado', lineas=[
+            ('A1', '013-01', 2, 'preparado'),
+            ('A2', '013-01', 1, 'preparado'),
+        ])
+        bulto = Bulto.objects.create(solicitud=solicitud)
+        for detalle in solicitud.detalles.all():
+            detalle.bulto = bulto
+            detalle.save()
+        solicitud.refresh_from_db()
+        self.assertEqual(solicitud.lineas_embaladas, 2)
+
+        bulto.delete()
+        self.assertContadoresConsistentes()
+        solicitud.refresh_from_db()
+        self.assertEqual(solicitud.lineas_embaladas, 0)
+
+
+class CrearDetallesTests(ContadoresTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Stock.objects.bulk_create([
+            Stock(codigo='A1', bodega='013-01', stock_disponible=10),
+            Stock(codigo='A2', bodega='013-03', stock_disponible=1),
+            Stock(codigo='A3', bodega='013-01', stock_disponible=5),
+        ])
+
+    def test_validar_stock_en_una_consulta(self):
+        lineas = [
+            {'codigo': 'A1', 'descripcion': 'uno', 'cantidad': 3, 'bodega': '013-01'},
+            {'codigo': 'A2', 'descripcion': 'dos', 'cantidad': 4, 'bodega': '013-03'},
+            {'codigo': 'NO', 'descripcion': 'tres', 'cantidad': 1, 'bodega': '013-01'},
+            {'codigo': 'X', 'descripcion': 'cuatro', 'cantidad': 9, 'bodega': '013'},
+            {'codigo': 'Y', 'descripcion': 'cinco', 'cantidad': 1, 'bodega': ''},
+        ]
+        with self.assertNumQueries(1):
+            con_stock, sin_stock = validar_stock(lineas)
+
+        self.assertEqual([linea['codigo'] for linea in con_stock], ['A1', 'X'])
+        self.assertEqual(
+            [(e['codigo'], e['stock_disponible'], e.get('faltante')) for e in sin_stock],
+            [('A2', 1, 3), ('NO', 0, None), ('Y', None, None)],
+        )
+        self.assertEqual(sin_stock[2]['bodega'], 'Sin asignar')
+
+    def test_igual_que_crear_por_linea(self):
+        lineas = [
+            {'codigo': 'A1', 'descripcion': 'Válvula', 'cantidad': 3, 'bodega': '013-01'},
+            {'codigo': 'A3', 'descripcion': 'Cilindro', 'cantidad': 2, 'bodega': '013-01'},
+            {'codigo': 'Z9', 'descripcion': 'Manguera', 'cantidad': 1, 'bodega': '013'},
+        ]
+        en_lote = self.crear_solicitud()
+        crear_detalles(en_lote, lineas)
+        por_linea = self.crear_solicitud()
+        for linea in lineas:
+            SolicitudDetalle.objects.create(solicitud=por_linea, estado_bodega='pendiente', **linea)
+
+        def resultado(solicitud):
+            solicitud.refresh_from_db()
+            return (
+                list(solicitud.detalles.values_list(
+                    'codigo', 'descripcion', 'cantidad', 'bodega', 'estado_bodega', 'texto_busqueda'
+                )),
+                list(StockReserva.objects.filter(solicitud=solicitud).order_by('detalle_id').values_list(
+                    'codigo', 'bodega', 'cantidad', 'estado'
+                )),
+                tuple(getattr(solicitud, campo) for campo in Solicitud.CAMPOS_AVANCE),
+            )
+
+        self.assertEqual(resultado(en_lote), resultado(por_linea))
+        self.assertContadoresConsistentes()
+
+    def test_solo_bodega_despacho_nace_preparado(self):
+        solicitud = self.crear_solicitud(estado='en_despacho')
+        crear_detalles(
+            solicitud,
+            [{'codigo': 'Z9', 'descripcion': 'Manguera', 'cantidad': 2, 'bodega': '013'}],
+            estado_bodega='preparado',
+        )
+        self.assertEqual(
+            list(StockReserva.objects.filter(solicitud=solicitud).values_list('estado', flat=True)),
+            ['consumida'],
+        )
+        self.assertContadoresConsistentes()
+
+
+class CambiarEstadoTests(ContadoresTestCase):
+
+    def setUp(self):
+        Stock.objects.bulk_create([
+            Stock(codigo='A1', bodega='013', stock_disponible=10),
+            Stock(codigo='A2', bodega='013', stock_disponible=1),
+        ])
+        self.solicitud = self.crear_solicitud(estado='listo_despacho', lineas=[
+            ('A1', '013-01', 4, 'preparado'),
+            ('A2', '013-01', 3, 'preparando'),
+            ('A4', '013-01', 1, 'pendiente'),
+        ])
+        self.bulto = Bulto.objects.create(solicitud=self.solicitud, estado='listo_despacho')
+        for detalle in self.solicitud.detalles.exclude(codigo='A4'):
+            detalle.bulto = self.bulto
+            detalle.save()
+        self.pendiente = self.crear_solicitud(lineas=[('A1', '013-01', 1, 'pendiente')])
+
+    def stock_013(self):
+        return dict(Stock.objects.filter(bodega='013').values_list('codigo', 'stock_disponible'))
+
+    def test_despachar(self):
+        from .transiciones import cambiar_estado
+
+        reporte = cambiar_estado([self.solicitud.pk, self.pendiente.pk], 'despachado')
+        self.assertEqual(reporte[self.solicitud.pk]['bultos_finalizados'], 1)
+        self.assertEqual(reporte[self.solicitud.pk]['detalles_preparados'], 1)
+
+        # Solo salen las líneas con bulto, sin dejar stock negativo
+        self.assertEqual(self.stock_013(), {'A1': 6, 'A2': 0})
+
+        self.solicitud.refresh_from_db()
+        self.assertEqual(self.solicitud.estado, 'despachado')
+        self.assertIsNotNone(self.solicitud.fecha_despachado)
+        self.bulto.refresh_from_db()
+        self.assertEqual(self.bulto.estado, 'finalizado')
+        self.assertIsNotNone(self.bulto.fecha_envio)
+        self.assertEqual(
+            set(StockReserva.objects.filter(detalle__bulto=self.bulto).values_list('estado', flat=True)),
+            {'consumida'},
+        )
+        self.assertContadoresConsistentes()
+
+    def test_despachar_recalcula_lead_time_de_bulto_compartido(self):
+        from reportes.models import SolicitudLeadTime
+        from .transiciones import cambiar_estado
+
+        self.pendiente.detalles.update(bulto=self.bulto)
+        SolicitudLeadTime.objects.all().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            cambiar_estado([self.solicitud.pk], 'despachado')
+        self.assertEqual(
+            set(SolicitudLeadTime.objects.values_list('solicitud_id', flat=True)),
+            {self.solicitud.pk, self.pendiente.pk},
+        )
+
+    def test_despachar_de_nuevo_no_descuenta(self):
+        from .transiciones import cambiar_estado
+
+        cambiar_estado([self.solicitud.pk], 'despachado')
+        reporte = cambiar_estado([self.solicitud.pk], 'despachado')
+        self.assertFalse(reporte[self.solicitud.pk]['cambio'])
+        self.assertEqual(self.stock_013(), {'A1': 6, 'A2': 0})
+        self.assertContadoresConsistentes()
+
+
+class ActualizacionMasivaTests(ContadoresTestCase):
+
+    def excel(self, filas):
+        from io import BytesIO
+
+        import pandas as pd
+
+        salida = BytesIO()
+        pd.DataFrame(filas, columns=['fecha', 'PC / OF', 'NUMERO', 'Cliente', 'ESTATUS', 'N° Guia']).to_excel(salida, index=False)
+        return salida.getvalue()
+
+    def test_exito_por_fila(self):
+        from .bulk_update import ejecutar_actualizacion_masiva
+
+        hoy = timezone.localdate()
+        en_despacho = self.crear_solicitud(numero_pedido='1001', fecha_solicitud=hoy)
+        embalada = self.crear_solicitud(numero_pedido='1002', fecha_solicitud=hoy)
+        # Sin el estado configurado, el lote de 'listo_despacho' falla y se revierte solo
+        EstadoWorkflow.objects.filter(slug='listo_despacho').delete()
+        EstadoWorkflow.limpiar_cache()
+
+        resultado = ejecutar_actualizacion_masiva(self.excel([
+            (hoy.strftime('%d/%m/%Y'), 'PC', 1001, 'SUC PRUEBA', 'EN DESPACHO', None),
+            (hoy.strftime('%d/%m/%Y'), 'PC', 1002, 'SUC PRUEBA', 'EMBALADO', 555),
+        ]))
+
+        # La guía de la segunda fila quedó grabada aunque su cambio de estado falló
+        self.assertEqual(resultado['actualizados'], 2)
+        self.assertEqual(len(resultado['errores']), 1)
+        en_despacho.refresh_from_db()
+        embalada.refresh_from_db()
+        self.assertEqual((en_despacho.estado, embalada.estado), ('en_despacho', 'pendiente'))
+        self.assertEqual(embalada.numero_guia_despacho, '555')
+        self.assertContadoresConsistentes()
+
+
+class ArchivoTests(ContadoresTestCase):
+
+    def test_archivar_cerradas(self):
+        from .archivo import archivar, fecha_corte, reconstruir
+
+        vieja = self.crear_solicitud(estado='despachado', lineas=[('A1', '013-01', 2, 'preparado')])
+        otra = self.crear_solicitud(estado='despachado', lineas=[('A2', '013-01', 1, 'preparado')])
+        vigente = self.crear_solicitud(lineas=[('A3', '013-03', 1, 'pendiente')])
+        # Un bulto con líneas de una solicitud archivable y de una vigente queda vigente
+        compartido = Bulto.objects.create(solicitud=vieja)
+        SolicitudDetalle.objects.filter(solicitud__in=[vieja, vigente]).update(bulto=compartido)
+        contadores.recalcular_avance()
+        hace_dos_años = timezone.now() - timedelta(days=730)
+        Solicitud.objects.filter(pk__in=[vieja.pk, otra.pk]).update(fecha_despachado=hace_dos_años)
+
+        totales = archivar(fecha_corte(12))
+
+        self.assertEqual(totales['solicitudes'], 2)
+        self.assertEqual(list(Solicitud.objects.values_list('pk', flat=True)), [vigente.pk])
+        compartido.refresh_from_db()
+        self.assertIsNone(compartido.solicitud_id)
+        self.assertContadoresConsistentes()
 
-# Create your tests here.
+        reconstruida = reconstruir(SolicitudArchivada.objects.get(pk=vieja.pk))
+        self.assertEqual([d.codigo for d in reconstruida.detalles_list], ['A1'])
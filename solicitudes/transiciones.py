@@ -0,0 +1,213 @@
+"""
+Cambio de estado de varias solicitudes a la vez.
+
+cambiar_estado() aplica la transición de N solicitudes con UPDATEs por
+conjunto dentro de una sola transacción:
+
+- estado, guía y timestamp de transición (fecha_en_despacho, ...);
+- contadores del dashboard (por estado y por bodega);
+- al pasar a 'despachado': bultos a 'finalizado' con fecha de envío/entrega,
+  detalles con bulto a 'preparado' (y su reserva consumida) y descuento del
+  stock de bodega 013, una sentencia para todos los códigos.
+
+La cantidad de consultas no depende de cuántas solicitudes se cierren (salvo
+el descuento, en lotes de LOTE_STOCK códigos). QuerySet.update() no dispara
+señales: lo que hacían (contadores, lead time, caché del dashboard) se hace
+aquí explícitamente.
+"""
+
+import logging
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from configuracion.models import EstadoWorkflow
+
+from . import contadores
+from .models import Solicitud, SolicitudDetalle
+from .services import SolicitudServiceError
+
+logger = logging.getLogger(__name__)
+
+BODEGA_DESPACHO = contadores.BODEGA_DESPACHO
+LOTE_STOCK = 500
+
+
+def cambiar_estado(solicitud_ids, nuevo_estado, numero_guia_despacho='', ahora=None):
+    """
+    Lleva las solicitudes a `nuevo_estado`.
+
+    Las que ya estaban en ese estado no se reprocesan (solo se graba la guía
+    si viene); en particular, una solicitud ya despachada no vuelve a
+    descontar stock.
+
+    Returns:
+        dict {id: reporte}; reporte tiene 'ok', 'estado_anterior', 'estado',
+        'cambio', 'bultos_finalizados', 'detalles_preparados', 'descontados',
+        'sin_stock_013' (códigos sin registro en bodega 013) y 'mensaje'.
+
+    Raises:
+        SolicitudServiceError: si el estado no existe en la configuración.
+    """
+    if not EstadoWorkflow.obtener(EstadoWorkflow.TIPO_SOLICITUD, nuevo_estado):
+        raise SolicitudServiceError(f"Estado '{nuevo_estado}' no existe")
+
+    ids = {int(i) for i in solicitud_ids}
+    ahora = ahora or timezone.now()
+    finalizados = []
+    numero_guia_despacho = (numero_guia_despacho or '').strip()[:100]
+
+    with transaction.atomic():
+        filas = {
+            fila['pk']: fila
+            for fila in (
+                Solicitud.objects
+                .select_for_update()
+                .filter(pk__in=ids)
+                .values('pk', 'estado', 'urgente', 'afecta_stock')
+            )
+        }
+        reporte = {
+            pk: _reporte(fila['estado'], nuevo_estado, fila['estado'] != nuevo_estado)
+            for pk, fila in filas.items()
+        }
+        for pk in ids - set(filas):
+            reporte[pk] = dict(_reporte(None, nuevo_estado, False), ok=False, mensaje='Solicitud no encontrada')
+
+        cambian = [pk for pk, fila in filas.items() if fila['estado'] != nuevo_estado]
+        if numero_guia_despacho and filas:
+            Solicitud.objects.filter(pk__in=filas).update(numero_guia_despacho=numero_guia_despacho, updated_at=ahora)
+        if cambian:
+            _actualizar_estado(cambian, filas, nuevo_estado, ahora)
+        if cambian and nuevo_estado == 'despachado':
+            con_stock = [pk for pk in cambian if filas[pk]['afecta_stock']]
+            finalizados = _finalizar_bultos(cambian, ahora, reporte)
+            _preparar_detalles(cambian, ahora, reporte)
+            _descontar_stock(con_stock, reporte)
+
+        if cambian or numero_guia_despacho:
+            from core.cache_datos import invalidar_cache_datos
+            from reportes.services import programar_recalculo_lead_time
+
+            # Otras solicitudes con líneas en los bultos finalizados también cambian
+            programar_recalculo_lead_time(*cambian, bultos=finalizados)
+            invalidar_cache_datos()
+
+    for pk in cambian:
+        datos = reporte[pk]
+        datos['mensaje'] = f"{datos['estado_anterior']} → {nuevo_estado}"
+        if datos['sin_stock_013']:
+            datos['ok'] = False
+            datos['mensaje'] += f" (sin stock en bodega 013: {', '.join(datos['sin_stock_013'])})"
+    logger.info(
+        f"Cambio de estado a {nuevo_estado}: {len(cambian)} de {len(ids)} solicitudes "
+        f"({len(ids) - len(filas)} no encontradas)"
+    )
+    return reporte
+
+
+def _reporte(estado_anterior, nuevo_estado, cambio):
+    return {
+        'ok': True,
+        'estado_anterior': estado_anterior,
+        'estado': nuevo_estado,
+        'cambio': cambio,
+        'bultos_finalizados': 0,
+        'detalles_preparados': 0,
+        'descontados': 0,
+        'sin_stock_013': [],
+        'mensaje': 'Sin cambios' if not cambio else '',
+    }
+
+
+def _actualizar_estado(ids, filas, nuevo_estado, ahora):
+    """Estado, timestamp de transición y contadores por estado/bodega."""
+    toca_pendiente = [pk for pk in ids if 'pendiente' in (filas[pk]['estado'], nuevo_estado)]
+    bodega_antes = contadores.claves_bodega(toca_pendiente) if toca_pendiente else Counter()
+
+    Solicitud.objects.filter(pk__in=ids).update(estado=nuevo_estado, updated_at=ahora)
+    campo_fecha = Solicitud.FECHAS_TRANSICION.get(nuevo_estado)
+    if campo_fecha:
+        Solicitud.objects.filter(pk__in=ids, **{f'{campo_fecha}__isnull': True}).update(**{campo_fecha: ahora})
+
+    contadores.ajustar_solicitudes(
+        ((filas[pk]['estado'], filas[pk]['urgente']), (nuevo_estado, filas[pk]['urgente']))
+        for pk in ids
+    )
+    if toca_pendiente:
+        contadores.ajustar_bodega_conjunto(bodega_antes, contadores.claves_bodega(toca_pendiente))
+
+
+def _finalizar_bultos(ids, ahora, reporte):
+    """Bultos de las solicitudes a 'finalizado'; retorna sus ids."""
+    from despacho.models import Bulto
+
+    bultos = Bulto.objects.filter(solicitud_id__in=ids)
+    finalizados = list(bultos.values_list('pk', 'solicitud_id'))
+    for solicitud_id, n in Counter(solicitud_id for _, solicitud_id in finalizados).items():
+        reporte[solicitud_id]['bultos_finalizados'] = n
+    bultos.update(
+        estado='finalizado',
+        fecha_envio=Coalesce(F('fecha_envio'), Value(ahora)),
+        fecha_entrega=Coalesce(F('fecha_entrega'), Value(ahora)),
+    )
+    return [pk for pk, _ in finalizados]
+
+
+def _preparar_detalles(ids, ahora, reporte):
+    """Los detalles con bulto quedan 'preparado' (estado final de la línea)."""
+    from bodega.models import StockReserva
+
+    detalles = (
+        SolicitudDetalle.objects
+        .filter(solicitud_id__in=ids, bulto__isnull=False)
+        .exclude(estado_bodega='preparado')
+    )
+    for fila in detalles.values('solicitud_id').annotate(n=Count('pk')).order_by():
+        reporte[fila['solicitud_id']]['detalles_preparados'] = fila['n']
+    StockReserva.objects.filter(detalle__in=detalles).exclude(estado='consumida').update(
+        estado='consumida', updated_at=ahora
+    )
+    if detalles.update(estado_bodega='preparado'):
+        contadores.recalcular_avance(ids)
+
+
+def _descontar_stock(ids, reporte):
+    """
+    Descuenta de bodega 013 lo que salió en bultos (sin bajar de 0), un UPDATE
+    por lote de códigos. Equivale a descontar línea por línea como antes.
+    """
+    from bodega.models import Stock
+
+    if not ids:
+        return
+    lineas = list(
+        SolicitudDetalle.objects
+        .filter(solicitud_id__in=ids, bulto__isnull=False)
+        .values_list('solicitud_id', 'codigo', 'cantidad')
+    )
+    por_codigo = defaultdict(int)
+    for _, codigo, cantidad in lineas:
+        por_codigo[codigo] += cantidad
+
+    codigos = sorted(por_codigo)
+    existentes = set()
+    for inicio in range(0, len(codigos), LOTE_STOCK):
+        lote = codigos[inicio:inicio + LOTE_STOCK]
+        filas = Stock.objects.filter(bodega=BODEGA_DESPACHO, codigo__in=lote)
+        existentes.update(filas.select_for_update().values_list('codigo', flat=True))
+        descuento = Case(
+            *[When(codigo=codigo, then=Value(por_codigo[codigo])) for codigo in lote],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        filas.update(stock_disponible=Greatest(F('stock_disponible') - descuento, Value(0)))
+
+    for solicitud_id, codigo, _ in lineas:
+        if codigo in existentes:
+            reporte[solicitud_id]['descontados'] += 1
+        elif codigo not in reporte[solicitud_id]['sin_stock_013']:
+            reporte[solicitud_id]['sin_stock_013'].append(codigo)
@@ -1,15 +1,17 @@
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
-from django.db.models import Count, Q
+from django.db import transaction
+from django.db.models import Count, F, Q
 from django.http import JsonResponse, HttpRequest, HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.views.decorators.csrf import csrf_exempt
 import json
 
+from core.busqueda import buscar_solicitudes
 from core.decorators import role_required
 from core.models import Bodega
+from core.paginacion import paginar
 from configuracion.models import EstadoWorkflow, TipoSolicitud
 from despacho.models import Bulto
 from .forms import (
@@ -19,8 +21,12 @@ from .forms import (
     SolicitudDetalleEdicionFormSet,
     BultoEdicionFormSet
 )
+from . import contadores
 from .models import Solicitud
-from .services import crear_solicitud_desde_payload, SolicitudServiceError
+from .services import crear_detalles, crear_solicitud_desde_payload, validar_stock, SolicitudServiceError
+
+# Estados que ve el rol despacho en la lista de solicitudes
+ESTADOS_LISTA_DESPACHO = ['en_despacho', 'embalado', 'listo_despacho', 'en_ruta']
 
 
 @login_required
@@ -57,7 +63,7 @@ def lista_solicitudes(request):
             tiene_pendientes=Exists(detalles_pendientes)
         ).filter(tiene_pendientes=True)
     elif user.es_despacho():
-        solicitudes = solicitudes.filter(estado__in=['en_despacho', 'embalado', 'listo_despacho', 'en_ruta'])
+        solicitudes = solicitudes.filter(estado__in=ESTADOS_LISTA_DESPACHO)
 
     # PASO 3: Aplicar filtros desde la URL
     estado = (request.GET.get('estado', '') or '').strip()
@@ -75,14 +81,7 @@ def lista_solicitudes(request):
     if transporte:
         solicitudes = solicitudes.filter(transporte=transporte)
     if busqueda:
-        solicitudes = solicitudes.filter(
-            Q(cliente__icontains=busqueda)
-            | Q(codigo__icontains=busqueda)
-            | Q(descripcion__icontains=busqueda)
-            | Q(numero_pedido__icontains=busqueda)
-            | Q(numero_st__icontains=busqueda)
-            | Q(numero_ot__icontains=busqueda)
-        )
+        solicitudes = buscar_solicitudes(solicitudes, busqueda)
 
     # PASO 4: Cargar relaciones ANTES de paginar (Django solo carga 25 en la query)
     # El prefetch_related es inteligente y solo carga relaciones de los objetos obtenidos
@@ -96,9 +95,16 @@ def lista_solicitudes(request):
         .order_by('id')  # Orden ascendente: más antiguas primero
     )
     
-    # PASO 5: Paginar (esto ejecuta la query pero Django solo trae 25 registros)
-    paginator = Paginator(solicitudes, 25)
-    page_obj = paginator.get_page(request.GET.get('page'))
+    # PASO 5: Paginar por keyset (WHERE id > cursor): la página N cuesta lo mismo
+    # que la primera. El total sale de la tabla de contadores cuando los filtros
+    # lo permiten; si no, de la estimación del planificador.
+    total = None
+    if not user.es_bodega() and not (tipo or transporte or busqueda):
+        estados = ESTADOS_LISTA_DESPACHO if user.es_despacho() else None
+        if estado:
+            estados = [estado] if estados is None or estado in estados else []
+        total = contadores.total_solicitudes(estados, solo_urgentes=urgente == '1')
+    page_obj = paginar(solicitudes, ('id',), request.GET, limite=25, total=total)
 
     # Stats: Solo si es necesario (comentado por ahora para velocidad)
     # stats = Solicitud.objects.values('estado').annotate(total=Count('id'))
@@ -115,7 +121,7 @@ def lista_solicitudes(request):
         'busqueda': busqueda,
         'stats': stats,
         'es_admin': user.es_admin(),
-        'tipos': [(t.codigo, t.nombre) for t in TipoSolicitud.activos()] if TipoSolicitud.activos().exists() else Solicitud.TIPOS,
+        'tipos': TipoSolicitud.opciones() or Solicitud.TIPOS,
         'estados_config': estados_opciones,
         'transportes_config': TransporteConfig.activos(),
     }
@@ -130,8 +136,6 @@ def crear_solicitud(request):
     VALIDA STOCK: Crea solicitud solo con códigos que tienen stock.
     Si hay un solo código y no tiene stock, rechaza la solicitud.
     """
-    from bodega.models import Stock
-    
     bodegas_activas = list(
         Bodega.objects.filter(activa=True)
         .order_by('codigo')
@@ -167,61 +171,8 @@ def crear_solicitud(request):
                 messages.error(request, 'Debes ingresar al menos un producto en la tabla.')
             else:
                 # ⚠️ VALIDACIÓN DE STOCK: Separar códigos con stock de los que no tienen
-                detalles_con_stock = []
-                detalles_sin_stock = []
-                
-                for cd in detalles_validos:
-                    codigo = cd.get('codigo') or 'SC'
-                    cantidad = cd.get('cantidad')
-                    bodega_asignada = (cd.get('bodega') or '').strip()
-                    
-                    # Bodega 013 no requiere validación de stock - siempre permitir
-                    if bodega_asignada == '013':
-                        detalles_con_stock.append(cd)
-                        continue
-                    
-                    # Si no hay bodega asignada, no tiene stock
-                    if not bodega_asignada:
-                        detalles_sin_stock.append({
-                            'codigo': codigo,
-                            'descripcion': cd.get('descripcion', ''),
-                            'cantidad': cantidad,
-                            'bodega': 'Sin asignar',
-                            'problema': 'No tiene bodega asignada',
-                            'stock_disponible': None
-                        })
-                        continue
-                    
-                    # Validar stock en la bodega asignada
-                    stock_bodega = Stock.objects.filter(
-                        codigo=codigo,
-                        bodega=bodega_asignada
-                    ).first()
-                    
-                    if not stock_bodega:
-                        detalles_sin_stock.append({
-                            'codigo': codigo,
-                            'descripcion': cd.get('descripcion', ''),
-                            'cantidad': cantidad,
-                            'bodega': bodega_asignada,
-                            'problema': f'El código no existe en bodega {bodega_asignada}',
-                            'stock_disponible': 0
-                        })
-                    elif stock_bodega.stock_disponible < cantidad:
-                        faltante = cantidad - stock_bodega.stock_disponible
-                        detalles_sin_stock.append({
-                            'codigo': codigo,
-                            'descripcion': cd.get('descripcion', ''),
-                            'cantidad': cantidad,
-                            'bodega': bodega_asignada,
-                            'problema': f'Stock insuficiente: tiene {stock_bodega.stock_disponible}, se solicitan {cantidad}',
-                            'stock_disponible': stock_bodega.stock_disponible,
-                            'faltante': faltante
-                        })
-                    else:
-                        # Stock suficiente, agregar a los que tienen stock
-                        detalles_con_stock.append(cd)
-                
+                detalles_con_stock, detalles_sin_stock = validar_stock(detalles_validos)
+
                 # ⚠️ REGLA CRÍTICA: Si hay un solo código y no tiene stock, NO crear la solicitud
                 if len(detalles_validos) == 1 and len(detalles_sin_stock) == 1:
                     error = detalles_sin_stock[0]
@@ -304,19 +255,14 @@ def crear_solicitud(request):
                 if todas_bodega_013:
                     solicitud.estado = 'en_despacho'
 
-                solicitud.save()
+                with transaction.atomic():
+                    solicitud.save()
 
-                # Guardar SOLO las líneas que tienen stock
-                for cd in detalles_con_stock:
-                    bodega_detalle = (cd.get('bodega') or '').strip()
-                    estado_bodega_inicial = 'preparado' if todas_bodega_013 else 'pendiente'
-                    
-                    solicitud.detalles.create(
-                        codigo=cd.get('codigo') or 'SC',
-                        descripcion=cd.get('descripcion') or '',
-                        cantidad=cd.get('cantidad'),
-                        bodega=bodega_detalle,
-                        estado_bodega=estado_bodega_inicial,
+                    # Guardar SOLO las líneas que tienen stock
+                    crear_detalles(
+                        solicitud,
+                        detalles_con_stock,
+                        estado_bodega='preparado' if todas_bodega_013 else 'pendiente',
                     )
 
                 messages.success(
@@ -410,11 +356,12 @@ def preparar_producto(request, detalle_id):
         
         messages.success(request, f'Producto {detalle.codigo} marcado como preparado.')
         
-        # Verificar si la solicitud está completa
-        solicitud = detalle.solicitud
-        pendientes = solicitud.detalles.exclude(estado_bodega='preparado').exists()
+        # Verificar si la solicitud está completa (contadores de avance ya actualizados)
+        solicitud = Solicitud.objects.filter(
+            pk=detalle.solicitud_id, lineas_preparadas=F('lineas_total')
+        ).first()
         
-        if not pendientes:
+        if solicitud:
             solicitud.estado = 'en_despacho'
             solicitud.save()
             messages.info(request, '¡Todos los productos preparados! Solicitud enviada a despacho.')
@@ -699,6 +646,7 @@ def editar_solicitud(request, pk):
                 if detalles_con_bulto.exists():
                     detalles_actualizados = detalles_con_bulto.exclude(estado_bodega='preparado').update(estado_bodega='preparado')
                     if detalles_actualizados > 0:
+                        contadores.recalcular_avance([solicitud.pk])
                         logger.info(f"{detalles_actualizados} detalles actualizados a 'preparado' para solicitud #{solicitud.id}")
                 
                 # Descontar stock si corresponde (solo si afecta stock)
@@ -718,15 +666,9 @@ def editar_solicitud(request, pk):
                 print(f"   Productos descontados: {resultado_descuento.get('descontados', 0)}")
                 print(f"{'='*60}\n")
             
-            # Limpiar caché del informe para que refleje los cambios
-            from django.core.cache import cache
-            # Limpiar todo el caché de informes (las claves empiezan con 'informe_completo_')
-            # Como no tenemos delete_pattern en locmem, limpiamos todo
-            try:
-                cache.clear()
-                print(f"🗑️  Caché limpiado para reflejar cambios en reportes")
-            except Exception as e:
-                print(f"⚠️  No se pudo limpiar caché: {e}")
+            # Invalidar caché de informes y dashboard (incluye cambios hechos con QuerySet.update())
+            from core.cache_datos import invalidar_cache_datos
+            invalidar_cache_datos()
             
             messages.success(request, f'Solicitud #{solicitud.id} actualizada correctamente.')
             return redirect('solicitudes:detalle', pk=solicitud.pk)
@@ -754,180 +696,52 @@ def editar_solicitud(request, pk):
 def cambiar_estado_solicitud(request, pk):
     """
     Permite al admin cambiar el estado de una solicitud.
-    Si el nuevo estado es 'despachado', actualiza bultos asociados y descuenta el stock.
+    Si el nuevo estado es 'despachado', finaliza sus bultos y descuenta el stock
+    (ver solicitudes.transiciones).
     """
-    from .services import descontar_stock_despachado
-    from django.utils import timezone
-    import logging
-    
-    logger = logging.getLogger(__name__)
-    
-    # LOG INICIAL
-    print(f"\n{'='*60}")
-    print(f"🔔 CAMBIAR ESTADO SOLICITUD - Solicitud #{pk}")
-    print(f"{'='*60}")
-    print(f"Usuario: {request.user}")
-    print(f"Método: {request.method}")
-    print(f"POST data: {dict(request.POST)}")
-    
+    from .transiciones import cambiar_estado
+
     solicitud = get_object_or_404(Solicitud, pk=pk)
-    
-    print(f"Estado actual: {solicitud.estado}")
-    print(f"Afecta stock: {solicitud.afecta_stock}")
-    
+
     if request.method != 'POST':
-        print("❌ Método no es POST")
         return JsonResponse({'success': False, 'message': 'Método no permitido'}, status=405)
-    
+
     nuevo_estado = request.POST.get('estado')
     numero_guia_despacho = request.POST.get('numero_guia_despacho', '').strip()
-    
-    print(f"Nuevo estado: {nuevo_estado}")
-    print(f"Número guía: {numero_guia_despacho}")
-    
-    logger.info(f"Cambiar estado solicitud #{solicitud.id}: {solicitud.estado} → {nuevo_estado}")
-    logger.info(f"Guía: {numero_guia_despacho}")
-    
     if not nuevo_estado:
         return JsonResponse({'success': False, 'message': 'Estado no proporcionado'}, status=400)
-    
-    estado_anterior = solicitud.estado
-    solicitud.estado = nuevo_estado
-    
-    # Si se proporciona número de guía, guardarlo
-    if numero_guia_despacho:
-        solicitud.numero_guia_despacho = numero_guia_despacho
-        solicitud.save(update_fields=['estado', 'numero_guia_despacho'])
-    else:
-        solicitud.save(update_fields=['estado'])
-    
-    # Si el nuevo estado es despachado, actualizar bultos asociados y descontar stock
+
+    try:
+        resultado = cambiar_estado([solicitud.pk], nuevo_estado, numero_guia_despacho)[solicitud.pk]
+    except SolicitudServiceError as exc:
+        return JsonResponse({'success': False, 'message': str(exc)}, status=400)
+    solicitud.refresh_from_db()
+
     resultado_descuento = None
-    bultos_actualizados = 0
-    
-    # LÓGICA SIMPLE: Si la solicitud pasa a 'despachado', buscar TODOS los bultos asociados y finalizarlos
-    if nuevo_estado == 'despachado':
-        print(f"\n{'='*60}")
-        print(f"🚚 PROCESANDO DESPACHO - Solicitud #{solicitud.id}")
-        print(f"{'='*60}")
-        print(f"   Afecta stock: {solicitud.afecta_stock}")
-        print(f"   Estado anterior: {estado_anterior}")
-        print(f"   Nuevo estado: {nuevo_estado}")
-        
-        # SOLO procesar si cambió el estado (evitar procesar múltiples veces)
-        if estado_anterior != 'despachado':
-            
-            # BUSCAR TODOS los bultos asociados a esta solicitud
-            bultos_asociados = Bulto.objects.filter(solicitud=solicitud)
-            total_bultos = bultos_asociados.count()
-            
-            print(f"\n📦 ACTUALIZACIÓN DE BULTOS:")
-            print(f"   Bultos encontrados: {total_bultos}")
-            logger.info(f"Buscando bultos para solicitud #{solicitud.id}. Total: {total_bultos}")
-            
-            if total_bultos > 0:
-                # ACTUALIZAR DIRECTAMENTE todos los bultos a 'finalizado' y establecer fechas si faltan
-                ahora = timezone.now()
-                
-                for bulto in bultos_asociados:
-                    estado_anterior_bulto = bulto.estado
-                    print(f"\n   📦 Bulto {bulto.codigo}:")
-                    print(f"      Estado anterior: '{estado_anterior_bulto}'")
-                    
-                    # SIEMPRE actualizar a 'finalizado' cuando la solicitud está despachada
-                    bulto.estado = 'finalizado'
-                    campos_actualizar = ['estado']
-                    
-                    # Establecer fechas si no existen
-                    if not bulto.fecha_entrega:
-                        bulto.fecha_entrega = ahora
-                        campos_actualizar.append('fecha_entrega')
-                        print(f"      ✅ Fecha entrega establecida: {bulto.fecha_entrega}")
-                    
-                    if not bulto.fecha_envio:
-                        bulto.fecha_envio = ahora
-                        campos_actualizar.append('fecha_envio')
-                        print(f"      ✅ Fecha envío establecida: {bulto.fecha_envio}")
-                    
-                    try:
-                        bulto.save(update_fields=campos_actualizar)
-                        bultos_actualizados += 1
-                        print(f"      ✅ Bulto actualizado a 'finalizado'")
-                        logger.info(f"Bulto {bulto.codigo} actualizado a 'finalizado' para solicitud #{solicitud.id}")
-                    except Exception as e:
-                        print(f"      ❌ ERROR al guardar bulto: {e}")
-                        logger.error(f"Error al actualizar bulto {bulto.codigo}: {e}", exc_info=True)
-            else:
-                print(f"   ⚠️  ADVERTENCIA: No se encontraron bultos asociados a la solicitud")
-                logger.warning(f"No se encontraron bultos para solicitud #{solicitud.id}")
-            
-            # Actualizar detalles que tienen bulto asignado (marcarlos como 'preparado' que es el estado final)
-            # Nota: Los detalles no tienen un estado 'despachado', así que los mantenemos en 'preparado'
-            print(f"\n📋 ACTUALIZACIÓN DE DETALLES:")
-            detalles_con_bulto = solicitud.detalles.filter(bulto__isnull=False)
-            total_detalles_con_bulto = detalles_con_bulto.count()
-            print(f"   Detalles con bulto asignado: {total_detalles_con_bulto}")
-            logger.info(f"Actualizando detalles con bulto para solicitud #{solicitud.id}. Total: {total_detalles_con_bulto}")
-            
-            if total_detalles_con_bulto > 0:
-                detalles_actualizados = detalles_con_bulto.exclude(estado_bodega='preparado').update(estado_bodega='preparado')
-                if detalles_actualizados > 0:
-                    print(f"   ✅ {detalles_actualizados} detalles actualizados a 'preparado'")
-                    logger.info(f"{detalles_actualizados} detalles actualizados a 'preparado' para solicitud #{solicitud.id}")
-                else:
-                    print(f"   ℹ️  Todos los detalles ya estaban en estado 'preparado'")
-                    logger.info(f"Todos los detalles ya estaban 'preparado' para solicitud #{solicitud.id}")
-            
-            # Descontar stock
-            print(f"\n💰 DESCUENTO DE STOCK:")
-            print(f"   Afecta stock: {solicitud.afecta_stock}")
-            logger.info(f"Ejecutando descuento de stock para solicitud #{solicitud.id}. Afecta stock: {solicitud.afecta_stock}")
-            
-            resultado_descuento = descontar_stock_despachado(solicitud)
-            
-            print(f"   Resultado: {resultado_descuento.get('message', 'N/A')}")
-            print(f"   Productos descontados: {resultado_descuento.get('descontados', 0)}")
-            
-            if resultado_descuento.get('errores'):
-                print(f"   ⚠️  Errores encontrados: {resultado_descuento['errores']}")
-            
-            logger.info(f"Resultado descuento stock solicitud #{solicitud.id}: {resultado_descuento}")
-            
-            if not resultado_descuento['success']:
-                mensaje = f'Solicitud marcada como despachada, pero hubo errores al descontar stock: {resultado_descuento.get("errores", [])}'
-                print(f"\n   ❌ ERROR EN DESCUENTO DE STOCK")
-                logger.error(f"Error al descontar stock para solicitud #{solicitud.id}: {resultado_descuento.get('errores', [])}")
-                return JsonResponse({
-                    'success': True,
-                    'warning': True,
-                    'message': mensaje,
-                    'descuento': resultado_descuento
-                })
-            
-            print(f"\n{'='*60}")
-            print(f"✅ DESPACHO PROCESADO EXITOSAMENTE")
-            print(f"   Bultos actualizados: {bultos_actualizados}/{total_bultos}")
-            print(f"   Productos descontados: {resultado_descuento.get('descontados', 0)}")
-            print(f"{'='*60}\n")
-        else:
-            logger.info(f"Solicitud #{solicitud.id} ya estaba despachada, omitiendo procesamiento adicional")
-    
+    if nuevo_estado == 'despachado' and resultado['cambio']:
+        resultado_descuento = _resumen_descuento(solicitud, resultado)
+
     mensaje = f'Estado cambiado a {solicitud.get_estado_display()}'
     if numero_guia_despacho:
         mensaje += f' (Guía/Factura: {numero_guia_despacho})'
-    if bultos_actualizados > 0:
-        mensaje += f'. {bultos_actualizados} bulto(s) actualizado(s) a finalizado.'
-    if resultado_descuento and resultado_descuento.get('descontados', 0) > 0:
-        mensaje += f' Se descontaron {resultado_descuento["descontados"]} productos de bodega 013.'
+    if resultado['bultos_finalizados'] > 0:
+        mensaje += f". {resultado['bultos_finalizados']} bulto(s) actualizado(s) a finalizado."
+    if resultado['descontados'] > 0:
+        mensaje += f" Se descontaron {resultado['descontados']} productos de bodega 013."
     elif nuevo_estado == 'despachado' and not resultado_descuento:
         mensaje += ' (Ya estaba despachada, sin cambios en stock)'
-    
-    print(f"\n✅ CAMBIO EXITOSO:")
-    print(f"   Estado: {estado_anterior} → {nuevo_estado}")
-    print(f"   Bultos actualizados: {bultos_actualizados}")
-    print(f"   Mensaje: {mensaje}")
-    print(f"{'='*60}\n")
-    
+
+    if resultado_descuento and not resultado_descuento['success']:
+        return JsonResponse({
+            'success': True,
+            'warning': True,
+            'message': (
+                'Solicitud marcada como despachada, pero hubo errores al descontar stock: '
+                f"{resultado_descuento['errores']}"
+            ),
+            'descuento': resultado_descuento,
+        })
+
     return JsonResponse({
         'success': True,
         'message': mensaje,
@@ -938,6 +752,26 @@ def cambiar_estado_solicitud(request, pk):
     })
 
 
+def _resumen_descuento(solicitud, resultado):
+    """Resultado del descuento de stock con la forma que espera el frontend."""
+    if not solicitud.afecta_stock:
+        return {
+            'success': True,
+            'descontados': 0,
+            'errores': [],
+            'message': 'Solicitud no afecta stock (orden especial, garantías, traslados, etc.)'
+        }
+    return {
+        'success': not resultado['sin_stock_013'],
+        'descontados': resultado['descontados'],
+        'errores': [
+            {'codigo': codigo, 'mensaje': 'No existe en bodega 013'}
+            for codigo in resultado['sin_stock_013']
+        ],
+        'message': f"Se descontaron {resultado['descontados']} productos de bodega 013",
+    }
+
+
 @login_required
 @role_required(['admin'])
 def actualizacion_masiva(request):
@@ -1039,6 +873,18 @@ def actualizacion_masiva(request):
     if dep.get('total_no_encontrados', 0) > 0:
         msgs.append(f"{dep['total_no_encontrados']} no encontradas")
     messages.success(request, '. '.join(msgs) if msgs else 'Proceso completado.')
+    if dep.get('transportes_desconocidos'):
+        messages.warning(
+            request,
+            'Transportes no reconocidos (no se modificó el transporte): '
+            + ', '.join(dep['transportes_desconocidos'])
+        )
+    if dep.get('sin_stock_013'):
+        messages.warning(
+            request,
+            'Códigos despachados sin registro en bodega 013 (no se descontó stock): '
+            + ', '.join(dep['sin_stock_013'][:30])
+        )
     return redirect('solicitudes:actualizacion_masiva')
 
 